@@ -0,0 +1,216 @@
+"""
+지연 시간 기반 원격 백엔드 라우터 (+ 헤지 요청)
+
+백엔드별로 지연 시간/오류율 EWMA와 최근 지연 시간 분포(p50/p95/p99)를 유지하고,
+현재 가장 빠른 정상 백엔드로 작업을 보냅니다. 실패하면 다음 백엔드로 넘어가고,
+선택적으로 첫 백엔드가 자신의 p95를 넘기면 두 번째 백엔드에 헤지 요청을 보내
+먼저 끝난 쪽을 쓰고 나머지는 취소합니다.
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+
+# 라우터 설정 (환경 변수로 변경 가능)
+ROUTER_EWMA_ALPHA = float(os.environ.get("ROUTER_EWMA_ALPHA", "0.2"))
+ROUTER_WINDOW = int(os.environ.get("ROUTER_WINDOW", "200"))
+ROUTER_MAX_ERROR_RATE = float(os.environ.get("ROUTER_MAX_ERROR_RATE", "0.5"))
+ROUTER_COOLDOWN = float(os.environ.get("ROUTER_COOLDOWN", "30"))
+ROUTER_HEDGE = os.environ.get("ROUTER_HEDGE", "0") == "1"
+ROUTER_HEDGE_MIN_SAMPLES = int(os.environ.get("ROUTER_HEDGE_MIN_SAMPLES", "20"))
+
+
+def percentile(values, q):
+    """정렬된 리스트의 q 분위수 (선형 보간)"""
+    if not values:
+        return None
+    position = (len(values) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+class BackendStats:
+    """백엔드 하나의 지연 시간/오류율 통계"""
+
+    def __init__(self, alpha=ROUTER_EWMA_ALPHA, window=ROUTER_WINDOW):
+        self.alpha = alpha
+        self.latencies = deque(maxlen=window)
+        self.ewma_latency = None
+        self.ewma_error_rate = 0.0
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.cancelled = 0
+        self.last_error_at = None
+
+    def _update_latency(self, latency):
+        self.latencies.append(latency)
+        if self.ewma_latency is None:
+            self.ewma_latency = latency
+        else:
+            self.ewma_latency += self.alpha * (latency - self.ewma_latency)
+
+    def record_success(self, latency):
+        self.requests += 1
+        self._update_latency(latency)
+        self.ewma_error_rate *= 1 - self.alpha
+
+    def record_cancelled(self, elapsed):
+        """헤지에서 져 취소된 요청
+
+        경과 시간은 실제 지연 시간의 하한일 뿐이라 분위수 창에는 넣지 않고,
+        EWMA를 올릴 수만 있게 반영합니다 (느린 백엔드가 잘린 시점만큼 빠르게 기록되지 않도록).
+        """
+        self.cancelled += 1
+        if self.ewma_latency is None:
+            self.ewma_latency = elapsed
+        elif elapsed > self.ewma_latency:
+            self.ewma_latency += self.alpha * (elapsed - self.ewma_latency)
+
+    def record_error(self):
+        self.requests += 1
+        self.errors += 1
+        self.last_error_at = time.monotonic()
+        self.ewma_error_rate += self.alpha * (1 - self.ewma_error_rate)
+
+    def healthy(self, max_error_rate=ROUTER_MAX_ERROR_RATE, cooldown=ROUTER_COOLDOWN):
+        """오류율이 높으면 쿨다운 동안 제외 (쿨다운 후 다시 시도)"""
+        if self.ewma_error_rate < max_error_rate:
+            return True
+        return time.monotonic() - self.last_error_at > cooldown
+
+    def percentiles(self):
+        ordered = sorted(self.latencies)
+        return {q: percentile(ordered, q) for q in (0.5, 0.95, 0.99)}
+
+    def snapshot(self):
+        p = self.percentiles()
+
+        def ms(value):
+            return round(value * 1000, 1) if value is not None else None
+
+        return {
+            "ewma_ms": ms(self.ewma_latency),
+            "p50_ms": ms(p[0.5]),
+            "p95_ms": ms(p[0.95]),
+            "p99_ms": ms(p[0.99]),
+            "error_rate": round(self.ewma_error_rate, 3),
+            "requests": self.requests,
+            "errors": self.errors,
+            "cancelled": self.cancelled,
+            "in_flight": self.in_flight,
+            "healthy": self.healthy(),
+        }
+
+
+class BackendRouter:
+    """가장 빠른 정상 백엔드로 라우팅하고 실패 시 다음 백엔드로 넘어가는 라우터
+
+    Args:
+        backends: {이름: async fn(params) -> 결과} (등록 순서가 초기 우선순위)
+        hedge: p95를 넘기면 두 번째 백엔드로 헤지 요청을 보낼지 여부
+        hedge_min_samples: 헤지에 필요한 최소 지연 시간 샘플 수
+    """
+
+    def __init__(self, backends, hedge=ROUTER_HEDGE, hedge_min_samples=ROUTER_HEDGE_MIN_SAMPLES):
+        if not backends:
+            raise ValueError("라우터에 백엔드가 하나 이상 필요합니다")
+        self.backends = dict(backends)
+        self.order = list(self.backends)
+        self.stats = {name: BackendStats() for name in self.backends}
+        self.hedge = hedge
+        self.hedge_min_samples = hedge_min_samples
+
+    def ranked(self):
+        """정상 백엔드를 빠른 순으로 (측정값이 없는 백엔드는 먼저 시도해 측정)"""
+        def sort_key(name):
+            stats = self.stats[name]
+            if stats.ewma_latency is not None:
+                latency = stats.ewma_latency
+            else:
+                # 아직 호출하지 않은 백엔드는 먼저, 실패만 한 백엔드는 마지막
+                latency = -1.0 if stats.requests == 0 else float("inf")
+            return (not stats.healthy(), latency, self.order.index(name))
+        return sorted(self.backends, key=sort_key)
+
+    async def _call(self, name, params):
+        stats = self.stats[name]
+        stats.in_flight += 1
+        started = time.perf_counter()
+        try:
+            result = await self.backends[name](params)
+        except asyncio.CancelledError:
+            stats.record_cancelled(time.perf_counter() - started)
+            raise
+        except Exception:
+            stats.record_error()
+            raise
+        finally:
+            stats.in_flight -= 1
+        stats.record_success(time.perf_counter() - started)
+        return result
+
+    def _hedge_delay(self, name):
+        stats = self.stats[name]
+        if len(stats.latencies) < self.hedge_min_samples:
+            return None
+        return stats.percentiles()[0.95]
+
+    async def _race(self, candidates, params, errors):
+        """첫 후보를 보내고, 헤지가 켜져 있으면 p95를 넘길 때 두 번째 후보도 보냄
+
+        먼저 성공한 (결과, 이름, 헤지 여부)를 반환하고 진 쪽은 취소합니다.
+        실패한 백엔드는 errors에 기록되고 candidates에서 제거됩니다.
+        """
+        primary = candidates.pop(0)
+        tasks = {asyncio.ensure_future(self._call(primary, params)): primary}
+        delay = self._hedge_delay(primary) if self.hedge and candidates else None
+
+        hedged = False
+        if delay is not None:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                hedged = True
+                secondary = candidates.pop(0)
+                print(f"⏱️ {primary}가 p95({delay * 1000:.0f}ms) 초과, {secondary}로 헤지 요청")
+                tasks[asyncio.ensure_future(self._call(secondary, params))] = secondary
+
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result(), tasks[task], hedged
+                    errors.append(f"{tasks[task]}: {task.exception()}")
+                    print(f"⚠️ 백엔드 실패: {errors[-1]}")
+        finally:
+            # 진 쪽 요청 취소 후 정리될 때까지 대기
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+        return None
+
+    async def call(self, params):
+        """작업 실행 후 (결과, 메타데이터) 반환, 모든 백엔드가 실패하면 RuntimeError"""
+        candidates = self.ranked()
+        errors = []
+
+        while candidates:
+            outcome = await self._race(candidates, params, errors)
+            if outcome is not None:
+                result, winner, hedged = outcome
+                return result, {
+                    "backend": winner,
+                    "hedged": hedged,
+                    "failed_over": errors,
+                    "backend_stats": self.snapshot(),
+                }
+
+        raise RuntimeError("모든 백엔드 실패: " + "; ".join(errors))
+
+    def snapshot(self):
+        return {name: stats.snapshot() for name, stats in self.stats.items()}
@@ -0,0 +1,116 @@
+"""
+요청 마이크로 배칭 (Request Coalescer)
+
+짧은 시간 창 안에 들어온 작업 중 같은 배치 키(해상도, 스텝, 가이던스)를 가진
+것들을 모아 한 번의 pipe() 호출로 처리합니다.
+"""
+
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# 배칭 설정 (환경 변수로 변경 가능)
+MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", "4"))
+BATCH_MAX_WAIT_MS = float(os.environ.get("BATCH_MAX_WAIT_MS", "50"))
+MAX_CONCURRENCY = int(os.environ.get("MAX_CONCURRENCY", str(MAX_BATCH_SIZE)))
+
+
+class RequestCoalescer:
+    """같은 키의 작업을 모아 배치 함수 한 번으로 실행하는 코얼레서
+
+    Args:
+        run_batch: 작업 리스트를 받아 같은 길이의 결과 리스트를 반환하는 함수
+        max_batch_size: 한 배치의 최대 작업 수
+        max_wait_ms: 첫 작업이 도착한 뒤 배치를 기다리는 최대 시간 (ms)
+    """
+
+    def __init__(self, run_batch, max_batch_size=MAX_BATCH_SIZE,
+                 max_wait_ms=BATCH_MAX_WAIT_MS):
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._pending = {}
+        self._timers = {}
+        # GPU는 한 번에 한 배치만 처리하도록 단일 스레드 사용
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    async def submit(self, key, item):
+        """작업을 대기열에 넣고 해당 작업의 결과를 기다림
+
+        Returns:
+            (결과, 배치 크기, {"started", "executor_wait_s", "run_s"})
+            started는 실행기가 배치를 실제로 시작한 time.perf_counter() 값이고,
+            executor_wait_s는 배치를 꺼낸 뒤 앞선 GPU 작업을 기다린 시간입니다.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        bucket = self._pending.setdefault(key, [])
+        bucket.append((item, future))
+
+        if len(bucket) >= self.max_batch_size:
+            self._flush(key)
+        elif key not in self._timers:
+            self._timers[key] = loop.call_later(self.max_wait, self._flush, key)
+
+        return await future
+
+    async def run_exclusive(self, fn, *args):
+        """배치와 같은 GPU 스레드에서 단독 작업 실행 (스트리밍 등)"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    def _flush(self, key):
+        """대기 중인 배치를 꺼내 실행기로 보냄"""
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+
+        bucket = self._pending.pop(key, [])
+        if not bucket:
+            return
+
+        # 최대 배치 크기를 넘는 작업은 다음 배치로 넘김
+        batch, rest = bucket[:self.max_batch_size], bucket[self.max_batch_size:]
+        if rest:
+            self._pending[key] = rest
+            loop = asyncio.get_running_loop()
+            self._timers[key] = loop.call_later(self.max_wait, self._flush, key)
+
+        asyncio.ensure_future(self._run(batch))
+
+    async def _run(self, batch):
+        loop = asyncio.get_running_loop()
+        items = [item for item, _ in batch]
+        flushed = time.perf_counter()
+        timing = {}
+
+        def run():
+            # 실행기 대기열(앞선 배치/단독 작업)을 빠져나와 실제로 시작한 시각부터 잼
+            timing["started"] = time.perf_counter()
+            try:
+                return self.run_batch(items)
+            finally:
+                timing["run_s"] = time.perf_counter() - timing["started"]
+
+        try:
+            results = await loop.run_in_executor(self._executor, run)
+            if len(results) != len(items):
+                raise RuntimeError(
+                    f"배치 결과 수 불일치: {len(results)} != {len(items)}"
+                )
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        timing["executor_wait_s"] = timing["started"] - flushed
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result((result, len(batch), timing))
+
+
+def concurrency_modifier(current_concurrency):
+    """RunPod 워커 하나가 동시에 받을 작업 수"""
+    return MAX_CONCURRENCY
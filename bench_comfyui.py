@@ -0,0 +1,144 @@
+"""
+ComfyUI 클라이언트 처리량 벤치마크 (가짜 RunPod 엔드포인트 사용)
+
+기존 runpod_comfyui_lora_example.generate_image 방식 (작업마다 /runsync 하나씩, 순차)과
+comfyui_client.ComfyClient (/run 비동기 제출 + 일괄 /status 폴링 + 동시 진행 수 제한)를
+같은 가짜 엔드포인트(워커 N개, 작업당 고정 시간)로 비교합니다.
+각 케이스는 별도 프로세스에서 가짜 서버를 띄워 실행합니다.
+
+사용법:
+    python bench_comfyui.py
+    python bench_comfyui.py --jobs 64 --workers 8 --job-seconds 1 --in-flight 4 8 16 --output comfy.json
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import subprocess
+import sys
+import threading
+import time
+from io import BytesIO
+
+from PIL import Image
+
+
+def legacy_generate(base_url, workflow, prompt):
+    """기존 generate_image (얕은 복사 + /runsync, 비교 기준)"""
+    import requests
+
+    workflow_copy = workflow.copy()
+    workflow_copy["6"]["inputs"]["text"] = prompt
+    response = requests.post(
+        f"{base_url}/bench/runsync",
+        headers={"Authorization": "Bearer bench", "Content-Type": "application/json"},
+        json={"input": {"workflow": workflow_copy}}
+    )
+    result = response.json()
+    if "output" in result and "images" in result["output"]:
+        entry = result["output"]["images"][0]
+        data = entry["data"] if isinstance(entry, dict) else entry
+        Image.open(BytesIO(base64.b64decode(data))).load()
+        return True
+    return False
+
+
+def start_fake(workers, job_seconds):
+    """백그라운드 스레드의 이벤트 루프에서 가짜 엔드포인트 실행"""
+    from fake_runpod import FakeRunPod
+
+    fake = FakeRunPod(workers=workers, job_seconds=job_seconds)
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    base_url = asyncio.run_coroutine_threadsafe(fake.start(port=0), loop).result()
+    return fake, base_url
+
+
+def run_case(method, jobs, workers, job_seconds, in_flight, poll_interval):
+    from comfyui_client import ComfyClient
+    from runpod_comfyui_lora_example import template, workflow
+
+    fake, base_url = start_fake(workers, job_seconds)
+    prompts = [f"anime character, scene {i}" for i in range(jobs)]
+
+    started = time.perf_counter()
+    if method == "legacy":
+        ok = sum(legacy_generate(base_url, workflow, p) for p in prompts)
+        client_requests = {}
+    else:
+        async def run():
+            client = ComfyClient("bench", "bench", api_url=base_url, max_in_flight=in_flight,
+                                 poll_interval=poll_interval)
+            try:
+                results = await client.run_all([template.render(prompt=p) for p in prompts])
+            finally:
+                await client.close()
+            return sum(r.ok for r in results), client.requests
+
+        ok, client_requests = asyncio.run(run())
+    elapsed = time.perf_counter() - started
+
+    return {
+        "method": method,
+        "in_flight": in_flight if method != "legacy" else 1,
+        "jobs": jobs,
+        "ok": ok,
+        "elapsed_s": round(elapsed, 3),
+        "jobs_per_s": round(jobs / elapsed, 3),
+        "server_requests": dict(fake.requests),
+        "client_requests": client_requests,
+    }
+
+
+def spawn(label, method, args, in_flight=0):
+    proc = subprocess.run(
+        [sys.executable, __file__, "--case", method, str(args.jobs), str(args.workers),
+         str(args.job_seconds), str(in_flight), str(args.poll_interval)],
+        capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"{label} 실패:\n{proc.stderr[-3000:]}")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["label"] = label
+    requests = result["server_requests"]
+    print(f"   {label:<24}{result['elapsed_s']:>9.2f}초{result['jobs_per_s']:>9.2f}작업/초"
+          f"   성공 {result['ok']}/{result['jobs']}  status 요청 {requests['status']}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ComfyUI 클라이언트 처리량 벤치마크")
+    parser.add_argument("--jobs", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=8, help="가짜 엔드포인트의 워커 수")
+    parser.add_argument("--job-seconds", type=float, default=1.0)
+    parser.add_argument("--in-flight", type=int, nargs="+", default=[4, 8, 16])
+    parser.add_argument("--poll-interval", type=float, default=0.25)
+    parser.add_argument("--output", default="")
+    parser.add_argument("--case", nargs=6, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        method, jobs, workers, job_seconds, in_flight, poll_interval = args.case
+        print(json.dumps(run_case(method, int(jobs), int(workers), float(job_seconds),
+                                  int(in_flight), float(poll_interval))))
+        return
+
+    print(f"🧪 작업 {args.jobs}개, 워커 {args.workers}개, 작업당 {args.job_seconds}초\n")
+    results = [spawn("legacy (/runsync 순차)", "legacy", args)]
+    for in_flight in args.in_flight:
+        results.append(spawn(f"client (동시 {in_flight})", "client", args, in_flight))
+
+    legacy_s = results[0]["elapsed_s"]
+    best = min(results[1:], key=lambda r: r["elapsed_s"])
+    print(f"\n최고 처리량: {best['label']}, 순차 대비 {legacy_s / best['elapsed_s']:.1f}x")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"jobs": args.jobs, "workers": args.workers, "job_seconds": args.job_seconds,
+                       "results": results}, f, indent=2)
+        print(f"✅ 결과 저장: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
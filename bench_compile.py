@@ -0,0 +1,211 @@
+"""
+해상도 버킷 + torch.compile 벤치마크
+
+버킷마다 트랜스포머 한 스텝(forward) 시간을 eager와 컴파일 버전으로 비교하고,
+컴파일 캐시가 비어 있을 때(cold)와 이전 실행의 캐시를 재사용할 때(warm)의
+시작 비용(모든 버킷 워밍업까지 걸린 시간)을 측정합니다.
+인프로세스 캐시의 영향을 없애기 위해 각 케이스를 별도 프로세스에서 실행합니다.
+
+--model tiny는 무작위 가중치의 작은 FluxTransformer2DModel로 CPU에서도 돌고,
+--model flux는 handler.py와 같은 경로의 FLUX.1-dev 트랜스포머를 GPU에서 사용합니다.
+
+사용법:
+    python bench_compile.py --model tiny --buckets 512x512 768x512 --mode default
+    python bench_compile.py --model flux --output compile.json
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+TINY_CONFIG = {
+    "num_layers": 1,
+    "num_single_layers": 2,
+    "attention_head_dim": 128,
+    "num_attention_heads": 2,
+    "joint_attention_dim": 256,
+    "pooled_projection_dim": 64,
+    "guidance_embeds": True,
+}
+
+
+def make_transformer(kind):
+    import torch
+    from diffusers import FluxTransformer2DModel
+
+    if kind == "tiny":
+        torch.manual_seed(0)
+        return FluxTransformer2DModel(**TINY_CONFIG).eval(), torch.device("cpu"), torch.float32
+
+    from handler import model_path
+
+    transformer = FluxTransformer2DModel.from_pretrained(
+        model_path, subfolder="transformer", torch_dtype=torch.bfloat16
+    )
+    return transformer.to("cuda").eval(), torch.device("cuda"), torch.bfloat16
+
+
+def make_inputs(config, width, height, batch_size, device, dtype, text_tokens=512):
+    """FLUX 파이프라인이 트랜스포머에 넘기는 것과 같은 형태의 입력"""
+    import torch
+
+    seq = (height // 16) * (width // 16)
+    generator = torch.Generator().manual_seed(0)
+
+    def randn(*shape):
+        return torch.randn(*shape, generator=generator).to(device, dtype)
+
+    inputs = {
+        "hidden_states": randn(batch_size, seq, config.in_channels),
+        "encoder_hidden_states": randn(batch_size, text_tokens, config.joint_attention_dim),
+        "pooled_projections": randn(batch_size, config.pooled_projection_dim),
+        "timestep": torch.full((batch_size,), 0.5, device=device, dtype=dtype),
+        "img_ids": torch.zeros(seq, 3, device=device, dtype=dtype),
+        "txt_ids": torch.zeros(text_tokens, 3, device=device, dtype=dtype),
+        "return_dict": False,
+    }
+    if config.guidance_embeds:
+        inputs["guidance"] = torch.full((batch_size,), 3.5, device=device, dtype=dtype)
+    return inputs
+
+
+def run_case(kind, compiled, cache_root, buckets, steps, mode, text_tokens):
+    """단일 케이스 실행 (자식 프로세스에서 호출)"""
+    import torch
+    from compile_cache import configure_cache, load_artifacts, save_artifacts, compile_module
+
+    started = time.perf_counter()
+    transformer, device, dtype = make_transformer(kind)
+    config = transformer.config
+    load_s = time.perf_counter() - started
+
+    artifacts_loaded = False
+    cache_dir = None
+    if compiled:
+        cache_dir = configure_cache(cache_root, f"bench-{kind}", mode)
+        artifacts_loaded = load_artifacts(cache_dir)
+        transformer = compile_module(transformer, mode=mode)
+
+    def sync():
+        if device.type == "cuda":
+            torch.cuda.synchronize()
+
+    per_bucket = {}
+    warmup_started = time.perf_counter()
+    with torch.no_grad():
+        for width, height in buckets:
+            inputs = make_inputs(config, width, height, 1, device, dtype, text_tokens)
+
+            first_started = time.perf_counter()
+            transformer(**inputs)
+            sync()
+            first_call_s = time.perf_counter() - first_started
+
+            timings = []
+            for _ in range(steps):
+                step_started = time.perf_counter()
+                transformer(**inputs)
+                sync()
+                timings.append((time.perf_counter() - step_started) * 1000)
+
+            per_bucket[f"{width}x{height}"] = {
+                "first_call_s": round(first_call_s, 3),
+                "step_ms_p50": round(float(np.percentile(timings, 50)), 2),
+                "step_ms_min": round(min(timings), 2),
+            }
+    warmup_s = sum(b["first_call_s"] for b in per_bucket.values())
+
+    if compiled:
+        save_artifacts(cache_dir)
+
+    return {
+        "model": kind,
+        "compiled": compiled,
+        "mode": mode if compiled else None,
+        "artifacts_loaded": artifacts_loaded,
+        "load_s": round(load_s, 2),
+        # 모든 버킷의 첫 호출(컴파일 포함) 시간 합 = 시작 시 워밍업 비용
+        "warmup_s": round(warmup_s, 2),
+        "total_s": round(time.perf_counter() - warmup_started + load_s, 2),
+        "buckets": per_bucket,
+    }
+
+
+def spawn(args, label, compiled, cache_root):
+    cmd = [
+        sys.executable, __file__, "--model", args.model, "--steps", str(args.steps),
+        "--mode", args.mode, "--text-tokens", str(args.text_tokens),
+        "--buckets", *args.buckets, "--cache-root", cache_root,
+        "--case", "compiled" if compiled else "eager",
+    ]
+    print(f"▶️ {label} 실행 중...")
+    proc = subprocess.run(cmd, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{label} 실패:\n{proc.stderr[-3000:]}")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["label"] = label
+    return result
+
+
+def main():
+    from compile_cache import TORCH_COMPILE_MODE
+    from resolution_buckets import build_buckets
+
+    parser = argparse.ArgumentParser(description="해상도 버킷 torch.compile 벤치마크")
+    parser.add_argument("--model", choices=["tiny", "flux"], default="tiny")
+    parser.add_argument("--buckets", nargs="+", default=None,
+                        help="WxH 목록 (기본: resolution_buckets 설정)")
+    parser.add_argument("--steps", type=int, default=5)
+    parser.add_argument("--mode", default=TORCH_COMPILE_MODE)
+    parser.add_argument("--text-tokens", type=int, default=512)
+    parser.add_argument("--cache-root", default="",
+                        help="컴파일 캐시 루트 (기본: 임시 디렉토리, cold/warm 비교용)")
+    parser.add_argument("--output", default="")
+    parser.add_argument("--case", choices=["eager", "compiled"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.buckets is None:
+        args.buckets = [f"{w}x{h}" for w, h in build_buckets()]
+    buckets = [tuple(int(v) for v in b.split("x")) for b in args.buckets]
+
+    if args.case:
+        result = run_case(args.model, args.case == "compiled", args.cache_root, buckets,
+                          args.steps, args.mode, args.text_tokens)
+        print(json.dumps(result))
+        return
+
+    cache_root = args.cache_root or tempfile.mkdtemp(prefix="compile-cache-")
+    results = [
+        spawn(args, "eager", False, cache_root),
+        spawn(args, "compiled (cold cache)", True, cache_root),
+        spawn(args, "compiled (warm cache)", True, cache_root),
+    ]
+    eager, cold, warm = results
+
+    print(f"\n{'bucket':<12}{'eager(ms)':>12}{'compiled(ms)':>14}{'speedup':>9}"
+          f"{'cold 1st(s)':>13}{'warm 1st(s)':>13}")
+    for bucket in eager["buckets"]:
+        e = eager["buckets"][bucket]["step_ms_p50"]
+        c = warm["buckets"][bucket]["step_ms_p50"]
+        print(f"{bucket:<12}{e:>12}{c:>14}{e / c:>8.2f}x"
+              f"{cold['buckets'][bucket]['first_call_s']:>13}{warm['buckets'][bucket]['first_call_s']:>13}")
+
+    print("\n시작 비용 (모델 로드 + 모든 버킷 워밍업)")
+    for result in results:
+        print(f"  {result['label']:<24}{result['load_s'] + result['warmup_s']:>8.2f}초"
+              f"  (아티팩트 로드: {result['artifacts_loaded']})")
+    print(f"  캐시 위치: {cache_root}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"cache_root": cache_root, "results": results}, f, indent=2)
+        print(f"✅ 결과 저장: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,394 @@
+"""
+핸들러 오버헤드 벤치마크 (가짜 파이프라인 사용)
+
+handler.py / handler_sd3.py / handler_api.py를 실제 모델이나 원격 API 없이 불러와
+요청 크기의 합성 이미지를 돌려주는 가짜 파이프라인을 주입하고, GPU 외 구간
+(파라미터 파싱, generator 준비, 업스케일, 인코딩, base64 등)을 단계별로 측정합니다.
+단계별 p50/p95/p99와 최대 RSS를 보고하며, 케이스마다 별도 프로세스에서 실행합니다.
+
+사용법:
+    python bench_handler.py --output bench.json
+    python bench_handler.py --handlers flux --sizes 1024 --scales 1 2 --repeat 50
+    python bench_handler.py --output new.json --compare bench.json
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import resource
+import subprocess
+import sys
+import time
+from types import SimpleNamespace
+
+import numpy as np
+from PIL import Image
+
+from metrics import read_peak_rss_mb, reset_peak_rss
+
+HANDLERS = ["flux", "sd3", "api"]
+SIZES = [512, 1024, 1536]
+SCALES = [1, 2, 4]
+
+
+class FakeVAE:
+    """VAE slicing/tiling 호출만 받는 가짜 VAE"""
+
+    def enable_slicing(self):
+        pass
+
+    def disable_slicing(self):
+        pass
+
+    def enable_tiling(self):
+        pass
+
+    def disable_tiling(self):
+        pass
+
+
+class FakePipeline:
+    """요청 해상도의 합성 이미지를 돌려주는 가짜 diffusers 파이프라인
+
+    이미지는 해상도별로 한 번 만들어 재사용하므로 pipe() 호출 자체는 거의 0초이고,
+    측정값에는 핸들러 쪽 오버헤드만 남습니다.
+    """
+
+    def __init__(self, text_seq_dim=4096, pooled_dim=768):
+        import torch
+
+        self.torch = torch
+        self._execution_device = torch.device("cpu")
+        self.vae = FakeVAE()
+        self.text_seq_dim = text_seq_dim
+        self.pooled_dim = pooled_dim
+        self._frames = {}
+        self.last_call_s = 0.0
+
+    def frame(self, width, height):
+        """부드러운 그라디언트 + 약한 노이즈 (실제 생성 이미지와 비슷한 압축률)"""
+        key = (width, height)
+        if key not in self._frames:
+            rng = np.random.default_rng(0)
+            y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+            base = np.stack([
+                128 + 100 * np.sin(x / 97.0),
+                128 + 100 * np.cos(y / 71.0),
+                128 + 100 * np.sin((x + y) / 131.0),
+            ], axis=-1)
+            base += rng.normal(0, 6, base.shape)
+            self._frames[key] = np.clip(base, 0, 255).astype(np.uint8)
+        return self._frames[key]
+
+    def encode_prompt(self, prompt, prompt_2=None, device=None, num_images_per_prompt=1,
+                      max_sequence_length=512, **kwargs):
+        torch = self.torch
+        prompt_embeds = torch.zeros(1, max_sequence_length, self.text_seq_dim, dtype=torch.float16)
+        pooled_prompt_embeds = torch.zeros(1, self.pooled_dim, dtype=torch.float16)
+        text_ids = torch.zeros(max_sequence_length, 3, dtype=torch.float16)
+        return prompt_embeds, pooled_prompt_embeds, text_ids
+
+    def __call__(self, width=1024, height=1024, prompt_embeds=None, prompt=None,
+                 num_inference_steps=28, callback_on_step_end=None, **kwargs):
+        started = time.perf_counter()
+        if callback_on_step_end is not None:
+            for step in range(num_inference_steps):
+                callback_on_step_end(self, step, None, {"latents": None})
+        if prompt_embeds is not None:
+            count = prompt_embeds.shape[0]
+        else:
+            count = len(prompt) if isinstance(prompt, list) else 1
+        frame = self.frame(width, height)
+        images = [Image.fromarray(frame) for _ in range(count)]
+        self.last_call_s = time.perf_counter() - started
+        return SimpleNamespace(images=images)
+
+    # LoRAManager가 호출하는 메서드 (어댑터 없이 실행하므로 아무것도 하지 않음)
+    def enable_lora(self):
+        pass
+
+    def disable_lora(self):
+        pass
+
+    def set_adapters(self, *args, **kwargs):
+        pass
+
+    def fuse_lora(self, *args, **kwargs):
+        pass
+
+    def unfuse_lora(self, *args, **kwargs):
+        pass
+
+
+class StageTimer:
+    """단계별 시간(초)과 최대 RSS 수집"""
+
+    def __init__(self):
+        self.timings = {}
+        self.peak_rss = {}
+
+    def run(self, stage, fn, *args):
+        reset_peak_rss()
+        started = time.perf_counter()
+        result = fn(*args)
+        self.record(stage, time.perf_counter() - started)
+        return result
+
+    def record(self, stage, elapsed):
+        self.timings.setdefault(stage, []).append(elapsed)
+        self.peak_rss[stage] = max(self.peak_rss.get(stage, 0.0), read_peak_rss_mb())
+
+    def summary(self):
+        stages = {}
+        for stage, values in self.timings.items():
+            ms = np.array(values) * 1000
+            stages[stage] = {
+                "p50_ms": round(float(np.percentile(ms, 50)), 3),
+                "p95_ms": round(float(np.percentile(ms, 95)), 3),
+                "p99_ms": round(float(np.percentile(ms, 99)), 3),
+                "mean_ms": round(float(ms.mean()), 3),
+                "peak_rss_mb": round(self.peak_rss[stage], 1),
+            }
+        return stages
+
+
+def job_input(size, scale, index):
+    # 프롬프트를 매번 바꿔 프롬프트 캐시 미스 경로(인코딩 + 저장)까지 포함
+    job = {"prompt": f"bench prompt {index}", "width": size, "height": size, "steps": 28}
+    if scale > 1:
+        job.update({"upscale": True, "upscale_factor": scale})
+    return job
+
+
+def bench_flux(size, scale, repeat, loop):
+    import torch
+    import handler
+    from bootstrap import ModelBootstrap
+    from image_output import parse_output_options, encode_image, package_output
+    from lora_manager import LoRAManager
+    from memory_planner import known_footprints, plan_memory
+    from prompt_cache import PromptEmbeddingCache
+
+    fake = FakePipeline()
+    fake.frame(size, size)
+
+    def load_fake():
+        handler.pipe = fake
+        handler.memory_plan = plan_memory("flux", known_footprints("flux"), 80 * 1024 ** 3)
+        handler.prompt_cache = PromptEmbeddingCache(handler.encode_prompt, model_id="bench",
+                                                    device=fake._execution_device)
+        handler.lora_manager = LoRAManager(fake)
+
+    noop = lambda: None
+    handler.bootstrap = ModelBootstrap(noop, load_fake, noop)
+    handler.bootstrap.start()
+    handler.bootstrap.wait()
+
+    timer = StageTimer()
+    for i in range(repeat):
+        job = job_input(size, scale, i)
+
+        def parse():
+            return handler.parse_job_input(job), parse_output_options(job)
+
+        params, options = timer.run("parse", parse)
+        timer.run("generator", lambda: torch.Generator(device=fake._execution_device).manual_seed(params["seed"]))
+        (image, _), = timer.run("run_batch", handler.run_batch, [params])
+        # run_batch에서 가짜 pipe() 시간을 뺀 값 (LoRA/임베딩 캐시/VAE 설정 등)
+        timer.record("run_batch_overhead", timer.timings["run_batch"][-1] - fake.last_call_s)
+        if scale > 1:
+            image = timer.run("upscale", handler.postprocess, image, params)
+        data = timer.run("encode", encode_image, image, options)
+        timer.run("package", package_output, data, options, f"bench-{i}")
+
+        job_e2e = {"id": f"bench-e2e-{i}", "input": job_input(size, scale, repeat + i)}
+        reset_peak_rss()
+        started = time.perf_counter()
+        result = loop.run_until_complete(handler.handler(job_e2e))
+        timer.record("end_to_end", time.perf_counter() - started)
+        if "error" in result:
+            raise RuntimeError(result["error"])
+    return timer
+
+
+def bench_sd3(size, scale, repeat, loop):
+    import torch
+    import handler_sd3
+    from image_output import parse_output_options, encode_image, package_output
+    from memory_planner import known_footprints, plan_memory, apply_vae_settings
+    from request_params import parse_common
+
+    fake = FakePipeline()
+    fake.frame(size, size)
+    handler_sd3.pipe = fake
+    handler_sd3.memory_plan = plan_memory("sd3", known_footprints("sd3"), 80 * 1024 ** 3)
+
+    timer = StageTimer()
+    for i in range(repeat):
+        job = job_input(size, 1, i)
+
+        def parse():
+            return parse_common(job, model="sd3"), parse_output_options(job)
+
+        params, options = timer.run("parse", parse)
+        timer.run("generator", lambda: torch.Generator(device=fake._execution_device).manual_seed(params["seed"]))
+        timer.run("vae_settings", apply_vae_settings, fake, handler_sd3.memory_plan, size, size)
+        image = timer.run("pipeline", lambda: fake(width=size, height=size, prompt=params["prompt"]).images[0])
+        data = timer.run("encode", encode_image, image, options)
+        timer.run("package", package_output, data, options, f"bench-{i}")
+
+        result = timer.run("end_to_end", handler_sd3.handler, {"id": f"bench-e2e-{i}", "input": job})
+        if "error" in result:
+            raise RuntimeError(result["error"])
+    return timer
+
+
+def bench_api(size, scale, repeat, loop):
+    from io import BytesIO
+
+    import handler_api
+    from backend_router import BackendRouter
+    from image_output import parse_output_options, build_output_async
+    from request_params import parse_common
+
+    # 원격 API 대신 미리 인코딩한 PNG를 돌려주는 가짜 백엔드
+    buffer = BytesIO()
+    Image.fromarray(FakePipeline().frame(size, size)).save(buffer, format="PNG", compress_level=1)
+    payload = buffer.getvalue()
+
+    async def fake_backend(params):
+        return payload
+
+    handler_api.router = BackendRouter({"fake": fake_backend}, hedge=False)
+
+    timer = StageTimer()
+    for i in range(repeat):
+        job = job_input(size, 1, i)
+
+        def parse():
+            return parse_common(job, model="api", random_seed=False), parse_output_options(job)
+
+        params, options = timer.run("parse", parse)
+        data, _ = timer.run("route", lambda: loop.run_until_complete(handler_api.router.call(params)))
+        image = timer.run("decode", lambda: Image.open(BytesIO(data)).convert("RGB"))
+        timer.run("output", lambda: loop.run_until_complete(build_output_async(image, options, f"bench-{i}")))
+
+        job_e2e = {"id": f"bench-e2e-{i}", "input": job}
+        result = timer.run("end_to_end", lambda: loop.run_until_complete(handler_api.handler(job_e2e)))
+        if "error" in result:
+            raise RuntimeError(result["error"])
+    return timer
+
+
+BENCHMARKS = {"flux": bench_flux, "sd3": bench_sd3, "api": bench_api}
+
+
+def run_case(name, size, scale, repeat):
+    """단일 케이스 실행 (자식 프로세스에서 호출)"""
+    import_started = time.perf_counter()
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    timer = BENCHMARKS[name](size, scale, repeat, loop)
+    return {
+        "handler": name,
+        "size": size,
+        "scale": scale,
+        "repeat": repeat,
+        "total_s": round(time.perf_counter() - import_started, 2),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "stages": timer.summary(),
+    }
+
+
+def git_revision():
+    try:
+        proc = subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                              capture_output=True, text=True, check=True)
+        return proc.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def case_id(result):
+    return f"{result['handler']}/{result['size']}/x{result['scale']}"
+
+
+def compare(results, baseline_path):
+    """이전 결과 파일과 단계별 p50 비교"""
+    with open(baseline_path) as f:
+        baseline = {case_id(r): r for r in json.load(f)["results"]}
+
+    print(f"\n📊 {baseline_path} 대비 p50 변화")
+    print(f"{'case':<18}{'stage':<20}{'before(ms)':>12}{'after(ms)':>12}{'change':>9}")
+    for result in results:
+        before = baseline.get(case_id(result))
+        if before is None:
+            continue
+        for stage, stats in result["stages"].items():
+            old = before["stages"].get(stage)
+            if old is None or old["p50_ms"] == 0:
+                continue
+            change = (stats["p50_ms"] / old["p50_ms"] - 1) * 100
+            print(f"{case_id(result):<18}{stage:<20}{old['p50_ms']:>12}{stats['p50_ms']:>12}{change:>+8.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="핸들러 오버헤드 벤치마크")
+    parser.add_argument("--handlers", nargs="+", default=HANDLERS, choices=HANDLERS)
+    parser.add_argument("--sizes", nargs="+", type=int, default=SIZES)
+    parser.add_argument("--scales", nargs="+", type=int, default=SCALES,
+                        help="업스케일 배율 (1이면 업스케일 없음, flux만 적용)")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--output", default="")
+    parser.add_argument("--compare", default="", help="비교할 이전 결과 JSON")
+    parser.add_argument("--case", nargs=3, metavar=("HANDLER", "SIZE", "SCALE"),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        name, size, scale = args.case
+        print(json.dumps(run_case(name, int(size), int(scale), args.repeat)))
+        return
+
+    results = []
+    print(f"{'handler':<8}{'size':>6}{'scale':>7}  {'stage':<20}{'p50(ms)':>10}{'p95(ms)':>10}"
+          f"{'p99(ms)':>10}{'peakRSS(MB)':>13}")
+    for name in args.handlers:
+        for size in args.sizes:
+            # 업스케일은 flux 핸들러만 지원
+            for scale in (args.scales if name == "flux" else [1]):
+                proc = subprocess.run(
+                    [sys.executable, __file__, "--repeat", str(args.repeat),
+                     "--case", name, str(size), str(scale)],
+                    capture_output=True, text=True
+                )
+                if proc.returncode != 0:
+                    print(f"❌ {name} {size} x{scale} 실패:\n{proc.stderr[-2000:]}")
+                    continue
+                result = json.loads(proc.stdout.strip().splitlines()[-1])
+                results.append(result)
+                for stage, stats in result["stages"].items():
+                    print(f"{name:<8}{size:>6}{scale:>7}  {stage:<20}{stats['p50_ms']:>10}"
+                          f"{stats['p95_ms']:>10}{stats['p99_ms']:>10}{stats['peak_rss_mb']:>13}")
+
+    if args.output:
+        report = {
+            "meta": {
+                "git_revision": git_revision(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "repeat": args.repeat,
+            },
+            "results": results,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ 결과 저장: {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+데이터셋 패키저 벤치마크
+
+기존 FluxLoRATrainer.prepare_dataset (모든 이미지 열기/RGB 변환, 단일 스레드, 무압축 ZIP)과
+dataset_packager (헤더 검증 + 필요한 파일만 병렬 변환 + JPEG/PNG 무압축 저장)를
+같은 폴더로 비교하고, 이미지를 몇 장 추가하거나 캡션을 바꿨을 때의 증분 갱신 시간도 잽니다.
+각 케이스는 별도 프로세스에서 실행합니다.
+
+사용법:
+    python bench_packager.py
+    python bench_packager.py --images 500 --added 10 --output packager.json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+
+import numpy as np
+from PIL import Image
+
+
+def legacy_prepare_dataset(image_folder, output_zip, trigger_word="TOK", captions=None):
+    """기존 FluxLoRATrainer.prepare_dataset (비교 기준)"""
+    with zipfile.ZipFile(output_zip, 'w') as zf:
+        for filename in os.listdir(image_folder):
+            if filename.lower().endswith(('.png', '.jpg', '.jpeg')):
+                img_path = os.path.join(image_folder, filename)
+                img = Image.open(img_path)
+                if img.mode != 'RGB':
+                    img = img.convert('RGB')
+                zf.write(img_path, f"{filename}")
+                base_name = os.path.splitext(filename)[0]
+                if captions and filename in captions:
+                    caption = captions[filename]
+                else:
+                    caption = f"a photo of {trigger_word}"
+                zf.writestr(f"{base_name}.txt", caption)
+    return output_zip
+
+
+def make_image(rng, index):
+    """사진과 비슷하게 압축되도록 부드러운 그라디언트 + 노이즈 이미지"""
+    kind = index % 20
+    if kind == 0:
+        size, fmt, mode = (3000, 2000), "JPEG", "RGB"      # 리사이즈 필요
+    elif kind in (1, 2):
+        size, fmt, mode = (1024, 1024), "PNG", "RGBA"      # 변환 필요
+    elif kind < 8:
+        size, fmt, mode = (1024, 1024), "PNG", "RGB"
+    else:
+        size, fmt, mode = (1536, 1024), "JPEG", "RGB"
+    width, height = size
+    y, x = np.mgrid[0:height, 0:width]
+    base = np.stack([(x * 255 // width), (y * 255 // height), ((x + y) * 255 // (width + height))], -1)
+    array = np.clip(base + rng.integers(-20, 20, base.shape), 0, 255).astype(np.uint8)
+    image = Image.fromarray(array)
+    if mode == "RGBA":
+        image.putalpha(200)
+    ext = "jpg" if fmt == "JPEG" else "png"
+    return image, fmt, f"img_{index:04d}.{ext}"
+
+
+def make_folder(folder, start, count):
+    rng = np.random.default_rng(start)
+    os.makedirs(folder, exist_ok=True)
+    for index in range(start, start + count):
+        image, fmt, name = make_image(rng, index)
+        image.save(os.path.join(folder, name), format=fmt, quality=90)
+
+
+def folder_mb(folder):
+    return sum(os.path.getsize(os.path.join(folder, n)) for n in os.listdir(folder)) / 1024 ** 2
+
+
+def run_case(method, folder, output_zip, captions_path):
+    from dataset_packager import DatasetPackager
+
+    captions = None
+    if captions_path:
+        with open(captions_path) as f:
+            captions = json.load(f)
+
+    started = time.perf_counter()
+    if method == "legacy":
+        legacy_prepare_dataset(folder, output_zip, "TOK", captions)
+        report = {}
+    else:
+        report = DatasetPackager().package(folder, output_zip, "TOK", captions)
+    elapsed = time.perf_counter() - started
+    return {
+        "method": method,
+        "elapsed_s": round(elapsed, 3),
+        "zip_mb": round(os.path.getsize(output_zip) / 1024 ** 2, 1),
+        **{k: v for k, v in report.items() if k != "elapsed_s"},
+    }
+
+
+def spawn(label, method, folder, output_zip, captions_path=""):
+    proc = subprocess.run(
+        [sys.executable, __file__, "--case", method, folder, output_zip, captions_path or "-"],
+        capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"{label} 실패:\n{proc.stderr[-3000:]}")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["label"] = label
+    print(f"   {label:<32}{result['elapsed_s']:>9.2f}초{result['zip_mb']:>9.1f}MB  {result.get('mode', '')}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="데이터셋 패키저 벤치마크")
+    parser.add_argument("--images", type=int, default=500)
+    parser.add_argument("--added", type=int, default=10)
+    parser.add_argument("--work-dir", default="")
+    parser.add_argument("--output", default="")
+    parser.add_argument("--case", nargs=4, metavar=("METHOD", "FOLDER", "ZIP", "CAPTIONS"),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        method, folder, output_zip, captions_path = args.case
+        print(json.dumps(run_case(method, folder, output_zip, "" if captions_path == "-" else captions_path)))
+        return
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="packager-bench-")
+    folder = os.path.join(work_dir, "images")
+    print(f"🖼️ 테스트 이미지 {args.images}장 생성 중: {folder}")
+    make_folder(folder, 0, args.images)
+    print(f"   폴더 크기: {folder_mb(folder):.1f}MB\n")
+
+    legacy_zip = os.path.join(work_dir, "legacy.zip")
+    new_zip = os.path.join(work_dir, "packaged.zip")
+    results = [
+        spawn("legacy (전체)", "legacy", folder, legacy_zip),
+        spawn("packager (처음)", "packager", folder, new_zip),
+        spawn("packager (변경 없음)", "packager", folder, new_zip),
+    ]
+
+    make_folder(folder, args.images, args.added)
+    results.append(spawn(f"legacy (+{args.added}장, 전체 다시)", "legacy", folder, legacy_zip))
+    results.append(spawn(f"packager (+{args.added}장)", "packager", folder, new_zip))
+
+    captions_path = os.path.join(work_dir, "captions.json")
+    with open(captions_path, "w") as f:
+        json.dump({"img_0003.png": "TOK standing on a beach"}, f)
+    results.append(spawn("packager (캡션 1개 변경)", "packager", folder, new_zip, captions_path))
+
+    legacy_s, packager_s = results[0]["elapsed_s"], results[1]["elapsed_s"]
+    print(f"\n처음 패키징: {legacy_s / packager_s:.1f}x 빠름, "
+          f"증분(+{args.added}장): {results[3]['elapsed_s'] / results[4]['elapsed_s']:.1f}x 빠름")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"images": args.images, "added": args.added, "results": results}, f, indent=2)
+        print(f"✅ 결과 저장: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
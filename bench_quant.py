@@ -0,0 +1,253 @@
+"""
+가중치 양자화 비교 (none / int8 / fp8)
+
+모드별로 로드 시간, 상주 메모리(RSS 증가량과 텐서 크기), 트랜스포머 스텝 지연 시간,
+기준(양자화 없음) 대비 출력 오차를 비교합니다. 각 모드는 별도 프로세스에서 실행합니다.
+
+--model tiny: 무작위 가중치의 작은 FluxTransformer2DModel (CPU, 기본 bfloat16).
+    기준 가중치도 같은 safetensors 형식으로 저장해 같은 방식(mmap)으로 로드합니다.
+    출력 오차는 트랜스포머 출력의 상대 L2 오차와 PSNR입니다.
+--model flux: handler.py 경로의 FLUX.1-dev (GPU). 같은 시드로 이미지를 생성해
+    기준 이미지 대비 PSNR을 계산합니다.
+
+사용법:
+    python bench_quant.py --model tiny
+    python bench_quant.py --model flux --size 512 --output quant.json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from metrics import read_peak_rss_mb
+
+MODES = ["none", "int8", "fp8"]
+
+TINY_CONFIG = {
+    "num_layers": 2,
+    "num_single_layers": 4,
+    "attention_head_dim": 128,
+    "num_attention_heads": 8,
+    "joint_attention_dim": 1024,
+    "pooled_projection_dim": 256,
+    "guidance_embeds": True,
+}
+
+
+def current_rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return read_peak_rss_mb()
+
+
+def module_mb(module):
+    size = sum(t.numel() * t.element_size() for t in module.parameters())
+    size += sum(t.numel() * t.element_size() for t in module.buffers())
+    return size / 1024 ** 2
+
+
+def psnr(a, b, peak):
+    mse = float(np.mean((a.astype(np.float64) - b.astype(np.float64)) ** 2))
+    return float("inf") if mse == 0 else 10 * np.log10(peak ** 2 / mse)
+
+
+def tiny_skeleton():
+    from diffusers import FluxTransformer2DModel
+
+    return FluxTransformer2DModel(**TINY_CONFIG)
+
+
+def prepare_tiny(work_dir, dtype_name):
+    """기준/양자화 가중치 파일 생성 (부모 프로세스에서 한 번)"""
+    import torch
+    from quantization import quantize_module, save_quantized
+    from safetensors.torch import save_file
+
+    dtype = getattr(torch, dtype_name)
+    paths = {}
+    for mode in MODES:
+        path = os.path.join(work_dir, f"tiny-{mode}.safetensors")
+        torch.manual_seed(0)
+        module = tiny_skeleton().eval()
+        started = time.perf_counter()
+        if mode == "none":
+            save_file({k: v.to(dtype).contiguous() for k, v in module.state_dict().items()}, path)
+        else:
+            save_quantized(quantize_module(module, mode, dtype), path, mode, dtype, source="tiny")
+        print(f"⚙️ {mode}: 파일 생성 {time.perf_counter() - started:.2f}초, "
+              f"{os.path.getsize(path) / 1024 ** 2:.1f}MB")
+        paths[mode] = path
+    return paths
+
+
+def tiny_inputs(config, size, dtype, text_tokens=512):
+    import torch
+
+    seq = (size // 16) ** 2
+    generator = torch.Generator().manual_seed(0)
+
+    def randn(*shape):
+        return torch.randn(*shape, generator=generator).to(dtype)
+
+    return {
+        "hidden_states": randn(1, seq, config.in_channels),
+        "encoder_hidden_states": randn(1, text_tokens, config.joint_attention_dim),
+        "pooled_projections": randn(1, config.pooled_projection_dim),
+        "timestep": torch.full((1,), 0.5, dtype=dtype),
+        "img_ids": torch.zeros(seq, 3, dtype=dtype),
+        "txt_ids": torch.zeros(text_tokens, 3, dtype=dtype),
+        "guidance": torch.full((1,), 3.5, dtype=dtype),
+        "return_dict": False,
+    }
+
+
+def run_tiny(mode, path, size, steps, dtype_name, output_path):
+    """tiny 모델 한 모드 실행 (자식 프로세스)"""
+    import torch
+    from quantization import load_quantized
+    from safetensors import safe_open
+
+    dtype = getattr(torch, dtype_name)
+    # diffusers 임포트 시간/메모리는 측정에서 제외
+    with torch.device("meta"):
+        tiny_skeleton()
+    rss_before = current_rss_mb()
+    started = time.perf_counter()
+    if mode == "none":
+        with torch.device("meta"):
+            module = tiny_skeleton()
+        with safe_open(path, framework="pt") as f:
+            state = {k: f.get_tensor(k) for k in f.keys()}
+        module.load_state_dict(state, assign=True)
+        module.eval()
+    else:
+        module = load_quantized(tiny_skeleton, path)
+    load_s = time.perf_counter() - started
+    rss_after_load = current_rss_mb()
+
+    inputs = tiny_inputs(module.config, size, dtype)
+    timings = []
+    with torch.no_grad():
+        output = module(**inputs)[0]
+        for _ in range(steps):
+            step_started = time.perf_counter()
+            module(**inputs)
+            timings.append((time.perf_counter() - step_started) * 1000)
+    np.save(output_path, output.float().numpy())
+
+    return {
+        "mode": mode,
+        "load_s": round(load_s, 3),
+        "weights_mb": round(module_mb(module), 1),
+        "file_mb": round(os.path.getsize(path) / 1024 ** 2, 1),
+        "rss_after_load_mb": round(rss_after_load - rss_before, 1),
+        "rss_after_run_mb": round(current_rss_mb() - rss_before, 1),
+        "step_ms_p50": round(float(np.percentile(timings, 50)), 2),
+    }
+
+
+def run_flux(mode, size, steps, output_path):
+    """FLUX.1-dev 한 모드 실행 (자식 프로세스, GPU)"""
+    os.environ["QUANT_MODE"] = mode
+    import torch
+    import handler
+
+    rss_before = current_rss_mb()
+    started = time.perf_counter()
+    handler.load_model()
+    torch.cuda.synchronize()
+    load_s = time.perf_counter() - started
+    rss_after_load = current_rss_mb()
+
+    params = handler.parse_job_input({"prompt": "a lighthouse on a cliff at sunset", "seed": 0,
+                                      "width": size, "height": size, "steps": steps})
+    torch.cuda.reset_peak_memory_stats()
+    started = time.perf_counter()
+    (image, info), = handler.run_batch([params])
+    elapsed = time.perf_counter() - started
+    np.save(output_path, np.array(image))
+
+    return {
+        "mode": mode,
+        "load_s": round(load_s, 2),
+        "weights_mb": round(module_mb(handler.pipe.transformer) + module_mb(handler.pipe.text_encoder_2), 1),
+        "rss_after_load_mb": round(rss_after_load - rss_before, 1),
+        "gpu_peak_mb": round(torch.cuda.max_memory_allocated() / 1024 ** 2, 1),
+        "step_ms_p50": round(float(np.percentile(info["metrics"].extra["steps_ms"][1:], 50)), 2),
+        "generate_s": round(elapsed, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="가중치 양자화 비교")
+    parser.add_argument("--model", choices=["tiny", "flux"], default="tiny")
+    parser.add_argument("--modes", nargs="+", default=MODES, choices=MODES)
+    parser.add_argument("--size", type=int, default=512)
+    parser.add_argument("--steps", type=int, default=5)
+    parser.add_argument("--dtype", default="bfloat16", help="tiny 모델 계산 dtype")
+    parser.add_argument("--work-dir", default="")
+    parser.add_argument("--output", default="")
+    parser.add_argument("--case", nargs=2, metavar=("MODE", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="quant-bench-")
+    os.makedirs(work_dir, exist_ok=True)
+
+    if args.case:
+        mode, path = args.case
+        output_path = os.path.join(work_dir, f"output-{mode}.npy")
+        if args.model == "tiny":
+            result = run_tiny(mode, path, args.size, args.steps, args.dtype, output_path)
+        else:
+            result = run_flux(mode, args.size, args.steps, output_path)
+        print(json.dumps(result))
+        return
+
+    paths = prepare_tiny(work_dir, args.dtype) if args.model == "tiny" else {m: "-" for m in MODES}
+    modes = ["none"] + [m for m in args.modes if m != "none"]
+
+    results = []
+    for mode in modes:
+        proc = subprocess.run(
+            [sys.executable, __file__, "--model", args.model, "--size", str(args.size),
+             "--steps", str(args.steps), "--dtype", args.dtype, "--work-dir", work_dir,
+             "--case", mode, paths[mode]],
+            capture_output=True, text=True
+        )
+        if proc.returncode != 0:
+            print(f"❌ {mode} 실패:\n{proc.stderr[-3000:]}")
+            continue
+        results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    # 기준 대비 출력 오차
+    baseline = np.load(os.path.join(work_dir, "output-none.npy"))
+    for result in results:
+        output = np.load(os.path.join(work_dir, f"output-{result['mode']}.npy"))
+        if args.model == "tiny":
+            result["rel_l2_error"] = round(float(np.linalg.norm(output - baseline) / np.linalg.norm(baseline)), 5)
+            result["psnr_db"] = round(psnr(output, baseline, float(np.abs(baseline).max())), 2)
+        else:
+            result["psnr_db"] = round(psnr(output, baseline, 255.0), 2)
+
+    columns = ["mode", "load_s", "weights_mb", "rss_after_load_mb", "rss_after_run_mb",
+               "step_ms_p50", "psnr_db"]
+    print("".join(f"{c:>18}" for c in columns))
+    for result in results:
+        print("".join(f"{str(result.get(c, '-')):>18}" for c in columns))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"model": args.model, "size": args.size, "results": results}, f, indent=2)
+        print(f"✅ 결과 저장: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+업스케일링 벤치마크
+
+기존 upscale_image (전체 프레임 cv2.resize INTER_CUBIC)와 upscaler 모듈의
+타일 병렬 업스케일을 비교합니다. 최대 RSS를 정확히 재기 위해 각 케이스를
+별도 프로세스에서 실행합니다.
+
+사용법:
+    python bench_upscale.py
+    python bench_upscale.py --backends cubic lanczos --repeat 5
+"""
+
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+SIZES = [1024, 2048]
+SCALES = [2, 3, 4]
+
+
+def legacy_upscale_image(image, scale=2):
+    """기존 handler.py의 upscale_image (비교 기준)"""
+    img_array = np.array(image)
+    height, width = img_array.shape[:2]
+    new_dimensions = (width * scale, height * scale)
+    upscaled = cv2.resize(img_array, new_dimensions, interpolation=cv2.INTER_CUBIC)
+    return Image.fromarray(upscaled)
+
+
+def make_image(size):
+    rng = np.random.default_rng(0)
+    array = rng.integers(0, 256, (size, size, 3), dtype=np.uint8)
+    return Image.fromarray(array)
+
+
+def peak_rss_mb():
+    # Linux에서 ru_maxrss 단위는 KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_case(method, size, scale, repeat):
+    """단일 케이스 실행 (자식 프로세스에서 호출)"""
+    image = make_image(size)
+    if method == "legacy":
+        fn = lambda: legacy_upscale_image(image, scale)
+    else:
+        from upscaler import upscale
+        fn = lambda: upscale(image, scale, backend=method)
+
+    baseline_rss = peak_rss_mb()
+    fn()  # 워밍업
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+
+    best = min(timings)
+    return {
+        "method": method,
+        "size": size,
+        "scale": scale,
+        "best_s": round(best, 4),
+        "mean_s": round(sum(timings) / len(timings), 4),
+        "mpix_per_s": round((size * scale) ** 2 / 1e6 / best, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "peak_rss_delta_mb": round(peak_rss_mb() - baseline_rss, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="업스케일링 벤치마크")
+    parser.add_argument("--backends", nargs="+", default=["cubic", "lanczos"])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", default="")
+    parser.add_argument("--case", nargs=3, metavar=("METHOD", "SIZE", "SCALE"),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        method, size, scale = args.case
+        print(json.dumps(run_case(method, int(size), int(scale), args.repeat)))
+        return
+
+    results = []
+    print(f"{'method':<10}{'size':>6}{'scale':>7}{'best(s)':>10}{'MP/s':>8}{'peakRSS(MB)':>13}")
+    for size in SIZES:
+        for scale in SCALES:
+            for method in ["legacy"] + args.backends:
+                proc = subprocess.run(
+                    [sys.executable, __file__, "--repeat", str(args.repeat),
+                     "--case", method, str(size), str(scale)],
+                    capture_output=True, text=True, check=True
+                )
+                result = json.loads(proc.stdout.strip().splitlines()[-1])
+                results.append(result)
+                print(f"{method:<10}{size:>6}{scale:>7}{result['best_s']:>10}"
+                      f"{result['mpix_per_s']:>8}{result['peak_rss_mb']:>13}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"✅ 결과 저장: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+모델 부트스트랩 (백그라운드 로딩 + 준비 상태 머신)
+
+모델 다운로드/로드/워밍업을 백그라운드 스레드에서 실행해 워커가
+runpod.serverless.start 이후 바로 상태를 보고할 수 있게 합니다.
+
+상태: pending -> downloading -> loading -> warming -> ready
+      (어느 단계에서든 실패하면 failed)
+"""
+
+import asyncio
+import os
+import threading
+import time
+import traceback
+
+PENDING = "pending"
+DOWNLOADING = "downloading"
+LOADING = "loading"
+WARMING = "warming"
+READY = "ready"
+FAILED = "failed"
+
+# 준비 전 도착한 작업을 기다리게 할 최대 시간 (초, 0이면 즉시 거절)
+BOOTSTRAP_WAIT_TIMEOUT = float(os.environ.get("BOOTSTRAP_WAIT_TIMEOUT", "900"))
+
+
+class ModelBootstrap:
+    """다운로드 -> 로드 -> 워밍업 단계를 백그라운드에서 실행하는 상태 머신
+
+    Args:
+        download_fn: 모델 파일 다운로드 함수
+        load_fn: 파이프라인 로드 함수
+        warmup_fn: 기본 해상도 워밍업 함수
+    """
+
+    def __init__(self, download_fn, load_fn, warmup_fn):
+        self.phases = [
+            (DOWNLOADING, download_fn),
+            (LOADING, load_fn),
+            (WARMING, warmup_fn),
+        ]
+        self.state = PENDING
+        self.error = None
+        self.timings = {}
+        self._done = threading.Event()
+        self._thread = None
+        self._started_at = None
+
+    def start(self):
+        """백그라운드 스레드에서 부트스트랩 시작"""
+        if self._thread is not None:
+            return
+        self._started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="model-bootstrap", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        for state, fn in self.phases:
+            self.state = state
+            print(f"⏱️ 부트스트랩 단계 시작: {state}")
+            started = time.perf_counter()
+            try:
+                fn()
+            except Exception as e:
+                self.timings[state] = round(time.perf_counter() - started, 3)
+                self.error = f"{state} 단계 실패: {e}"
+                self.state = FAILED
+                print(f"❌ {self.error}")
+                traceback.print_exc()
+                self._done.set()
+                return
+            self.timings[state] = round(time.perf_counter() - started, 3)
+            print(f"✅ {state} 완료 ({self.timings[state]}초)")
+
+        self.timings["total"] = round(time.perf_counter() - self._started_at, 3)
+        self.state = READY
+        print(f"🚀 워커 준비 완료! (총 {self.timings['total']}초)")
+        self._done.set()
+
+    @property
+    def ready(self):
+        return self.state == READY
+
+    def wait(self, timeout=None):
+        """준비 완료(또는 실패)까지 대기, 준비되었으면 True"""
+        self._done.wait(timeout)
+        return self.ready
+
+    async def wait_async(self, timeout=BOOTSTRAP_WAIT_TIMEOUT):
+        """이벤트 루프를 막지 않고 준비 완료까지 대기"""
+        if self._done.is_set() or timeout <= 0:
+            return self.ready
+        return await asyncio.to_thread(self.wait, timeout)
+
+    def status(self):
+        """현재 상태 및 단계별 소요 시간"""
+        status = {"state": self.state, "timings": dict(self.timings)}
+        if self.error:
+            status["error"] = self.error
+        return status
@@ -0,0 +1,295 @@
+"""
+RunPod ComfyUI 엔드포인트용 배치 비동기 클라이언트
+
+- Workflow: 불변 워크플로우 그래프. set/override/connect/bind는 항상 깊은 복사본을 돌려주므로
+  공유 템플릿이 요청마다 바뀌지 않음. bind로 이름 붙인 파라미터는 render(**값)으로 채움
+- ComfyClient: /run으로 비동기 제출, 진행 중인 작업의 /status를 한 주기에 한꺼번에 조회,
+  동시에 진행 중인 작업 수를 COMFY_MAX_IN_FLIGHT로 제한, 끝난 작업의 이미지는 스레드에서
+  바로 디코드 (다른 작업의 폴링과 겹침)
+
+    client = ComfyClient(ENDPOINT_ID, RUNPOD_API_KEY)
+    async for result in client.run_many([template.render(prompt=p) for p in prompts]):
+        result.images[0].save(f"{result.index}.png")
+
+로컬 확인: python fake_runpod.py / python bench_comfyui.py
+"""
+
+import asyncio
+import base64
+import copy
+import json
+import os
+import time
+from io import BytesIO
+
+from PIL import Image
+
+from http_client import PooledHTTPClient
+
+# 클라이언트 설정 (환경 변수로 변경 가능)
+RUNPOD_API_URL = os.environ.get("RUNPOD_API_URL", "https://api.runpod.ai/v2")
+COMFY_MAX_IN_FLIGHT = int(os.environ.get("COMFY_MAX_IN_FLIGHT", "8"))
+# /status 조회 주기 (초, 진행 중인 작업 전체를 한 번에 조회)
+COMFY_POLL_INTERVAL = float(os.environ.get("COMFY_POLL_INTERVAL", "1.0"))
+COMFY_JOB_TIMEOUT = float(os.environ.get("COMFY_JOB_TIMEOUT", "600"))
+
+FINISHED = ("COMPLETED", "FAILED", "CANCELLED", "TIMED_OUT")
+
+
+class Workflow:
+    """ComfyUI API 형식 그래프 ({노드 ID: {"class_type", "inputs"}})의 불변 래퍼
+
+    Args:
+        graph: 워크플로우 dict (깊은 복사해서 보관)
+        params: {파라미터 이름: [(노드 ID, 입력 이름), ...]}
+    """
+
+    def __init__(self, graph, params=None):
+        self._graph = copy.deepcopy(graph)
+        self._params = {
+            name: tuple((str(node_id), input_name) for node_id, input_name in targets)
+            for name, targets in (params or {}).items()
+        }
+
+    @classmethod
+    def load(cls, path, params=None):
+        with open(path) as f:
+            return cls(json.load(f), params)
+
+    def _node(self, node_id):
+        node_id = str(node_id)
+        if node_id not in self._graph:
+            raise ValueError(f"워크플로우에 없는 노드: {node_id}")
+        return node_id
+
+    def __contains__(self, node_id):
+        return str(node_id) in self._graph
+
+    def __getitem__(self, node_id):
+        return copy.deepcopy(self._graph[self._node(node_id)])
+
+    @property
+    def params(self):
+        return dict(self._params)
+
+    def to_dict(self):
+        return copy.deepcopy(self._graph)
+
+    def override(self, overrides):
+        """{노드 ID: {입력 이름: 값}}을 적용한 새 Workflow"""
+        graph = copy.deepcopy(self._graph)
+        for node_id, inputs in overrides.items():
+            graph[self._node(node_id)]["inputs"].update(copy.deepcopy(inputs))
+        return Workflow(graph, self._params)
+
+    def set(self, node_id, input_name, value):
+        return self.override({node_id: {input_name: value}})
+
+    def connect(self, node_id, input_name, source_id, output=0):
+        """node_id의 입력을 source_id 노드의 output번째 출력에 연결"""
+        return self.set(node_id, input_name, [self._node(source_id), output])
+
+    def bind(self, name, *targets):
+        """파라미터 이름을 하나 이상의 (노드 ID, 입력 이름)에 연결한 새 Workflow"""
+        for node_id, _ in targets:
+            self._node(node_id)
+        return Workflow(self._graph, {**self._params, name: targets})
+
+    def render(self, **values):
+        """파라미터 값을 채운 워크플로우 dict (매번 새 깊은 복사본)"""
+        unknown = set(values) - set(self._params)
+        if unknown:
+            raise ValueError(f"알 수 없는 워크플로우 파라미터: {', '.join(sorted(unknown))}")
+        overrides = {}
+        for name, value in values.items():
+            for node_id, input_name in self._params[name]:
+                overrides.setdefault(node_id, {})[input_name] = value
+        return self.override(overrides).to_dict() if overrides else self.to_dict()
+
+
+def decode_images(output):
+    """ComfyUI 워커 출력 -> PIL 이미지 목록
+
+    지원 형식: {"images": ["<b64>", ...]}, {"images": [{"type": "base64", "data": "<b64>"}, ...]},
+    {"message": "<b64>"} (구버전 워커)
+    """
+    if not isinstance(output, dict):
+        raise ValueError(f"알 수 없는 출력 형식: {type(output).__name__}")
+    entries = output.get("images")
+    if entries is None and isinstance(output.get("message"), str):
+        entries = [output["message"]]
+    images = []
+    for entry in entries or []:
+        if isinstance(entry, dict):
+            if entry.get("type", "base64") != "base64":
+                raise ValueError(f"base64가 아닌 이미지 출력은 지원하지 않습니다: {entry.get('type')}")
+            entry = entry["data"]
+        if entry.startswith("data:"):
+            entry = entry.split(",", 1)[1]
+        image = Image.open(BytesIO(base64.b64decode(entry)))
+        image.load()
+        images.append(image)
+    return images
+
+
+class ComfyResult:
+    """작업 하나의 결과 (index는 제출한 워크플로우 순서)"""
+
+    def __init__(self, index, job_id, status, images=None, error=None, output=None, timings=None):
+        self.index = index
+        self.job_id = job_id
+        self.status = status
+        self.images = images or []
+        self.error = error
+        self.output = output
+        self.timings = timings or {}
+
+    @property
+    def ok(self):
+        return self.status == "COMPLETED" and self.error is None
+
+    def to_dict(self):
+        return {"index": self.index, "job_id": self.job_id, "status": self.status,
+                "images": len(self.images), "error": self.error, "timings": self.timings}
+
+
+class ComfyClient:
+    """RunPod 서버리스 /run + /status 클라이언트
+
+    Args:
+        endpoint_id: RunPod 엔드포인트 ID
+        api_key: RunPod API 키
+        max_in_flight: 동시에 큐/실행 중인 작업 수 상한
+        poll_interval: /status 조회 주기 (초)
+    """
+
+    def __init__(self, endpoint_id, api_key, api_url=RUNPOD_API_URL, client=None,
+                 max_in_flight=COMFY_MAX_IN_FLIGHT, poll_interval=COMFY_POLL_INTERVAL,
+                 job_timeout=COMFY_JOB_TIMEOUT):
+        self.base_url = f"{api_url.rstrip('/')}/{endpoint_id}"
+        self.headers = {"Authorization": f"Bearer {api_key}"}
+        self.client = client or PooledHTTPClient()
+        self.max_in_flight = max_in_flight
+        self.poll_interval = poll_interval
+        self.job_timeout = job_timeout
+        self.requests = {"run": 0, "status": 0, "cancel": 0}
+
+    async def submit(self, workflow):
+        """워크플로우 하나를 /run으로 제출하고 작업 ID 반환"""
+        if isinstance(workflow, Workflow):
+            workflow = workflow.to_dict()
+        self.requests["run"] += 1
+        # 제출은 재시도하지 않음 (받아들여진 뒤 시간 초과면 과금되는 작업이 중복으로 쌓임)
+        response = await self.client.post(f"{self.base_url}/run", headers=self.headers,
+                                          json={"input": {"workflow": workflow}}, retries=0)
+        return response.json()["id"]
+
+    async def status(self, job_id):
+        self.requests["status"] += 1
+        response = await self.client.get(f"{self.base_url}/status/{job_id}", headers=self.headers)
+        return response.json()
+
+    async def cancel(self, job_id):
+        self.requests["cancel"] += 1
+        await self.client.post(f"{self.base_url}/cancel/{job_id}", headers=self.headers, retries=0)
+
+    async def _finish(self, index, job_id, job, submitted_at):
+        timings = {
+            "queue_s": round(job.get("delayTime", 0) / 1000, 3),
+            "execution_s": round(job.get("executionTime", 0) / 1000, 3),
+            "total_s": round(time.monotonic() - submitted_at, 3),
+        }
+        if job["status"] != "COMPLETED":
+            return ComfyResult(index, job_id, job["status"], error=job.get("error") or job["status"],
+                               timings=timings)
+        output = job.get("output") or {}
+        if isinstance(output, dict) and output.get("error"):
+            return ComfyResult(index, job_id, job["status"], error=output["error"], output=output,
+                               timings=timings)
+        try:
+            # 디코드는 스레드에서 (다른 작업의 상태 조회와 겹침)
+            images = await asyncio.to_thread(decode_images, output)
+        except Exception as e:
+            return ComfyResult(index, job_id, job["status"], error=f"이미지 디코드 실패: {e}",
+                               output=output, timings=timings)
+        return ComfyResult(index, job_id, job["status"], images=images, timings=timings)
+
+    async def run_many(self, workflows):
+        """워크플로우 목록을 제출하고 끝나는 순서대로 ComfyResult를 yield
+
+        진행 중인 작업이 max_in_flight개가 되면 하나가 끝날 때까지 다음 제출을 미룹니다.
+        """
+        workflows = list(workflows)
+        pending = iter(enumerate(workflows))
+        in_flight = {}   # 작업 ID -> (index, 제출 시각)
+        decoding = set()
+        exhausted = False
+
+        try:
+            while not exhausted or in_flight or decoding:
+                # 1. 빈 자리만큼 제출
+                submits = []
+                while not exhausted and len(in_flight) + len(submits) < self.max_in_flight:
+                    item = next(pending, None)
+                    if item is None:
+                        exhausted = True
+                        break
+                    submits.append(item)
+                if submits:
+                    job_ids = await asyncio.gather(*(self.submit(w) for _, w in submits),
+                                                   return_exceptions=True)
+                    now = time.monotonic()
+                    for (index, _), job_id in zip(submits, job_ids):
+                        if isinstance(job_id, Exception):
+                            yield ComfyResult(index, None, "FAILED", error=f"제출 실패: {job_id}")
+                        else:
+                            in_flight[job_id] = (index, now)
+
+                # 2. 끝난 디코드 결과 전달
+                for task in [t for t in decoding if t.done()]:
+                    decoding.discard(task)
+                    yield task.result()
+                if not in_flight:
+                    if decoding:
+                        await asyncio.wait(decoding, return_when=asyncio.FIRST_COMPLETED)
+                    continue
+
+                # 3. 진행 중인 작업 상태를 한 주기에 한꺼번에 조회
+                await asyncio.sleep(self.poll_interval)
+                job_ids = list(in_flight)
+                statuses = await asyncio.gather(*(self.status(j) for j in job_ids), return_exceptions=True)
+                now = time.monotonic()
+                for job_id, job in zip(job_ids, statuses):
+                    index, submitted_at = in_flight[job_id]
+                    if isinstance(job, Exception):
+                        print(f"⚠️ 상태 조회 실패 ({job_id}): {job}")
+                        continue
+                    if job.get("status") in FINISHED:
+                        del in_flight[job_id]
+                        decoding.add(asyncio.ensure_future(self._finish(index, job_id, job, submitted_at)))
+                    elif now - submitted_at > self.job_timeout:
+                        del in_flight[job_id]
+                        try:
+                            await self.cancel(job_id)
+                        except Exception as e:
+                            print(f"⚠️ 시간 초과 작업 취소 실패 ({job_id}): {e}")
+                        yield ComfyResult(index, job_id, "TIMED_OUT", error=f"{self.job_timeout:.0f}초 초과")
+        finally:
+            # 소비자가 중간에 멈추면 남은 작업 취소
+            for job_id in in_flight:
+                try:
+                    await self.cancel(job_id)
+                except Exception:
+                    pass
+            for task in decoding:
+                task.cancel()
+
+    async def run_all(self, workflows):
+        """run_many 결과를 워크플로우 순서대로 모아 반환"""
+        results = [None] * len(workflows)
+        async for result in self.run_many(workflows):
+            results[result.index] = result
+        return results
+
+    async def close(self):
+        await self.client.close()
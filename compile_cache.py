@@ -0,0 +1,124 @@
+"""
+torch.compile 경로와 컴파일 캐시 영속화
+
+트랜스포머를 고정 형태(dynamic=False)로 컴파일하고, Inductor FX 그래프 캐시 /
+Triton 오토튠 캐시 디렉토리를 MODEL_CACHE_DIR 아래(네트워크 볼륨)에 둡니다.
+torch.compiler.save_cache_artifacts가 있는 버전에서는 워밍업 후 캐시 아티팩트를
+한 파일로 저장해 다음 콜드 스타트에서 먼저 불러옵니다.
+
+캐시 디렉토리는 torch 버전, GPU 이름, 모델 리비전, 컴파일 모드별로 나뉘어
+서로 다른 환경의 아티팩트가 섞이지 않습니다.
+"""
+
+import hashlib
+import os
+import time
+
+# 컴파일 설정 (환경 변수로 변경 가능)
+TORCH_COMPILE = os.environ.get("TORCH_COMPILE", "0") == "1"
+TORCH_COMPILE_MODE = os.environ.get("TORCH_COMPILE_MODE", "max-autotune-no-cudagraphs")
+# 워밍업에서 버킷마다 컴파일해 둘 배치 크기 (비어 있으면 1부터 최대 배치 크기까지 전부)
+COMPILE_WARMUP_BATCH_SIZES = [
+    int(v) for v in os.environ.get("COMPILE_WARMUP_BATCH_SIZES", "").split(",") if v.strip()
+]
+
+ARTIFACTS_FILE = "cache_artifacts.bin"
+
+
+def cache_namespace(model_revision, mode=TORCH_COMPILE_MODE):
+    """torch 버전 / GPU / 모델 리비전 / 모드로 캐시 디렉토리 이름 결정"""
+    import torch
+
+    device = torch.cuda.get_device_name(0) if torch.cuda.is_available() else "cpu"
+    raw = f"{torch.__version__}|{torch.version.cuda}|{device}|{model_revision}|{mode}"
+    return hashlib.sha256(raw.encode()).hexdigest()[:16]
+
+
+def configure_cache(cache_root, model_revision, mode=TORCH_COMPILE_MODE):
+    """Inductor/Triton 캐시를 볼륨 디렉토리로 지정 (첫 컴파일 전에 호출)"""
+    import torch._inductor.config as inductor_config
+
+    cache_dir = os.path.join(cache_root, cache_namespace(model_revision, mode))
+    os.makedirs(cache_dir, exist_ok=True)
+    os.environ["TORCHINDUCTOR_CACHE_DIR"] = os.path.join(cache_dir, "inductor")
+    os.environ["TRITON_CACHE_DIR"] = os.path.join(cache_dir, "triton")
+    os.environ["TORCHINDUCTOR_FX_GRAPH_CACHE"] = "1"
+    os.environ["TORCHINDUCTOR_AUTOGRAD_CACHE"] = "1"
+    inductor_config.fx_graph_cache = True
+    return cache_dir
+
+
+def load_artifacts(cache_dir):
+    """저장된 캐시 아티팩트 불러오기 (있으면 True)"""
+    import torch
+
+    path = os.path.join(cache_dir, ARTIFACTS_FILE)
+    # torch.compiler 모듈 자체가 없는 버전(2.0 이하)도 있으므로 getattr로 확인
+    load_cache_artifacts = getattr(getattr(torch, "compiler", None), "load_cache_artifacts", None)
+    if not os.path.exists(path) or load_cache_artifacts is None:
+        return False
+    try:
+        with open(path, "rb") as f:
+            load_cache_artifacts(f.read())
+        print(f"📦 컴파일 캐시 아티팩트 로드: {path}")
+        return True
+    except Exception as e:
+        # 손상되었거나 호환되지 않는 캐시는 무시하고 새로 컴파일
+        print(f"⚠️ 컴파일 캐시 아티팩트 로드 실패 (무시): {e}")
+        return False
+
+
+def save_artifacts(cache_dir):
+    """워밍업 후 캐시 아티팩트를 한 파일로 저장 (임시 파일 + os.replace)"""
+    import torch
+
+    save_cache_artifacts = getattr(getattr(torch, "compiler", None), "save_cache_artifacts", None)
+    if save_cache_artifacts is None:
+        return None
+    artifacts = save_cache_artifacts()
+    if not artifacts:
+        return None
+    data, _ = artifacts
+    path = os.path.join(cache_dir, ARTIFACTS_FILE)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    print(f"💾 컴파일 캐시 아티팩트 저장: {path} ({len(data) / 1024 ** 2:.1f}MB)")
+    return path
+
+
+def compile_module(module, mode=TORCH_COMPILE_MODE, max_shapes=64):
+    """고정 형태로 컴파일 (버킷 x 배치 크기마다 그래프 하나)"""
+    import torch
+
+    torch._dynamo.config.cache_size_limit = max(torch._dynamo.config.cache_size_limit, max_shapes)
+    return torch.compile(module, mode=mode, fullgraph=False, dynamic=False)
+
+
+def warmup_batch_sizes(max_batch_size, configured=COMPILE_WARMUP_BATCH_SIZES):
+    """고정 형태 컴파일에서 미리 만들 배치 크기
+
+    코얼레서는 1부터 max_batch_size까지 어떤 크기의 배치든 만들 수 있으므로 기본은 전부입니다.
+    워밍업하지 않은 크기는 첫 요청에서 컴파일됩니다.
+    """
+    if configured:
+        return sorted(set(configured))
+    return list(range(1, max_batch_size + 1))
+
+
+def warmup_buckets(run, buckets, batch_sizes):
+    """버킷 x 배치 크기마다 run(width, height, batch_size)을 실행해 그래프 컴파일
+
+    Returns:
+        {"WxH@B": 초} 워밍업 시간
+    """
+    report = {}
+    for width, height in buckets:
+        for batch_size in batch_sizes:
+            started = time.perf_counter()
+            run(width, height, batch_size)
+            elapsed = time.perf_counter() - started
+            report[f"{width}x{height}@{batch_size}"] = round(elapsed, 2)
+            print(f"🔥 컴파일 워밍업 {width}x{height} (배치 {batch_size}): {elapsed:.1f}초")
+    return report
@@ -0,0 +1,258 @@
+"""
+파이프라인 구성요소 풀 (체크포인트 파일 기반 중복 제거)
+
+FLUX와 SD3 파이프라인은 같은 T5-XXL 등 동일한 서브모듈을 쓰는 경우가 있습니다.
+가중치를 읽어 해시하지 않고 체크포인트 파일로 구성요소 키를 만들어
+(model_provision 마커나 허브 캐시 blob 이름의 가중치 파일 sha256, 없으면 경로+revision),
+이미 같은 클래스/키의 모듈이 풀에 있으면 새로 읽지 않고 기존 모듈을 공유합니다.
+
+공유된 모듈은 여러 파이프라인이 함께 쓰므로 한 파이프라인이 바꾸면 안 됩니다.
+- 오프로드 계획(accelerate 훅 설치)을 적용하는 파이프라인은 먼저 withdraw로
+  공유 중인 구성요소를 자기 사본으로 바꾸고, 자기 모듈은 풀에서 뺍니다
+- LoRA는 공유된 텍스트 인코더에 주입하지 않습니다 (lora_manager 참고)
+"""
+
+import gc
+import importlib
+import os
+import re
+import threading
+
+from model_provision import read_marker
+
+# 풀에서 공유를 시도할 구성요소 (트랜스포머는 모델마다 달라 제외)
+POOLABLE_COMPONENTS = ("text_encoder", "text_encoder_2", "text_encoder_3", "vae")
+
+
+def module_bytes(module):
+    """모듈 파라미터+버퍼 크기 (바이트)"""
+    size = sum(p.numel() * p.element_size() for p in module.parameters())
+    size += sum(b.numel() * b.element_size() for b in module.buffers())
+    return size
+
+
+# 구성요소 키에 쓰는 가중치 파일 확장자 (config.json 등 설정 파일은 체크포인트마다 달라 제외)
+WEIGHT_EXTENSIONS = (".safetensors", ".bin", ".pt", ".pth", ".ckpt")
+SHA256_HEX = re.compile(r"^[0-9a-f]{64}$")
+
+
+def _file_variant(relpath):
+    """diffusers 가중치 파일 이름의 variant (model.fp16.safetensors -> fp16, 샤드 포함)"""
+    parts = os.path.splitext(os.path.basename(relpath))[0].split(".")
+    return parts[1].split("-")[0] if len(parts) > 1 else None
+
+
+def _weight_hashes(files, variant=None):
+    """(상대 경로, sha256) 목록 -> 실제로 로드될 가중치 파일의 sha256 목록
+
+    from_pretrained와 같은 순서로 고릅니다: variant 파일이 있으면 그것, 없으면 기본 파일,
+    safetensors가 있으면 safetensors만. sha256을 모르는 파일이 있으면 None.
+    """
+    weights = [(rel, sha) for rel, sha in files if rel.endswith(WEIGHT_EXTENSIONS)]
+    chosen = [(rel, sha) for rel, sha in weights if variant and _file_variant(rel) == variant]
+    if not chosen:
+        chosen = [(rel, sha) for rel, sha in weights if _file_variant(rel) is None]
+    if any(rel.endswith(".safetensors") for rel, _ in chosen):
+        chosen = [(rel, sha) for rel, sha in chosen if rel.endswith(".safetensors")]
+    if not chosen or any(not sha or not SHA256_HEX.match(sha) for _, sha in chosen):
+        return None
+    return tuple(sorted(sha for _, sha in chosen))
+
+
+def _marker_files(path, name):
+    """model_provision 마커에 기록된 하위 폴더 파일의 (상대 경로, sha256) 목록"""
+    marker = read_marker(path) if os.path.isdir(path) else None
+    if not marker:
+        return None
+    prefix = f"{name}/"
+    files = tuple(sorted(
+        (rel[len(prefix):], meta.get("sha256"))
+        for rel, meta in marker.get("files", {}).items() if rel.startswith(prefix)
+    ))
+    return files or None
+
+
+def _hub_files(repo_id, name, revision=None, token=None):
+    """허브 캐시 스냅샷의 (상대 경로, blob 이름) 목록
+
+    LFS 파일의 blob 이름은 sha256(64자리 hex)이고, 일반 파일은 git sha1이라
+    _weight_hashes에서 걸러집니다.
+    """
+    if os.path.isdir(repo_id):
+        return None
+    try:
+        from huggingface_hub import snapshot_download
+
+        local = snapshot_download(repo_id, revision=revision, allow_patterns=[f"{name}/*"],
+                                  local_files_only=True, token=token)
+    except Exception:
+        return None
+    folder = os.path.join(local, name)
+    files = []
+    for root, _, names in os.walk(folder):
+        for filename in names:
+            full = os.path.join(root, filename)
+            files.append((os.path.relpath(full, folder), os.path.basename(os.path.realpath(full))))
+    return tuple(sorted(files)) or None
+
+
+def component_key(path, name, revision=None, variant=None, token=None):
+    """가중치를 읽지 않고 만드는 구성요소 키
+
+    로드될 가중치 파일의 sha256을 알면(마커 또는 허브 캐시 blob 이름) 그것으로 키를 만들어
+    로컬 마커 체크포인트와 허브 캐시 체크포인트의 같은 가중치끼리도 공유되고,
+    모르면 같은 경로/revision/하위 폴더일 때만 공유합니다.
+    """
+    for files in (_marker_files(path, name), _hub_files(path, name, revision, token)):
+        hashes = _weight_hashes(files or (), variant)
+        if hashes:
+            return ("weights", hashes)
+    location = os.path.realpath(os.path.join(path, name)) if os.path.isdir(path) else f"{path}/{name}"
+    return ("path", location, revision, variant)
+
+
+class ComponentPool:
+    """같은 체크포인트의 서브모듈을 파이프라인 간에 공유하는 풀"""
+
+    def __init__(self):
+        self._modules = {}
+        self._owners = {}
+        self._loaders = {}
+        self._lock = threading.Lock()
+        self.loaded_bytes = 0
+
+    def _share(self, key, label):
+        module, owners = self._owners[id(self._modules[key])]
+        owners.append(label)
+        return module
+
+    def get(self, owner, name, key_fn, load):
+        """풀에 같은 키의 모듈이 있으면 그것을, 없으면 load()로 읽어 등록 후 반환
+
+        Args:
+            key_fn: 구성요소 키를 만드는 함수 (허브 캐시는 로드 후에야 키가 정해질 수 있어 두 번 호출)
+            load: 이 파이프라인용 모듈을 새로 읽는 함수 (withdraw에서 사본을 만들 때도 사용)
+        """
+        label = f"{owner}.{name}"
+        with self._lock:
+            self._loaders[label] = load
+            key = key_fn()
+            if key in self._modules:
+                return self._share(key, label)
+
+        module = load()
+        with self._lock:
+            self.loaded_bytes += module_bytes(module)
+            key = key_fn()
+            if key in self._modules:
+                shared = self._share(key, label)
+            else:
+                self._modules[key] = module
+                self._owners[id(module)] = (module, [label])
+                return module
+        del module
+        gc.collect()
+        return shared
+
+    def is_shared(self, module):
+        """모듈을 두 개 이상의 파이프라인이 쓰고 있는지"""
+        entry = self._owners.get(id(module))
+        return entry is not None and entry[0] is module and len(entry[1]) > 1
+
+    def withdraw(self, pipe, owner):
+        """파이프라인의 구성요소를 바꾸기 전(오프로드 훅 설치 등)에 호출
+
+        다른 파이프라인과 공유 중인 구성요소는 이 파이프라인 전용 사본으로 바꾸고,
+        이 파이프라인만 쓰는 구성요소는 이후 파이프라인이 받지 않도록 풀에서 뺍니다.
+        """
+        for name, module in list(pipe.components.items()):
+            entry = self._owners.get(id(module))
+            if entry is None or entry[0] is not module:
+                continue
+            label = f"{owner}.{name}"
+            with self._lock:
+                owners = entry[1]
+                if label in owners:
+                    owners.remove(label)
+                if not owners:
+                    del self._owners[id(module)]
+                    self._modules = {k: m for k, m in self._modules.items() if m is not module}
+                    continue
+                load = self._loaders[label]
+
+            print(f"♻️ {label}: 다른 파이프라인과 공유 중이라 전용 사본을 로드합니다")
+            private = load()
+            with self._lock:
+                self.loaded_bytes += module_bytes(private)
+            pipe.register_modules(**{name: private})
+
+    def report(self):
+        """절약된 메모리 요약 (시작 시 출력용)"""
+        shared = []
+        saved = 0
+        for module, owners in self._owners.values():
+            for label in owners[1:]:
+                shared.append(f"{label} -> {owners[0]}")
+                saved += module_bytes(module)
+        report = {
+            "unique_components": len(self._owners),
+            "loaded_gb": round(self.loaded_bytes / 1024 ** 3, 2),
+            "saved_gb": round(saved / 1024 ** 3, 2),
+            "shared": shared,
+        }
+        print(f"♻️ 구성요소 풀: 고유 {report['unique_components']}개, "
+              f"로드 {report['loaded_gb']}GB, 중복 제거로 {report['saved_gb']}GB 절약")
+        for line in shared:
+            print(f"   공유: {line}")
+        return report
+
+
+# 프로세스 전체에서 공유하는 풀
+shared_pool = ComponentPool()
+
+
+def load_pipeline(pipeline_cls, path, owner, pool=shared_pool,
+                  poolable=POOLABLE_COMPONENTS, **kwargs):
+    """공유 가능한 구성요소를 풀에서 받아 파이프라인 로드
+
+    Args:
+        pipeline_cls: diffusers 파이프라인 클래스
+        path: 로컬 경로 또는 허브 repo id
+        owner: 풀 보고서에 쓸 파이프라인 이름
+        kwargs: from_pretrained에 그대로 전달 (torch_dtype, variant, token, 미리 로드한 구성요소 등)
+    """
+    config = pipeline_cls.load_config(
+        path,
+        **{k: v for k, v in kwargs.items() if k in ("token", "local_files_only", "revision")}
+    )
+    component_kwargs = {
+        k: v for k, v in kwargs.items()
+        if k in ("torch_dtype", "variant", "token", "local_files_only", "revision")
+    }
+
+    components = {}
+    for name in poolable:
+        if name in kwargs:
+            # 호출자가 직접 준 구성요소(양자화 모듈 등)는 그대로 사용
+            continue
+        spec = config.get(name)
+        if not isinstance(spec, (list, tuple)) or spec[0] is None:
+            continue
+        library, class_name = spec
+        component_cls = getattr(importlib.import_module(library), class_name)
+
+        def load(component_cls=component_cls, name=name):
+            try:
+                return component_cls.from_pretrained(path, subfolder=name, **component_kwargs)
+            except (OSError, ValueError):
+                # variant 파일이 없는 구성요소는 기본 가중치로 로드
+                kwargs_no_variant = {k: v for k, v in component_kwargs.items() if k != "variant"}
+                return component_cls.from_pretrained(path, subfolder=name, **kwargs_no_variant)
+
+        def key_fn(class_name=class_name, name=name):
+            key = component_key(path, name, kwargs.get("revision"), kwargs.get("variant"), kwargs.get("token"))
+            return (class_name, str(kwargs.get("torch_dtype")), key)
+
+        components[name] = pool.get(owner, name, key_fn, load)
+
+    return pipeline_cls.from_pretrained(path, **components, **kwargs)
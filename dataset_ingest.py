@@ -0,0 +1,335 @@
+"""
+학습 데이터셋 수집 (스트리밍 다운로드 / 스트리밍 압축 해제 / 병렬 전처리 / 캐시)
+
+1. 다운로드: 응답을 메모리에 올리지 않고 디스크로 바로 쓰면서 SHA-256 계산
+   (같은 URL의 ETag/Last-Modified/Content-Length가 이전과 같으면 다운로드 생략)
+2. 압축 해제: zip/tar 멤버를 하나씩 스트림으로 꺼내 바로 전처리 풀에 넘김
+   (풀에 넘겨 둔 작업이 INGEST_MAX_PENDING개면 하나가 끝날 때까지 압축 해제를 멈춤)
+3. 전처리(프로세스 풀): 디코드, 검증, RGB 변환, EXIF 회전, 학습 버킷 크기로 잘라 리사이즈
+4. 캐시: (아카이브 해시, 전처리 설정)별 디렉토리에 결과와 manifest.json 저장
+   같은 데이터셋을 다시 제출하면 위 작업을 모두 건너뜀
+
+결과 디렉토리에는 <이름>.png와 같은 이름의 캡션(<이름>.txt)이 나란히 놓입니다.
+<이름>은 아카이브 안 경로를 평탄하게 만든 것이고, 다른 경로와 겹치면 경로의 짧은 해시를 붙입니다.
+"""
+
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import tarfile
+import tempfile
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import requests
+from PIL import Image, ImageOps
+
+from model_provision import FileLock
+from resolution_buckets import ResolutionBuckets, build_buckets
+
+# 수집 설정 (환경 변수로 변경 가능)
+DATASET_CACHE_DIR = os.environ.get("DATASET_CACHE_DIR", "/workspace/datasets")
+INGEST_WORKERS = int(os.environ.get("INGEST_WORKERS", "0")) or os.cpu_count() or 1
+# 전처리 풀에 한 번에 넘겨 둘 최대 이미지 수 (0이면 워커 수 × 4)
+INGEST_MAX_PENDING = int(os.environ.get("INGEST_MAX_PENDING", "0"))
+# 학습 해상도 (버킷 면적 기준 변 길이)와 버킷 비율
+TRAIN_RESOLUTION = int(os.environ.get("TRAIN_RESOLUTION", "1024"))
+TRAIN_BUCKET_ASPECTS = os.environ.get("TRAIN_BUCKET_ASPECTS", "1:1,4:3,3:4,3:2,2:3,16:9,9:16")
+# 짧은 변이 이보다 작은 이미지는 제외 (업스케일하면 학습 품질이 떨어짐)
+INGEST_MIN_SIDE = int(os.environ.get("INGEST_MIN_SIDE", "256"))
+# 디코드 전에 거부할 픽셀 수 (압축 폭탄 방지)
+INGEST_MAX_PIXELS = int(os.environ.get("INGEST_MAX_PIXELS", str(64 * 1024 * 1024)))
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".bmp", ".gif", ".tif", ".tiff"}
+CAPTION_EXTENSIONS = {".txt", ".caption"}
+PREP_VERSION = "2"
+CHUNK_SIZE = 1024 * 1024
+INDEX_FILE = "url_index.json"
+MANIFEST_FILE = "manifest.json"
+
+
+def _entry_stem(name):
+    """아카이브 안 경로에서 확장자를 뗀 정규화된 경로 (이미지/캡션 짝 맞추기용)"""
+    stem, _ = os.path.splitext(name.replace("\\", "/").strip("/"))
+    return stem
+
+
+def _entry_key(stem, used):
+    """정규화된 경로 -> 평탄한 파일 이름
+
+    "a b"/"a_b", "dir/x"/"dir__x"처럼 평탄하게 만들면 겹치는 경로는
+    뒤에 나온 쪽에 경로의 짧은 해시를 붙여 구분합니다.
+    """
+    key = stem.replace("/", "__").replace(" ", "_")
+    if key in used:
+        key = f"{key}-{hashlib.sha1(stem.encode()).hexdigest()[:8]}"
+    return key
+
+
+def _skip_member(name):
+    parts = name.replace("\\", "/").split("/")
+    return any(p.startswith(".") or p == "__MACOSX" for p in parts)
+
+
+def _prep_settings(resolution, aspects):
+    return {
+        "version": PREP_VERSION,
+        "resolution": resolution,
+        "buckets": [list(b) for b in build_buckets("", aspects, str(resolution))],
+        "min_side": INGEST_MIN_SIDE,
+    }
+
+
+def _settings_hash(settings):
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode()).hexdigest()[:8]
+
+
+def prepare_image(src, dst_base, buckets, min_side=INGEST_MIN_SIDE, max_pixels=INGEST_MAX_PIXELS):
+    """이미지 하나 전처리 (프로세스 풀에서 실행)
+
+    Returns:
+        {"file", "bucket", "source_size"} 또는 실패 시 {"error"}
+    """
+    try:
+        with Image.open(src) as image:
+            width, height = image.size
+            if width * height > max_pixels:
+                return {"error": f"픽셀 수 초과 ({width}x{height})"}
+            if min(width, height) < min_side:
+                return {"error": f"너무 작음 ({width}x{height})"}
+            image.load()
+            image = ImageOps.exif_transpose(image)
+            if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+                # 투명 배경은 흰색으로 합성
+                rgba = image.convert("RGBA")
+                image = Image.new("RGB", rgba.size, (255, 255, 255))
+                image.paste(rgba, mask=rgba.split()[-1])
+            elif image.mode != "RGB":
+                image = image.convert("RGB")
+            bucket = ResolutionBuckets(buckets).snap(*image.size)
+            if image.size != bucket:
+                image = ImageOps.fit(image, bucket, Image.LANCZOS)
+            dst = dst_base + ".png"
+            image.save(dst, format="PNG", compress_level=1)
+        return {"file": os.path.basename(dst), "bucket": f"{bucket[0]}x{bucket[1]}",
+                "source_size": [width, height]}
+    except Exception as e:
+        return {"error": f"{type(e).__name__}: {str(e).replace(src, os.path.basename(src))}"}
+    finally:
+        os.remove(src)
+
+
+def iter_archive(path):
+    """아카이브 멤버를 (이름, 파일 객체)로 하나씩 (전체를 메모리에 올리지 않음)"""
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or _skip_member(info.filename):
+                    continue
+                with archive.open(info) as f:
+                    yield info.filename, f
+    elif tarfile.is_tarfile(path):
+        # r|*: 앞에서부터 순서대로 읽는 스트림 모드
+        with open(path, "rb") as raw, tarfile.open(fileobj=raw, mode="r|*") as archive:
+            for member in archive:
+                if not member.isfile() or _skip_member(member.name):
+                    continue
+                yield member.name, archive.extractfile(member)
+    else:
+        raise ValueError("지원하지 않는 데이터셋 형식입니다 (zip 또는 tar)")
+
+
+class DatasetIngestor:
+    """URL의 데이터셋을 학습용 디렉토리로 준비 (아카이브 내용 해시로 캐시)"""
+
+    def __init__(self, cache_dir=DATASET_CACHE_DIR, resolution=TRAIN_RESOLUTION,
+                 aspects=TRAIN_BUCKET_ASPECTS, workers=INGEST_WORKERS, max_pending=INGEST_MAX_PENDING):
+        self.cache_dir = cache_dir
+        self.resolution = resolution
+        self.settings = _prep_settings(resolution, aspects)
+        self.buckets = [tuple(b) for b in self.settings["buckets"]]
+        self.workers = workers
+        self.max_pending = max_pending or workers * 4
+        os.makedirs(cache_dir, exist_ok=True)
+
+    # --- URL 인덱스 (URL -> 검증자 + 아카이브 해시) ---
+
+    def _read_index(self):
+        try:
+            with open(os.path.join(self.cache_dir, INDEX_FILE)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _update_index(self, url, entry):
+        with FileLock(os.path.join(self.cache_dir, INDEX_FILE + ".lock")):
+            index = self._read_index()
+            index[url] = entry
+            path = os.path.join(self.cache_dir, INDEX_FILE)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(index, f, indent=2)
+            os.replace(tmp_path, path)
+
+    @staticmethod
+    def _validators(headers):
+        return {k: headers.get(k) for k in ("ETag", "Last-Modified", "Content-Length")}
+
+    def dataset_dir(self, dataset_hash):
+        return os.path.join(self.cache_dir, f"{dataset_hash[:16]}-{_settings_hash(self.settings)}")
+
+    def load_manifest(self, dataset_hash):
+        try:
+            with open(os.path.join(self.dataset_dir(dataset_hash), MANIFEST_FILE)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    # --- 단계 ---
+
+    def download(self, response, dst):
+        """응답 본문을 디스크로 스트리밍하며 SHA-256 계산"""
+        digest = hashlib.sha256()
+        size = 0
+        with open(dst, "wb") as f:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                f.write(chunk)
+                digest.update(chunk)
+                size += len(chunk)
+        return digest.hexdigest(), size
+
+    def prepare(self, archive_path, dataset_hash, source=""):
+        """아카이브를 스트림으로 풀면서 이미지를 프로세스 풀에서 전처리"""
+        final_dir = self.dataset_dir(dataset_hash)
+        staging = tempfile.mkdtemp(prefix=".staging-", dir=self.cache_dir)
+        os.chmod(staging, 0o755)
+        raw_dir = os.path.join(staging, "raw")
+        image_dir = os.path.join(staging, "images")
+        os.makedirs(raw_dir)
+        os.makedirs(image_dir)
+
+        started = time.perf_counter()
+        captions, futures, keys, inflight = {}, {}, set(), set()
+        # CUDA를 초기화한 프로세스에서 fork하지 않도록 spawn 사용
+        context = multiprocessing.get_context("spawn")
+        try:
+            with ProcessPoolExecutor(max_workers=self.workers, mp_context=context) as pool:
+                for name, f in iter_archive(archive_path):
+                    ext = os.path.splitext(name)[1].lower()
+                    stem = _entry_stem(name)
+                    if ext in CAPTION_EXTENSIONS:
+                        captions[stem] = f.read().decode("utf-8", "replace").strip()
+                    elif ext in IMAGE_EXTENSIONS and stem not in futures:
+                        # 풀에 넘겨 둔 작업이 많으면 하나가 끝날 때까지 압축 해제를 멈춤
+                        if len(inflight) >= self.max_pending:
+                            _, inflight = wait(inflight, return_when=FIRST_COMPLETED)
+                        key = _entry_key(stem, keys)
+                        keys.add(key)
+                        raw_path = os.path.join(raw_dir, key + ext)
+                        with open(raw_path, "wb") as out:
+                            shutil.copyfileobj(f, out, CHUNK_SIZE)
+                        future = pool.submit(prepare_image, raw_path, os.path.join(image_dir, key), self.buckets)
+                        futures[stem] = (name, key, future)
+                        inflight.add(future)
+                extracted_s = time.perf_counter() - started
+
+                images, rejected, bucket_counts = [], [], {}
+                for stem, (name, key, future) in sorted(futures.items()):
+                    result = future.result()
+                    if "error" in result:
+                        rejected.append({"source": name, "error": result["error"]})
+                        continue
+                    caption = captions.get(stem, "")
+                    if caption:
+                        with open(os.path.join(image_dir, key + ".txt"), "w", encoding="utf-8") as out:
+                            out.write(caption)
+                    images.append({"file": result["file"], "caption": caption,
+                                   "bucket": result["bucket"], "source": name,
+                                   "source_size": result["source_size"]})
+                    bucket_counts[result["bucket"]] = bucket_counts.get(result["bucket"], 0) + 1
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        if not images:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise ValueError(f"사용할 수 있는 이미지가 없습니다 (제외 {len(rejected)}개)")
+
+        shutil.rmtree(raw_dir)
+        manifest = {
+            "dataset_hash": dataset_hash,
+            "source": source,
+            "settings": self.settings,
+            "images": images,
+            "rejected": rejected,
+            "buckets": dict(sorted(bucket_counts.items())),
+            "timings": {
+                "extract_s": round(extracted_s, 2),
+                "prepare_s": round(time.perf_counter() - started, 2),
+            },
+            "created_at": time.time(),
+        }
+        with open(os.path.join(staging, MANIFEST_FILE), "w") as f:
+            json.dump(manifest, f, indent=2)
+
+        # 완성된 디렉토리만 보이도록 원자적으로 이동
+        if os.path.exists(final_dir):
+            shutil.rmtree(final_dir)
+        os.replace(staging, final_dir)
+        return manifest
+
+    def _result(self, manifest, cached, download_s=0.0):
+        return {
+            "dataset_hash": manifest["dataset_hash"],
+            "image_dir": os.path.join(self.dataset_dir(manifest["dataset_hash"]), "images"),
+            "manifest": manifest,
+            "images": len(manifest["images"]),
+            "rejected": len(manifest["rejected"]),
+            "buckets": manifest["buckets"],
+            "cached": cached,
+            "timings": {"download_s": round(download_s, 2), **({} if cached else manifest["timings"])},
+        }
+
+    def ingest(self, url):
+        """URL의 데이터셋을 준비하고 결과 디렉토리 정보 반환"""
+        response = requests.get(url, stream=True, timeout=(10, 300))
+        response.raise_for_status()
+        validators = self._validators(response.headers)
+
+        # 같은 URL + 같은 검증자 -> 본문을 받지 않고 캐시 사용
+        known = self._read_index().get(url)
+        if known and (validators["ETag"] or validators["Last-Modified"]) \
+                and known.get("validators") == validators:
+            manifest = self.load_manifest(known["dataset_hash"])
+            if manifest:
+                response.close()
+                print(f"♻️ 데이터셋 캐시 사용 (URL 일치): {known['dataset_hash'][:16]}")
+                return self._result(manifest, cached=True)
+
+        print(f"📥 데이터셋 다운로드 (스트리밍): {url}")
+        started = time.perf_counter()
+        fd, archive_path = tempfile.mkstemp(prefix=".download-", dir=self.cache_dir)
+        os.close(fd)
+        try:
+            with response:
+                dataset_hash, size = self.download(response, archive_path)
+            download_s = time.perf_counter() - started
+            print(f"✅ 다운로드 완료: {size / 1024 ** 2:.1f}MB, {download_s:.1f}초")
+            self._update_index(url, {"validators": validators, "dataset_hash": dataset_hash})
+
+            # 같은 데이터셋을 동시에 처리하는 워커는 하나만 전처리
+            with FileLock(self.dataset_dir(dataset_hash) + ".lock"):
+                manifest = self.load_manifest(dataset_hash)
+                if manifest:
+                    print(f"♻️ 데이터셋 캐시 사용 (내용 해시 일치): {dataset_hash[:16]}")
+                    return self._result(manifest, cached=True, download_s=download_s)
+                manifest = self.prepare(archive_path, dataset_hash, source=url)
+        finally:
+            os.remove(archive_path)
+
+        print(f"✅ 데이터셋 준비 완료: {len(manifest['images'])}개 "
+              f"(제외 {len(manifest['rejected'])}개), 버킷 {manifest['buckets']}")
+        return self._result(manifest, cached=False, download_s=download_s)
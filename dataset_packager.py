@@ -0,0 +1,256 @@
+"""
+학습 데이터셋 ZIP 패키저 (병렬 / 증분)
+
+- 검증: 이미지 헤더만 읽어 형식, 크기, 색상 모드 확인 (전체 디코드 없음)
+- 변환: RGB가 아니거나 PACKAGE_MAX_SIDE보다 큰 이미지만 프로세스 풀에서 변환/리사이즈
+- 압축: 이미 압축된 JPEG/PNG는 무압축(ZIP_STORED)으로 저장, 캡션만 deflate
+- 증분: <zip>.manifest.json에 파일 해시와 캡션을 기록해 두고, 다시 실행하면
+  추가된 파일은 기존 ZIP의 복사본에 덧붙이고, 바뀌거나 지워진 파일이 있을 때만 ZIP을 다시 쓰되
+  바뀌지 않은 항목은 기존 ZIP에서 그대로 복사 (ZIP 항목이 매니페스트와 다르면 전체 재생성)
+
+벤치마크: python bench_packager.py
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from PIL import Image
+
+# 패키저 설정 (환경 변수로 변경 가능)
+# 긴 변이 이보다 크면 줄여서 저장 (0이면 리사이즈 안 함)
+PACKAGE_MAX_SIDE = int(os.environ.get("PACKAGE_MAX_SIDE", "2048"))
+PACKAGE_WORKERS = int(os.environ.get("PACKAGE_WORKERS", "0")) or os.cpu_count() or 1
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+STORED_FORMATS = {"JPEG", "PNG"}
+MANIFEST_VERSION = "1"
+CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def inspect_image(path, max_side=PACKAGE_MAX_SIDE):
+    """헤더만 읽어 검증 (Image.open은 픽셀을 디코드하지 않음)
+
+    Returns:
+        {"format", "size", "mode", "convert"} - convert는 변환/리사이즈가 필요한지
+    """
+    with Image.open(path) as image:
+        fmt, size, mode = image.format, image.size, image.mode
+    if fmt not in STORED_FORMATS:
+        raise ValueError(f"지원하지 않는 이미지 형식: {fmt}")
+    too_large = max_side and max(size) > max_side
+    return {"format": fmt, "size": list(size), "mode": mode,
+            "convert": bool(mode != "RGB" or too_large)}
+
+
+def convert_image(src, dst, max_side=PACKAGE_MAX_SIDE):
+    """RGB 변환 + 긴 변 리사이즈 (프로세스 풀에서 실행, 원본 형식 유지)"""
+    with Image.open(src) as image:
+        fmt = image.format
+        if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+            # 투명 배경은 흰색으로 합성
+            rgba = image.convert("RGBA")
+            image = Image.new("RGB", rgba.size, (255, 255, 255))
+            image.paste(rgba, mask=rgba.split()[-1])
+        elif image.mode != "RGB":
+            image = image.convert("RGB")
+        if max_side and max(image.size) > max_side:
+            image.thumbnail((max_side, max_side), Image.LANCZOS)
+        if fmt == "JPEG":
+            image.save(dst, format="JPEG", quality=95)
+        else:
+            image.save(dst, format="PNG", compress_level=1)
+    return dst
+
+
+class DatasetPackager:
+    """이미지 폴더 -> 학습용 ZIP (이미지 + 같은 이름의 .txt 캡션)"""
+
+    def __init__(self, max_side=PACKAGE_MAX_SIDE, workers=PACKAGE_WORKERS):
+        self.max_side = max_side
+        self.workers = workers
+
+    @staticmethod
+    def manifest_path(output_zip):
+        return output_zip + ".manifest.json"
+
+    def _read_manifest(self, output_zip):
+        try:
+            with open(self.manifest_path(output_zip)) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if manifest.get("version") != MANIFEST_VERSION or manifest.get("max_side") != self.max_side:
+            return None
+        # 매니페스트와 ZIP 항목이 정확히 일치할 때만 증분 갱신 (중간에 끊긴 실행 감지)
+        expected = set()
+        for name in manifest.get("files", {}):
+            expected.update((name, f"{os.path.splitext(name)[0]}.txt"))
+        try:
+            with zipfile.ZipFile(output_zip) as zf:
+                names = zf.namelist()
+        except (OSError, zipfile.BadZipFile):
+            return None
+        if len(names) != len(set(names)) or set(names) != expected:
+            print(f"⚠️ {output_zip}이(가) 매니페스트와 다릅니다, 전체를 다시 만듭니다")
+            return None
+        return manifest
+
+    def _scan(self, image_folder, previous):
+        """파일마다 해시 + 헤더 검사 (크기/수정 시각이 같으면 이전 해시 재사용)"""
+        names = sorted(n for n in os.listdir(image_folder) if n.lower().endswith(IMAGE_EXTENSIONS))
+
+        def scan(name):
+            path = os.path.join(image_folder, name)
+            stat = os.stat(path)
+            old = previous.get(name)
+            if old and old["size"] == stat.st_size and old["mtime_ns"] == stat.st_mtime_ns:
+                return name, dict(old)
+            try:
+                info = inspect_image(path, self.max_side)
+            except Exception as e:
+                return name, {"error": f"{type(e).__name__}: {e}"}
+            return name, {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                          "sha256": file_sha256(path), "convert": info["convert"]}
+
+        with ThreadPoolExecutor(max_workers=min(32, self.workers * 2)) as pool:
+            scanned = dict(pool.map(scan, names))
+
+        # a.png / a.jpg처럼 확장자만 다르면 캡션 a.txt가 겹치므로 정렬 순서상 첫 파일만 사용
+        stems = {}
+        for name in names:
+            if "error" in scanned[name]:
+                continue
+            stem = os.path.splitext(name)[0]
+            if stem in stems:
+                scanned[name] = {"error": f"캡션 파일 {stem}.txt가 {stems[stem]}와 겹침"}
+            else:
+                stems[stem] = name
+        return scanned
+
+    def package(self, image_folder, output_zip, trigger_word="TOK", captions=None):
+        """ZIP 생성 또는 증분 갱신
+
+        Returns:
+            {"images", "added", "changed", "removed", "unchanged", "converted", "skipped",
+             "mode": "full"|"append"|"rebuild"|"noop", "elapsed_s"}
+        """
+        started = time.perf_counter()
+        captions = captions or {}
+        manifest = self._read_manifest(output_zip)
+        previous = manifest["files"] if manifest else {}
+
+        scanned = self._scan(image_folder, previous)
+        skipped = {name: entry["error"] for name, entry in scanned.items() if "error" in entry}
+        for name, error in skipped.items():
+            print(f"⚠️ 건너뜀: {name} ({error})")
+            del scanned[name]
+
+        for name, entry in scanned.items():
+            entry["caption"] = captions.get(name, f"a photo of {trigger_word}")
+
+        def same(name):
+            old = previous.get(name)
+            new = scanned[name]
+            return old is not None and old["sha256"] == new["sha256"] and old["caption"] == new["caption"]
+
+        unchanged = [n for n in scanned if same(n)]
+        added = [n for n in scanned if n not in previous]
+        changed = [n for n in scanned if n in previous and not same(n)]
+        removed = [n for n in previous if n not in scanned]
+        pending = added + changed
+
+        if manifest is None:
+            mode = "full"
+        elif not pending and not removed:
+            mode = "noop"
+        elif not changed and not removed:
+            mode = "append"
+        else:
+            mode = "rebuild"
+
+        converted = 0
+        if mode != "noop":
+            work_dir = output_zip + ".work"
+            tmp_zip = f"{output_zip}.{os.getpid()}.tmp"
+            os.makedirs(work_dir, exist_ok=True)
+            try:
+                sources = self._convert(image_folder, pending, scanned, work_dir)
+                converted = sum(1 for n in pending if scanned[n]["convert"])
+                # 항상 임시 파일에 쓰고 교체 (덧붙이다 끊겨도 기존 ZIP은 그대로)
+                if mode == "append":
+                    shutil.copyfile(output_zip, tmp_zip)
+                    with zipfile.ZipFile(tmp_zip, "a") as zf:
+                        self._write_entries(zf, pending, scanned, sources)
+                else:
+                    with zipfile.ZipFile(tmp_zip, "w") as zf:
+                        if mode == "rebuild":
+                            self._copy_unchanged(output_zip, zf, unchanged, previous)
+                        self._write_entries(zf, sorted(pending), scanned, sources)
+                os.replace(tmp_zip, output_zip)
+            finally:
+                shutil.rmtree(work_dir, ignore_errors=True)
+                if os.path.exists(tmp_zip):
+                    os.remove(tmp_zip)
+
+            tmp_manifest = f"{self.manifest_path(output_zip)}.{os.getpid()}.tmp"
+            with open(tmp_manifest, "w") as f:
+                json.dump({"version": MANIFEST_VERSION, "max_side": self.max_side,
+                           "files": scanned}, f, indent=2)
+            os.replace(tmp_manifest, self.manifest_path(output_zip))
+
+        return {
+            "images": len(scanned),
+            "added": len(added),
+            "changed": len(changed),
+            "removed": len(removed),
+            "unchanged": len(unchanged),
+            "converted": converted,
+            "skipped": len(skipped),
+            "mode": mode,
+            "elapsed_s": round(time.perf_counter() - started, 3),
+        }
+
+    def _convert(self, image_folder, names, scanned, work_dir):
+        """변환이 필요한 파일만 프로세스 풀에서 처리하고 {이름: 저장할 파일 경로} 반환"""
+        sources = {n: os.path.join(image_folder, n) for n in names}
+        targets = [n for n in names if scanned[n]["convert"]]
+        if not targets:
+            return sources
+        with ProcessPoolExecutor(max_workers=min(self.workers, len(targets))) as pool:
+            futures = {
+                n: pool.submit(convert_image, sources[n], os.path.join(work_dir, n), self.max_side)
+                for n in targets
+            }
+            for name, future in futures.items():
+                sources[name] = future.result()
+        return sources
+
+    @staticmethod
+    def _write_entries(zf, names, scanned, sources):
+        for name in names:
+            zf.write(sources[name], name, compress_type=zipfile.ZIP_STORED)
+            base_name = os.path.splitext(name)[0]
+            zf.writestr(f"{base_name}.txt", scanned[name]["caption"], compress_type=zipfile.ZIP_DEFLATED)
+
+    @staticmethod
+    def _copy_unchanged(old_zip, zf, names, previous):
+        """바뀌지 않은 이미지/캡션 항목을 기존 ZIP에서 그대로 복사 (재변환 없음)"""
+        with zipfile.ZipFile(old_zip) as old:
+            for name in names:
+                for arcname in (name, f"{os.path.splitext(name)[0]}.txt"):
+                    info = old.getinfo(arcname)
+                    with old.open(info) as src, zf.open(info, "w") as dst:
+                        shutil.copyfileobj(src, dst, CHUNK_SIZE)
@@ -0,0 +1,246 @@
+"""
+로컬 가짜 Replicate API (오케스트레이터 확인용)
+
+학습(trainings)과 예측(predictions)의 상태 전이, 웹훅 전송(서명 포함), 결과 파일 제공을
+흉내 냅니다. 실제 학습이나 과금 없이 training_orchestrator를 돌려볼 때 사용합니다.
+
+    python fake_replicate.py --port 8787 --training-seconds 30
+    REPLICATE_API_URL=http://127.0.0.1:8787/v1 python train_flux_lora_replicate.py
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import time
+import uuid
+
+from aiohttp import ClientSession, web
+from PIL import Image
+
+from training_orchestrator import sign_webhook
+
+
+class FakeReplicate:
+    """aiohttp 기반 가짜 Replicate 서버
+
+    Args:
+        training_seconds: 학습 생성부터 succeeded까지 걸리는 시간
+        prediction_seconds: 예측 하나가 걸리는 시간 (Prefer: wait이면 응답 전에 기다림)
+        fail_every: n번째 학습마다 실패 (0이면 실패 없음)
+        secret: 웹훅 서명 키 (비어 있으면 서명 헤더 없음)
+    """
+
+    def __init__(self, training_seconds=5.0, prediction_seconds=0.5, fail_every=0, secret=""):
+        self.training_seconds = training_seconds
+        self.prediction_seconds = prediction_seconds
+        self.fail_every = fail_every
+        self.secret = secret
+        self.trainings = {}
+        self.predictions = {}
+        self.requests = {"create_training": 0, "get_training": 0, "cancel_training": 0,
+                         "create_prediction": 0, "get_prediction": 0, "file": 0, "webhook": 0}
+        self.base_url = ""
+        self._runner = None
+        self._tasks = set()
+        self._image = self._make_image()
+
+    @staticmethod
+    def _make_image(size=256):
+        buffer = io.BytesIO()
+        Image.new("RGB", (size, size), (90, 120, 200)).save(buffer, format="PNG")
+        return buffer.getvalue()
+
+    def completed_at(self, training_id):
+        return self.trainings[training_id]["_completed_at"]
+
+    def _public(self, record):
+        return {k: v for k, v in record.items() if not k.startswith("_")}
+
+    def _spawn(self, coro):
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _send_webhook(self, record):
+        url = record.get("_webhook")
+        if not url:
+            return
+        body = json.dumps(self._public(record)).encode()
+        headers = {"Content-Type": "application/json"}
+        if self.secret:
+            webhook_id, timestamp = f"msg_{uuid.uuid4().hex}", str(int(time.time()))
+            headers.update({
+                "webhook-id": webhook_id,
+                "webhook-timestamp": timestamp,
+                "webhook-signature": f"v1,{sign_webhook(self.secret, webhook_id, timestamp, body)}",
+            })
+        self.requests["webhook"] += 1
+        try:
+            async with ClientSession() as session:
+                await session.post(url, data=body, headers=headers)
+        except Exception as e:
+            print(f"⚠️ 가짜 웹훅 전송 실패: {e}")
+
+    async def _run_training(self, record, fail):
+        await asyncio.sleep(self.training_seconds * 0.1)
+        if record["status"] == "canceled":
+            return
+        record["status"] = "processing"
+        if "start" in record["_events"]:
+            await self._send_webhook(record)
+        await asyncio.sleep(self.training_seconds * 0.9)
+        if record["status"] == "canceled":
+            return
+        if fail:
+            record["status"] = "failed"
+            record["error"] = "fake training failure"
+        else:
+            record["status"] = "succeeded"
+            record["output"] = {
+                "version": f"{record['destination']}:{uuid.uuid4().hex[:12]}",
+                "weights": f"{self.base_url}/files/{record['id']}.tar",
+            }
+        record["completed_at"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        record["_completed_at"] = time.monotonic()
+        if "completed" in record["_events"]:
+            await self._send_webhook(record)
+
+    # --- 라우트 ---
+
+    async def create_training(self, request):
+        self.requests["create_training"] += 1
+        body = await request.json()
+        training_id = uuid.uuid4().hex[:16]
+        record = {
+            "id": training_id,
+            "model": f"{request.match_info['owner']}/{request.match_info['name']}",
+            "version": request.match_info["version"],
+            "destination": body.get("destination", "user/model"),
+            "input": body.get("input", {}),
+            "status": "starting",
+            "output": None,
+            "error": None,
+            "urls": {
+                "get": f"{self.base_url}/v1/trainings/{training_id}",
+                "cancel": f"{self.base_url}/v1/trainings/{training_id}/cancel",
+            },
+            "_webhook": body.get("webhook"),
+            "_events": body.get("webhook_events_filter") or ["start", "output", "logs", "completed"],
+            "_completed_at": None,
+        }
+        self.trainings[training_id] = record
+        fail = self.fail_every and len(self.trainings) % self.fail_every == 0
+        self._spawn(self._run_training(record, fail))
+        return web.json_response(self._public(record), status=201)
+
+    async def get_training(self, request):
+        self.requests["get_training"] += 1
+        record = self.trainings.get(request.match_info["id"])
+        if record is None:
+            return web.json_response({"detail": "Not found"}, status=404)
+        return web.json_response(self._public(record))
+
+    async def cancel_training(self, request):
+        self.requests["cancel_training"] += 1
+        record = self.trainings.get(request.match_info["id"])
+        if record is None:
+            return web.json_response({"detail": "Not found"}, status=404)
+        if record["status"] not in ("succeeded", "failed", "canceled"):
+            record["status"] = "canceled"
+            record["_completed_at"] = time.monotonic()
+        return web.json_response(self._public(record))
+
+    async def _finish_prediction(self, record):
+        await asyncio.sleep(self.prediction_seconds)
+        count = int(record["input"].get("num_outputs", 1))
+        record["output"] = [f"{self.base_url}/files/{record['id']}_{i}.png" for i in range(count)]
+        record["status"] = "succeeded"
+
+    async def create_prediction(self, request):
+        self.requests["create_prediction"] += 1
+        body = await request.json()
+        prediction_id = uuid.uuid4().hex[:16]
+        record = {
+            "id": prediction_id,
+            "version": body.get("version"),
+            "input": body.get("input", {}),
+            "status": "processing",
+            "output": None,
+            "error": None,
+            "urls": {"get": f"{self.base_url}/v1/predictions/{prediction_id}"},
+        }
+        self.predictions[prediction_id] = record
+        task = self._spawn(self._finish_prediction(record))
+        if request.headers.get("Prefer", "").startswith("wait"):
+            await asyncio.shield(task)
+        return web.json_response(record, status=201)
+
+    async def get_prediction(self, request):
+        self.requests["get_prediction"] += 1
+        record = self.predictions.get(request.match_info["id"])
+        if record is None:
+            return web.json_response({"detail": "Not found"}, status=404)
+        return web.json_response(record)
+
+    async def get_file(self, request):
+        self.requests["file"] += 1
+        return web.Response(body=self._image, content_type="image/png")
+
+    # --- 서버 ---
+
+    def app(self):
+        app = web.Application()
+        app.router.add_post("/v1/models/{owner}/{name}/versions/{version}/trainings", self.create_training)
+        app.router.add_get("/v1/trainings/{id}", self.get_training)
+        app.router.add_post("/v1/trainings/{id}/cancel", self.cancel_training)
+        app.router.add_post("/v1/predictions", self.create_prediction)
+        app.router.add_get("/v1/predictions/{id}", self.get_prediction)
+        app.router.add_get("/files/{name}", self.get_file)
+        return app
+
+    async def start(self, host="127.0.0.1", port=8787):
+        """서버 시작 후 기본 URL 반환 (port=0이면 빈 포트 사용)"""
+        self._runner = web.AppRunner(self.app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://{host}:{port}"
+        return self.base_url
+
+    async def stop(self):
+        for task in list(self._tasks):
+            task.cancel()
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+
+async def serve(args):
+    fake = FakeReplicate(args.training_seconds, args.prediction_seconds, args.fail_every, args.secret)
+    base_url = await fake.start(args.host, args.port)
+    print(f"🧪 가짜 Replicate API: {base_url}/v1")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await fake.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="로컬 가짜 Replicate API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--training-seconds", type=float, default=30.0)
+    parser.add_argument("--prediction-seconds", type=float, default=2.0)
+    parser.add_argument("--fail-every", type=int, default=0)
+    parser.add_argument("--secret", default="")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+로컬 가짜 RunPod 서버리스 엔드포인트 (ComfyUI 워커 흉내, comfyui_client 확인용)
+
+/run, /runsync, /status/{id}, /cancel/{id}를 제공하고, 워커 수만큼만 작업을 동시에
+실행합니다. 작업은 job_seconds 뒤에 워크플로우의 EmptyLatentImage 크기로 만든
+base64 PNG를 {"images": [{"filename", "type": "base64", "data"}]} 형식으로 돌려줍니다.
+
+    python fake_runpod.py --port 8788 --workers 4 --job-seconds 2
+    RUNPOD_API_URL=http://127.0.0.1:8788/v2 python runpod_comfyui_lora_example.py
+"""
+
+import argparse
+import asyncio
+import base64
+import io
+import time
+import uuid
+
+from aiohttp import web
+from PIL import Image
+
+# /runsync가 결과를 기다리는 최대 시간 (초, 넘으면 IN_PROGRESS 상태로 응답)
+RUNSYNC_WAIT = 90
+
+
+class FakeRunPod:
+    """aiohttp 기반 가짜 RunPod 엔드포인트
+
+    Args:
+        workers: 동시에 실행하는 작업 수 (엔드포인트의 워커 수)
+        job_seconds: 작업 하나의 실행 시간
+        fail_every: n번째 작업마다 실패 (0이면 실패 없음)
+        image_size: 워크플로우에 크기가 없을 때의 이미지 크기
+    """
+
+    def __init__(self, workers=4, job_seconds=2.0, fail_every=0, image_size=512):
+        self.workers = workers
+        self.job_seconds = job_seconds
+        self.fail_every = fail_every
+        self.image_size = image_size
+        self.jobs = {}
+        self.requests = {"run": 0, "runsync": 0, "status": 0, "cancel": 0}
+        self.base_url = ""
+        self._slots = None
+        self._runner = None
+        self._tasks = set()
+        self._images = {}
+
+    def _image_b64(self, width, height):
+        key = (width, height)
+        if key not in self._images:
+            buffer = io.BytesIO()
+            Image.new("RGB", key, (200, 120, 90)).save(buffer, format="PNG")
+            self._images[key] = base64.b64encode(buffer.getvalue()).decode()
+        return self._images[key]
+
+    def _image_size(self, workflow):
+        for node in (workflow or {}).values():
+            if node.get("class_type") == "EmptyLatentImage":
+                inputs = node["inputs"]
+                return int(inputs.get("width", self.image_size)), int(inputs.get("height", self.image_size))
+        return self.image_size, self.image_size
+
+    def _public(self, job):
+        return {k: v for k, v in job.items() if not k.startswith("_")}
+
+    async def _run_job(self, job):
+        async with self._slots:
+            if job["status"] == "CANCELLED":
+                return
+            started = time.monotonic()
+            job["delayTime"] = int((started - job["_created"]) * 1000)
+            job["status"] = "IN_PROGRESS"
+            await asyncio.sleep(self.job_seconds)
+            if job["status"] == "CANCELLED":
+                return
+            job["executionTime"] = int((time.monotonic() - started) * 1000)
+            if job["_fail"]:
+                job["status"] = "FAILED"
+                job["error"] = "fake worker failure"
+            else:
+                width, height = self._image_size(job["_input"].get("workflow"))
+                job["status"] = "COMPLETED"
+                job["output"] = {"images": [{
+                    "filename": f"ComfyUI_{job['id'][:8]}.png",
+                    "type": "base64",
+                    "data": self._image_b64(width, height),
+                }]}
+        job["_done"].set()
+
+    def _create(self, body):
+        job_id = f"{uuid.uuid4()}-u1"
+        job = {
+            "id": job_id,
+            "status": "IN_QUEUE",
+            "_input": body.get("input", {}),
+            "_created": time.monotonic(),
+            "_fail": bool(self.fail_every and (len(self.jobs) + 1) % self.fail_every == 0),
+            "_done": asyncio.Event(),
+        }
+        self.jobs[job_id] = job
+        task = asyncio.ensure_future(self._run_job(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    # --- 라우트 ---
+
+    async def run(self, request):
+        self.requests["run"] += 1
+        job = self._create(await request.json())
+        return web.json_response({"id": job["id"], "status": job["status"]})
+
+    async def runsync(self, request):
+        self.requests["runsync"] += 1
+        job = self._create(await request.json())
+        try:
+            await asyncio.wait_for(job["_done"].wait(), RUNSYNC_WAIT)
+        except asyncio.TimeoutError:
+            pass
+        return web.json_response(self._public(job))
+
+    async def status(self, request):
+        self.requests["status"] += 1
+        job = self.jobs.get(request.match_info["job_id"])
+        if job is None:
+            return web.json_response({"error": "job not found"}, status=404)
+        return web.json_response(self._public(job))
+
+    async def cancel(self, request):
+        self.requests["cancel"] += 1
+        job = self.jobs.get(request.match_info["job_id"])
+        if job is None:
+            return web.json_response({"error": "job not found"}, status=404)
+        if job["status"] in ("IN_QUEUE", "IN_PROGRESS"):
+            job["status"] = "CANCELLED"
+            job["_done"].set()
+        return web.json_response({"id": job["id"], "status": job["status"]})
+
+    # --- 서버 ---
+
+    def app(self):
+        app = web.Application(client_max_size=64 * 1024 ** 2)
+        app.router.add_post("/v2/{endpoint}/run", self.run)
+        app.router.add_post("/v2/{endpoint}/runsync", self.runsync)
+        app.router.add_get("/v2/{endpoint}/status/{job_id}", self.status)
+        app.router.add_post("/v2/{endpoint}/cancel/{job_id}", self.cancel)
+        return app
+
+    async def start(self, host="127.0.0.1", port=8788):
+        """서버 시작 후 API 기본 URL(/v2) 반환 (port=0이면 빈 포트 사용)"""
+        self._slots = asyncio.Semaphore(self.workers)
+        self._runner = web.AppRunner(self.app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://{host}:{port}/v2"
+        return self.base_url
+
+    async def stop(self):
+        for task in list(self._tasks):
+            task.cancel()
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+
+async def serve(args):
+    fake = FakeRunPod(args.workers, args.job_seconds, args.fail_every)
+    base_url = await fake.start(args.host, args.port)
+    print(f"🧪 가짜 RunPod 엔드포인트: {base_url} (워커 {args.workers}개, 작업당 {args.job_seconds}초)")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await fake.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="로컬 가짜 RunPod 엔드포인트")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8788)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--job-seconds", type=float, default=2.0)
+    parser.add_argument("--fail-every", type=int, default=0)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
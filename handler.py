@@ -1,13 +1,33 @@
 import runpod
+import asyncio
+import time
 import torch
-import base64
-from io import BytesIO
-from PIL import Image
 from diffusers import FluxPipeline, DPMSolverMultistepScheduler
-import cv2
-import numpy as np
 import os
-from huggingface_hub import snapshot_download
+from batching import RequestCoalescer, concurrency_modifier
+from prompt_cache import PromptEmbeddingCache, PROMPT_CACHE_DISK
+from bootstrap import ModelBootstrap
+from image_output import parse_output_options, encode_image, package_output, build_output, encode_executor
+from upscaler import upscale, UPSCALE_BACKEND
+from streaming import StepProgress, preview_settings, PREVIEW_EVERY, PREVIEW_SIZE
+from result_cache import ResultCache, cache_key, RESULT_CACHE_DISK
+from lora_manager import LoRAManager, resolve_lora
+from request_params import parse_common
+from component_pool import load_pipeline, shared_pool
+from memory_planner import (
+    component_footprints, device_memory_budget, plan_memory, apply_plan, apply_vae_settings
+)
+from metrics import JobMetrics, StepTimer, reset_peak_memory, peak_memory
+from resolution_buckets import (
+    ResolutionBuckets, bucketing_enabled, fit_to_request, BUCKET_RESIZE_OUTPUT
+)
+from quantization import QUANT_MODE, check_mode, load_flux_components
+from compile_cache import (
+    TORCH_COMPILE, configure_cache, load_artifacts, save_artifacts, compile_module,
+    warmup_buckets, warmup_batch_sizes
+)
+from model_provision import provision, is_complete
+from sweep import parse_sweep, plan_batches, contact_sheet, label, cost_report, SWEEP_MAX_BATCH_SIZE
 
 # GPU 메모리 최적화
 torch.cuda.empty_cache()
@@ -19,112 +39,610 @@ os.makedirs(MODEL_CACHE_DIR, exist_ok=True)
 # 환경 변수에서 HF 토큰 가져오기
 HF_TOKEN = os.environ.get("HF_TOKEN", "")
 
-print("🔧 모델 로드 중...")
-
-# 모델이 이미 다운로드되었는지 확인
+# 모델 경로 및 전역 파이프라인 (부트스트랩에서 채움)
 model_path = os.path.join(MODEL_CACHE_DIR, "flux-dev")
-if not os.path.exists(model_path) or len(os.listdir(model_path)) == 0:
-    print("📥 FLUX.1-dev 모델 다운로드 중... (첫 실행 시 20-30분 소요)")
+pipe = None
+prompt_cache = None
+lora_manager = None
+memory_plan = None
+
+# 워밍업 설정
+WARMUP_STEPS = int(os.environ.get("WARMUP_STEPS", "4"))
+
+# 결과 캐시 키에 포함할 모델 리비전 (모델/스케줄러가 바뀌면 변경)
+MODEL_REVISION = os.environ.get("MODEL_REVISION", "black-forest-labs/FLUX.1-dev")
+
+# 가중치 양자화 모드 (none, int8, fp8) - 출력이 달라지므로 캐시 키에 포함
+check_mode(QUANT_MODE)
+MODEL_ID = "black-forest-labs/FLUX.1-dev"
+PROMPT_MODEL_ID = MODEL_ID if QUANT_MODE == "none" else f"{MODEL_ID}:{QUANT_MODE}"
+
+# 스트리밍 모드 (진행 상황/미리보기를 generator로 전달)
+STREAM_MODE = os.environ.get("STREAM_MODE", "0") == "1"
+
+# 해상도 버킷 (TORCH_COMPILE=1이면 기본으로 켜져 버킷마다 한 번만 컴파일)
+buckets = ResolutionBuckets() if bucketing_enabled(TORCH_COMPILE) else None
+compile_cache_dir = None
+compile_report = {}
+transformer_compiled = False
+
+def download_model():
+    """모델이 없거나 불완전하면 다운로드 (완료 마커 확인, 워커 간 잠금, 이어받기)"""
+    if is_complete(model_path, "flux-dev"):
+        return
+
+    print("📥 FLUX.1-dev 모델 준비 중... (첫 실행 시 20-30분 소요)")
     try:
-        snapshot_download(
-            "black-forest-labs/FLUX.1-dev",
-            local_dir=model_path,
-            token=HF_TOKEN if HF_TOKEN else None,
-            local_dir_use_symlinks=False
-        )
-        print("✅ 모델 다운로드 완료!")
+        provision("flux-dev", model_path, token=HF_TOKEN if HF_TOKEN else None)
     except Exception as e:
         print(f"❌ 모델 다운로드 실패: {e}")
         print("HF_TOKEN 환경 변수를 확인하세요.")
         raise
 
-# 모델 로드 (전역 변수로 한 번만 로드)
-try:
-    pipe = FluxPipeline.from_pretrained(
+def encode_prompt(prompt, max_sequence_length):
+    """CLIP/T5 텍스트 인코딩"""
+    with torch.no_grad():
+        prompt_embeds, pooled_prompt_embeds, _ = pipe.encode_prompt(
+            prompt=prompt,
+            prompt_2=None,
+            device=pipe._execution_device,
+            num_images_per_prompt=1,
+            max_sequence_length=max_sequence_length
+        )
+    return prompt_embeds, pooled_prompt_embeds
+
+def load_model():
+    """모델 로드 (전역 변수로 한 번만 로드)"""
+    global pipe, prompt_cache, lora_manager, memory_plan, compile_cache_dir, transformer_compiled
+
+    print("🔧 모델 로드 중...")
+    # 양자화 모드면 트랜스포머/T5는 볼륨의 양자화 파일에서 메모리 매핑으로 로드
+    quantized = {}
+    if QUANT_MODE != "none":
+        quantized = load_flux_components(
+            model_path, QUANT_MODE, MODEL_CACHE_DIR, MODEL_ID,
+            model_revision=MODEL_REVISION, local_files_only=True
+        )
+
+    # 공유 가능한 구성요소(텍스트 인코더, VAE)는 구성요소 풀에서 받음
+    pipe = load_pipeline(
+        FluxPipeline,
         model_path,
+        owner="flux",
         torch_dtype=torch.float16,
         variant="fp16",
-        local_files_only=True
-    ).to("cuda")
-    
+        local_files_only=True,
+        **quantized
+    )
+
     # 스케줄러 최적화
     pipe.scheduler = DPMSolverMultistepScheduler.from_config(pipe.scheduler.config)
-    
-    # VAE 최적화
-    pipe.enable_vae_slicing()
-    pipe.enable_vae_tiling()
-    
+
+    # 메모리 예산에 맞는 가장 빠른 배치 방식 선택 (상주 / 모델 오프로드 / 순차 오프로드)
+    memory_plan = plan_memory(
+        "flux",
+        component_footprints(pipe),
+        device_memory_budget(),
+        batch_size=coalescer.max_batch_size
+    )
+    # 오프로드 훅은 모듈을 바꾸므로 다른 파이프라인과 공유 중인 구성요소는 전용 사본으로 교체
+    if memory_plan.strategy != "resident":
+        shared_pool.withdraw(pipe, "flux")
+    apply_plan(pipe, memory_plan)
+
+    # 트랜스포머 컴파일 (배치 방식을 적용한 뒤, 캐시는 볼륨에 두어 다음 콜드 스타트에서 재사용)
+    # 오프로드 훅은 호출마다 가중치를 옮겨 컴파일된 그래프가 맞지 않으므로 상주일 때만 컴파일
+    if TORCH_COMPILE and memory_plan.strategy == "resident":
+        compile_cache_dir = configure_cache(os.path.join(MODEL_CACHE_DIR, "torch_compile"), MODEL_REVISION)
+        compile_report["artifacts_loaded"] = load_artifacts(compile_cache_dir)
+        pipe.transformer = compile_module(pipe.transformer)
+        transformer_compiled = True
+    elif TORCH_COMPILE:
+        print(f"⚠️ 메모리 계획이 {memory_plan.strategy}라 torch.compile을 건너뜁니다 (상주일 때만 컴파일)")
+
+    # 프롬프트 임베딩 캐시
+    prompt_cache = PromptEmbeddingCache(
+        encode_prompt,
+        model_id=PROMPT_MODEL_ID,
+        disk_dir=os.path.join(MODEL_CACHE_DIR, "prompt_embeds") if PROMPT_CACHE_DISK else None,
+        device=pipe._execution_device
+    )
+
+    # LoRA 어댑터 풀
+    lora_manager = LoRAManager(pipe, is_shared=shared_pool.is_shared)
+
     print("✅ 모델 로드 완료!")
-except Exception as e:
-    print(f"❌ 모델 로드 실패: {e}")
-    raise
-
-def upscale_image(image, scale=2):
-    """간단한 업스케일링 함수"""
-    # PIL Image를 numpy array로 변환
-    img_array = np.array(image)
-    
-    # OpenCV로 업스케일
-    height, width = img_array.shape[:2]
-    new_dimensions = (width * scale, height * scale)
-    
-    # INTER_CUBIC 보간법 사용
-    upscaled = cv2.resize(img_array, new_dimensions, interpolation=cv2.INTER_CUBIC)
-    
-    # 다시 PIL Image로 변환
-    return Image.fromarray(upscaled)
-
-def handler(job):
+
+def warmup_model():
+    """기본 해상도로 한 번 생성해 커널/메모리 할당을 미리 수행 (컴파일 시 버킷마다)"""
+    if not transformer_compiled:
+        params = parse_job_input({"steps": WARMUP_STEPS, "seed": 0})
+        run_batch([params])
+        return
+
+    def run(width, height, batch_size):
+        params = parse_job_input({"steps": WARMUP_STEPS, "seed": 0, "width": width, "height": height})
+        run_batch([params] * batch_size)
+
+    # 코얼레서/스윕이 만드는 배치 크기를 모두 미리 컴파일 (요청 중 재컴파일 방지)
+    compile_report["batch_sizes"] = warmup_batch_sizes(coalescer.max_batch_size)
+    compile_report["warmup_s"] = warmup_buckets(run, buckets, compile_report["batch_sizes"])
+    compile_report["artifacts_file"] = save_artifacts(compile_cache_dir)
+
+def upscale_image(image, scale=2, backend=UPSCALE_BACKEND):
+    """타일 기반 병렬 업스케일링 (upscaler 모듈 사용)"""
+    return upscale(image, scale, backend)
+
+def parse_job_input(job_input):
+    """작업 입력에서 생성 파라미터 추출 (공통 파라미터는 request_params에서 검증)"""
+    params = parse_common(job_input, model="flux")
+    params.update({
+        "max_sequence_length": int(job_input.get("max_sequence_length", 512)),
+        "upscale": bool(job_input.get("upscale", False)),
+        "upscale_factor": int(job_input.get("upscale_factor", 2)),
+        "upscale_backend": job_input.get("upscale_backend", UPSCALE_BACKEND),
+        "preview_every": int(job_input.get("preview_every", PREVIEW_EVERY)),
+        "preview_size": int(job_input.get("preview_size", PREVIEW_SIZE)),
+        "lora_name": job_input.get("lora_name") or None,
+        "lora_strength": float(job_input.get("lora_strength", 1.0)),
+        "output_size": None,
+    })
+
+    # 배치 전에 LoRA 이름 검증 (잘못된 이름이 같은 배치의 다른 작업을 실패시키지 않게)
+    if params["lora_name"]:
+        # 어댑터 주입/전환은 컴파일된 그래프의 가드를 깨 재컴파일되거나 eager로 떨어짐
+        if transformer_compiled:
+            raise ValueError("TORCH_COMPILE=1로 컴파일된 워커에서는 lora_name을 지원하지 않습니다")
+        # 양자화된 Linear에는 LoRA를 주입/fuse할 수 없음 (quantization.QuantizedLinear.weight 참고)
+        if QUANT_MODE != "none":
+            raise ValueError(f"QUANT_MODE={QUANT_MODE} 워커에서는 lora_name을 지원하지 않습니다")
+        resolve_lora(params["lora_name"])
+
+    # 가장 가까운 해상도 버킷으로 생성 (요청 시 결과를 요청 크기로 맞춤)
+    if buckets is not None:
+        requested = (params["width"], params["height"])
+        params["width"], params["height"] = buckets.snap(*requested)
+        params["bucket"] = f"{params['width']}x{params['height']}"
+        if BUCKET_RESIZE_OUTPUT and requested != (params["width"], params["height"]):
+            params["output_size"] = requested
+
+    # 미리보기는 출력보다 크지 않게 (배치 전에 검증해 잘못된 값이 같은 배치를 실패시키지 않게)
+    params["preview_every"], params["preview_size"] = preview_settings(
+        params["preview_every"], params["preview_size"], params["width"], params["height"]
+    )
+    return params
+
+def batch_key(params):
+    """한 번의 pipe() 호출로 묶을 수 있는 작업의 키"""
+    return (
+        params["width"], params["height"], params["steps"],
+        params["guidance_scale"], params["max_sequence_length"],
+        params["lora_name"], params["lora_strength"] if params["lora_name"] else None
+    )
+
+def run_batch(batch, callback=None):
+    """같은 배치 키를 가진 작업들을 한 번의 pipe() 호출로 생성
+
+    Returns:
+        작업별 (image, info) 리스트 (info: 배치 단위 부가 정보, metrics는 JobMetrics)
+    """
+    first = batch[0]
+    metrics = JobMetrics()
+    reset_peak_memory()
+
+    # 배치의 LoRA 어댑터 활성화 (상주 어댑터는 디스크 읽기 없이 전환)
+    with metrics.stage("lora"):
+        lora_info = lora_manager.activate(first["lora_name"], first["lora_strength"])
+    namespace = ""
+    if lora_manager.affects_text_encoder(first["lora_name"]):
+        namespace = f"{first['lora_name']}:{first['lora_strength']}"
+
+    # 샘플마다 별도 generator를 사용해 작업별 시드 재현성 유지
+    generators = [
+        torch.Generator(device=pipe._execution_device).manual_seed(params["seed"])
+        for params in batch
+    ]
+
+    # 캐시된 프롬프트 임베딩 사용 (텍스트 인코더 재실행 방지)
+    # 해상도/배치 크기에 맞게 VAE slicing/tiling 설정
+    vae_info = apply_vae_settings(pipe, memory_plan, first["width"], first["height"], len(batch))
+
+    with metrics.stage("text_encode"):
+        embeds = [
+            prompt_cache.get(params["prompt"], params["max_sequence_length"], namespace)
+            for params in batch
+        ]
+        prompt_embeds = torch.cat([e[0] for e in embeds], dim=0)
+        pooled_prompt_embeds = torch.cat([e[1] for e in embeds], dim=0)
+
+    # 스텝 콜백으로 디노이징 스텝별 시간과 VAE 디코딩 시간 측정
+    step_timer = StepTimer(callback)
+    pipe_started = time.perf_counter()
+    with torch.cuda.amp.autocast():
+        images = pipe(
+            prompt_embeds=prompt_embeds,
+            pooled_prompt_embeds=pooled_prompt_embeds,
+            negative_prompt=[params["negative_prompt"] for params in batch],
+            width=first["width"],
+            height=first["height"],
+            num_inference_steps=first["steps"],
+            guidance_scale=first["guidance_scale"],
+            max_sequence_length=first["max_sequence_length"],
+            generator=generators,
+            callback_on_step_end=step_timer,
+            callback_on_step_end_tensor_inputs=step_timer.tensor_inputs
+        ).images
+    step_timer.record(metrics, pipe_started, time.perf_counter())
+    metrics.extra.update(peak_memory())
+
+    info = {
+        "lora": lora_info,
+        "memory": {"strategy": memory_plan.strategy, **vae_info},
+        "metrics": metrics
+    }
+    return [(image, info) for image in images]
+
+def run_stream(params, emit):
+    """단일 작업을 스텝 콜백과 함께 생성 (스트리밍 모드)"""
+    progress = StepProgress(
+        emit,
+        total_steps=params["steps"],
+        height=params["height"],
+        width=params["width"],
+        preview_every=params["preview_every"],
+        preview_size=params["preview_size"]
+    )
+    return run_batch([params], callback=progress)[0]
+
+coalescer = RequestCoalescer(run_batch)
+result_cache = ResultCache(
+    disk_dir=os.path.join(MODEL_CACHE_DIR, "result_cache") if RESULT_CACHE_DISK else None
+)
+bootstrap = ModelBootstrap(download_model, load_model, warmup_model)
+
+def postprocess(image, params):
+    """버킷 크기를 요청 크기로 맞추고 업스케일링 (요청 시)"""
+    if params["output_size"]:
+        image = fit_to_request(image, *params["output_size"])
+    if params["upscale"]:
+        image = upscale_image(image, params["upscale_factor"], params["upscale_backend"])
+    return image
+
+def not_ready_response():
+    """워커 준비 전 응답"""
+    status = bootstrap.status()
+    return {
+        "error": status.get("error", f"워커가 아직 준비되지 않았습니다 (state: {status['state']})"),
+        "status": status["state"],
+        "bootstrap": status
+    }
+
+def result_cache_key(params, output_options):
+    """seed가 명시된 요청의 결과 캐시 키 (그 외에는 None)"""
+    if not params["seed_explicit"]:
+        return None
+
+    fields = {
+        "model_revision": MODEL_REVISION,
+        "prompt": params["prompt"],
+        "negative_prompt": params["negative_prompt"],
+        "width": params["width"],
+        "height": params["height"],
+        "steps": params["steps"],
+        "guidance_scale": params["guidance_scale"],
+        "max_sequence_length": params["max_sequence_length"],
+        "seed": params["seed"],
+        "upscale": bool(params["upscale"]),
+        "format": output_options["format"],
+    }
+    if params["upscale"]:
+        fields["upscale_factor"] = params["upscale_factor"]
+        fields["upscale_backend"] = params["upscale_backend"]
+    if params["output_size"]:
+        fields["output_size"] = list(params["output_size"])
+    if QUANT_MODE != "none":
+        fields["quant_mode"] = QUANT_MODE
+    if params["lora_name"]:
+        fields["lora_name"] = params["lora_name"]
+        fields["lora_strength"] = params["lora_strength"]
+    if output_options["format"] == "png":
+        fields["compress_level"] = output_options["compress_level"]
+    else:
+        fields["quality"] = output_options["quality"]
+    return cache_key(fields)
+
+async def lookup_cached(job, params, output_options):
+    """결과 캐시 적중 시 파이프라인 없이 응답 생성"""
+    key = result_cache_key(params, output_options)
+    if key is None:
+        return None
+
+    entry = await asyncio.to_thread(result_cache.get, key)
+    if entry is None:
+        return None
+
+    data, meta = entry
+    result = await asyncio.to_thread(package_output, data, output_options, job.get("id"))
+    result.update({
+        "seed": params["seed"],
+        "width": meta["width"],
+        "height": meta["height"],
+        "cached": True,
+        "result_cache": result_cache.stats()
+    })
+    return result
+
+def encode_and_store(image, params, output_options, name, metrics):
+    """인코딩 후 결과 캐시에 저장하고 응답 필드 생성"""
+    with metrics.stage("encode"):
+        data = encode_image(image, output_options)
+    key = result_cache_key(params, output_options)
+    if key is not None:
+        with metrics.stage("result_cache_store"):
+            result_cache.put(key, data, {"width": image.width, "height": image.height})
+    with metrics.stage("package"):
+        return package_output(data, output_options, name)
+
+async def finish(job, image, params, output_options, metrics):
+    """업스케일 + 인코딩 후 응답 생성"""
+    if params["upscale"] or params["output_size"]:
+        with metrics.stage("postprocess"):
+            image = await asyncio.to_thread(postprocess, image, params)
+
+    # 인코딩은 별도 스레드 풀에서 (다음 배치 디노이징과 겹침)
+    loop = asyncio.get_running_loop()
+    result = await loop.run_in_executor(
+        encode_executor, encode_and_store, image, params, output_options, job.get("id"), metrics
+    )
+    result.update({
+        "seed": params["seed"],
+        "width": image.width,
+        "height": image.height,
+        "cached": False
+    })
+    if "bucket" in params:
+        result["bucket"] = params["bucket"]
+    result["prompt_cache"] = prompt_cache.stats()
+    result["result_cache"] = result_cache.stats()
+    result["bootstrap"] = bootstrap.status()
+    return result
+
+def generate_sweep(variations, max_batch_size, calibrate):
+    """스윕 변형을 배치 키별로 묶어 생성 (GPU 스레드에서 실행)
+
+    배치 계획에 이미 크기 1인 배치가 있으면 그 배치를 먼저 실행해 단일 작업 비용 측정에
+    씁니다. 없으면 calibrate(compare_single)일 때만 첫 변형을 따로 떼어 배치 1로 실행합니다.
+    프롬프트 임베딩은 첫 배치에서 캐시되므로 이후 배치는 텍스트 인코더를 건너뜁니다.
+
+    Returns:
+        (outputs, runs, 단일 작업 측정에 쓴 run 번호 또는 None)
+    """
+    outputs = [None] * len(variations)
+    batches = plan_batches(variations, batch_key, max_batch_size)
+    singles = [indices for indices in batches if len(indices) == 1]
+    if singles:
+        batches.remove(singles[0])
+        batches.insert(0, singles[0])
+    elif calibrate and len(variations) > 1:
+        batches = [[0]] + plan_batches(variations, batch_key, max_batch_size, range(1, len(variations)))
+    calibration_run = 0 if len(batches[0]) == 1 else None
+
+    runs = []
+    for indices in batches:
+        started = time.perf_counter()
+        results = run_batch([variations[i] for i in indices])
+        for i, result in zip(indices, results):
+            outputs[i] = result
+        runs.append({"indices": indices, "seconds": time.perf_counter() - started})
+    return outputs, runs, calibration_run
+
+async def finish_variation(job, index, image, params, output_options):
+    """스윕 이미지 하나의 후처리 + 인코딩 (작업별 메트릭은 따로 기록해 합침)"""
+    metrics = JobMetrics()
+    if params["upscale"] or params["output_size"]:
+        with metrics.stage("postprocess"):
+            image = await asyncio.to_thread(postprocess, image, params)
+    name = f"{job['id']}-{index}" if job.get("id") else None
+    loop = asyncio.get_running_loop()
+    result = await loop.run_in_executor(
+        encode_executor, encode_and_store, image, params, output_options, name, metrics
+    )
+    result.update({
+        "seed": params["seed"],
+        "guidance_scale": params["guidance_scale"],
+        "steps": params["steps"],
+        "width": image.width,
+        "height": image.height
+    })
+    return result, metrics
+
+async def run_sweep(job, metrics):
+    """파라미터 스윕 작업 (sweep.py 참고): 모든 이미지 + 컨택트 시트 + 비용 비교"""
+    job_input = job["input"]
+    with metrics.stage("parse"):
+        variations = [parse_job_input({**job_input, **v}) for v in parse_sweep(job_input)]
+        output_options = parse_output_options(job_input)
+        # 배치를 쪼개 단일 작업 비용을 따로 측정할지 (기본은 쪼개지 않음)
+        calibrate = bool(job_input["sweep"].get("compare_single", False))
+
+    first = variations[0]
+    # 컴파일된 워커는 워밍업한 배치 크기 안에서만 묶음 (재컴파일 방지)
+    limit = SWEEP_MAX_BATCH_SIZE
+    if transformer_compiled:
+        limit = min(limit, max(compile_report["batch_sizes"]))
+    max_batch_size = memory_plan.max_batch_size(
+        first["width"], first["height"], first["max_sequence_length"], limit=limit
+    )
+
+    started = time.perf_counter()
+    outputs, runs, calibration_run = await coalescer.run_exclusive(
+        generate_sweep, variations, max_batch_size, calibrate
+    )
+    for run in runs:
+        metrics.merge(outputs[run["indices"][0]][1]["metrics"])
+
+    finished = await asyncio.gather(*(
+        finish_variation(job, i, image, params, output_options)
+        for i, ((image, _), params) in enumerate(zip(outputs, variations))
+    ))
+    for _, image_metrics in finished:
+        metrics.merge(image_metrics)
+
+    with metrics.stage("contact_sheet"):
+        sheet = await asyncio.to_thread(
+            contact_sheet, [image for image, _ in outputs], [label(p) for p in variations]
+        )
+        sheet_options = {**output_options, "format": "jpeg", "quality": 80}
+        sheet_name = f"{job['id']}-sheet" if job.get("id") else None
+        sheet_output = await asyncio.to_thread(build_output, sheet, sheet_options, sheet_name)
+    sweep_s = time.perf_counter() - started
+
+    calibration = None
+    if calibration_run is not None and len(variations) > 1:
+        index = runs[calibration_run]["indices"][0]
+        stages = outputs[index][1]["metrics"].stages
+        calibration = {
+            "index": index,
+            "total_s": runs[calibration_run]["seconds"] + sum(finished[index][1].stages.values()),
+            "text_encode_s": stages.get("text_encode", 0.0),
+            "denoise_s": stages.get("denoise", 0.0),
+            "steps": variations[index]["steps"],
+        }
+
+    return {
+        "images": [result for result, _ in finished],
+        "contact_sheet": {**sheet_output, "width": sheet.width, "height": sheet.height},
+        "count": len(variations),
+        "max_batch_size": max_batch_size,
+        "batches": [{
+            "size": len(run["indices"]),
+            "guidance_scale": variations[run["indices"][0]]["guidance_scale"],
+            "steps": variations[run["indices"][0]]["steps"],
+            "seconds": round(run["seconds"], 3)
+        } for run in runs],
+        "cost": cost_report(sweep_s, variations, calibration),
+        "memory": outputs[0][1]["memory"],
+        "prompt_cache": prompt_cache.stats(),
+        "result_cache": result_cache.stats(),
+        "metrics": metrics.finish("flux")
+    }
+
+def is_sweep(job):
+    return isinstance(job.get("input"), dict) and "sweep" in job["input"]
+
+async def handler(job):
     """RUNPOD 핸들러 함수"""
+    metrics = JobMetrics()
     try:
-        job_input = job["input"]
-        
-        # 파라미터 추출
-        prompt = job_input.get("prompt", "beautiful landscape")
-        negative_prompt = job_input.get("negative_prompt", "")
-        width = job_input.get("width", 1024)
-        height = job_input.get("height", 1024)
-        num_inference_steps = job_input.get("steps", 28)
-        guidance_scale = job_input.get("guidance_scale", 3.5)
-        seed = job_input.get("seed", -1)
-        upscale = job_input.get("upscale", False)
-        upscale_factor = job_input.get("upscale_factor", 2)        
-        # 시드 설정
-        if seed == -1:
-            seed = torch.randint(0, 2**32, (1,)).item()
-        
-        generator = torch.Generator(device="cuda").manual_seed(seed)
-        
-        # 이미지 생성
-        with torch.cuda.amp.autocast():
-            image = pipe(
-                prompt=prompt,
-                negative_prompt=negative_prompt,
-                width=width,
-                height=height,
-                num_inference_steps=num_inference_steps,
-                guidance_scale=guidance_scale,
-                generator=generator
-            ).images[0]
-        
-        # 업스케일링 (요청 시)
-        if upscale:
-            image = upscale_image(image, upscale_factor)
-        
-        # Base64 인코딩
-        buffered = BytesIO()
-        image.save(buffered, format="PNG")
-        img_str = base64.b64encode(buffered.getvalue()).decode()
-        
-        return {
-            "image": img_str,
-            "seed": seed,
-            "width": image.width,
-            "height": image.height
-        }
-        
+        # 워커 준비 전이면 대기하거나 상태와 함께 즉시 거절
+        if not await bootstrap.wait_async():
+            return not_ready_response()
+
+        # 파라미터 스윕은 여러 배치를 한 작업으로 처리
+        if is_sweep(job):
+            return await run_sweep(job, metrics)
+
+        with metrics.stage("parse"):
+            params = parse_job_input(job["input"])
+            output_options = parse_output_options(job["input"])
+
+        # 같은 결정적 요청의 결과가 캐시에 있으면 바로 반환
+        with metrics.stage("result_cache_lookup"):
+            cached = await lookup_cached(job, params, output_options)
+        if cached is not None:
+            cached["metrics"] = metrics.finish("flux")
+            return cached
+
+        # 이미지 생성 (같은 설정의 작업과 함께 배치 처리)
+        submitted = time.perf_counter()
+        (image, info), batch_size, timing = await coalescer.submit(batch_key(params), params)
+        # 배치 창 대기 + 앞선 GPU 작업 대기 (배치 실행 시간은 제외)
+        metrics.add("queue_wait", timing["started"] - submitted)
+        metrics.merge(info["metrics"])
+
+        result = await finish(job, image, params, output_options, metrics)
+        result.update(info)
+        result["batch_size"] = batch_size
+        result["batch_time"] = round(timing["run_s"], 3)
+        result["metrics"] = metrics.finish("flux")
+        return result
+
     except Exception as e:
+        metrics.finish("flux", status="error")
         return {"error": str(e)}
 
-# RUNPOD 서버리스 시작
-runpod.serverless.start({"handler": handler})
\ No newline at end of file
+async def stream_handler(job):
+    """RUNPOD 스트리밍 핸들러 (진행 상황 -> 미리보기 -> 최종 이미지 순서로 yield)"""
+    metrics = JobMetrics()
+    try:
+        if not await bootstrap.wait_async():
+            yield not_ready_response()
+            return
+
+        if is_sweep(job):
+            result = await run_sweep(job, metrics)
+            result["status"] = "completed"
+            yield result
+            return
+
+        with metrics.stage("parse"):
+            params = parse_job_input(job["input"])
+            output_options = parse_output_options(job["input"])
+
+        with metrics.stage("result_cache_lookup"):
+            cached = await lookup_cached(job, params, output_options)
+        if cached is not None:
+            cached["status"] = "completed"
+            cached["metrics"] = metrics.finish("flux")
+            yield cached
+            return
+
+        loop = asyncio.get_running_loop()
+        events = asyncio.Queue()
+
+        def emit(event):
+            loop.call_soon_threadsafe(events.put_nowait, event)
+
+        def generate():
+            try:
+                return run_stream(params, emit)
+            finally:
+                emit(None)
+
+        task = asyncio.ensure_future(coalescer.run_exclusive(generate))
+
+        while True:
+            event = await events.get()
+            if event is None:
+                break
+            yield event
+
+        image, info = await task
+        metrics.merge(info["metrics"])
+
+        result = await finish(job, image, params, output_options, metrics)
+        result.update(info)
+        result["status"] = "completed"
+        result["metrics"] = metrics.finish("flux")
+        yield result
+
+    except Exception as e:
+        metrics.finish("flux", status="error")
+        yield {"error": str(e)}
+
+if __name__ == "__main__":
+    # 모델 로딩은 백그라운드에서 진행하고 워커는 바로 시작
+    bootstrap.start()
+
+    # RUNPOD 서버리스 시작 (STREAM_MODE=1이면 스트리밍 핸들러 사용)
+    if STREAM_MODE:
+        runpod.serverless.start({
+            "handler": stream_handler,
+            "concurrency_modifier": concurrency_modifier,
+            "return_aggregate_stream": True
+        })
+    else:
+        runpod.serverless.start({
+            "handler": handler,
+            "concurrency_modifier": concurrency_modifier
+        })
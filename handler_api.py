@@ -1,84 +1,189 @@
 import runpod
-import torch
-import base64
+import asyncio
+import time
 from io import BytesIO
 from PIL import Image
-import requests
 import os
+from image_output import parse_output_options, encode_image, package_output, encode_executor
+from request_params import parse_common
+from http_client import http_client, backoff_delay, HTTP_MAX_RETRIES
+from backend_router import BackendRouter
+from metrics import JobMetrics
 
-def handler(job):
-    """RUNPOD 핸들러 - Replicate API 사용"""
+# 원격 API 설정 (로컬 목 서버로 바꿔 테스트 가능)
+HF_API_URL = os.environ.get(
+    "HF_API_URL",
+    "https://api-inference.huggingface.co/models/black-forest-labs/FLUX.1-schnell"
+)
+REPLICATE_API_URL = os.environ.get("REPLICATE_API_URL", "https://api.replicate.com/v1")
+REPLICATE_MODEL = os.environ.get("REPLICATE_MODEL", "black-forest-labs/flux-schnell")
+# 작업 하나가 원격 API를 기다리는 최대 시간 (초)
+API_JOB_TIMEOUT = float(os.environ.get("API_JOB_TIMEOUT", "300"))
+# 워커 하나가 동시에 처리할 작업 수 (대부분 네트워크 대기)
+API_MAX_CONCURRENCY = int(os.environ.get("API_MAX_CONCURRENCY", "16"))
+# 라우터에 넣을 백엔드 (쉼표로 구분, Replicate는 토큰이 있을 때만 사용)
+API_BACKENDS = [
+    name.strip() for name in os.environ.get("API_BACKENDS", "replicate,hf").split(",")
+    if name.strip()
+]
+
+async def generate_hf(params):
+    """Hugging Face Inference API로 생성, 이미지 바이트 반환"""
+    hf_token = os.environ.get("HF_TOKEN", "")
+    headers = {"Authorization": f"Bearer {hf_token}"}
+    seed = params["seed"]
+
+    response = await http_client.post(
+        HF_API_URL,
+        headers=headers,
+        json={
+            "inputs": params["prompt"],
+            "parameters": {
+                "width": params["width"],
+                "height": params["height"],
+                "num_inference_steps": params["steps"],
+                "seed": seed if seed != -1 else None
+            }
+        },
+        timeout=API_JOB_TIMEOUT,
+        # 서버 측 작업을 만들지 않는 동기 추론 호출이라 재시도해도 작업이 쌓이지 않음
+        retries=HTTP_MAX_RETRIES
+    )
+    return response.body
+
+# 진행 중인 원격 예측 취소 요청 (완료 전에 가비지 컬렉션되지 않도록 참조 유지)
+_cancel_tasks = set()
+
+def _cancel_prediction(prediction, headers):
+    """끝나지 않은 Replicate 예측을 백그라운드에서 취소 (과금 방지)"""
+    cancel_url = (prediction or {}).get("urls", {}).get("cancel")
+    if not cancel_url:
+        return
+    task = asyncio.ensure_future(http_client.post(cancel_url, headers=headers, retries=0))
+    _cancel_tasks.add(task)
+    task.add_done_callback(_cancel_tasks.discard)
+
+async def generate_replicate(params):
+    """Replicate HTTP API로 생성 (Prefer: wait 후 필요하면 폴링), 이미지 바이트 반환"""
+    headers = {"Authorization": f"Bearer {os.environ.get('REPLICATE_API_TOKEN', '')}"}
+    create_headers = dict(headers)
+    if not router.hedge:
+        # 헤지 중에는 생성 응답을 바로 받아야 예측 id로 취소할 수 있으므로 기다리지 않음
+        create_headers["Prefer"] = "wait"
+    seed = params["seed"]
+    deadline = time.monotonic() + API_JOB_TIMEOUT
+
+    prediction = None
     try:
-        job_input = job["input"]
-        
-        # 파라미터 추출
-        prompt = job_input.get("prompt", "beautiful landscape")
-        width = job_input.get("width", 1024)
-        height = job_input.get("height", 1024)
-        num_inference_steps = job_input.get("steps", 4)  # schnell은 4단계
-        seed = job_input.get("seed", -1)
-        
-        # Replicate API 호출 (더 간단하고 효율적)
-        replicate_api_token = os.environ.get("REPLICATE_API_TOKEN", "")
-        
-        if not replicate_api_token:
-            # 대안: Hugging Face Inference API 사용
-            hf_token = os.environ.get("HF_TOKEN", "")
-            api_url = "https://api-inference.huggingface.co/models/black-forest-labs/FLUX.1-schnell"
-            
-            headers = {"Authorization": f"Bearer {hf_token}"}
-            
-            response = requests.post(
-                api_url,
-                headers=headers,
-                json={
-                    "inputs": prompt,
-                    "parameters": {
-                        "width": width,
-                        "height": height,
-                        "num_inference_steps": num_inference_steps,
-                        "seed": seed if seed != -1 else None
-                    }
-                }
-            )
-            
-            if response.status_code == 200:
-                image = Image.open(BytesIO(response.content))
-            else:
-                return {"error": f"API error: {response.status_code} - {response.text}"}
-        else:
-            # Replicate API 사용
-            import replicate
-            
-            output = replicate.run(
-                "black-forest-labs/flux-schnell",
-                input={
-                    "prompt": prompt,
-                    "width": width,
-                    "height": height,
-                    "num_inference_steps": num_inference_steps,
+        response = await http_client.post(
+            f"{REPLICATE_API_URL}/models/{REPLICATE_MODEL}/predictions",
+            headers=create_headers,
+            json={
+                "input": {
+                    "prompt": params["prompt"],
+                    "width": params["width"],
+                    "height": params["height"],
+                    "num_inference_steps": params["steps"],
                     "seed": seed if seed != -1 else None
                 }
-            )
-            
-            # URL에서 이미지 다운로드
-            response = requests.get(output[0])
-            image = Image.open(BytesIO(response.content))
-        
-        # Base64 인코딩
-        buffered = BytesIO()
-        image.save(buffered, format="PNG")
-        img_str = base64.b64encode(buffered.getvalue()).decode()
-        
+            },
+            # 예측 생성은 재시도하지 않음 (받아들여진 뒤 시간 초과면 중복 과금)
+            retries=0
+        )
+        prediction = response.json()
+
+        # 아직 끝나지 않았으면 지터 백오프로 상태 폴링
+        attempt = 0
+        while prediction.get("status") not in ("succeeded", "failed", "canceled"):
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Replicate 예측 시간 초과: {prediction.get('id')}")
+            await asyncio.sleep(0.5 + backoff_delay(attempt, base=0.5, maximum=5))
+            attempt += 1
+            response = await http_client.get(prediction["urls"]["get"], headers=headers)
+            prediction = response.json()
+    finally:
+        # 헤지에서 졌거나 시간 초과/폴링 오류로 빠져나가면 원격 예측도 취소
+        if prediction is not None and prediction.get("status") not in ("succeeded", "failed", "canceled"):
+            _cancel_prediction(prediction, headers)
+
+    if prediction["status"] != "succeeded":
+        raise RuntimeError(f"Replicate 예측 실패: {prediction.get('error') or prediction['status']}")
+
+    output = prediction["output"]
+    image_url = output[0] if isinstance(output, list) else output
+
+    # URL에서 이미지 다운로드 (같은 커넥션 풀 재사용)
+    response = await http_client.get(image_url)
+    return response.body
+
+GENERATORS = {
+    "replicate": generate_replicate,
+    "hf": generate_hf,
+}
+
+def available_backends():
+    """설정된 백엔드만 라우터에 등록 (API_BACKENDS 순서가 초기 우선순위)"""
+    backends = {}
+    for name in API_BACKENDS:
+        if name not in GENERATORS:
+            raise ValueError(f"알 수 없는 API 백엔드: {name} (사용 가능: {', '.join(GENERATORS)})")
+        if name == "replicate" and not os.environ.get("REPLICATE_API_TOKEN", ""):
+            continue
+        backends[name] = GENERATORS[name]
+    return backends
+
+router = BackendRouter(available_backends())
+
+def reencode(data, output_options, name, metrics):
+    """원격 API 결과를 요청 형식으로 다시 인코딩하고 응답 필드 생성"""
+    with metrics.stage("decode"):
+        image = Image.open(BytesIO(data))
+        image.load()
+    with metrics.stage("encode"):
+        encoded = encode_image(image, output_options)
+    with metrics.stage("package"):
+        return package_output(encoded, output_options, name)
+
+async def handler(job):
+    """RUNPOD 핸들러 - 가장 빠른 원격 API로 라우팅"""
+    metrics = JobMetrics()
+    try:
+        job_input = job["input"]
+
+        # 파라미터 추출 및 검증 (공통 규칙, schnell은 4단계)
+        with metrics.stage("parse"):
+            output_options = parse_output_options(job_input)
+            params = parse_common(job_input, model="api", random_seed=False)
+
+        # 지연 시간/오류율 기준으로 백엔드 선택 (실패 시 다음 백엔드, 선택적 헤지)
+        with metrics.stage("remote"):
+            data, routing = await router.call(params)
+
+        # 디코딩/인코딩 (형식/반환 방식은 요청 또는 환경 변수로 선택)
+        result = await asyncio.get_running_loop().run_in_executor(
+            encode_executor, reencode, data, output_options, job.get("id"), metrics
+        )
+
         return {
-            "image": img_str,
-            "seed": seed,
-            "width": width,
-            "height": height
+            **result,
+            "seed": params["seed"],
+            "width": params["width"],
+            "height": params["height"],
+            "routing": routing,
+            "metrics": metrics.finish("api")
         }
-        
+
     except Exception as e:
+        metrics.finish("api", status="error")
         return {"error": str(e)}
 
-# RUNPOD 서버리스 시작
-runpod.serverless.start({"handler": handler})
\ No newline at end of file
+def concurrency_modifier(current_concurrency):
+    """RunPod 워커 하나가 동시에 받을 작업 수"""
+    return API_MAX_CONCURRENCY
+
+if __name__ == "__main__":
+    # RUNPOD 서버리스 시작
+    runpod.serverless.start({
+        "handler": handler,
+        "concurrency_modifier": concurrency_modifier
+    })
@@ -1,50 +1,76 @@
 import runpod
+import time
 import torch
-import base64
-from io import BytesIO
 from PIL import Image
 from diffusers import StableDiffusion3Pipeline, DPMSolverMultistepScheduler
 import os
+from image_output import parse_output_options, encode_image, package_output
+from request_params import parse_common
+from component_pool import load_pipeline, shared_pool
+from memory_planner import (
+    component_footprints, device_memory_budget, plan_memory, apply_plan, apply_vae_settings
+)
+from metrics import JobMetrics, StepTimer, reset_peak_memory, peak_memory
 
 # GPU 메모리 최적화
 torch.cuda.empty_cache()
 
-print("🔧 Stable Diffusion 3 모델 로드 중...")
+# 전역 파이프라인 (load_model에서 채움)
+pipe = None
+memory_plan = None
 
-# SD3는 더 작고 효율적 (약 4-6GB)
-pipe = StableDiffusion3Pipeline.from_pretrained(
-    "stabilityai/stable-diffusion-3-medium-diffusers",
-    torch_dtype=torch.float16,
-    variant="fp16",
-    use_auth_token=os.environ.get("HF_TOKEN", "")
-).to("cuda")
+def load_model():
+    """SD3 모델 로드 (전역 변수로 한 번만 로드)"""
+    global pipe, memory_plan
 
-# 메모리 최적화
-pipe.enable_vae_slicing()
-pipe.enable_vae_tiling()
-pipe.enable_sequential_cpu_offload()
+    print("🔧 Stable Diffusion 3 모델 로드 중...")
+
+    # SD3는 더 작고 효율적 (약 4-6GB)
+    # 공유 가능한 구성요소(텍스트 인코더, VAE)는 구성요소 풀에서 받음
+    hf_token = os.environ.get("HF_TOKEN", "")
+    pipe = load_pipeline(
+        StableDiffusion3Pipeline,
+        "stabilityai/stable-diffusion-3-medium-diffusers",
+        owner="sd3",
+        torch_dtype=torch.float16,
+        variant="fp16",
+        token=hf_token if hf_token else None
+    )
+
+    # 메모리 예산에 맞는 가장 빠른 배치 방식 선택 (상주 / 모델 오프로드 / 순차 오프로드)
+    memory_plan = plan_memory("sd3", component_footprints(pipe), device_memory_budget())
+    # 오프로드 훅은 모듈을 바꾸므로 다른 파이프라인과 공유 중인 구성요소는 전용 사본으로 교체
+    if memory_plan.strategy != "resident":
+        shared_pool.withdraw(pipe, "sd3")
+    apply_plan(pipe, memory_plan)
 
 def handler(job):
     """RUNPOD 핸들러 함수"""
+    metrics = JobMetrics()
     try:
         job_input = job["input"]
         
-        # 파라미터 추출
-        prompt = job_input.get("prompt", "beautiful landscape")
-        negative_prompt = job_input.get("negative_prompt", "")
-        width = job_input.get("width", 1024)
-        height = job_input.get("height", 1024)
-        num_inference_steps = job_input.get("steps", 30)
-        guidance_scale = job_input.get("guidance_scale", 7.0)
-        seed = job_input.get("seed", -1)
+        # 파라미터 추출 및 검증 (공통 규칙)
+        with metrics.stage("parse"):
+            output_options = parse_output_options(job_input)
+            params = parse_common(job_input, model="sd3")
+        prompt = params["prompt"]
+        negative_prompt = params["negative_prompt"]
+        width = params["width"]
+        height = params["height"]
+        num_inference_steps = params["steps"]
+        guidance_scale = params["guidance_scale"]
+        seed = params["seed"]
         
-        # 시드 설정
-        if seed == -1:
-            seed = torch.randint(0, 2**32, (1,)).item()
+        generator = torch.Generator(device=pipe._execution_device).manual_seed(seed)
         
-        generator = torch.Generator(device="cuda").manual_seed(seed)
+        # 해상도에 맞게 VAE slicing/tiling 설정
+        apply_vae_settings(pipe, memory_plan, width, height)
         
-        # 이미지 생성
+        # 이미지 생성 (스텝 콜백으로 디노이징/VAE 디코딩 시간 측정)
+        reset_peak_memory()
+        step_timer = StepTimer()
+        pipe_started = time.perf_counter()
         with torch.cuda.amp.autocast():
             image = pipe(
                 prompt=prompt,
@@ -53,23 +79,33 @@ def handler(job):
                 height=height,
                 num_inference_steps=num_inference_steps,
                 guidance_scale=guidance_scale,
-                generator=generator
+                generator=generator,
+                callback_on_step_end=step_timer,
+                callback_on_step_end_tensor_inputs=step_timer.tensor_inputs
             ).images[0]
+        step_timer.record(metrics, pipe_started, time.perf_counter())
+        metrics.extra.update(peak_memory())
         
-        # Base64 인코딩
-        buffered = BytesIO()
-        image.save(buffered, format="PNG")
-        img_str = base64.b64encode(buffered.getvalue()).decode()
+        # 인코딩 (형식/반환 방식은 요청 또는 환경 변수로 선택)
+        with metrics.stage("encode"):
+            data = encode_image(image, output_options)
+        with metrics.stage("package"):
+            result = package_output(data, output_options, name=job.get("id"))
         
         return {
-            "image": img_str,
+            **result,
             "seed": seed,
             "width": image.width,
-            "height": image.height
+            "height": image.height,
+            "metrics": metrics.finish("sd3")
         }
         
     except Exception as e:
+        metrics.finish("sd3", status="error")
         return {"error": str(e)}
 
-# RUNPOD 서버리스 시작
-runpod.serverless.start({"handler": handler})
\ No newline at end of file
+if __name__ == "__main__":
+    load_model()
+
+    # RUNPOD 서버리스 시작
+    runpod.serverless.start({"handler": handler})
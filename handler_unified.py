@@ -0,0 +1,162 @@
+"""
+통합 RunPod 핸들러 (FLUX / SD3 / 원격 API)
+
+요청의 model 필드로 백엔드를 고릅니다. 각 백엔드 모듈(handler.py, handler_sd3.py,
+handler_api.py)은 선택적으로 download_model / load_model / warmup_model과
+handler(job)를 제공하며, 모델 로딩은 하나의 백그라운드 부트스트랩에서 순서대로
+진행해 구성요소 풀이 백엔드 간 동일한 텍스트 인코더/VAE를 공유하도록 합니다.
+
+요청 예시:
+    {"input": {"model": "sd3", "prompt": "a cat"}}
+"""
+
+import asyncio
+import importlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import runpod
+
+from batching import concurrency_modifier
+from bootstrap import ModelBootstrap
+from component_pool import shared_pool
+
+# 사용할 백엔드 (쉼표로 구분)와 model 필드가 없을 때의 기본값
+ENABLED_BACKENDS = [
+    name.strip() for name in os.environ.get("ENABLED_BACKENDS", "flux,sd3,api").split(",")
+    if name.strip()
+]
+DEFAULT_MODEL = os.environ.get("DEFAULT_MODEL", ENABLED_BACKENDS[0] if ENABLED_BACKENDS else "flux")
+
+
+class Backend:
+    """백엔드 레지스트리 항목"""
+
+    def __init__(self, name, module_name, aliases=(), gpu=True):
+        self.name = name
+        self.module_name = module_name
+        self.aliases = tuple(aliases)
+        self.gpu = gpu
+        self.module = None
+
+    def load_module(self):
+        if self.module is None:
+            self.module = importlib.import_module(self.module_name)
+        return self.module
+
+    def call(self, phase):
+        """모듈에 해당 단계 함수가 있으면 실행"""
+        fn = getattr(self.module, phase, None)
+        if fn is not None:
+            fn()
+
+
+BACKENDS = {}
+ALIASES = {}
+
+
+def register_backend(name, module_name, aliases=(), gpu=True):
+    """백엔드 등록 (model 필드의 이름과 별칭으로 라우팅)"""
+    backend = Backend(name, module_name, aliases, gpu)
+    BACKENDS[name] = backend
+    for alias in (name,) + backend.aliases:
+        ALIASES[alias] = name
+    return backend
+
+
+register_backend("flux", "handler", aliases=("flux-dev", "flux.1-dev"))
+register_backend("sd3", "handler_sd3", aliases=("sd3-medium",))
+register_backend("api", "handler_api", aliases=("flux-schnell", "remote"), gpu=False)
+
+for name in ENABLED_BACKENDS:
+    if name not in BACKENDS:
+        raise ValueError(f"알 수 없는 백엔드: {name} (사용 가능: {', '.join(BACKENDS)})")
+
+enabled = [BACKENDS[name] for name in ENABLED_BACKENDS]
+for backend in enabled:
+    backend.load_module()
+
+startup_report = {}
+
+
+def download_all():
+    for backend in enabled:
+        backend.call("download_model")
+
+
+def load_all():
+    for backend in enabled:
+        backend.call("load_model")
+    startup_report["component_pool"] = shared_pool.report()
+
+
+def warmup_all():
+    for backend in enabled:
+        backend.call("warmup_model")
+
+
+bootstrap = ModelBootstrap(download_all, load_all, warmup_all)
+
+# FLUX 핸들러가 준비 상태를 통합 부트스트랩에서 확인하도록 교체
+if "flux" in BACKENDS and BACKENDS["flux"] in enabled:
+    flux_module = BACKENDS["flux"].module
+    flux_module.bootstrap = bootstrap
+    # GPU 작업은 FLUX 배치와 같은 단일 스레드에서 직렬화
+    run_on_gpu = flux_module.coalescer.run_exclusive
+else:
+    _gpu_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gpu")
+
+    async def run_on_gpu(fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_gpu_executor, fn, *args)
+
+
+def resolve_backend(job_input):
+    """요청의 model 필드로 백엔드 선택"""
+    name = str(job_input.get("model", DEFAULT_MODEL)).lower()
+    backend = BACKENDS.get(ALIASES.get(name, name))
+    if backend is None or backend not in enabled:
+        available = ", ".join(b.name for b in enabled)
+        raise ValueError(f"지원하지 않는 model: {name} (사용 가능: {available})")
+    return backend
+
+
+async def handler(job):
+    """통합 RUNPOD 핸들러"""
+    try:
+        job_input = job.get("input")
+        if not isinstance(job_input, dict):
+            raise ValueError("input은 객체(dict)여야 합니다")
+        backend = resolve_backend(job_input)
+
+        if not await bootstrap.wait_async():
+            status = bootstrap.status()
+            return {
+                "error": status.get("error", f"워커가 아직 준비되지 않았습니다 (state: {status['state']})"),
+                "status": status["state"],
+                "bootstrap": status
+            }
+
+        fn = backend.module.handler
+        if asyncio.iscoroutinefunction(fn):
+            result = await fn(job)
+        elif backend.gpu:
+            result = await run_on_gpu(fn, job)
+        else:
+            result = await asyncio.to_thread(fn, job)
+
+        result["model"] = backend.name
+        return result
+
+    except Exception as e:
+        return {"error": str(e)}
+
+
+if __name__ == "__main__":
+    bootstrap.start()
+
+    # RUNPOD 서버리스 시작
+    runpod.serverless.start({
+        "handler": handler,
+        "concurrency_modifier": concurrency_modifier
+    })
@@ -0,0 +1,138 @@
+"""
+풀링된 비동기 HTTP 클라이언트
+
+- keep-alive 커넥션 풀 재사용 (작업마다 새 TLS 핸드셰이크 없음)
+- 호출별 타임아웃
+- 연결 오류/타임아웃/429/5xx에 대해 지터가 있는 지수 백오프로 제한된 재시도
+  (기본은 GET/HEAD 등 멱등 요청과 Idempotency-Key가 있는 요청만, POST는 호출부에서 retries로 지정)
+"""
+
+import asyncio
+import json
+import os
+import random
+
+import aiohttp
+
+# HTTP 설정 (환경 변수로 변경 가능)
+HTTP_TIMEOUT = float(os.environ.get("HTTP_TIMEOUT", "120"))
+HTTP_CONNECT_TIMEOUT = float(os.environ.get("HTTP_CONNECT_TIMEOUT", "10"))
+HTTP_MAX_RETRIES = int(os.environ.get("HTTP_MAX_RETRIES", "3"))
+HTTP_BACKOFF_BASE = float(os.environ.get("HTTP_BACKOFF_BASE", "0.5"))
+HTTP_BACKOFF_MAX = float(os.environ.get("HTTP_BACKOFF_MAX", "10"))
+HTTP_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", "64"))
+
+RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+# 재시도해도 서버 상태가 한 번 보낸 것과 같은 메서드
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+
+class HTTPError(Exception):
+    """재시도 후에도 실패한 HTTP 응답"""
+
+    def __init__(self, status, body, url):
+        self.status = status
+        self.body = body
+        self.url = url
+        text = body[:500].decode("utf-8", "replace") if isinstance(body, bytes) else str(body)
+        super().__init__(f"HTTP {status} ({url}): {text}")
+
+
+class Response:
+    """읽기가 끝난 응답 (세션과 무관하게 사용 가능)"""
+
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def json(self):
+        return json.loads(self.body)
+
+
+def backoff_delay(attempt, base=HTTP_BACKOFF_BASE, maximum=HTTP_BACKOFF_MAX):
+    """full jitter 지수 백오프 (attempt는 0부터)"""
+    return random.uniform(0, min(maximum, base * (2 ** attempt)))
+
+
+def is_idempotent(method, headers=None):
+    """기본 재시도 대상인지 (멱등 메서드이거나 Idempotency-Key 헤더가 있음)"""
+    if method.upper() in IDEMPOTENT_METHODS:
+        return True
+    return any(name.lower() == "idempotency-key" for name in (headers or {}))
+
+
+class PooledHTTPClient:
+    """이벤트 루프별 aiohttp 세션을 재사용하는 클라이언트"""
+
+    def __init__(self, timeout=HTTP_TIMEOUT, connect_timeout=HTTP_CONNECT_TIMEOUT,
+                 max_retries=HTTP_MAX_RETRIES, pool_size=HTTP_POOL_SIZE):
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_retries = max_retries
+        self.pool_size = pool_size
+        self._session = None
+        self._loop = None
+
+    def _get_session(self):
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60, ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(connector=connector)
+            self._loop = loop
+        return self._session
+
+    async def request(self, method, url, *, headers=None, json=None, data=None,
+                      timeout=None, retries=None):
+        """요청 후 본문까지 읽은 Response 반환, 재시도 후에도 실패하면 HTTPError
+
+        retries를 지정하지 않으면 멱등 요청만 max_retries번 재시도합니다. 예측/작업 생성 같은
+        POST는 시간 초과 후 서버가 이미 받은 요청을 다시 보내 중복 과금될 수 있으므로 재시도하지 않습니다.
+        """
+        if retries is None:
+            retries = self.max_retries if is_idempotent(method, headers) else 0
+        client_timeout = aiohttp.ClientTimeout(
+            total=timeout or self.timeout, connect=self.connect_timeout
+        )
+        session = self._get_session()
+
+        for attempt in range(retries + 1):
+            try:
+                async with session.request(method, url, headers=headers, json=json, data=data,
+                                           timeout=client_timeout) as resp:
+                    body = await resp.read()
+                    status = resp.status
+                    response_headers = dict(resp.headers)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt >= retries:
+                    raise
+                delay = backoff_delay(attempt)
+                print(f"⚠️ HTTP {method} {url} 실패 ({type(e).__name__}), {delay:.2f}초 후 재시도")
+                await asyncio.sleep(delay)
+                continue
+
+            if status < 400:
+                return Response(status, response_headers, body)
+            if status in RETRY_STATUSES and attempt < retries:
+                delay = backoff_delay(attempt)
+                retry_after = response_headers.get("Retry-After")
+                if retry_after and retry_after.isdigit():
+                    delay = min(float(retry_after), HTTP_BACKOFF_MAX)
+                print(f"⚠️ HTTP {status} ({url}), {delay:.2f}초 후 재시도")
+                await asyncio.sleep(delay)
+                continue
+            raise HTTPError(status, body, url)
+
+    async def get(self, url, **kwargs):
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request("POST", url, **kwargs)
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+
+# 프로세스 전체에서 공유하는 클라이언트
+http_client = PooledHTTPClient()
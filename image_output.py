@@ -0,0 +1,150 @@
+"""
+이미지 출력 단계 (인코딩 + 반환 방식)
+
+- 형식 선택: PNG(압축 레벨), WebP, JPEG(품질)
+- 인코딩은 전용 스레드 풀에서 실행해 다음 작업의 디노이징과 겹치게 함
+- 반환 방식: base64 인라인 또는 참조(마운트 볼륨 경로 / S3 호환 스토리지 URL)
+"""
+
+import asyncio
+import base64
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+# 출력 기본값 (환경 변수로 변경 가능, 요청별로 덮어쓰기 가능)
+OUTPUT_FORMAT = os.environ.get("OUTPUT_FORMAT", "png").lower()
+OUTPUT_QUALITY = int(os.environ.get("OUTPUT_QUALITY", "90"))
+PNG_COMPRESS_LEVEL = int(os.environ.get("PNG_COMPRESS_LEVEL", "1"))
+OUTPUT_MODE = os.environ.get("OUTPUT_MODE", "base64").lower()
+OUTPUT_DIR = os.environ.get("OUTPUT_DIR", "/runpod-volume/outputs")
+OUTPUT_BASE_URL = os.environ.get("OUTPUT_BASE_URL", "")
+ENCODE_WORKERS = int(os.environ.get("ENCODE_WORKERS", "2"))
+
+# S3 호환 스토리지 (S3_BUCKET이 설정되면 참조 모드에서 사용)
+S3_BUCKET = os.environ.get("S3_BUCKET", "")
+S3_ENDPOINT_URL = os.environ.get("S3_ENDPOINT_URL", "")
+S3_PREFIX = os.environ.get("S3_PREFIX", "outputs")
+
+FORMATS = {
+    "png": ("PNG", "png", "image/png"),
+    "webp": ("WEBP", "webp", "image/webp"),
+    "jpeg": ("JPEG", "jpg", "image/jpeg"),
+    "jpg": ("JPEG", "jpg", "image/jpeg"),
+}
+MODES = ("base64", "reference")
+
+encode_executor = ThreadPoolExecutor(max_workers=ENCODE_WORKERS, thread_name_prefix="encode")
+
+
+def parse_output_options(job_input):
+    """작업 입력에서 출력 옵션 추출"""
+    options = {
+        "format": str(job_input.get("output_format", OUTPUT_FORMAT)).lower(),
+        "quality": int(job_input.get("quality", OUTPUT_QUALITY)),
+        "compress_level": int(job_input.get("compress_level", PNG_COMPRESS_LEVEL)),
+        "mode": str(job_input.get("output_mode", OUTPUT_MODE)).lower(),
+    }
+    if options["format"] not in FORMATS:
+        raise ValueError(f"지원하지 않는 출력 형식: {options['format']} (png, webp, jpeg)")
+    if options["mode"] not in MODES:
+        raise ValueError(f"지원하지 않는 출력 모드: {options['mode']} (base64, reference)")
+    if not 1 <= options["quality"] <= 100:
+        raise ValueError(f"quality는 1~100이어야 합니다: {options['quality']}")
+    if not 0 <= options["compress_level"] <= 9:
+        raise ValueError(f"compress_level은 0~9여야 합니다: {options['compress_level']}")
+    return options
+
+
+def encode_image(image, options):
+    """선택한 형식으로 이미지를 바이트로 인코딩"""
+    pil_format, _, _ = FORMATS[options["format"]]
+
+    buffered = BytesIO()
+    if pil_format == "PNG":
+        image.save(buffered, format="PNG", compress_level=options["compress_level"])
+    elif pil_format == "WEBP":
+        image.save(buffered, format="WEBP", quality=options["quality"], method=4)
+    else:
+        # JPEG는 알파 채널을 지원하지 않음
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        image.save(buffered, format="JPEG", quality=options["quality"], optimize=False)
+    return buffered.getvalue()
+
+
+class LocalStorage:
+    """마운트된 볼륨(로컬 디렉토리)에 저장하고 경로 또는 URL 반환"""
+
+    def __init__(self, directory=OUTPUT_DIR, base_url=OUTPUT_BASE_URL):
+        self.directory = directory
+        self.base_url = base_url.rstrip("/")
+        os.makedirs(directory, exist_ok=True)
+
+    def put(self, name, data, content_type):
+        path = os.path.join(self.directory, name)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        if self.base_url:
+            return {"image_url": f"{self.base_url}/{name}"}
+        return {"image_path": path}
+
+
+class S3Storage:
+    """S3 호환 스토리지에 업로드하고 URL 반환"""
+
+    def __init__(self, bucket=S3_BUCKET, endpoint_url=S3_ENDPOINT_URL, prefix=S3_PREFIX):
+        import boto3
+
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.client = boto3.client("s3", endpoint_url=endpoint_url or None)
+
+    def put(self, name, data, content_type):
+        key = f"{self.prefix}/{name}" if self.prefix else name
+        self.client.put_object(Bucket=self.bucket, Key=key, Body=data, ContentType=content_type)
+        url = self.client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": key},
+            ExpiresIn=7 * 24 * 3600
+        )
+        return {"image_url": url}
+
+
+_storage = None
+
+
+def get_storage():
+    """참조 모드용 스토리지 (S3_BUCKET이 있으면 S3, 없으면 로컬 디렉토리)"""
+    global _storage
+    if _storage is None:
+        _storage = S3Storage() if S3_BUCKET else LocalStorage()
+    return _storage
+
+
+def package_output(data, options, name=None):
+    """인코딩된 바이트로 응답 필드(dict) 생성 (base64 인라인 또는 참조)"""
+    _, extension, content_type = FORMATS[options["format"]]
+
+    output = {"format": options["format"], "bytes": len(data)}
+    if options["mode"] == "base64":
+        output["image"] = base64.b64encode(data).decode()
+    else:
+        filename = f"{name or uuid.uuid4().hex}.{extension}"
+        output.update(get_storage().put(filename, data, content_type))
+    return output
+
+
+def build_output(image, options, name=None):
+    """이미지를 인코딩해 응답 필드(dict) 생성"""
+    return package_output(encode_image(image, options), options, name)
+
+
+async def build_output_async(image, options, name=None):
+    """인코딩 스레드 풀에서 build_output 실행"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(encode_executor, build_output, image, options, name)
@@ -0,0 +1,314 @@
+"""
+LoRA 학습용 latent / 텍스트 임베딩 사전 계산
+
+데이터셋(dataset_ingest 결과)의 이미지를 VAE로, 캡션을 CLIP/T5로 한 번만 인코딩해
+네트워크 볼륨에 메모리 매핑 가능한 .npy 샤드로 저장합니다. 학습은 JPEG 디코드나
+VAE 실행 없이 이 텐서만 읽습니다.
+
+디렉토리 구조 (<root>/<데이터셋 해시>/<모델 리비전>/):
+    latents/<WxH>/latents.npy      (N, 16, H/8, W/8) float16, 버킷별 샤드
+    latents/<WxH>/index.json       샤드 행 순서의 이미지 파일 이름 (완료 마커 겸용)
+    text-<캡션 해시>/prompt_embeds.npy   (고유 캡션 수, L, 4096) float16
+    text-<캡션 해시>/pooled.npy          (고유 캡션 수, 768) float16
+    text-<캡션 해시>/index.json          고유 캡션 목록과 이미지 -> 행 매핑
+
+각 샤드는 임시 디렉토리에 쓴 뒤 os.replace로 옮기므로 중간에 멈춘 결과는 보이지 않습니다.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import torch
+from PIL import Image
+
+from model_provision import read_marker
+
+# 사전 계산 설정 (환경 변수로 변경 가능)
+LATENT_CACHE_DIR = os.environ.get("LATENT_CACHE_DIR", "/workspace/latent_cache")
+PRECOMPUTE_BATCH_SIZE = int(os.environ.get("PRECOMPUTE_BATCH_SIZE", "4"))
+TRAIN_MAX_SEQUENCE_LENGTH = int(os.environ.get("TRAIN_MAX_SEQUENCE_LENGTH", "512"))
+
+INDEX_FILE = "index.json"
+# 인코딩 결과에 영향을 주는 구성요소 (리비전 해시에 포함)
+ENCODER_COMPONENTS = ("vae/", "text_encoder/", "text_encoder_2/", "tokenizer/", "tokenizer_2/")
+
+
+def model_revision(model_path):
+    """인코더 파일 해시로 모델 리비전 결정
+
+    로컬 디렉토리는 프로비저닝 마커(model_provision)의 파일 해시를, 허브 ID는 커밋 해시를
+    사용하고, 둘 다 없으면 경로/이름 자체를 사용합니다.
+    """
+    if os.path.isdir(model_path):
+        marker = read_marker(model_path)
+        raw = json.dumps(sorted(
+            (path, meta["sha256"]) for path, meta in marker["files"].items()
+            if path.startswith(ENCODER_COMPONENTS)
+        )) if marker else os.path.abspath(model_path)
+    else:
+        try:
+            from huggingface_hub import HfApi
+
+            raw = f"{model_path}@{HfApi().model_info(model_path).sha}"
+        except Exception:
+            raw = model_path
+    return hashlib.sha256(raw.encode()).hexdigest()[:16]
+
+
+def load_encoders(model_path, device="cuda", dtype=torch.bfloat16):
+    """트랜스포머 없이 VAE / 텍스트 인코더만 로드
+
+    Returns:
+        (vae, encode_prompt, release) - release()는 인코더를 GPU에서 내림
+    """
+    from diffusers import FluxPipeline
+
+    pipe = FluxPipeline.from_pretrained(model_path, transformer=None, torch_dtype=dtype).to(device)
+
+    @torch.no_grad()
+    def encode_prompt(captions, max_sequence_length):
+        prompt_embeds, pooled, _ = pipe.encode_prompt(
+            prompt=captions, prompt_2=None, device=pipe._execution_device,
+            num_images_per_prompt=1, max_sequence_length=max_sequence_length
+        )
+        return prompt_embeds, pooled
+
+    def release():
+        pipe.to("cpu")
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    return pipe.vae, encode_prompt, release
+
+
+def _captions_hash(captions, max_sequence_length):
+    raw = json.dumps([max_sequence_length, captions], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def _read_index(path):
+    try:
+        with open(os.path.join(path, INDEX_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _publish(staging, final_dir, index):
+    """index.json을 마지막에 쓰고 디렉토리를 원자적으로 교체"""
+    with open(os.path.join(staging, INDEX_FILE), "w") as f:
+        json.dump(index, f)
+    if os.path.exists(final_dir):
+        shutil.rmtree(final_dir)
+    os.replace(staging, final_dir)
+
+
+def load_image_tensor(path):
+    """PNG -> (3, H, W) float32 [-1, 1]"""
+    with Image.open(path) as image:
+        array = np.asarray(image.convert("RGB"), dtype=np.float32)
+    return torch.from_numpy(array).permute(2, 0, 1) / 127.5 - 1.0
+
+
+@torch.no_grad()
+def encode_latents(vae, images):
+    """FLUX VAE 인코딩 (분포 평균 사용, shift/scaling 적용 후 float16)"""
+    images = images.to(vae.device, vae.dtype)
+    latents = vae.encode(images).latent_dist.mode()
+    latents = (latents - vae.config.shift_factor) * vae.config.scaling_factor
+    return latents.to(torch.float16).cpu().numpy()
+
+
+class LatentCache:
+    """(데이터셋 해시, 버킷, 모델 리비전)별 latent / 텍스트 임베딩 샤드 저장소"""
+
+    def __init__(self, root=LATENT_CACHE_DIR, batch_size=PRECOMPUTE_BATCH_SIZE):
+        self.root = root
+        self.batch_size = batch_size
+        os.makedirs(root, exist_ok=True)
+
+    def base_dir(self, dataset_hash, revision):
+        return os.path.join(self.root, dataset_hash[:16], revision)
+
+    def latent_dir(self, dataset_hash, revision, bucket):
+        return os.path.join(self.base_dir(dataset_hash, revision), "latents", bucket)
+
+    def text_dir(self, dataset_hash, revision, captions, max_sequence_length):
+        name = f"text-{_captions_hash(captions, max_sequence_length)}"
+        return os.path.join(self.base_dir(dataset_hash, revision), name)
+
+    def _staging(self, final_dir):
+        os.makedirs(os.path.dirname(final_dir), exist_ok=True)
+        return tempfile.mkdtemp(prefix=".staging-", dir=os.path.dirname(final_dir))
+
+    # --- latent ---
+
+    def _encode_bucket(self, vae, image_dir, files, bucket, final_dir):
+        width, height = (int(v) for v in bucket.split("x"))
+        factor = 2 ** (len(vae.config.block_out_channels) - 1)
+        staging = self._staging(final_dir)
+        try:
+            shard = np.lib.format.open_memmap(
+                os.path.join(staging, "latents.npy"), mode="w+", dtype=np.float16,
+                shape=(len(files), vae.config.latent_channels, height // factor, width // factor)
+            )
+            # 다음 배치 이미지 디코드를 GPU 인코딩과 겹침
+            with ThreadPoolExecutor(max_workers=4) as decoder, ThreadPoolExecutor(max_workers=1) as prefetch:
+                def decode(start):
+                    names = files[start:start + self.batch_size]
+                    return torch.stack(list(decoder.map(
+                        load_image_tensor, [os.path.join(image_dir, n) for n in names])))
+
+                starts = list(range(0, len(files), self.batch_size))
+                pending = prefetch.submit(decode, starts[0])
+                for i, start in enumerate(starts):
+                    images = pending.result()
+                    if i + 1 < len(starts):
+                        pending = prefetch.submit(decode, starts[i + 1])
+                    shard[start:start + len(images)] = encode_latents(vae, images)
+            shard.flush()
+            del shard
+            _publish(staging, final_dir, {"bucket": bucket, "files": files})
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+    # --- 텍스트 ---
+
+    def _encode_texts(self, encode_prompt, captions, max_sequence_length, final_dir):
+        unique = list(dict.fromkeys(captions))
+        staging = self._staging(final_dir)
+        try:
+            prompt_shard = pooled_shard = None
+            for start in range(0, len(unique), self.batch_size):
+                batch = unique[start:start + self.batch_size]
+                prompt_embeds, pooled = encode_prompt(batch, max_sequence_length)
+                prompt_embeds = prompt_embeds.to(torch.float16).cpu().numpy()
+                pooled = pooled.to(torch.float16).cpu().numpy()
+                if prompt_shard is None:
+                    prompt_shard = np.lib.format.open_memmap(
+                        os.path.join(staging, "prompt_embeds.npy"), mode="w+", dtype=np.float16,
+                        shape=(len(unique),) + prompt_embeds.shape[1:])
+                    pooled_shard = np.lib.format.open_memmap(
+                        os.path.join(staging, "pooled.npy"), mode="w+", dtype=np.float16,
+                        shape=(len(unique),) + pooled.shape[1:])
+                prompt_shard[start:start + len(batch)] = prompt_embeds
+                pooled_shard[start:start + len(batch)] = pooled
+            prompt_shard.flush()
+            pooled_shard.flush()
+            del prompt_shard, pooled_shard
+            row = {caption: i for i, caption in enumerate(unique)}
+            _publish(staging, final_dir, {
+                "max_sequence_length": max_sequence_length,
+                "captions": unique,
+                "rows": [row[c] for c in captions],
+            })
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+    def is_complete(self, manifest, captions, revision, max_sequence_length=TRAIN_MAX_SEQUENCE_LENGTH):
+        """모든 샤드가 이미 있는지 (True면 인코더를 로드할 필요 없음)"""
+        dataset_hash = manifest["dataset_hash"]
+        by_bucket = {}
+        for entry in manifest["images"]:
+            by_bucket.setdefault(entry["bucket"], []).append(entry["file"])
+        for bucket, files in by_bucket.items():
+            index = _read_index(self.latent_dir(dataset_hash, revision, bucket))
+            if not index or index["files"] != files:
+                return False
+        return _read_index(self.text_dir(dataset_hash, revision, captions, max_sequence_length)) is not None
+
+    def precompute(self, manifest, image_dir, captions, revision, vae, encode_prompt,
+                   max_sequence_length=TRAIN_MAX_SEQUENCE_LENGTH):
+        """없는 샤드만 인코딩
+
+        Args:
+            manifest: dataset_ingest의 manifest (images[*].file / bucket)
+            captions: manifest["images"] 순서의 학습 캡션
+            vae: 학습과 같은 dtype/디바이스의 AutoencoderKL
+            encode_prompt: (캡션 목록, max_sequence_length) -> (prompt_embeds, pooled)
+
+        Returns:
+            {"path", "revision", "latents": {bucket: "cached"|"encoded"}, "text", "timings"}
+        """
+        dataset_hash = manifest["dataset_hash"]
+        by_bucket = {}
+        for entry in manifest["images"]:
+            by_bucket.setdefault(entry["bucket"], []).append(entry["file"])
+
+        report = {"path": self.base_dir(dataset_hash, revision), "revision": revision,
+                  "latents": {}, "text": "cached", "timings": {}}
+        started = time.perf_counter()
+        for bucket, files in sorted(by_bucket.items()):
+            final_dir = self.latent_dir(dataset_hash, revision, bucket)
+            index = _read_index(final_dir)
+            if index and index["files"] == files:
+                report["latents"][bucket] = "cached"
+                continue
+            self._encode_bucket(vae, image_dir, files, bucket, final_dir)
+            report["latents"][bucket] = "encoded"
+        report["timings"]["latents_s"] = round(time.perf_counter() - started, 2)
+
+        started = time.perf_counter()
+        text_dir = self.text_dir(dataset_hash, revision, captions, max_sequence_length)
+        if _read_index(text_dir) is None:
+            self._encode_texts(encode_prompt, captions, max_sequence_length, text_dir)
+            report["text"] = "encoded"
+        report["text_dir"] = text_dir
+        report["timings"]["text_s"] = round(time.perf_counter() - started, 2)
+
+        encoded = sum(1 for v in report["latents"].values() if v == "encoded")
+        print(f"🧮 latent 사전 계산: 버킷 {len(by_bucket)}개 중 {encoded}개 인코딩, "
+              f"텍스트 {report['text']} ({sum(report['timings'].values()):.1f}초)")
+        return report
+
+    def open(self, manifest, revision, text_dir):
+        """학습용으로 샤드를 메모리 매핑해 연다"""
+        return CachedLatents(self, manifest, revision, text_dir)
+
+
+class CachedLatents:
+    """메모리 매핑된 latent / 텍스트 임베딩 샤드 (학습 루프에서 사용)"""
+
+    def __init__(self, cache, manifest, revision, text_dir):
+        dataset_hash = manifest["dataset_hash"]
+        text_index = _read_index(text_dir)
+        if text_index is None:
+            raise FileNotFoundError(f"텍스트 임베딩 샤드가 없습니다: {text_dir}")
+        self.prompt_embeds = np.load(os.path.join(text_dir, "prompt_embeds.npy"), mmap_mode="r")
+        self.pooled = np.load(os.path.join(text_dir, "pooled.npy"), mmap_mode="r")
+        text_rows = dict(zip((e["file"] for e in manifest["images"]), text_index["rows"]))
+
+        # 버킷별 (latent 샤드, 각 행의 텍스트 행)
+        self.buckets = {}
+        for bucket in sorted({e["bucket"] for e in manifest["images"]}):
+            path = cache.latent_dir(dataset_hash, revision, bucket)
+            index = _read_index(path)
+            if index is None:
+                raise FileNotFoundError(f"latent 샤드가 없습니다: {path}")
+            latents = np.load(os.path.join(path, "latents.npy"), mmap_mode="r")
+            self.buckets[bucket] = (latents, np.array([text_rows[f] for f in index["files"]]))
+
+    def __len__(self):
+        return sum(len(latents) for latents, _ in self.buckets.values())
+
+    def bucket_sizes(self):
+        return {bucket: len(latents) for bucket, (latents, _) in self.buckets.items()}
+
+    def batch(self, bucket, indices):
+        """버킷 안 행 번호 목록 -> (latents, prompt_embeds, pooled) float16 텐서"""
+        latents, text_rows = self.buckets[bucket]
+        indices = np.sort(np.asarray(indices))
+        rows = text_rows[indices]
+        return (
+            torch.from_numpy(np.ascontiguousarray(latents[indices])),
+            torch.from_numpy(np.ascontiguousarray(self.prompt_embeds[rows])),
+            torch.from_numpy(np.ascontiguousarray(self.pooled[rows])),
+        )
@@ -0,0 +1,206 @@
+"""
+LoRA 어댑터 풀 (핫 스왑)
+
+diffusers load_lora_weights / set_adapters 위에서 동작합니다.
+
+- 호스트 메모리 계층: 최근 사용한 N개 어댑터의 파싱된 state dict를 LRU로 보관
+  (다시 사용할 때 디스크 읽기/파싱 생략)
+- 파이프라인 계층: 최근 사용한 M개 어댑터를 파이프라인에 로드해 두고
+  set_adapters만으로 전환
+- 같은 어댑터를 연속으로 사용하면 선택적으로 가중치를 fuse해 스텝당 LoRA 연산 제거
+- lora_name은 LORA_DIR 안의 파일 이름이거나 LORA_HUB_ALLOWLIST에 있는 허브 repo id만 허용
+- 텍스트 인코더를 다른 파이프라인과 공유 중이면(component_pool) LoRA는 트랜스포머에만 적용
+"""
+
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+# LoRA 설정 (환경 변수로 변경 가능)
+LORA_DIR = os.environ.get("LORA_DIR", "/workspace/models/loras")
+LORA_HOST_CACHE_SIZE = int(os.environ.get("LORA_HOST_CACHE_SIZE", "8"))
+LORA_MAX_LOADED = int(os.environ.get("LORA_MAX_LOADED", "3"))
+LORA_FUSE = os.environ.get("LORA_FUSE", "1") == "1"
+LORA_FUSE_AFTER = int(os.environ.get("LORA_FUSE_AFTER", "2"))
+# 요청에서 쓸 수 있는 허브 repo id (쉼표 구분, "owner/*"는 해당 owner 전체, 비어 있으면 허브 사용 안 함)
+LORA_HUB_ALLOWLIST = [
+    name.strip() for name in os.environ.get("LORA_HUB_ALLOWLIST", "").split(",") if name.strip()
+]
+
+
+def adapter_name(lora_name):
+    """PEFT 어댑터 이름으로 쓸 수 있게 변환 (점 등 특수문자 제거)
+
+    "a.b"/"a_b"처럼 변환 결과가 겹치지 않도록 원래 이름의 짧은 sha1을 붙입니다.
+    """
+    digest = hashlib.sha1(lora_name.encode()).hexdigest()[:8]
+    return f"{re.sub(r'[^0-9a-zA-Z_]', '_', lora_name)}_{digest}"
+
+
+HUB_REPO_ID = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]*/[A-Za-z0-9][A-Za-z0-9_.-]*$")
+
+
+def hub_allowed(repo_id, allowlist=LORA_HUB_ALLOWLIST):
+    if not HUB_REPO_ID.match(repo_id) or ".." in repo_id:
+        return False
+    for allowed in allowlist:
+        if repo_id == allowed or (allowed.endswith("/*") and repo_id.startswith(allowed[:-1])):
+            return True
+    return False
+
+
+def resolve_lora(lora_name, lora_dir=LORA_DIR, allowlist=LORA_HUB_ALLOWLIST):
+    """요청의 lora_name -> LORA_DIR 안의 실제 경로 또는 허용된 허브 repo id
+
+    경로 구분자/상위 디렉토리가 들어간 이름, LORA_DIR 밖을 가리키는 심볼릭 링크,
+    허용 목록에 없는 허브 repo id는 ValueError로 거절합니다.
+    """
+    if not isinstance(lora_name, str) or not lora_name.strip() or "\x00" in lora_name:
+        raise ValueError("lora_name은 비어 있지 않은 문자열이어야 합니다")
+    if "/" in lora_name and hub_allowed(lora_name, allowlist):
+        return lora_name
+    if "/" in lora_name or "\\" in lora_name or lora_name.startswith("."):
+        raise ValueError(f"허용되지 않은 lora_name: {lora_name!r} (LORA_DIR의 파일 이름 또는 허용된 허브 repo id)")
+
+    root = os.path.realpath(lora_dir)
+    path = os.path.realpath(os.path.join(root, lora_name))
+    if os.path.commonpath([root, path]) != root:
+        raise ValueError(f"허용되지 않은 lora_name: {lora_name!r} (LORA_DIR 밖을 가리킴)")
+    if not os.path.exists(path):
+        raise ValueError(f"LoRA를 찾을 수 없습니다: {lora_name}")
+    return path
+
+
+class LoRAManager:
+    """파이프라인의 LoRA 어댑터를 LRU로 관리하고 작업마다 활성화
+
+    Args:
+        pipe: diffusers 파이프라인 (LoRA 로더 믹스인 포함)
+        lora_dir: LoRA 파일 디렉토리
+        hub_allowlist: 허용할 허브 repo id 목록
+        host_cache_size: 호스트 메모리에 보관할 state dict 수
+        max_loaded: 파이프라인에 동시에 로드해 둘 어댑터 수
+        fuse: 연속 사용 시 가중치 fuse 여부
+        fuse_after: fuse를 시작할 연속 사용 횟수
+        is_shared: 모듈이 다른 파이프라인과 공유 중인지 확인하는 함수 (component_pool.shared_pool.is_shared)
+    """
+
+    def __init__(self, pipe, lora_dir=LORA_DIR, host_cache_size=LORA_HOST_CACHE_SIZE,
+                 max_loaded=LORA_MAX_LOADED, fuse=LORA_FUSE, fuse_after=LORA_FUSE_AFTER,
+                 hub_allowlist=LORA_HUB_ALLOWLIST, is_shared=None):
+        self.pipe = pipe
+        self.lora_dir = lora_dir
+        self.hub_allowlist = hub_allowlist
+        self.host_cache_size = max(1, host_cache_size)
+        self.max_loaded = max(1, max_loaded)
+        self.fuse = fuse
+        self.fuse_after = max(1, fuse_after)
+        self.is_shared = is_shared
+
+        self._host = OrderedDict()
+        self._loaded = OrderedDict()
+        self._lock = threading.Lock()
+        self._active = None
+        self._fused = None
+        self._last = None
+        self._streak = 0
+
+    def _resolve(self, lora_name):
+        return resolve_lora(lora_name, self.lora_dir, self.hub_allowlist)
+
+    def _state_dict(self, lora_name):
+        """호스트 LRU에서 state dict 반환 (없으면 디스크에서 읽고 파싱)"""
+        if lora_name in self._host:
+            self._host.move_to_end(lora_name)
+            return self._host[lora_name], "host"
+
+        state_dict = self.pipe.lora_state_dict(self._resolve(lora_name))
+        if isinstance(state_dict, tuple):
+            state_dict = state_dict[0]
+        self._host[lora_name] = state_dict
+        while len(self._host) > self.host_cache_size:
+            self._host.popitem(last=False)
+        return state_dict, "disk"
+
+    def _text_encoder_shared(self):
+        if self.is_shared is None:
+            return False
+        return any(self.is_shared(getattr(self.pipe, name, None)) for name in ("text_encoder", "text_encoder_2"))
+
+    def _ensure_loaded(self, lora_name):
+        name = adapter_name(lora_name)
+        if lora_name in self._loaded:
+            self._loaded.move_to_end(lora_name)
+            return name, "loaded"
+
+        state_dict, source = self._state_dict(lora_name)
+        if self._text_encoder_shared():
+            # 공유된 텍스트 인코더에 주입하면 다른 파이프라인(SD3 등)까지 바뀌므로 트랜스포머에만 적용
+            skipped = [key for key in state_dict if key.startswith("text_encoder")]
+            if skipped:
+                print(f"⚠️ {lora_name}: 텍스트 인코더를 공유 중이라 텍스트 인코더 LoRA {len(skipped)}개 키를 건너뜁니다")
+                state_dict = {k: v for k, v in state_dict.items() if not k.startswith("text_encoder")}
+        # load_lora_weights가 dict를 변경하지 않도록 얕은 복사본 전달
+        self.pipe.load_lora_weights(dict(state_dict), adapter_name=name)
+        self._loaded[lora_name] = any(key.startswith("text_encoder") for key in state_dict)
+
+        while len(self._loaded) > self.max_loaded:
+            old, _ = self._loaded.popitem(last=False)
+            self.pipe.delete_adapters(adapter_name(old))
+        return name, source
+
+    def _unfuse(self):
+        if self._fused is not None:
+            self.pipe.unfuse_lora()
+            self._fused = None
+
+    def activate(self, lora_name=None, lora_strength=1.0):
+        """작업에 맞게 어댑터 활성화 후 전환 정보 반환 (GPU 스레드에서 호출)"""
+        started = time.perf_counter()
+        key = (lora_name, float(lora_strength)) if lora_name else None
+
+        with self._lock:
+            self._streak = self._streak + 1 if key == self._last else 1
+            self._last = key
+
+            if key is None:
+                self._unfuse()
+                if self._active is not None:
+                    self.pipe.disable_lora()
+                    self._active = None
+                source = "none"
+            elif key == self._fused:
+                source = "fused"
+            else:
+                self._unfuse()
+                name, source = self._ensure_loaded(lora_name)
+                if key != self._active:
+                    self.pipe.enable_lora()
+                    self.pipe.set_adapters([name], adapter_weights=[float(lora_strength)])
+                    if source == "loaded":
+                        source = "switched"
+                elif source == "loaded":
+                    source = "active"
+                self._active = key
+
+                # 같은 어댑터가 연속으로 쓰이면 fuse해 스텝당 LoRA 연산 제거
+                if self.fuse and self._streak >= self.fuse_after:
+                    self.pipe.fuse_lora(lora_scale=1.0, adapter_names=[name])
+                    self._fused = key
+
+        return {
+            "lora_name": lora_name,
+            "lora_strength": float(lora_strength) if lora_name else None,
+            "source": source,
+            "fused": self._fused is not None,
+            "switch_ms": round((time.perf_counter() - started) * 1000, 2),
+        }
+
+    def affects_text_encoder(self, lora_name):
+        """어댑터가 텍스트 인코더 가중치를 포함하는지 (프롬프트 캐시 키 분리용)"""
+        if not lora_name:
+            return False
+        return self._loaded.get(lora_name, False)
@@ -0,0 +1,236 @@
+"""
+메모리 예산 플래너 (오프로드 전략 자동 선택)
+
+사용 가능한 디바이스 메모리와 파이프라인 구성요소별 크기를 추정해
+메모리에 맞는 가장 빠른 구성을 고릅니다.
+
+    resident (전부 GPU 상주) > model (모델 단위 CPU 오프로드) > sequential (레이어 단위 오프로드)
+
+VAE slicing/tiling은 해상도(픽셀 수)와 남은 메모리를 보고 배치마다 켜고 끕니다.
+추정 로직은 CPU에서 가상 메모리 예산으로 테스트할 수 있습니다:
+
+    python memory_planner.py --model flux --budget-gb 24 --width 1024 --height 1024
+"""
+
+import argparse
+import json
+import os
+
+GB = 1024 ** 3
+
+# 강제 설정 (auto / resident / model / sequential), (auto / on / off)
+OFFLOAD_STRATEGY = os.environ.get("OFFLOAD_STRATEGY", "auto").lower()
+VAE_TILING = os.environ.get("VAE_TILING", "auto").lower()
+# 가상 메모리 예산 (GB, 설정 시 실제 디바이스 메모리 대신 사용)
+MEMORY_BUDGET_GB = os.environ.get("MEMORY_BUDGET_GB", "")
+# CUDA 컨텍스트/단편화용 여유분
+MEMORY_RESERVE_GB = float(os.environ.get("MEMORY_RESERVE_GB", "1.5"))
+# 이 픽셀 수를 넘으면 VAE tiling 사용
+VAE_TILING_PIXELS = int(os.environ.get("VAE_TILING_PIXELS", str(1536 * 1536)))
+# 계획 시 가정할 최대 해상도
+PLAN_MAX_PIXELS = int(os.environ.get("PLAN_MAX_PIXELS", str(1024 * 1024)))
+
+STRATEGIES = ("resident", "model", "sequential")
+
+# 가중치 없이 시뮬레이션할 때 쓰는 구성요소별 파라미터 수
+KNOWN_PARAMETERS = {
+    "flux": {
+        "transformer": 11_900_000_000,
+        "text_encoder_2": 4_760_000_000,
+        "text_encoder": 123_000_000,
+        "vae": 84_000_000,
+    },
+    "sd3": {
+        "transformer": 2_030_000_000,
+        "text_encoder_3": 4_760_000_000,
+        "text_encoder_2": 695_000_000,
+        "text_encoder": 123_000_000,
+        "vae": 84_000_000,
+    },
+}
+
+# 활성화 메모리 근사 계수 (바이트, fp16 기준)
+TRANSFORMER_BYTES_PER_TOKEN = {"flux": 3072 * 2 * 32, "sd3": 1536 * 2 * 32}
+VAE_DECODE_BYTES_PER_PIXEL = 128 * 2 * 3
+
+
+def component_footprints(pipe):
+    """파이프라인 구성요소별 파라미터+버퍼 크기 (바이트)"""
+    footprints = {}
+    for name, component in pipe.components.items():
+        if not hasattr(component, "parameters"):
+            continue
+        size = sum(p.numel() * p.element_size() for p in component.parameters())
+        size += sum(b.numel() * b.element_size() for b in component.buffers())
+        footprints[name] = size
+    return footprints
+
+
+def known_footprints(model, dtype_bytes=2):
+    """알려진 파라미터 수로 구성요소 크기 추정 (시뮬레이션용)"""
+    return {name: count * dtype_bytes for name, count in KNOWN_PARAMETERS[model].items()}
+
+
+def device_memory_budget():
+    """계획에 쓸 메모리 예산 (바이트): MEMORY_BUDGET_GB 또는 현재 GPU 여유 메모리
+
+    CUDA가 없으면 0을 반환하고, plan_memory는 예산 0을 sequential로 계획합니다.
+    """
+    if MEMORY_BUDGET_GB:
+        return int(float(MEMORY_BUDGET_GB) * GB)
+
+    import torch
+
+    if not torch.cuda.is_available():
+        print("⚠️ CUDA를 사용할 수 없어 GPU 메모리 예산을 0으로 계획합니다 (MEMORY_BUDGET_GB로 지정 가능)")
+        return 0
+    free, _ = torch.cuda.mem_get_info()
+    return free
+
+
+def denoise_activation_bytes(model, width, height, batch_size=1, text_tokens=512):
+    """디노이징 한 스텝의 활성화 메모리 근사"""
+    tokens = (width // 16) * (height // 16) + text_tokens
+    return tokens * TRANSFORMER_BYTES_PER_TOKEN.get(model, TRANSFORMER_BYTES_PER_TOKEN["flux"]) * batch_size
+
+
+def vae_decode_bytes(width, height, batch_size=1):
+    """VAE 디코딩 활성화 메모리 근사 (slicing/tiling 없이)"""
+    return width * height * VAE_DECODE_BYTES_PER_PIXEL * batch_size
+
+
+class MemoryPlan:
+    """선택된 오프로드 전략과 VAE 설정 기준"""
+
+    def __init__(self, model, strategy, budget, footprints, reason):
+        self.model = model
+        self.strategy = strategy
+        self.budget = budget
+        self.footprints = footprints
+        self.reason = reason
+
+    def gpu_weights_during_decode(self):
+        """VAE 디코딩 시점에 GPU에 있는 가중치 크기"""
+        if self.strategy == "resident":
+            return sum(self.footprints.values())
+        if self.strategy == "model":
+            return self.footprints.get("vae", 0)
+        return 0
+
+    def gpu_weights_during_denoise(self):
+        """디노이징 중 GPU에 있는 가중치 크기"""
+        if self.strategy == "resident":
+            return sum(self.footprints.values())
+        if self.strategy == "model":
+            return self.footprints.get("transformer", max(self.footprints.values(), default=0))
+        return 0
+
+    def max_batch_size(self, width, height, text_tokens=512, limit=16):
+        """디노이징 활성화가 예산 안에 들어가는 가장 큰 배치 크기 (최소 1, 최대 limit)
+
+        VAE 디코딩은 vae_settings가 slicing으로 맞추므로 제한에 넣지 않습니다.
+        """
+        headroom = self.budget - self.gpu_weights_during_denoise() - MEMORY_RESERVE_GB * GB
+        per_sample = denoise_activation_bytes(self.model, width, height, 1, text_tokens)
+        if headroom <= per_sample:
+            return 1
+        return max(1, min(limit, int(headroom // per_sample)))
+
+    def vae_settings(self, width, height, batch_size=1):
+        """(slicing, tiling) 결정"""
+        if VAE_TILING in ("on", "off"):
+            enabled = VAE_TILING == "on"
+            return enabled, enabled
+
+        headroom = self.budget - self.gpu_weights_during_decode() - MEMORY_RESERVE_GB * GB
+        per_image = vae_decode_bytes(width, height)
+        tiling = width * height > VAE_TILING_PIXELS or per_image > headroom
+        slicing = batch_size > 1 and per_image * batch_size > headroom
+        return slicing, tiling
+
+    def to_dict(self):
+        return {
+            "model": self.model,
+            "strategy": self.strategy,
+            "budget_gb": round(self.budget / GB, 2),
+            "weights_gb": round(sum(self.footprints.values()) / GB, 2),
+            "components_gb": {k: round(v / GB, 2) for k, v in self.footprints.items()},
+            "reason": self.reason,
+        }
+
+
+def plan_memory(model, footprints, budget, max_pixels=PLAN_MAX_PIXELS, batch_size=1,
+                strategy=OFFLOAD_STRATEGY):
+    """메모리에 맞는 가장 빠른 오프로드 전략 선택"""
+    side = int(max_pixels ** 0.5)
+    activations = denoise_activation_bytes(model, side, side, batch_size)
+    reserve = MEMORY_RESERVE_GB * GB
+    total = sum(footprints.values())
+    largest = max(footprints.values()) if footprints else 0
+
+    if strategy != "auto":
+        if strategy not in STRATEGIES:
+            raise ValueError(f"지원하지 않는 OFFLOAD_STRATEGY: {strategy} ({', '.join(STRATEGIES)})")
+        return MemoryPlan(model, strategy, budget, footprints, "OFFLOAD_STRATEGY 환경 변수로 지정")
+
+    if budget <= 0:
+        return MemoryPlan(model, "sequential", budget, footprints,
+                          "사용 가능한 GPU 메모리가 없음 (CUDA 없음 또는 예산 0)")
+    if total + activations + reserve <= budget:
+        return MemoryPlan(model, "resident", budget, footprints,
+                          f"전체 가중치 {total / GB:.1f}GB + 활성화 {activations / GB:.1f}GB가 예산 안에 들어감")
+    if largest + activations + reserve <= budget:
+        return MemoryPlan(model, "model", budget, footprints,
+                          f"가장 큰 구성요소 {largest / GB:.1f}GB + 활성화 {activations / GB:.1f}GB는 예산 안에 들어감")
+    return MemoryPlan(model, "sequential", budget, footprints,
+                      f"가장 큰 구성요소 {largest / GB:.1f}GB + 활성화 {activations / GB:.1f}GB도 "
+                      f"예산 {budget / GB:.1f}GB를 넘음")
+
+
+def apply_plan(pipe, plan, device="cuda"):
+    """계획에 따라 파이프라인 배치 (from_pretrained 직후 CPU 상태에서 호출)"""
+    if plan.strategy == "resident":
+        pipe.to(device)
+    elif plan.strategy == "model":
+        pipe.enable_model_cpu_offload()
+    else:
+        pipe.enable_sequential_cpu_offload()
+    print(f"🧠 메모리 계획: {json.dumps(plan.to_dict(), ensure_ascii=False)}")
+    return pipe
+
+
+def apply_vae_settings(pipe, plan, width, height, batch_size=1):
+    """배치 해상도에 맞게 VAE slicing/tiling 켜고 끄기"""
+    slicing, tiling = plan.vae_settings(width, height, batch_size)
+    if slicing:
+        pipe.vae.enable_slicing()
+    else:
+        pipe.vae.disable_slicing()
+    if tiling:
+        pipe.vae.enable_tiling()
+    else:
+        pipe.vae.disable_tiling()
+    return {"vae_slicing": slicing, "vae_tiling": tiling}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="메모리 계획 시뮬레이션 (CPU)")
+    parser.add_argument("--model", choices=sorted(KNOWN_PARAMETERS), default="flux")
+    parser.add_argument("--budget-gb", type=float, nargs="+", default=[12, 16, 24, 40, 80])
+    parser.add_argument("--width", type=int, default=1024)
+    parser.add_argument("--height", type=int, default=1024)
+    parser.add_argument("--batch-size", type=int, default=1)
+    args = parser.parse_args()
+
+    footprints = known_footprints(args.model)
+    for budget_gb in args.budget_gb:
+        plan = plan_memory(args.model, footprints, int(budget_gb * GB),
+                           max_pixels=args.width * args.height, batch_size=args.batch_size)
+        slicing, tiling = plan.vae_settings(args.width, args.height, args.batch_size)
+        max_batch = plan.max_batch_size(args.width, args.height)
+        print(f"{budget_gb:>6.1f}GB -> {plan.strategy:<10} slicing={slicing!s:<5} tiling={tiling!s:<5} "
+              f"max_batch={max_batch:<3} ({plan.reason})")
+
+
+if __name__ == "__main__":
+    main()
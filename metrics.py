@@ -0,0 +1,305 @@
+"""
+작업별 단계 시간 측정과 메트릭 내보내기
+
+- JobMetrics: 작업 하나의 단계별 벽시계 시간 (parse, text_encode, denoise, vae_decode,
+  upscale, encode, package 등)과 최대 메모리를 기록해 응답의 metrics 키로 반환
+  (GPU 최대 메모리는 배치 단위, 호스트 RSS는 동시 작업과 공유하는 프로세스 전체 최댓값)
+- StepTimer: callback_on_step_end로 디노이징 스텝별 시간을 기록
+  (마지막 스텝 이후 pipe() 반환까지는 VAE 디코딩 시간으로 계산)
+- MetricsRegistry: 작업 메트릭을 히스토그램으로 모아 METRICS_FILE에 Prometheus
+  텍스트 또는 JSON으로 주기적으로 기록 (사이드카가 스크랩, 파일 기록은 전용 스레드에서)
+
+기록은 perf_counter 호출과 딕셔너리 갱신뿐이라 운영 환경에서 항상 켜 둡니다.
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+# 메트릭 설정 (환경 변수로 변경 가능)
+METRICS_FILE = os.environ.get("METRICS_FILE", "")
+METRICS_FORMAT = os.environ.get("METRICS_FORMAT", "")
+METRICS_FLUSH_SECONDS = float(os.environ.get("METRICS_FLUSH_SECONDS", "10"))
+METRICS_NAMESPACE = os.environ.get("METRICS_NAMESPACE", "flux_worker")
+
+# 단계 시간 히스토그램 버킷 (초)
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def read_peak_rss_mb():
+    """현재 프로세스 최대 RSS (MB) - /proc의 VmHWM, 없으면 ru_maxrss"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+
+    # Linux에서 ru_maxrss 단위는 KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def reset_peak_rss():
+    """최대 RSS 초기화 (Linux만 지원, 실패하면 프로세스 전체 최대값으로 측정)"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _cuda():
+    try:
+        import torch
+    except ImportError:
+        return None
+    return torch.cuda if torch.cuda.is_available() else None
+
+
+def reset_peak_memory():
+    """GPU 최대 메모리 측정 시작 (GPU 스레드에서 배치 시작 시 호출)
+
+    호스트 RSS는 초기화하지 않습니다. clear_refs는 프로세스 전체에 적용되어
+    동시에 도는 배치/인코딩의 측정까지 지우기 때문입니다.
+    """
+    cuda = _cuda()
+    if cuda is not None:
+        cuda.reset_peak_memory_stats()
+
+
+def peak_memory():
+    """GPU는 마지막 reset_peak_memory 이후 최대값, 호스트는 프로세스 전체 최대 RSS (MB)"""
+    cuda = _cuda()
+    return {
+        "gpu_peak_mb": round(cuda.max_memory_allocated() / 1024 ** 2, 1) if cuda is not None else None,
+        "process_peak_rss_mb": round(read_peak_rss_mb(), 1),
+    }
+
+
+class JobMetrics:
+    """작업 하나의 단계별 시간과 메모리 기록"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.extra = {}
+        self.observed = False
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def add(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def merge(self, other):
+        """배치 단위 메트릭(JobMetrics)을 작업 메트릭에 합침"""
+        for name, seconds in other.stages.items():
+            self.add(name, seconds)
+        self.extra.update(other.extra)
+
+    def to_dict(self):
+        return {
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 2),
+            "stages_ms": {name: round(seconds * 1000, 2) for name, seconds in self.stages.items()},
+            **self.extra,
+        }
+
+    def finish(self, model, status="ok", registry=None):
+        """응답용 dict를 만들고 레지스트리에 한 번만 집계 (집계 실패는 작업에 영향 없음)"""
+        result = self.to_dict()
+        if not self.observed:
+            self.observed = True
+            try:
+                (registry or default_registry).observe(model, result, status)
+            except Exception as e:
+                print(f"⚠️ 메트릭 집계 실패: {e}")
+        return result
+
+
+class StepTimer:
+    """디노이징 스텝 시간을 기록하는 callback_on_step_end (다른 콜백을 감쌀 수 있음)
+
+    Args:
+        inner: 함께 호출할 콜백 (예: streaming.StepProgress)
+    """
+
+    def __init__(self, inner=None):
+        self.inner = inner
+        self.tensor_inputs = inner.tensor_inputs if inner is not None else ["latents"]
+        self.marks = []
+
+    def __call__(self, pipeline, step, timestep, callback_kwargs):
+        self.marks.append(time.perf_counter())
+        if self.inner is not None:
+            return self.inner(pipeline, step, timestep, callback_kwargs)
+        return callback_kwargs
+
+    def record(self, metrics, pipe_started, pipe_finished):
+        """pipe() 시작/종료 시각으로 denoise / vae_decode / 스텝별 시간 기록
+
+        denoise에는 첫 스텝 전 준비(잠재 변수/타임스텝 생성)가 포함됩니다.
+        """
+        if not self.marks:
+            metrics.add("denoise", pipe_finished - pipe_started)
+            return
+        metrics.add("denoise", self.marks[-1] - pipe_started)
+        metrics.add("vae_decode", pipe_finished - self.marks[-1])
+        previous = pipe_started
+        steps = []
+        for mark in self.marks:
+            steps.append(round((mark - previous) * 1000, 2))
+            previous = mark
+        metrics.extra["steps_ms"] = steps
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}"
+
+
+class MetricsRegistry:
+    """작업 메트릭을 모아 파일로 내보내는 레지스트리
+
+    Args:
+        path: 기록할 파일 (비어 있으면 메모리에만 집계)
+        fmt: "prometheus" 또는 "json" (비어 있으면 확장자가 .json일 때 JSON)
+        flush_seconds: 파일 기록 최소 간격 (초)
+    """
+
+    def __init__(self, path=METRICS_FILE, fmt=METRICS_FORMAT, flush_seconds=METRICS_FLUSH_SECONDS,
+                 namespace=METRICS_NAMESPACE):
+        self.path = path
+        self.fmt = fmt or ("json" if path.endswith(".json") else "prometheus")
+        self.flush_seconds = flush_seconds
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flusher = None
+        self._jobs = {}
+        self._stages = {}
+        self._memory = {}
+        self._last_flush = 0.0
+
+    def observe(self, model, job_metrics, status="ok"):
+        with self._lock:
+            self._jobs[(model, status)] = self._jobs.get((model, status), 0) + 1
+
+            stages = dict(job_metrics["stages_ms"])
+            stages["total"] = job_metrics["total_ms"]
+            for stage, ms in stages.items():
+                seconds = ms / 1000
+                hist = self._stages.setdefault((model, stage), {
+                    "buckets": [0] * len(STAGE_BUCKETS), "sum": 0.0, "count": 0
+                })
+                for i, bound in enumerate(STAGE_BUCKETS):
+                    if seconds <= bound:
+                        hist["buckets"][i] += 1
+                hist["sum"] += seconds
+                hist["count"] += 1
+
+            for kind, field in (("gpu", "gpu_peak_mb"), ("host", "process_peak_rss_mb")):
+                value = job_metrics.get(field)
+                if value is not None:
+                    key = (model, kind)
+                    self._memory[key] = max(self._memory.get(key, 0.0), value * 1024 ** 2)
+
+        # 파일 기록은 전용 스레드에서 (이벤트 루프/인코딩 스레드를 막지 않게)
+        if self._due():
+            if self._flusher is None:
+                self._flusher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="metrics")
+            self._flusher.submit(self.flush)
+
+    def _due(self):
+        return bool(self.path) and time.monotonic() - self._last_flush >= self.flush_seconds
+
+    def to_json(self):
+        with self._lock:
+            return {
+                "jobs": [{"model": m, "status": s, "count": c} for (m, s), c in self._jobs.items()],
+                "stages": [
+                    {"model": m, "stage": stage, "count": h["count"], "sum_s": round(h["sum"], 4),
+                     "buckets": dict(zip(map(str, STAGE_BUCKETS), h["buckets"]))}
+                    for (m, stage), h in self._stages.items()
+                ],
+                "peak_memory_bytes": [
+                    {"model": m, "kind": kind, "value": int(v)} for (m, kind), v in self._memory.items()
+                ],
+            }
+
+    def render_prometheus(self):
+        ns = self.namespace
+        lines = [
+            f"# HELP {ns}_jobs_total Completed jobs by status",
+            f"# TYPE {ns}_jobs_total counter",
+        ]
+        with self._lock:
+            for (model, status), count in sorted(self._jobs.items()):
+                lines.append(f"{ns}_jobs_total{_labels(model=model, status=status)} {count}")
+
+            lines += [
+                f"# HELP {ns}_stage_seconds Wall time per job stage",
+                f"# TYPE {ns}_stage_seconds histogram",
+            ]
+            for (model, stage), hist in sorted(self._stages.items()):
+                for bound, count in zip(STAGE_BUCKETS, hist["buckets"]):
+                    labels = _labels(model=model, stage=stage, le=bound)
+                    lines.append(f"{ns}_stage_seconds_bucket{labels} {count}")
+                labels = _labels(model=model, stage=stage, le="+Inf")
+                lines.append(f"{ns}_stage_seconds_bucket{labels} {hist['count']}")
+                labels = _labels(model=model, stage=stage)
+                lines.append(f"{ns}_stage_seconds_sum{labels} {hist['sum']:.6f}")
+                lines.append(f"{ns}_stage_seconds_count{labels} {hist['count']}")
+
+            lines += [
+                f"# HELP {ns}_peak_memory_bytes Highest peak memory observed (gpu: per batch, host: process RSS)",
+                f"# TYPE {ns}_peak_memory_bytes gauge",
+            ]
+            for (model, kind), value in sorted(self._memory.items()):
+                lines.append(f"{ns}_peak_memory_bytes{_labels(model=model, kind=kind)} {int(value)}")
+        return "\n".join(lines) + "\n"
+
+    def flush(self, force=False):
+        """flush_seconds마다 파일에 원자적으로 기록 (호출마다 고유한 임시 파일 + os.replace)
+
+        간격 확인과 기록을 같은 잠금 안에서 해 여러 스레드가 동시에 쓰지 않게 합니다.
+        """
+        if not self.path:
+            return
+        with self._flush_lock:
+            now = time.monotonic()
+            if not force and now - self._last_flush < self.flush_seconds:
+                return
+            self._last_flush = now
+
+            if self.fmt == "json":
+                content = json.dumps(self.to_json(), indent=2)
+            else:
+                content = self.render_prometheus()
+
+            directory = os.path.dirname(self.path) or "."
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(
+                dir=directory, prefix=os.path.basename(self.path) + ".", suffix=".tmp"
+            )
+            try:
+                with os.fdopen(fd, "w") as f:
+                    f.write(content)
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+
+
+# 프로세스 전체에서 공유하는 레지스트리
+default_registry = MetricsRegistry()
@@ -0,0 +1,388 @@
+"""
+모델 프로비저닝 (선택 다운로드 / 검증 / 이어받기 / 워커 간 잠금)
+
+- 변형별 매니페스트(allow 패턴)로 실제로 로드하는 파일만 받음
+- 파일마다 크기와 SHA-256을 확인한 뒤 완료 마커(.provision.json)를 기록
+  (마커가 없거나 파일이 맞지 않으면 미완료로 간주해 다시 확인)
+- <파일>.partial에 이어 쓰고 HTTP Range로 중단된 지점부터 재개
+- 여러 파일을 병렬로 다운로드
+- 네트워크 볼륨을 공유하는 여러 워커 중 하나만 다운로드하고 나머지는 잠금에서 대기
+
+허브는 HuggingFaceHub 또는 로컬 디렉토리(LocalHub, 테스트/오프라인용)를 사용합니다.
+"""
+
+import fcntl
+import fnmatch
+import hashlib
+import json
+import os
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+# 프로비저닝 설정 (환경 변수로 변경 가능)
+PROVISION_WORKERS = int(os.environ.get("PROVISION_WORKERS", "4"))
+PROVISION_LOCK_TIMEOUT = float(os.environ.get("PROVISION_LOCK_TIMEOUT", "7200"))
+# 완료 마커가 있을 때 확인 수준: size(크기만) 또는 full(해시까지 다시 계산)
+PROVISION_VERIFY = os.environ.get("PROVISION_VERIFY", "size")
+# 로컬 허브 디렉토리 (설정하면 Hugging Face 대신 <dir>/<repo_id>/에서 복사)
+HUB_LOCAL_DIR = os.environ.get("HUB_LOCAL_DIR", "")
+
+MARKER_FILE = ".provision.json"
+CHUNK_SIZE = 8 * 1024 * 1024
+
+# 변형별 매니페스트 (diffusers 형식 중 파이프라인이 실제로 읽는 파일만)
+MANIFESTS = {
+    "flux-dev": {
+        "repo_id": "black-forest-labs/FLUX.1-dev",
+        "allow_patterns": [
+            "model_index.json",
+            "scheduler/*",
+            "text_encoder/*",
+            "text_encoder_2/*",
+            "tokenizer/*",
+            "tokenizer_2/*",
+            "transformer/*",
+            "vae/*",
+        ],
+    },
+    "flux-schnell": {
+        "repo_id": "black-forest-labs/FLUX.1-schnell",
+        "allow_patterns": [
+            "model_index.json",
+            "scheduler/*",
+            "text_encoder/*",
+            "text_encoder_2/*",
+            "tokenizer/*",
+            "tokenizer_2/*",
+            "transformer/*",
+            "vae/*",
+        ],
+    },
+    "sd3-medium": {
+        "repo_id": "stabilityai/stable-diffusion-3-medium-diffusers",
+        "allow_patterns": [
+            "model_index.json",
+            "scheduler/*",
+            "text_encoder/*",
+            "text_encoder_2/*",
+            "text_encoder_3/*",
+            "tokenizer/*",
+            "tokenizer_2/*",
+            "tokenizer_3/*",
+            "transformer/*",
+            "vae/*",
+        ],
+    },
+}
+
+
+class RemoteFile:
+    """허브의 파일 하나 (sha256은 허브가 알려주지 않으면 None)"""
+
+    def __init__(self, path, size, sha256=None):
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+
+
+class LocalHub:
+    """<root>/<repo_id>/ 디렉토리를 허브처럼 사용 (테스트/오프라인 미러)"""
+
+    def __init__(self, root):
+        self.root = root
+
+    def _repo_dir(self, repo_id):
+        return os.path.join(self.root, repo_id)
+
+    def list_files(self, repo_id, revision=None, token=None):
+        repo_dir = self._repo_dir(repo_id)
+        if not os.path.isdir(repo_dir):
+            raise FileNotFoundError(f"로컬 허브에 저장소가 없습니다: {repo_dir}")
+        files = []
+        for directory, _, names in os.walk(repo_dir):
+            for name in names:
+                full = os.path.join(directory, name)
+                rel = os.path.relpath(full, repo_dir).replace(os.sep, "/")
+                files.append(RemoteFile(rel, os.path.getsize(full), file_sha256(full)))
+        return files
+
+    def open(self, repo_id, path, offset=0, revision=None, token=None):
+        f = open(os.path.join(self._repo_dir(repo_id), path), "rb")
+        f.seek(offset)
+        return f
+
+
+class _HTTPStream:
+    """urllib 응답을 read(n)/close()로 감싼 스트림"""
+
+    def __init__(self, response):
+        self.response = response
+
+    def read(self, size):
+        return self.response.read(size)
+
+    def close(self):
+        self.response.close()
+
+
+class HuggingFaceHub:
+    """Hugging Face Hub (파일 목록은 API, 내용은 Range 요청으로 이어받기)"""
+
+    def list_files(self, repo_id, revision=None, token=None):
+        from huggingface_hub import HfApi
+
+        info = HfApi().model_info(repo_id, revision=revision, files_metadata=True, token=token)
+        files = []
+        for sibling in info.siblings:
+            sha256 = sibling.lfs.sha256 if sibling.lfs else None
+            files.append(RemoteFile(sibling.rfilename, sibling.size, sha256))
+        return files
+
+    def open(self, repo_id, path, offset=0, revision=None, token=None):
+        from huggingface_hub import hf_hub_url
+
+        request = urllib.request.Request(hf_hub_url(repo_id, path, revision=revision))
+        if token:
+            # CDN으로 리다이렉트될 때 토큰이 전달되지 않도록 unredirected 헤더 사용
+            request.add_unredirected_header("Authorization", f"Bearer {token}")
+        if offset:
+            request.add_header("Range", f"bytes={offset}-")
+        response = urllib.request.urlopen(request, timeout=60)
+        if offset and response.status != 206:
+            response.close()
+            raise IOError(f"서버가 이어받기(Range)를 지원하지 않습니다: {path}")
+        return _HTTPStream(response)
+
+
+def default_hub():
+    return LocalHub(HUB_LOCAL_DIR) if HUB_LOCAL_DIR else HuggingFaceHub()
+
+
+def file_sha256(path, limit=None):
+    """파일(또는 앞쪽 limit 바이트)의 SHA-256 (hex)"""
+    return _hash_prefix(path, limit).hexdigest()
+
+
+def _hash_prefix(path, limit=None):
+    digest = hashlib.sha256()
+    remaining = limit
+    with open(path, "rb") as f:
+        while remaining is None or remaining > 0:
+            chunk = f.read(CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            digest.update(chunk)
+            if remaining is not None:
+                remaining -= len(chunk)
+    return digest
+
+
+def select_files(files, allow_patterns):
+    """allow 패턴(fnmatch)에 맞는 파일만 선택"""
+    return [f for f in files if any(fnmatch.fnmatch(f.path, p) for p in allow_patterns)]
+
+
+class FileLock:
+    """fcntl.flock 기반 프로세스 간 잠금 (같은 볼륨을 공유하는 워커 간)"""
+
+    def __init__(self, path, timeout=PROVISION_LOCK_TIMEOUT, poll=1.0, message="다른 워커가 모델을 준비 중입니다"):
+        self.path = path
+        self.timeout = timeout
+        self.poll = poll
+        self.message = message
+        self._fd = None
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        deadline = time.monotonic() + self.timeout
+        announced = False
+        while True:
+            try:
+                fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return self
+            except BlockingIOError:
+                if not announced:
+                    print(f"⏳ {self.message}. 대기: {self.path}")
+                    announced = True
+                if time.monotonic() > deadline:
+                    os.close(self._fd)
+                    raise TimeoutError(f"잠금 대기 시간 초과: {self.path}")
+                time.sleep(self.poll)
+
+    def __exit__(self, *exc):
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+        os.close(self._fd)
+        self._fd = None
+
+
+def read_marker(dest):
+    try:
+        with open(os.path.join(dest, MARKER_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_marker(dest, marker):
+    path = os.path.join(dest, MARKER_FILE)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(marker, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def is_complete(dest, variant, verify=PROVISION_VERIFY):
+    """완료 마커가 현재 매니페스트와 맞고 모든 파일이 제자리에 있는지"""
+    marker = read_marker(dest)
+    manifest = MANIFESTS[variant]
+    if not marker or marker.get("variant") != variant:
+        return False
+    if marker.get("allow_patterns") != manifest["allow_patterns"]:
+        return False
+    for path, meta in marker["files"].items():
+        full = os.path.join(dest, path)
+        if not os.path.isfile(full) or os.path.getsize(full) != meta["size"]:
+            return False
+        if verify == "full" and meta.get("sha256") and file_sha256(full) != meta["sha256"]:
+            return False
+    return True
+
+
+def _verify(path, remote, digest=None):
+    """크기와 (알려진 경우) SHA-256 확인, 맞으면 sha256 반환"""
+    if os.path.getsize(path) != remote.size:
+        return None
+    sha256 = digest.hexdigest() if digest is not None else file_sha256(path)
+    if remote.sha256 and sha256 != remote.sha256:
+        return None
+    return sha256
+
+
+def fetch_file(hub, repo_id, remote, dest, revision=None, token=None):
+    """파일 하나를 받아 검증 후 제자리로 이동 (partial이 있으면 이어받기)
+
+    Returns:
+        (sha256, 새로 받은 바이트 수)
+    """
+    final_path = os.path.join(dest, remote.path)
+    os.makedirs(os.path.dirname(final_path), exist_ok=True)
+
+    # 이미 받은 파일 (마커 이전 다운로드 포함)
+    if os.path.isfile(final_path):
+        sha256 = _verify(final_path, remote)
+        if sha256 is not None:
+            return sha256, 0
+        os.remove(final_path)
+
+    partial_path = final_path + ".partial"
+    received = 0
+    # 손상된 partial(이어받기 포함)은 지우고 처음부터 한 번 더 받은 뒤에야 실패로 처리
+    for attempt in range(2):
+        digest, count = _download_partial(hub, repo_id, remote, partial_path, revision, token)
+        received += count
+        sha256 = _verify(partial_path, remote, digest)
+        if sha256 is not None:
+            os.replace(partial_path, final_path)
+            return sha256, received
+        os.remove(partial_path)
+        if attempt == 0:
+            print(f"⚠️ 파일 검증 실패, 처음부터 다시 받습니다: {remote.path}")
+    raise IOError(f"파일 검증 실패 (크기/해시 불일치): {remote.path}")
+
+
+def _download_partial(hub, repo_id, remote, partial_path, revision=None, token=None):
+    """partial 파일을 끝까지 이어 받고 (전체 해시 객체, 새로 받은 바이트 수) 반환"""
+    offset = os.path.getsize(partial_path) if os.path.exists(partial_path) else 0
+    if offset > remote.size:
+        os.remove(partial_path)
+        offset = 0
+
+    # 이어받을 부분까지의 해시를 먼저 계산하고 이어서 갱신
+    digest = _hash_prefix(partial_path, offset) if offset else hashlib.sha256()
+    received = 0
+    if offset < remote.size:
+        stream = hub.open(repo_id, remote.path, offset=offset, revision=revision, token=token)
+        try:
+            with open(partial_path, "ab") as f:
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    digest.update(chunk)
+                    received += len(chunk)
+        finally:
+            stream.close()
+    return digest, received
+
+
+def provision(variant, dest, hub=None, token=None, revision=None, workers=PROVISION_WORKERS):
+    """변형의 파일을 dest에 준비 (완료되어 있으면 바로 반환)
+
+    Returns:
+        {"variant", "files", "downloaded_files", "downloaded_bytes", "elapsed_s", "skipped"}
+    """
+    if variant not in MANIFESTS:
+        raise ValueError(f"알 수 없는 모델 변형: {variant} ({', '.join(MANIFESTS)})")
+    manifest = MANIFESTS[variant]
+    started = time.perf_counter()
+
+    if is_complete(dest, variant):
+        return {"variant": variant, "skipped": True, "elapsed_s": 0.0}
+
+    # 한 워커만 다운로드하고 나머지는 잠금에서 기다렸다가 완료 여부만 확인
+    with FileLock(dest.rstrip("/") + ".lock"):
+        if is_complete(dest, variant):
+            return {"variant": variant, "skipped": True,
+                    "elapsed_s": round(time.perf_counter() - started, 2)}
+
+        hub = hub or default_hub()
+        files = select_files(hub.list_files(manifest["repo_id"], revision, token),
+                             manifest["allow_patterns"])
+        if not files:
+            raise RuntimeError(f"매니페스트에 맞는 파일이 없습니다: {manifest['repo_id']}")
+
+        # 마커가 없으면 (다시) 검증하는 동안 불완전 상태로 보이도록 기존 마커 제거
+        marker_path = os.path.join(dest, MARKER_FILE)
+        if os.path.exists(marker_path):
+            os.remove(marker_path)
+
+        total = sum(f.size for f in files)
+        print(f"📥 {manifest['repo_id']}: {len(files)}개 파일, {total / 1024 ** 3:.1f}GB 확인/다운로드")
+
+        def fetch(remote):
+            return remote, fetch_file(hub, manifest["repo_id"], remote, dest, revision, token)
+
+        results = {}
+        downloaded = 0
+        downloaded_files = 0
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            for remote, (sha256, received) in executor.map(fetch, files):
+                results[remote.path] = {"size": remote.size, "sha256": sha256}
+                downloaded += received
+                if received:
+                    downloaded_files += 1
+                    print(f"   ✅ {remote.path} ({received / 1024 ** 2:.1f}MB)")
+
+        _write_marker(dest, {
+            "variant": variant,
+            "repo_id": manifest["repo_id"],
+            "revision": revision,
+            "allow_patterns": manifest["allow_patterns"],
+            "files": results,
+            "completed_at": time.time(),
+        })
+
+    elapsed = time.perf_counter() - started
+    print(f"✅ 모델 준비 완료: {downloaded_files}개 파일 {downloaded / 1024 ** 3:.2f}GB, {elapsed:.1f}초")
+    return {
+        "variant": variant,
+        "skipped": False,
+        "files": len(results),
+        "downloaded_files": downloaded_files,
+        "downloaded_bytes": downloaded,
+        "elapsed_s": round(elapsed, 2),
+    }
+
@@ -0,0 +1,146 @@
+"""
+프롬프트 임베딩 캐시
+
+(모델, 프롬프트, max_sequence_length) 키로 CLIP/T5 인코딩 결과를 저장해
+같은 프롬프트 템플릿을 반복할 때 텍스트 인코더 실행을 건너뜁니다.
+메모리 계층은 바이트 크기 기준 LRU로 제거하고, 선택적으로 safetensors
+디스크 계층을 두어 워커 재시작 후에도 재사용합니다.
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from safetensors.torch import load_file, save_file
+
+# 캐시 설정 (환경 변수로 변경 가능)
+PROMPT_CACHE_MAX_MB = float(os.environ.get("PROMPT_CACHE_MAX_MB", "512"))
+PROMPT_CACHE_DISK = os.environ.get("PROMPT_CACHE_DISK", "1") == "1"
+
+
+def _tensor_bytes(tensor):
+    return tensor.element_size() * tensor.nelement()
+
+
+class PromptEmbeddingCache:
+    """메모리 크기 제한 LRU + 선택적 디스크 계층 프롬프트 임베딩 캐시
+
+    Args:
+        encode_fn: (prompt, max_sequence_length) -> (prompt_embeds, pooled_prompt_embeds)
+        model_id: 캐시 키에 포함할 모델 식별자
+        max_bytes: 메모리 계층 최대 크기 (바이트)
+        disk_dir: safetensors 파일을 저장할 디렉토리 (None이면 디스크 계층 사용 안 함)
+        device: 디스크에서 읽은 텐서를 옮길 디바이스
+    """
+
+    def __init__(self, encode_fn, model_id, max_bytes=PROMPT_CACHE_MAX_MB * 1024 * 1024,
+                 disk_dir=None, device=None):
+        self.encode_fn = encode_fn
+        self.device = device
+        self.model_id = model_id
+        self.max_bytes = int(max_bytes)
+        self.disk_dir = disk_dir
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _key(self, prompt, max_sequence_length, namespace):
+        raw = f"{self.model_id}\0{namespace}\0{max_sequence_length}\0{prompt}".encode("utf-8")
+        return hashlib.sha256(raw).hexdigest()
+
+    def get(self, prompt, max_sequence_length=512, namespace=""):
+        """프롬프트 임베딩 반환 (캐시에 없으면 인코딩 후 저장)
+
+        namespace는 텍스트 인코더를 바꾸는 요소(예: 텍스트 인코더 LoRA)를 구분할 때 사용
+        """
+        key = self._key(prompt, max_sequence_length, namespace)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+
+        entry = self._load_from_disk(key)
+        if entry is not None:
+            with self._lock:
+                self.disk_hits += 1
+        else:
+            entry = self.encode_fn(prompt, max_sequence_length)
+            with self._lock:
+                self.misses += 1
+            self._save_to_disk(key, entry)
+
+        self._put(key, entry)
+        return entry
+
+    def _put(self, key, entry):
+        size = sum(_tensor_bytes(t) for t in entry)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = entry
+            self._bytes += size
+
+            # 가장 오래 사용하지 않은 항목부터 제거
+            while self._bytes > self.max_bytes:
+                _, old = self._entries.popitem(last=False)
+                self._bytes -= sum(_tensor_bytes(t) for t in old)
+                self.evictions += 1
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.safetensors")
+
+    def _load_from_disk(self, key):
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            tensors = load_file(path, device=str(self.device) if self.device else "cpu")
+            return tensors["prompt_embeds"], tensors["pooled_prompt_embeds"]
+        except Exception as e:
+            print(f"⚠️ 프롬프트 캐시 파일 손상, 무시: {e}")
+            return None
+
+    def _save_to_disk(self, key, entry):
+        if not self.disk_dir:
+            return
+        prompt_embeds, pooled_prompt_embeds = entry
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            save_file({
+                "prompt_embeds": prompt_embeds.detach().contiguous().cpu(),
+                "pooled_prompt_embeds": pooled_prompt_embeds.detach().contiguous().cpu(),
+            }, tmp_path)
+            # 다른 워커가 반쯤 쓴 파일을 읽지 않도록 원자적으로 교체
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"⚠️ 프롬프트 캐시 저장 실패: {e}")
+
+    def stats(self):
+        """캐시 통계"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
@@ -0,0 +1,285 @@
+"""
+FLUX 트랜스포머 / T5 인코더 가중치 전용(weight-only) 양자화
+
+- int8: 출력 채널별 absmax 스케일, 범위 [-127, 127]
+- fp8: float8_e4m3fn + 출력 채널별 스케일 (torch에 float8 dtype이 있을 때)
+
+nn.Linear만 양자화하고 나머지(정규화, 임베딩 등)는 계산 dtype으로 둡니다.
+forward에서는 레이어 단위로 가중치를 계산 dtype으로 복원해 곱합니다.
+
+양자화 결과는 볼륨에 safetensors 한 파일로 한 번만 저장하고, 이후에는 meta 디바이스에
+뼈대만 만든 뒤 메모리 매핑된 텐서를 그대로 붙여(assign) 로드하므로 float16 중간 사본이
+생기지 않습니다. CPU에서도 양자화/로드가 가능합니다.
+"""
+
+import hashlib
+import json
+import os
+import time
+
+import torch
+from torch import nn
+from safetensors import safe_open
+from safetensors.torch import save_file
+
+from model_provision import FileLock
+
+# 양자화 설정 (환경 변수로 변경 가능)
+QUANT_MODE = os.environ.get("QUANT_MODE", "none")
+QUANT_COMPONENTS = [
+    name.strip() for name in os.environ.get("QUANT_COMPONENTS", "transformer,text_encoder_2").split(",")
+    if name.strip()
+]
+# 이보다 작은 Linear는 양자화하지 않음 (오차 대비 절약이 작음)
+QUANT_MIN_FEATURES = int(os.environ.get("QUANT_MIN_FEATURES", "256"))
+
+QUANT_MODES = ("none", "int8", "fp8")
+FORMAT_VERSION = "1"
+INT8_MAX = 127.0
+FP8_MAX = 448.0
+
+
+def fp8_supported():
+    return hasattr(torch, "float8_e4m3fn")
+
+
+def check_mode(mode):
+    if mode not in QUANT_MODES:
+        raise ValueError(f"지원하지 않는 QUANT_MODE: {mode} ({', '.join(QUANT_MODES)})")
+    if mode == "fp8" and not fp8_supported():
+        raise ValueError("이 torch 버전은 float8_e4m3fn을 지원하지 않습니다 (int8을 사용하세요)")
+    return mode
+
+
+class QuantizedLinear(nn.Module):
+    """가중치 전용 양자화 Linear
+
+    fp8 가중치는 uint8로 보관합니다 (module.to(dtype) 같은 부동소수점 캐스팅에
+    바뀌지 않도록). int8은 정수 dtype이라 그대로 둡니다.
+    """
+
+    def __init__(self, in_features, out_features, bias, mode, compute_dtype, device=None):
+        super().__init__()
+        self.in_features = in_features
+        self.out_features = out_features
+        self.mode = mode
+        self.compute_dtype = compute_dtype
+        storage = torch.int8 if mode == "int8" else torch.uint8
+        self.register_buffer("qweight", torch.empty(out_features, in_features, dtype=storage, device=device))
+        self.register_buffer("scale", torch.empty(out_features, 1, dtype=compute_dtype, device=device))
+        if bias:
+            self.bias = nn.Parameter(torch.empty(out_features, dtype=compute_dtype, device=device),
+                                     requires_grad=False)
+        else:
+            self.register_parameter("bias", None)
+
+    @classmethod
+    def from_linear(cls, linear, mode, compute_dtype):
+        module = cls(linear.in_features, linear.out_features, linear.bias is not None,
+                     mode, compute_dtype, device=linear.weight.device)
+        weight = linear.weight.detach().float()
+        absmax = weight.abs().amax(dim=1, keepdim=True).clamp(min=1e-8)
+        if mode == "int8":
+            scale = absmax / INT8_MAX
+            qweight = torch.round(weight / scale).clamp(-INT8_MAX, INT8_MAX).to(torch.int8)
+        else:
+            scale = absmax / FP8_MAX
+            qweight = (weight / scale).to(torch.float8_e4m3fn).view(torch.uint8)
+        module.qweight.copy_(qweight)
+        module.scale.copy_(scale.to(compute_dtype))
+        if linear.bias is not None:
+            module.bias.data.copy_(linear.bias.detach().to(compute_dtype))
+        return module
+
+    @property
+    def weight(self):
+        # 일부 모델 코드(T5 등)는 weight.dtype으로 입력 dtype을 맞추므로 계산 dtype 텐서를 노출
+        # 실제 가중치가 아니므로 LoRA처럼 weight 값을 쓰는 코드와는 함께 쓸 수 없음 (handler에서 거절)
+        return self.scale
+
+    def dequantize(self, dtype):
+        if self.mode == "int8":
+            weight = self.qweight.to(dtype)
+        else:
+            weight = self.qweight.view(torch.float8_e4m3fn).to(dtype)
+        return weight * self.scale.to(dtype)
+
+    def forward(self, x):
+        bias = self.bias.to(x.dtype) if self.bias is not None else None
+        return nn.functional.linear(x, self.dequantize(x.dtype), bias)
+
+    def extra_repr(self):
+        return f"in_features={self.in_features}, out_features={self.out_features}, mode={self.mode}"
+
+
+def _quantizable(module):
+    return (isinstance(module, nn.Linear)
+            and min(module.in_features, module.out_features) >= QUANT_MIN_FEATURES)
+
+
+def _keeps_fp32(module, name):
+    """transformers의 _keep_in_fp32_modules에 속하는지 (T5의 wo 등, fp16 오버플로 방지)"""
+    keep = getattr(module, "_keep_in_fp32_modules", None) or []
+    parts = name.split(".")
+    return any(k in parts for k in keep)
+
+
+def quantize_module(module, mode, compute_dtype=torch.float16):
+    """모듈의 Linear를 레이어 단위로 양자화 (원본 가중치는 교체 즉시 해제)
+
+    양자화하지 않은 나머지 텐서는 compute_dtype으로 바꾸고, _keep_in_fp32_modules에
+    속한 레이어는 float32로 계산합니다.
+    """
+    check_mode(mode)
+    layers = {}
+    for name, child in list(module.named_modules()):
+        for child_name, grandchild in list(child.named_children()):
+            if not _quantizable(grandchild):
+                continue
+            full_name = f"{name}.{child_name}" if name else child_name
+            dtype = torch.float32 if _keeps_fp32(module, full_name) else compute_dtype
+            setattr(child, child_name, QuantizedLinear.from_linear(grandchild, mode, dtype))
+            layers[full_name] = str(dtype).replace("torch.", "")
+
+    for name, tensor in list(module.named_parameters()) + list(module.named_buffers()):
+        if tensor.is_floating_point():
+            dtype = torch.float32 if _keeps_fp32(module, name) else compute_dtype
+            tensor.data = tensor.data.to(dtype)
+    module.quantized_layers = layers
+    return module
+
+
+def save_quantized(module, path, mode, compute_dtype, source=""):
+    """양자화된 모듈을 safetensors 한 파일로 저장 (임시 파일 + os.replace)"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # 묶인 가중치(T5의 shared/embed_tokens 등)는 한 번만 저장하고 별칭으로 기록
+    state, aliases, seen = {}, {}, {}
+    for key, tensor in module.state_dict().items():
+        ptr = (tensor.data_ptr(), tensor.dtype, tuple(tensor.shape))
+        if ptr in seen:
+            aliases[key] = seen[ptr]
+            continue
+        seen[ptr] = key
+        state[key] = tensor.contiguous()
+    metadata = {
+        "format_version": FORMAT_VERSION,
+        "quant_mode": mode,
+        "compute_dtype": str(compute_dtype).replace("torch.", ""),
+        "quantized_layers": json.dumps(getattr(module, "quantized_layers", {})),
+        "aliases": json.dumps(aliases),
+        "source": source,
+    }
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    save_file(state, tmp_path, metadata=metadata)
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_metadata(path):
+    with safe_open(path, framework="pt") as f:
+        return f.metadata() or {}
+
+
+def load_quantized(build_skeleton, path, device="cpu"):
+    """meta 디바이스 뼈대에 메모리 매핑된 양자화 가중치를 붙여 로드
+
+    Args:
+        build_skeleton: 인자 없이 원본 구조의 모듈을 만드는 함수 (meta 디바이스 안에서 호출)
+        path: save_quantized로 저장한 파일
+        device: 텐서를 올릴 디바이스 ("cpu"면 mmap 그대로 사용)
+    """
+    metadata = read_metadata(path)
+    if metadata.get("format_version") != FORMAT_VERSION:
+        raise ValueError(f"양자화 파일 형식이 다릅니다: {path} ({metadata.get('format_version')})")
+    mode = metadata["quant_mode"]
+    layers = json.loads(metadata["quantized_layers"])
+
+    with torch.device("meta"):
+        module = build_skeleton()
+        named = dict(module.named_modules())
+        for name, dtype in layers.items():
+            parent_name, _, child_name = name.rpartition(".")
+            parent = named[parent_name] if parent_name else module
+            linear = getattr(parent, child_name)
+            setattr(parent, child_name, QuantizedLinear(
+                linear.in_features, linear.out_features, linear.bias is not None, mode,
+                getattr(torch, dtype)
+            ))
+
+    state = {}
+    with safe_open(path, framework="pt", device=str(device)) as f:
+        for key in f.keys():
+            state[key] = f.get_tensor(key)
+    for key, target in json.loads(metadata.get("aliases", "{}")).items():
+        state[key] = state[target]
+    module.load_state_dict(state, strict=True, assign=True)
+    module.quantized_layers = layers
+    return module.eval()
+
+
+def quantized_path(cache_dir, model_id, component, mode, model_revision=None):
+    """볼륨의 양자화 파일 경로 (모델 리비전이 바뀌면 이전 가중치 파일을 다시 쓰지 않도록 파일 이름에 포함)"""
+    safe_id = model_id.replace("/", "--")
+    if model_revision:
+        safe_id += "-" + hashlib.sha256(model_revision.encode()).hexdigest()[:12]
+    return os.path.join(cache_dir, "quantized", f"{safe_id}-{component}-{mode}.safetensors")
+
+
+def load_or_quantize(load_full, build_skeleton, path, mode, compute_dtype=torch.float16,
+                     device="cpu", source=""):
+    """볼륨에 양자화 파일이 없으면 한 번 만들어 저장한 뒤 mmap으로 로드
+
+    Args:
+        load_full: 원본 정밀도 모듈을 로드하는 함수 (최초 1회만 호출)
+        build_skeleton: 원본 구조 모듈을 만드는 함수 (meta 디바이스 안에서 호출)
+    """
+    if not os.path.exists(path):
+        # 같은 볼륨의 워커들이 동시에 양자화하지 않도록 잠그고, 잠금을 얻은 뒤 다시 확인
+        with FileLock(path + ".lock", message="다른 워커가 양자화 파일을 만드는 중입니다"):
+            if not os.path.exists(path):
+                print(f"⚙️ {mode} 양자화 파일 생성 중: {path}")
+                started = time.perf_counter()
+                module = quantize_module(load_full(), mode, compute_dtype)
+                save_quantized(module, path, mode, compute_dtype, source)
+                del module
+                print(f"✅ 양자화 완료 ({time.perf_counter() - started:.1f}초)")
+
+    started = time.perf_counter()
+    module = load_quantized(build_skeleton, path, device)
+    print(f"📦 {mode} 가중치 로드: {os.path.basename(path)} ({time.perf_counter() - started:.2f}초)")
+    return module
+
+
+def load_flux_components(model_path, mode, cache_dir, model_id, components=QUANT_COMPONENTS,
+                         compute_dtype=torch.float16, model_revision=None, **kwargs):
+    """FluxPipeline에 넘길 양자화 구성요소 dict (transformer, text_encoder_2)
+
+    model_revision은 양자화 파일 이름에만 쓰이고 from_pretrained에는 전달하지 않습니다.
+    """
+    from diffusers import FluxTransformer2DModel
+    from transformers import T5Config, T5EncoderModel
+
+    check_mode(mode)
+    loaders = {
+        "transformer": (
+            lambda: FluxTransformer2DModel.from_pretrained(
+                model_path, subfolder="transformer", torch_dtype=compute_dtype, **kwargs),
+            lambda: FluxTransformer2DModel.from_config(
+                FluxTransformer2DModel.load_config(model_path, subfolder="transformer")),
+        ),
+        "text_encoder_2": (
+            lambda: T5EncoderModel.from_pretrained(
+                model_path, subfolder="text_encoder_2", torch_dtype=compute_dtype, **kwargs),
+            lambda: T5EncoderModel(T5Config.from_pretrained(model_path, subfolder="text_encoder_2")),
+        ),
+    }
+
+    loaded = {}
+    for name in components:
+        if name not in loaders:
+            raise ValueError(f"양자화할 수 없는 구성요소: {name} ({', '.join(loaders)})")
+        load_full, build_skeleton = loaders[name]
+        path = quantized_path(cache_dir, model_id, name, mode, model_revision)
+        loaded[name] = load_or_quantize(load_full, build_skeleton, path, mode, compute_dtype,
+                                        source=f"{model_id}/{name}")
+    return loaded
@@ -0,0 +1,93 @@
+"""
+공통 요청 파싱/검증
+
+모든 핸들러(FLUX, SD3, API)가 같은 규칙으로 기본 생성 파라미터를 읽고 검증합니다.
+잘못된 값은 ValueError로 알려주고, 핸들러는 이를 {"error": ...}로 반환합니다.
+"""
+
+import random
+
+# 해상도/스텝 허용 범위
+MIN_SIZE = 256
+MAX_SIZE = 2048
+SIZE_MULTIPLE = 16
+MAX_STEPS = 100
+MAX_SEED = 2**32 - 1
+
+# 백엔드별 기본값
+DEFAULTS = {
+    "flux": {"steps": 28, "guidance_scale": 3.5},
+    "sd3": {"steps": 30, "guidance_scale": 7.0},
+    "api": {"steps": 4, "guidance_scale": 0.0},
+}
+
+
+def _int(job_input, name, default):
+    value = job_input.get(name, default)
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name}은(는) 정수여야 합니다: {value!r}")
+
+
+def _float(job_input, name, default):
+    value = job_input.get(name, default)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name}은(는) 숫자여야 합니다: {value!r}")
+
+
+def _size(job_input, name):
+    value = _int(job_input, name, 1024)
+    if not MIN_SIZE <= value <= MAX_SIZE:
+        raise ValueError(f"{name}은(는) {MIN_SIZE}~{MAX_SIZE} 사이여야 합니다: {value}")
+    # 파이프라인과 같은 방식으로 16의 배수로 내림
+    return value - value % SIZE_MULTIPLE
+
+
+def parse_common(job_input, model="flux", random_seed=True):
+    """공통 생성 파라미터 추출 및 검증
+
+    Args:
+        job_input: RunPod 작업 입력 dict
+        model: 기본값을 고를 백엔드 이름 (flux, sd3, api)
+        random_seed: seed가 -1일 때 무작위 시드를 정할지 여부
+            (False면 -1을 그대로 두어 원격 API가 정하게 함)
+    """
+    if not isinstance(job_input, dict):
+        raise ValueError("input은 객체(dict)여야 합니다")
+    defaults = DEFAULTS[model]
+
+    prompt = job_input.get("prompt", "beautiful landscape")
+    if not isinstance(prompt, str) or not prompt.strip():
+        raise ValueError("prompt는 비어 있지 않은 문자열이어야 합니다")
+    negative_prompt = job_input.get("negative_prompt", "") or ""
+    if not isinstance(negative_prompt, str):
+        raise ValueError("negative_prompt는 문자열이어야 합니다")
+
+    steps = _int(job_input, "steps", defaults["steps"])
+    if not 1 <= steps <= MAX_STEPS:
+        raise ValueError(f"steps는 1~{MAX_STEPS} 사이여야 합니다: {steps}")
+
+    guidance_scale = _float(job_input, "guidance_scale", defaults["guidance_scale"])
+    if guidance_scale < 0:
+        raise ValueError(f"guidance_scale은 0 이상이어야 합니다: {guidance_scale}")
+
+    seed = _int(job_input, "seed", -1)
+    if seed != -1 and not 0 <= seed <= MAX_SEED:
+        raise ValueError(f"seed는 -1 또는 0~{MAX_SEED} 사이여야 합니다: {seed}")
+    seed_explicit = seed != -1
+    if not seed_explicit and random_seed:
+        seed = random.randint(0, MAX_SEED)
+
+    return {
+        "prompt": prompt,
+        "negative_prompt": negative_prompt,
+        "width": _size(job_input, "width"),
+        "height": _size(job_input, "height"),
+        "steps": steps,
+        "guidance_scale": guidance_scale,
+        "seed": seed,
+        "seed_explicit": seed_explicit,
+    }
@@ -0,0 +1,105 @@
+"""
+해상도 버킷
+
+요청 해상도를 미리 정한 (width, height) 목록 중 가장 가까운 것으로 맞춥니다.
+모든 버킷은 16의 배수이고, 가로세로 비율을 먼저 맞춘 뒤 면적이 가까운 것을 고릅니다.
+형태가 고정되므로 torch.compile로 컴파일한 트랜스포머를 버킷마다 한 번만
+컴파일해 두고 재사용할 수 있습니다 (compile_cache 참고).
+"""
+
+import math
+import os
+
+from PIL import Image, ImageOps
+
+from request_params import MIN_SIZE, MAX_SIZE, SIZE_MULTIPLE
+
+# 버킷 설정 (환경 변수로 변경 가능)
+# BUCKETING: auto(TORCH_COMPILE=1일 때만), on, off
+BUCKETING = os.environ.get("BUCKETING", "auto")
+# 명시 목록 (예: "1024x1024,1216x832"), 비어 있으면 비율 x 면적 조합으로 생성
+RESOLUTION_BUCKETS = os.environ.get("RESOLUTION_BUCKETS", "")
+BUCKET_ASPECTS = os.environ.get("BUCKET_ASPECTS", "1:1,4:3,3:4,3:2,2:3,16:9,9:16")
+# 면적 기준 변 길이 (1024 -> 약 1024x1024 픽셀)
+BUCKET_AREAS = os.environ.get("BUCKET_AREAS", "1024")
+# 버킷 크기로 생성한 뒤 요청 크기로 맞춰 돌려줄지 (가운데 기준 잘라 리사이즈)
+BUCKET_RESIZE_OUTPUT = os.environ.get("BUCKET_RESIZE_OUTPUT", "0") == "1"
+
+# 비율 오차를 면적 오차보다 얼마나 크게 볼지
+ASPECT_WEIGHT = 4.0
+
+
+def _round(value):
+    value = int(round(value / SIZE_MULTIPLE)) * SIZE_MULTIPLE
+    return max(MIN_SIZE, min(MAX_SIZE, value))
+
+
+def bucket_for(aspect, side):
+    """비율(width/height)과 면적 기준 변 길이로 16의 배수 (width, height) 계산"""
+    width = side * math.sqrt(aspect)
+    height = side / math.sqrt(aspect)
+    return _round(width), _round(height)
+
+
+def _parse_ratio(text):
+    w, h = text.split(":")
+    return float(w) / float(h)
+
+
+def build_buckets(spec=RESOLUTION_BUCKETS, aspects=BUCKET_ASPECTS, areas=BUCKET_AREAS):
+    """설정 문자열에서 버킷 목록 생성 (중복 제거, 정렬)"""
+    buckets = set()
+    if spec.strip():
+        for item in spec.split(","):
+            width, height = (int(v) for v in item.lower().strip().split("x"))
+            if width % SIZE_MULTIPLE or height % SIZE_MULTIPLE:
+                raise ValueError(f"버킷 크기는 {SIZE_MULTIPLE}의 배수여야 합니다: {item.strip()}")
+            buckets.add((width, height))
+    else:
+        for side in (int(v) for v in areas.split(",") if v.strip()):
+            for ratio in (r.strip() for r in aspects.split(",") if r.strip()):
+                buckets.add(bucket_for(_parse_ratio(ratio), side))
+    if not buckets:
+        raise ValueError("해상도 버킷이 비어 있습니다")
+    return sorted(buckets, key=lambda b: (b[0] * b[1], b[0]))
+
+
+class ResolutionBuckets:
+    """요청 해상도를 가장 가까운 버킷으로 맞추는 매퍼"""
+
+    def __init__(self, buckets=None):
+        self.buckets = list(buckets) if buckets else build_buckets()
+
+    def snap(self, width, height):
+        """(width, height)에 가장 가까운 버킷 (비율 우선, 그다음 면적)"""
+        aspect = math.log(width / height)
+        area = math.log(width * height)
+
+        def cost(bucket):
+            bw, bh = bucket
+            return (ASPECT_WEIGHT * abs(aspect - math.log(bw / bh))
+                    + abs(area - math.log(bw * bh)))
+
+        return min(self.buckets, key=cost)
+
+    def __iter__(self):
+        return iter(self.buckets)
+
+    def __len__(self):
+        return len(self.buckets)
+
+    def to_list(self):
+        return [f"{w}x{h}" for w, h in self.buckets]
+
+
+def bucketing_enabled(compile_enabled):
+    if BUCKETING not in ("auto", "on", "off"):
+        raise ValueError(f"지원하지 않는 BUCKETING: {BUCKETING} (auto, on, off)")
+    return BUCKETING == "on" or (BUCKETING == "auto" and compile_enabled)
+
+
+def fit_to_request(image, width, height):
+    """버킷 크기 이미지를 요청 크기로 (비율이 다르면 가운데 기준으로 잘라) 리사이즈"""
+    if image.size == (width, height):
+        return image
+    return ImageOps.fit(image, (width, height), Image.LANCZOS)
@@ -0,0 +1,186 @@
+"""
+결정적 요청용 콘텐츠 주소 결과 캐시
+
+seed를 명시한 요청은 (프롬프트, 해상도, 스텝, 가이던스, 시드, 업스케일 설정,
+출력 형식, 모델 리비전)으로 결과가 완전히 결정되므로, 이 값들의 정규화된
+해시를 키로 인코딩된 이미지 바이트를 저장합니다.
+
+- 메모리 계층: 바이트 크기 제한 LRU
+- 디스크 계층: 네트워크 볼륨, 전체 크기 제한 (오래 사용하지 않은 파일부터 삭제)
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+# 캐시 설정 (환경 변수로 변경 가능)
+RESULT_CACHE_MEMORY_MB = float(os.environ.get("RESULT_CACHE_MEMORY_MB", "256"))
+RESULT_CACHE_DISK_MB = float(os.environ.get("RESULT_CACHE_DISK_MB", "4096"))
+RESULT_CACHE_DISK = os.environ.get("RESULT_CACHE_DISK", "1") == "1"
+
+
+def cache_key(fields):
+    """파라미터 dict의 정규화된 SHA-256 해시"""
+    canonical = json.dumps(fields, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """메모리 LRU + 크기 제한 디스크 계층 결과 캐시
+
+    Args:
+        memory_max_bytes: 메모리 계층 최대 크기 (바이트)
+        disk_dir: 디스크 계층 디렉토리 (None이면 사용 안 함)
+        disk_max_bytes: 디스크 계층 최대 크기 (바이트)
+    """
+
+    def __init__(self, memory_max_bytes=RESULT_CACHE_MEMORY_MB * 1024 * 1024,
+                 disk_dir=None, disk_max_bytes=RESULT_CACHE_DISK_MB * 1024 * 1024):
+        self.memory_max_bytes = int(memory_max_bytes)
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = int(disk_max_bytes)
+
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        self._disk_bytes = 0
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._disk_bytes = sum(size for _, size, _ in self._scan_disk())
+
+    def get(self, key):
+        """(data, meta) 반환, 없으면 None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+
+        entry = self._load_from_disk(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+        self._put_memory(key, entry)
+        return entry
+
+    def put(self, key, data, meta):
+        """인코딩된 이미지 바이트와 메타데이터 저장"""
+        entry = (data, meta)
+        self._put_memory(key, entry)
+        self._save_to_disk(key, entry)
+
+    def _put_memory(self, key, entry):
+        size = len(entry[0])
+        if size > self.memory_max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = entry
+            self._bytes += size
+            while self._bytes > self.memory_max_bytes:
+                _, (old, _) = self._entries.popitem(last=False)
+                self._bytes -= len(old)
+
+    def _paths(self, key):
+        directory = os.path.join(self.disk_dir, key[:2])
+        return os.path.join(directory, f"{key}.bin"), os.path.join(directory, f"{key}.json")
+
+    def _load_from_disk(self, key):
+        if not self.disk_dir:
+            return None
+        data_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            with open(data_path, "rb") as f:
+                data = f.read()
+        except (OSError, ValueError):
+            return None
+        if len(data) != meta.get("bytes"):
+            return None
+        # 최근 사용 시각 갱신 (디스크 LRU 제거 기준)
+        try:
+            os.utime(data_path)
+        except OSError:
+            pass
+        return data, meta
+
+    def _save_to_disk(self, key, entry):
+        if not self.disk_dir:
+            return
+        data, meta = entry
+        data_path, meta_path = self._paths(key)
+        if os.path.exists(meta_path):
+            return
+        try:
+            os.makedirs(os.path.dirname(data_path), exist_ok=True)
+            suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+            # 데이터 먼저, 메타데이터를 마지막에 써서 반쯤 쓴 항목을 읽지 않도록 함
+            with open(data_path + suffix, "wb") as f:
+                f.write(data)
+            os.replace(data_path + suffix, data_path)
+            with open(meta_path + suffix, "w") as f:
+                json.dump({**meta, "bytes": len(data)}, f)
+            os.replace(meta_path + suffix, meta_path)
+        except OSError as e:
+            print(f"⚠️ 결과 캐시 저장 실패: {e}")
+            return
+
+        with self._disk_lock:
+            self._disk_bytes += len(data)
+            if self._disk_bytes > self.disk_max_bytes:
+                self._evict_disk()
+
+    def _scan_disk(self):
+        """(data_path, size, mtime) 목록"""
+        entries = []
+        for root, _, files in os.walk(self.disk_dir):
+            for name in files:
+                if not name.endswith(".bin"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def _evict_disk(self):
+        """가장 오래 사용하지 않은 파일부터 삭제해 크기 제한의 90%까지 줄임"""
+        entries = sorted(self._scan_disk(), key=lambda e: e[2])
+        total = sum(size for _, size, _ in entries)
+        target = self.disk_max_bytes * 0.9
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            for victim in (path[:-4] + ".json", path):
+                try:
+                    os.remove(victim)
+                except OSError:
+                    pass
+            total -= size
+        self._disk_bytes = total
+
+    def stats(self):
+        """캐시 통계"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
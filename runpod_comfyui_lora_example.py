@@ -1,12 +1,11 @@
-import json
-import requests
-import base64
-from io import BytesIO
-from PIL import Image
+import asyncio
+import os
+
+from comfyui_client import ComfyClient, Workflow
 
 # RunPod ComfyUI API 설정
-RUNPOD_API_KEY = "your-runpod-api-key"
-ENDPOINT_ID = "your-endpoint-id"
+RUNPOD_API_KEY = os.environ.get("RUNPOD_API_KEY", "your-runpod-api-key")
+ENDPOINT_ID = os.environ.get("RUNPOD_ENDPOINT_ID", "your-endpoint-id")
 
 # FLUX + LoRA 워크플로우
 workflow = {
@@ -79,43 +78,44 @@ workflow = {
     }
 }
 
-# 요청 보내기
-def generate_image(prompt, lora_name=None, lora_strength=0.8):
-    # 워크플로우 수정
-    workflow_copy = workflow.copy()
-    workflow_copy["6"]["inputs"]["text"] = prompt
-    
-    if lora_name:
-        workflow_copy["10"]["inputs"]["lora_name"] = lora_name
-        workflow_copy["10"]["inputs"]["strength_model"] = lora_strength
-        workflow_copy["10"]["inputs"]["strength_clip"] = lora_strength
-        # LoRA 적용된 모델로 연결
-        workflow_copy["3"]["inputs"]["model"] = ["10", 0]
-    
-    # API 요청
-    response = requests.post(
-        f"https://api.runpod.ai/v2/{ENDPOINT_ID}/runsync",
-        headers={
-            "Authorization": f"Bearer {RUNPOD_API_KEY}",
-            "Content-Type": "application/json"
-        },
-        json={
-            "input": {
-                "workflow": workflow_copy
-            }
+# 불변 템플릿 (요청마다 깊은 복사본을 만들어 전역 workflow는 바뀌지 않음)
+template = Workflow(workflow).bind("prompt", ("6", "text")).bind("seed", ("3", "seed"))
+
+def lora_template(lora_name, lora_strength=0.8):
+    """LoRA 노드를 설정하고 KSampler를 LoRA 적용된 모델로 연결한 템플릿"""
+    return template.override({
+        "10": {
+            "lora_name": lora_name,
+            "strength_model": lora_strength,
+            "strength_clip": lora_strength,
         }
-    )
+    }).connect("3", "model", "10", 0)
+
+# 요청 보내기 (/run으로 한꺼번에 제출, 끝나는 대로 저장)
+def generate_images(prompts, lora_name=None, lora_strength=0.8, seed=12345, output_prefix="output"):
+    base = lora_template(lora_name, lora_strength) if lora_name else template
+    workflows = [base.render(prompt=prompt, seed=seed) for prompt in prompts]
     
-    result = response.json()
+    async def run():
+        client = ComfyClient(ENDPOINT_ID, RUNPOD_API_KEY)
+        try:
+            results = []
+            async for result in client.run_many(workflows):
+                if result.ok and result.images:
+                    path = f"{output_prefix}.png" if len(prompts) == 1 else f"{output_prefix}_{result.index}.png"
+                    result.images[0].save(path)
+                    print(f"✅ 이미지 생성 완료! {path} ({result.timings['total_s']}초)")
+                else:
+                    print(f"❌ 에러 ({prompts[result.index]}):", result.error)
+                results.append(result)
+            return sorted(results, key=lambda r: r.index)
+        finally:
+            await client.close()
     
-    # 이미지 추출
-    if "output" in result and "images" in result["output"]:
-        img_data = base64.b64decode(result["output"]["images"][0])
-        img = Image.open(BytesIO(img_data))
-        img.save("output.png")
-        print("✅ 이미지 생성 완료!")
-    else:
-        print("❌ 에러:", result)
+    return asyncio.run(run())
+
+def generate_image(prompt, lora_name=None, lora_strength=0.8):
+    return generate_images([prompt], lora_name, lora_strength)[0]
 
 # 사용 예시
 if __name__ == "__main__":
@@ -127,4 +127,16 @@ if __name__ == "__main__":
         "beautiful anime character in kimono",
         lora_name="anime_style_v2.safetensors",
         lora_strength=0.9
+    )
+    
+    # 여러 프롬프트를 동시에 (COMFY_MAX_IN_FLIGHT개까지 진행)
+    generate_images(
+        [
+            "anime character in a forest",
+            "anime character on a rooftop at night",
+            "anime character reading in a library",
+            "anime character at the beach",
+        ],
+        lora_name="anime_style_v2.safetensors",
+        output_prefix="batch"
     )
\ No newline at end of file
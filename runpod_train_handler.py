@@ -4,54 +4,84 @@ RunPod 서버리스 LoRA 학습 워커
 
 import runpod
 import torch
+import json
 import os
-import zipfile
-import requests
+import shutil
 from pathlib import Path
 
+from dataset_ingest import MANIFEST_FILE, DatasetIngestor
+from latent_cache import LatentCache, load_encoders, model_revision
+from model_provision import FileLock
+from memory_planner import device_memory_budget
+from train_buckets import FLUX_TRANSFORMER_BYTES, bucket_report, plan_for_device
+from train_lora import FINAL_DIR, TRAIN_CHECKPOINT_DIR, TRAIN_CHECKPOINT_EVERY, TRAIN_KEEP_CHECKPOINTS, final_weights
+from training_process import TRAIN_LOCK_TIMEOUT, TrainingProcess, job_key, write_config
+
+# 학습 백엔드: builtin (train_lora.py, 사전 계산 latent 사용) 또는 kohya
+TRAIN_BACKEND = os.environ.get("TRAIN_BACKEND", "builtin")
+# Kohya sd-scripts 설치 경로 (TRAIN_BACKEND=kohya일 때)
+KOHYA_DIR = os.environ.get("KOHYA_DIR", "/workspace/sd-scripts")
+
+# 데이터셋 수집기 (DATASET_CACHE_DIR에 전처리 결과를 캐시)
+ingestor = DatasetIngestor()
+# latent / 텍스트 임베딩 샤드 (LATENT_CACHE_DIR, 데이터셋 x 버킷 x 모델 리비전)
+latent_cache = LatentCache()
+
 # Kohya 학습 스크립트 활용
 def train_lora_kohya(config):
-    """Kohya 스크립트를 사용한 LoRA 학습"""
+    """Kohya 스크립트를 사용한 LoRA 학습 (진행 이벤트를 yield, 결과는 final/로 이동)"""
+    checkpoint_dir = config['checkpoint_dir']
+    
+    # 학습 명령 생성 (N 스텝마다 accelerate 상태를 체크포인트 디렉토리에 저장)
+    argv = [
+        "accelerate", "launch", "--num_cpu_threads_per_process=2", "train_network.py",
+        f"--pretrained_model_name_or_path={config['model_path']}",
+        f"--dataset_config={config['dataset_config']}",
+        f"--output_dir={checkpoint_dir}",
+        f"--output_name={config['output_name']}",
+        "--save_model_as=safetensors",
+        "--prior_loss_weight=1.0",
+        f"--max_train_steps={config['max_steps']}",
+        f"--learning_rate={config['learning_rate']}",
+        "--optimizer_type=AdamW8bit",
+        "--lr_scheduler=cosine_with_restarts",
+        "--lr_warmup_steps=100",
+        f"--train_batch_size={config.get('batch_size', 1)}",
+        "--gradient_checkpointing",
+        "--gradient_accumulation_steps=1",
+        "--mixed_precision=fp16",
+        "--save_precision=fp16",
+        "--network_module=networks.lora",
+        f"--network_rank={config['lora_rank']}",
+        f"--network_alpha={config['lora_alpha']}",
+        "--network_train_unet_only",
+        "--cache_latents",
+        "--cache_latents_to_disk",
+        "--persistent_data_loader_workers",
+        f"--save_every_n_steps={TRAIN_CHECKPOINT_EVERY}",
+        "--save_state",
+        f"--save_last_n_steps_state={TRAIN_CHECKPOINT_EVERY * TRAIN_KEEP_CHECKPOINTS}",
+    ]
     
-    # 학습 스크립트 생성
-    train_script = f"""
-    accelerate launch --num_cpu_threads_per_process=2 train_network.py \\
-      --pretrained_model_name_or_path={config['model_path']} \\
-      --dataset_config={config['dataset_config']} \\
-      --output_dir={config['output_dir']} \\
-      --output_name={config['output_name']} \\
-      --save_model_as=safetensors \\
-      --prior_loss_weight=1.0 \\
-      --max_train_steps={config['max_steps']} \\
-      --learning_rate={config['learning_rate']} \\
-      --optimizer_type="AdamW8bit" \\
-      --lr_scheduler="cosine_with_restarts" \\
-      --lr_warmup_steps=100 \\
-      --train_batch_size=1 \\
-      --gradient_checkpointing \\
-      --gradient_accumulation_steps=1 \\
-      --mixed_precision="fp16" \\
-      --save_precision="fp16" \\
-      --network_module="networks.lora" \\
-      --network_rank={config['lora_rank']} \\
-      --network_alpha={config['lora_alpha']} \\
-      --network_train_unet_only \\
-      --cache_latents \\
-      --cache_latents_to_disk \\
-      --persistent_data_loader_workers
-    """
+    # 이전 실행의 상태가 있으면 그 스텝부터 재개
+    states = sorted(Path(checkpoint_dir).glob(f"{config['output_name']}-step*-state"))
+    if states:
+        print(f"♻️ Kohya 상태에서 재개: {states[-1]}")
+        argv += [f"--resume={states[-1]}", "--skip_until_initial_step"]
     
-    # 학습 실행
-    os.system(train_script)
+    # 학습 실행 (진행 이벤트 전달)
+    yield from TrainingProcess(argv, cwd=KOHYA_DIR).events()
     
-    # 결과 파일 찾기
-    output_files = list(Path(config['output_dir']).glob("*.safetensors"))
-    if output_files:
-        return str(output_files[-1])  # 가장 최신 파일
-    return None
+    # 결과 파일을 final/로 옮겨 같은 작업 키로 다시 제출하면 학습을 건너뜀
+    output_file = Path(checkpoint_dir) / f"{config['output_name']}.safetensors"
+    if not output_file.exists():
+        raise RuntimeError(f"Kohya 결과 파일이 없습니다: {output_file}")
+    final_path = os.path.join(checkpoint_dir, FINAL_DIR, output_file.name)
+    os.makedirs(os.path.dirname(final_path), exist_ok=True)
+    shutil.move(str(output_file), final_path)
 
 def handler(job):
-    """RunPod 핸들러"""
+    """RunPod 핸들러 (단계/학습 진행 상황을 yield하고 마지막에 결과를 yield)"""
     try:
         job_input = job["input"]
         
@@ -62,73 +92,132 @@ def handler(job):
         max_steps = job_input.get("steps", 1000)
         learning_rate = job_input.get("learning_rate", 4e-4)
         lora_rank = job_input.get("lora_rank", 32)
+        seed = job_input.get("seed", 0)
+        backend = job_input.get("trainer", TRAIN_BACKEND)
         
-        # 2. 데이터셋 다운로드 및 준비
-        print(f"📥 데이터셋 다운로드: {dataset_url}")
-        dataset_path = "/tmp/dataset.zip"
-        
-        response = requests.get(dataset_url)
-        with open(dataset_path, 'wb') as f:
-            f.write(response.content)
-        
-        # ZIP 압축 해제
-        extract_path = "/tmp/dataset"
-        os.makedirs(extract_path, exist_ok=True)
-        
-        with zipfile.ZipFile(dataset_path, 'r') as zip_ref:
-            zip_ref.extractall(extract_path)
+        # 2. 데이터셋 다운로드 및 준비 (스트리밍 + 병렬 전처리, 같은 데이터셋은 캐시 재사용)
+        yield {"status": "progress", "stage": "dataset"}
+        dataset = ingestor.ingest(dataset_url)
+        extract_path = dataset["image_dir"]
         
-        # 3. 데이터셋 설정 파일 생성
-        dataset_config = {
-            "general": {
-                "enable_bucket": True,
-                "resolution": "1024,1024",
-                "batch_size": 1
-            },
-            "datasets": [{
-                "subsets": [{
-                    "image_dir": extract_path,
-                    "class_tokens": trigger_word,
-                    "num_repeats": 10
-                }]
-            }]
-        }
-        
-        # 설정 저장
-        import json
-        config_path = "/tmp/dataset_config.json"
-        with open(config_path, 'w') as f:
-            json.dump(dataset_config, f)
+        # 2-1. latent / 텍스트 임베딩 사전 계산 (이미 있는 샤드는 건너뜀)
+        instance_prompt = f"a photo of {trigger_word}"
+        manifest = dataset["manifest"]
+        captions = [
+            f"{trigger_word}, {entry['caption']}" if entry["caption"] else instance_prompt
+            for entry in manifest["images"]
+        ]
+        revision = model_revision(model_name)
+        if backend == "kohya":
+            precomputed = None
+        elif latent_cache.is_complete(manifest, captions, revision):
+            precomputed = latent_cache.precompute(manifest, extract_path, captions, revision, None, None)
+        else:
+            yield {"status": "progress", "stage": "precompute", "images": dataset["images"]}
+            vae, encode_prompt, release_encoders = load_encoders(model_name)
+            try:
+                precomputed = latent_cache.precompute(
+                    manifest, extract_path, captions, revision, vae, encode_prompt
+                )
+            finally:
+                release_encoders()
+                del vae, encode_prompt
+                torch.cuda.empty_cache()
         
-        # 4. 학습 실행
-        print("🚀 LoRA 학습 시작...")
-        
-        train_config = {
-            "model_path": model_name,
-            "dataset_config": config_path,
-            "output_dir": "/tmp/output",
-            "output_name": f"{trigger_word}_lora",
-            "max_steps": max_steps,
-            "learning_rate": learning_rate,
-            "lora_rank": lora_rank,
-            "lora_alpha": lora_rank
-        }
+        # 2-2. 버킷별 배치 크기 (메모리 예산 안에서 가장 큰 값)
+        budget = device_memory_budget()
+        batch_sizes, bucket_stats = plan_for_device(manifest["buckets"], budget=budget)
+        print(f"🪣 버킷 배치 크기: {batch_sizes}")
         
-        # 실제 학습 (간단한 버전)
-        # 실제로는 Kohya 스크립트나 diffusers의 train_text_to_image_lora.py 사용
-        from train_simple_lora import train_flux_lora  # 커스텀 학습 함수
-        
-        output_path = train_flux_lora(
-            model_name=model_name,
-            train_data_dir=extract_path,
-            output_dir="/tmp/output",
-            instance_prompt=f"a photo of {trigger_word}",
-            max_train_steps=max_steps,
-            learning_rate=learning_rate,
-            rank=lora_rank
+        # 2-3. 작업 키 -> 네트워크 볼륨의 체크포인트 디렉토리 (다시 제출하면 여기서 재개)
+        key = job_key(
+            job_input, backend=backend, dataset=dataset["dataset_hash"], revision=revision,
+            trigger_word=trigger_word, steps=max_steps, learning_rate=learning_rate,
+            lora_rank=lora_rank, seed=seed
         )
+        checkpoint_dir = os.path.join(TRAIN_CHECKPOINT_DIR, key)
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        output_name = f"{trigger_word}_lora"
+        
+        # 3. 학습 실행 (같은 작업 키를 다른 워커가 학습 중이면 기다림)
+        print(f"🚀 LoRA 학습 시작... (작업 키: {key})")
+        training = {}  # resumed / done 이벤트
+        with FileLock(os.path.join(checkpoint_dir, ".lock"), timeout=TRAIN_LOCK_TIMEOUT,
+                      message="다른 워커가 같은 작업을 학습 중입니다"):
+            if final_weights(checkpoint_dir, output_name):
+                print(f"♻️ 이미 학습이 끝난 작업: {checkpoint_dir}")
+                events = iter(())
+            elif backend == "kohya":
+                # 데이터셋 설정 파일 생성 (Kohya는 모든 버킷에 한 배치 크기를 쓰므로 가장 작은 값)
+                dataset_config = {
+                    "general": {
+                        "enable_bucket": True,
+                        "resolution": f"{ingestor.resolution},{ingestor.resolution}",
+                        "batch_size": min(batch_sizes.values())
+                    },
+                    "datasets": [{
+                        "subsets": [{
+                            "image_dir": extract_path,
+                            "class_tokens": trigger_word,
+                            "num_repeats": 10
+                        }]
+                    }]
+                }
+                
+                # 설정 저장
+                config_path = os.path.join(checkpoint_dir, "dataset_config.json")
+                with open(config_path, 'w') as f:
+                    json.dump(dataset_config, f)
+                
+                events = train_lora_kohya({
+                    "model_path": model_name,
+                    "dataset_config": config_path,
+                    "checkpoint_dir": checkpoint_dir,
+                    "output_name": output_name,
+                    "max_steps": max_steps,
+                    "learning_rate": learning_rate,
+                    "lora_rank": lora_rank,
+                    "lora_alpha": lora_rank,
+                    "batch_size": min(batch_sizes.values())
+                })
+            else:
+                # 사전 계산된 latent로 학습 (train_lora.py, 버킷별 배치 크기 그대로 사용)
+                # 재개할 때는 다른 GPU에 배정되더라도 처음 계획한 배치 크기를 유지 (샘플러 위치가 그대로 맞도록)
+                config_path = os.path.join(checkpoint_dir, "config.json")
+                if os.path.exists(config_path):
+                    with open(config_path) as f:
+                        previous = json.load(f)
+                    batch_sizes = previous["batch_sizes"]
+                    budget = previous.get("memory_budget", budget)
+                    bucket_stats = bucket_report(manifest["buckets"], batch_sizes, budget, FLUX_TRANSFORMER_BYTES)
+                    print(f"🪣 재개: 처음 계획한 버킷 배치 크기 사용 {batch_sizes}")
+                argv = write_config(config_path, {
+                    "model_name": model_name,
+                    "manifest_path": os.path.join(ingestor.dataset_dir(dataset["dataset_hash"]), MANIFEST_FILE),
+                    "latent_cache_dir": latent_cache.root,
+                    "revision": revision,
+                    "text_dir": precomputed["text_dir"],
+                    "batch_sizes": batch_sizes,
+                    "memory_budget": budget,
+                    "seed": seed,
+                    "max_steps": max_steps,
+                    "learning_rate": learning_rate,
+                    "rank": lora_rank,
+                    "checkpoint_dir": checkpoint_dir,
+                    "output_name": output_name,
+                })
+                events = TrainingProcess(argv).events()
+            
+            # 진행 이벤트 스트리밍 (start / resumed / step / checkpoint / done)
+            for event in events:
+                if event["event"] in ("resumed", "done"):
+                    training[event["event"]] = event
+                yield {"status": "training", "job_key": key, **event}
+            output_path = final_weights(checkpoint_dir, output_name)
+        if output_path is None:
+            raise RuntimeError(f"학습 결과 파일이 없습니다: {checkpoint_dir}")
         
-        # 5. 결과 업로드
+        # 4. 결과 업로드
         print("📤 학습된 LoRA 업로드 중...")
         
         # HuggingFace Hub에 업로드
@@ -141,7 +230,7 @@ def handler(job):
         api.create_repo(repo_id, exist_ok=True)
         
         # 파일 업로드
-        upload_url = api.upload_file(
+        api.upload_file(
             path_or_fileobj=output_path,
             path_in_repo=f"{trigger_word}_lora.safetensors",
             repo_id=repo_id,
@@ -193,19 +282,26 @@ image = pipe(prompt).images[0]
             repo_type="model"
         )
         
-        return {
+        yield {
             "status": "success",
             "lora_url": f"https://huggingface.co/{repo_id}",
             "trigger_word": trigger_word,
             "training_steps": max_steps,
+            "job_key": key,
+            "resumed_from_step": training["resumed"]["step"] if "resumed" in training else None,
+            "dataset": {k: dataset[k] for k in ("dataset_hash", "images", "rejected", "buckets", "cached", "timings")},
+            "precompute": {k: precomputed[k] for k in ("revision", "latents", "text", "timings")}
+            if precomputed else None,
+            "buckets": bucket_stats,
+            "throughput": training["done"].get("throughput") if "done" in training else None,
             "download_url": f"https://huggingface.co/{repo_id}/resolve/main/{trigger_word}_lora.safetensors"
         }
         
     except Exception as e:
-        return {
+        yield {
             "status": "error",
             "error": str(e)
         }
 
-# RunPod 서버리스 시작
-runpod.serverless.start({"handler": handler})
\ No newline at end of file
+# RunPod 서버리스 시작 (제너레이터 핸들러: /stream으로 진행 상황, /status로 전체 결과)
+runpod.serverless.start({"handler": handler, "return_aggregate_stream": True})
\ No newline at end of file
@@ -0,0 +1,126 @@
+"""
+스텝 진행 상황 + 저해상도 미리보기 스트리밍
+
+파이프라인의 callback_on_step_end 훅에서 진행 이벤트를 만들고, N 스텝마다
+VAE 대신 선형 latent->RGB 투영으로 값싼 미리보기를 생성합니다.
+"""
+
+import base64
+import os
+import time
+
+import torch
+from PIL import Image
+
+from image_output import encode_image
+
+# 미리보기 기본값 (요청별로 덮어쓰기 가능)
+PREVIEW_EVERY = int(os.environ.get("PREVIEW_EVERY", "5"))
+PREVIEW_SIZE = int(os.environ.get("PREVIEW_SIZE", "256"))
+# 요청의 preview_size 상한 (출력 크기보다도 크게 만들지 않음)
+PREVIEW_MAX_SIZE = int(os.environ.get("PREVIEW_MAX_SIZE", "512"))
+PREVIEW_OPTIONS = {"format": "jpeg", "quality": 70, "compress_level": 1}
+
+# FLUX 16채널 latent -> RGB 선형 근사 계수
+FLUX_LATENT_RGB_FACTORS = [
+    [-0.0346, 0.0244, 0.0681],
+    [0.0034, 0.0210, 0.0687],
+    [0.0275, -0.0668, -0.0433],
+    [-0.0174, 0.0160, 0.0617],
+    [0.0859, 0.0721, 0.0329],
+    [0.0004, 0.0383, 0.0115],
+    [0.0405, 0.0861, 0.0915],
+    [-0.0236, -0.0185, -0.0259],
+    [-0.0245, 0.0250, 0.1180],
+    [0.1008, 0.0755, -0.0421],
+    [-0.0515, 0.0201, 0.0011],
+    [0.0428, -0.0012, -0.0036],
+    [0.0817, 0.0765, 0.0749],
+    [-0.1264, -0.0522, -0.1103],
+    [-0.0280, -0.0881, -0.0499],
+    [-0.1262, -0.0982, -0.0778],
+]
+FLUX_LATENT_RGB_BIAS = [-0.0329, -0.0718, -0.0851]
+
+
+def unpack_flux_latents(latents, height, width, vae_scale_factor=8):
+    """FLUX 패킹 latent (B, N, C*4)를 (B, C, H/8, W/8)로 변환"""
+    if latents.ndim == 4:
+        return latents
+    batch, _, channels = latents.shape
+    h = 2 * (int(height) // (vae_scale_factor * 2))
+    w = 2 * (int(width) // (vae_scale_factor * 2))
+    latents = latents.view(batch, h // 2, w // 2, channels // 4, 2, 2)
+    latents = latents.permute(0, 3, 1, 4, 2, 5)
+    return latents.reshape(batch, channels // 4, h, w)
+
+
+def preview_settings(preview_every, preview_size, width, height, max_size=PREVIEW_MAX_SIZE):
+    """요청의 미리보기 설정 검증 -> (preview_every, preview_size)
+
+    preview_every는 0 이상(0이면 미리보기 없음), preview_size는 1 이상이어야 하며
+    크기는 출력의 긴 변과 PREVIEW_MAX_SIZE를 넘지 않게 줄입니다.
+    """
+    if preview_every < 0:
+        raise ValueError(f"preview_every는 0 이상이어야 합니다: {preview_every}")
+    if preview_size < 1:
+        raise ValueError(f"preview_size는 1 이상이어야 합니다: {preview_size}")
+    return preview_every, min(preview_size, max(width, height), max_size)
+
+
+def latents_to_preview(latents, height, width, preview_size=PREVIEW_SIZE):
+    """선형 투영으로 첫 번째 샘플의 미리보기 PIL 이미지 생성 (긴 변은 출력 크기/PREVIEW_MAX_SIZE 이하)"""
+    preview_size = min(preview_size, max(width, height), PREVIEW_MAX_SIZE)
+    latents = unpack_flux_latents(latents, height, width)[0].float()
+    factors = torch.tensor(FLUX_LATENT_RGB_FACTORS, device=latents.device)
+    bias = torch.tensor(FLUX_LATENT_RGB_BIAS, device=latents.device)
+
+    rgb = torch.einsum("chw,cr->hwr", latents, factors) + bias
+    rgb = ((rgb.clamp(-1, 1) + 1) * 127.5).to(torch.uint8).cpu().numpy()
+
+    preview = Image.fromarray(rgb)
+    scale = preview_size / max(preview.width, preview.height)
+    size = (max(1, round(preview.width * scale)), max(1, round(preview.height * scale)))
+    return preview.resize(size, Image.BILINEAR)
+
+
+class StepProgress:
+    """callback_on_step_end 콜백: 진행 이벤트와 주기적 미리보기를 emit으로 전달
+
+    Args:
+        emit: 이벤트(dict)를 받는 함수 (GPU 스레드에서 호출됨)
+        total_steps: 전체 디노이징 스텝 수
+        height, width: 생성 해상도
+        preview_every: 미리보기 간격 (0이면 미리보기 없음)
+        preview_size: 미리보기 긴 변 크기 (픽셀)
+    """
+
+    tensor_inputs = ["latents"]
+
+    def __init__(self, emit, total_steps, height, width,
+                 preview_every=PREVIEW_EVERY, preview_size=PREVIEW_SIZE):
+        self.emit = emit
+        self.total_steps = total_steps
+        self.height = height
+        self.width = width
+        self.preview_every, self.preview_size = preview_settings(preview_every, preview_size, width, height)
+        self.started = time.perf_counter()
+
+    def __call__(self, pipeline, step, timestep, callback_kwargs):
+        current = step + 1
+        event = {
+            "status": "progress",
+            "step": current,
+            "total_steps": self.total_steps,
+            "elapsed": round(time.perf_counter() - self.started, 3),
+        }
+
+        if self.preview_every > 0 and current % self.preview_every == 0 and current < self.total_steps:
+            preview = latents_to_preview(
+                callback_kwargs["latents"], self.height, self.width, self.preview_size
+            )
+            event["preview"] = base64.b64encode(encode_image(preview, PREVIEW_OPTIONS)).decode()
+            event["preview_format"] = PREVIEW_OPTIONS["format"]
+
+        self.emit(event)
+        return callback_kwargs
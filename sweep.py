@@ -0,0 +1,159 @@
+"""
+멀티 시드 / 파라미터 스윕 작업
+
+하나의 요청으로 seeds × guidance_scale × steps 조합을 생성합니다.
+
+- 프롬프트는 한 번만 인코딩 (프롬프트 캐시를 공유하므로 첫 배치만 텍스트 인코더 실행)
+- guidance_scale/steps가 같은 변형끼리 묶고, 메모리 예산에 맞는 크기로 나눠 pipe() 호출
+- 모든 이미지와 라벨이 붙은 컨택트 시트(썸네일 격자)를 한 응답으로 반환
+- 같은 작업을 단일 작업으로 나눠 보냈을 때의 예상 비용을 함께 보고 (배치 계획에 크기 1인
+  배치가 있을 때, 또는 sweep.compare_single=true로 첫 변형을 따로 실행할 때)
+
+    {"input": {"prompt": "...", "seed": 42,
+               "sweep": {"count": 4, "guidance_scale": [2.5, 3.5], "steps": [20, 28]}}}
+"""
+
+import math
+import os
+import random
+
+from PIL import Image, ImageDraw
+
+from request_params import MAX_SEED
+
+# 스윕 한 번에 만들 수 있는 최대 이미지 수
+SWEEP_MAX_VARIATIONS = int(os.environ.get("SWEEP_MAX_VARIATIONS", "64"))
+# pipe() 한 번에 넣는 최대 샘플 수 (메모리 예산이 더 작으면 그쪽을 따름)
+SWEEP_MAX_BATCH_SIZE = int(os.environ.get("SWEEP_MAX_BATCH_SIZE", "8"))
+# 컨택트 시트 썸네일의 긴 변 (픽셀)
+CONTACT_SHEET_THUMB = int(os.environ.get("CONTACT_SHEET_THUMB", "256"))
+
+DEFAULT_COUNT = 4
+LABEL_HEIGHT = 18
+
+
+def _grid(sweep, name):
+    values = sweep.get(name)
+    if values is None:
+        return [None]
+    if not isinstance(values, list):
+        values = [values]
+    if not values:
+        raise ValueError(f"sweep.{name}은(는) 비어 있지 않은 목록이어야 합니다")
+    return values
+
+
+def parse_sweep(job_input, max_variations=SWEEP_MAX_VARIATIONS):
+    """작업 입력의 sweep 필드 -> 변형 목록 [{"seed", "guidance_scale"?, "steps"?}, ...]
+
+    seeds가 없으면 입력의 seed(없으면 무작위)부터 count개의 연속 시드를 사용합니다.
+    guidance_scale/steps가 없으면 해당 항목은 입력의 값(또는 기본값)을 그대로 씁니다.
+    """
+    sweep = job_input.get("sweep")
+    if not isinstance(sweep, dict):
+        raise ValueError("sweep은 객체여야 합니다 (seeds/count, guidance_scale, steps)")
+
+    seeds = sweep.get("seeds")
+    if seeds is None:
+        count = int(sweep.get("count", DEFAULT_COUNT))
+        if count < 1:
+            raise ValueError(f"sweep.count는 1 이상이어야 합니다: {count}")
+        base = int(job_input.get("seed", -1))
+        if base == -1:
+            base = random.randint(0, MAX_SEED)
+        seeds = [(base + i) % (MAX_SEED + 1) for i in range(count)]
+    elif not isinstance(seeds, list) or not seeds:
+        raise ValueError("sweep.seeds는 비어 있지 않은 목록이어야 합니다")
+
+    guidance_scales = _grid(sweep, "guidance_scale")
+    steps = _grid(sweep, "steps")
+
+    total = len(seeds) * len(guidance_scales) * len(steps)
+    if total > max_variations:
+        raise ValueError(
+            f"스윕 조합이 너무 많습니다: {len(seeds)}×{len(guidance_scales)}×{len(steps)}={total} "
+            f"(최대 {max_variations})"
+        )
+
+    variations = []
+    for guidance_scale in guidance_scales:
+        for step_count in steps:
+            for seed in seeds:
+                variation = {"seed": seed}
+                if guidance_scale is not None:
+                    variation["guidance_scale"] = guidance_scale
+                if step_count is not None:
+                    variation["steps"] = step_count
+                variations.append(variation)
+    return variations
+
+
+def plan_batches(items, key, max_batch_size, indices=None):
+    """같은 키의 항목을 묶어 max_batch_size 이하의 배치로 나눔
+
+    Returns:
+        배치별 인덱스 목록 (키가 처음 나온 순서, 배치 안에서는 입력 순서)
+    """
+    indices = range(len(items)) if indices is None else indices
+    groups = {}
+    for index in indices:
+        groups.setdefault(key(items[index]), []).append(index)
+    batches = []
+    for group in groups.values():
+        for start in range(0, len(group), max_batch_size):
+            batches.append(group[start:start + max_batch_size])
+    return batches
+
+
+def contact_sheet(images, labels, thumb=CONTACT_SHEET_THUMB, columns=None):
+    """썸네일 격자 이미지 (각 칸 아래에 라벨)"""
+    columns = columns or math.ceil(math.sqrt(len(images)))
+    rows = math.ceil(len(images) / columns)
+    scale = thumb / max(images[0].width, images[0].height)
+    cell_w = max(1, round(images[0].width * scale))
+    cell_h = max(1, round(images[0].height * scale))
+
+    sheet = Image.new("RGB", (columns * cell_w, rows * (cell_h + LABEL_HEIGHT)), (24, 24, 24))
+    draw = ImageDraw.Draw(sheet)
+    for i, (image, label) in enumerate(zip(images, labels)):
+        x = (i % columns) * cell_w
+        y = (i // columns) * (cell_h + LABEL_HEIGHT)
+        sheet.paste(image.convert("RGB").resize((cell_w, cell_h), Image.BILINEAR), (x, y))
+        draw.text((x + 4, y + cell_h + 3), label, fill=(230, 230, 230))
+    return sheet
+
+
+def label(params):
+    return f"s{params['seed']} g{params['guidance_scale']:g} n{params['steps']}"
+
+
+def cost_report(sweep_s, variations, calibration=None):
+    """스윕 비용과 같은 작업을 단일 작업으로 보냈을 때의 예상 비용
+
+    calibration은 변형 하나(index)를 배치 1로 실행해 측정한 값입니다
+    ({"index", "total_s", "text_encode_s", "denoise_s", "steps"}). 단일 작업 예상치는
+    그 작업은 측정값 그대로, 나머지는 (고정 비용 + 스텝당 시간 × steps)로 계산하며
+    프롬프트 캐시 덕분에 텍스트 인코딩은 한 번만 셉니다. 측정값이 없으면 스윕 비용만 보고합니다.
+    큐 대기/콜드 스타트/네트워크 같은 플랫폼 측 작업당 오버헤드는 포함하지 않습니다.
+    """
+    count = len(variations)
+    report = {
+        "images": count,
+        "sweep_s": round(sweep_s, 3),
+        "per_image_s": round(sweep_s / count, 3),
+    }
+    if calibration is None:
+        return report
+
+    per_step = calibration["denoise_s"] / calibration["steps"]
+    fixed = calibration["total_s"] - calibration["denoise_s"] - calibration["text_encode_s"]
+    single_s = calibration["total_s"] + sum(
+        fixed + per_step * v["steps"] for i, v in enumerate(variations) if i != calibration["index"]
+    )
+    report.update({
+        "single_job_estimate_s": round(single_s, 3),
+        "single_job_per_image_s": round(single_s / count, 3),
+        "speedup": round(single_s / sweep_s, 2) if sweep_s > 0 else None,
+        "basis": "워커 측 시간만 비교 (단일 작업의 큐 대기/콜드 스타트 제외)",
+    })
+    return report
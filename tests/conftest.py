@@ -0,0 +1,6 @@
+"""테스트 공통 설정 (저장소 루트의 평면 모듈을 import할 수 있게 경로 추가)"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
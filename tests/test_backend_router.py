@@ -0,0 +1,124 @@
+"""backend_router: 지연 시간을 조절할 수 있는 가짜 백엔드로 EWMA 순서, 장애 전환, 헤지 확인"""
+
+import asyncio
+
+from backend_router import BackendRouter, BackendStats
+
+
+class FakeBackend:
+    """지연 시간과 실패 여부를 바꿀 수 있는 가짜 백엔드"""
+
+    def __init__(self, name, latency, fail=False):
+        self.name = name
+        self.latency = latency
+        self.fail = fail
+        self.calls = 0
+        self.cancelled = 0
+
+    async def __call__(self, params):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.latency)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.fail:
+            raise RuntimeError(f"{self.name} down")
+        return self.name
+
+
+def router_for(*backends, **kwargs):
+    return BackendRouter({b.name: b for b in backends}, **kwargs)
+
+
+def test_routes_to_lowest_ewma_latency():
+    slow, fast = FakeBackend("slow", 0.05), FakeBackend("fast", 0.005)
+    router = router_for(slow, fast)
+
+    async def main():
+        return [(await router.call({}))[1]["backend"] for _ in range(6)]
+
+    winners = asyncio.run(main())
+    # 처음 두 번은 측정되지 않은 백엔드를 하나씩 시도, 이후에는 빠른 쪽만
+    assert sorted(winners[:2]) == ["fast", "slow"]
+    assert winners[2:] == ["fast"] * 4
+    assert router.ranked() == ["fast", "slow"]
+    assert router.stats["fast"].ewma_latency < router.stats["slow"].ewma_latency
+
+
+def test_fails_over_and_marks_backend_unhealthy():
+    broken, backup = FakeBackend("broken", 0.001, fail=True), FakeBackend("backup", 0.01)
+    router = router_for(broken, backup)
+
+    async def main():
+        return [await router.call({}) for _ in range(5)]
+
+    results = asyncio.run(main())
+    assert all(result == "backup" for result, _ in results)
+    assert "broken" in results[0][1]["failed_over"][0]
+    # 실패만 한 백엔드는 마지막 순위라 다시 호출하지 않음
+    assert router.ranked() == ["backup", "broken"]
+    assert broken.calls == 1
+
+
+def test_error_rate_excludes_backend_until_cooldown():
+    stats = BackendStats(alpha=0.5)
+    for _ in range(2):
+        stats.record_error()
+    assert not stats.healthy(max_error_rate=0.5, cooldown=60)
+    assert stats.healthy(max_error_rate=0.5, cooldown=0)
+    for _ in range(3):
+        stats.record_success(0.1)
+    assert stats.healthy(max_error_rate=0.5, cooldown=60)
+
+
+def test_all_backends_failing_raises():
+    router = router_for(FakeBackend("a", 0.001, fail=True), FakeBackend("b", 0.001, fail=True))
+
+    async def main():
+        await router.call({})
+
+    try:
+        asyncio.run(main())
+    except RuntimeError as e:
+        assert "a down" in str(e) and "b down" in str(e)
+    else:
+        raise AssertionError("RuntimeError가 나야 합니다")
+
+
+def test_hedge_fires_after_p95_and_cancels_loser():
+    primary, secondary = FakeBackend("primary", 0.01), FakeBackend("secondary", 0.2)
+    router = router_for(primary, secondary, hedge=True, hedge_min_samples=5)
+
+    async def main():
+        # primary가 더 빠르게 측정되도록 먼저 호출 (secondary는 두 번째 순위)
+        for _ in range(6):
+            await router._call("primary", {})
+        await router._call("secondary", {})
+        before = router.stats["primary"].ewma_latency
+        samples = len(router.stats["primary"].latencies)
+
+        primary.latency = 1.0
+        secondary.latency = 0.02
+        result, meta = await router.call({})
+        return result, meta, before, samples
+
+    result, meta, before, samples = asyncio.run(main())
+    assert result == "secondary"
+    assert meta["hedged"] is True
+    assert primary.cancelled == 1
+    stats = router.stats["primary"]
+    assert stats.cancelled == 1
+    # 잘린 요청은 분위수 창에 들어가지 않고 EWMA를 낮추지 않음
+    assert len(stats.latencies) == samples
+    assert stats.ewma_latency >= before
+
+
+def test_cancelled_elapsed_only_raises_estimate():
+    stats = BackendStats(alpha=0.5)
+    stats.record_success(1.0)
+    stats.record_cancelled(0.1)
+    assert stats.ewma_latency == 1.0
+    stats.record_cancelled(3.0)
+    assert stats.ewma_latency == 2.0
+    assert list(stats.latencies) == [1.0]
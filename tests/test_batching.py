@@ -0,0 +1,44 @@
+"""batching: 배치 묶기와 실행기 대기/실행 시간 분리 확인"""
+
+import asyncio
+import time
+
+from batching import RequestCoalescer
+
+
+def test_same_key_coalesced_into_one_batch():
+    calls = []
+
+    def run_batch(items):
+        calls.append(list(items))
+        return [item * 2 for item in items]
+
+    async def main():
+        coalescer = RequestCoalescer(run_batch, max_batch_size=4, max_wait_ms=20)
+        return await asyncio.gather(*(coalescer.submit("k", i) for i in range(3)))
+
+    results = asyncio.run(main())
+    assert calls == [[0, 1, 2]]
+    assert [(result, size) for result, size, _ in results] == [(0, 3), (2, 3), (4, 3)]
+
+
+def test_executor_wait_reported_separately_from_run_time():
+    def run_batch(items):
+        time.sleep(0.05)
+        return items
+
+    async def main():
+        coalescer = RequestCoalescer(run_batch, max_batch_size=1, max_wait_ms=0)
+        # GPU 스레드를 다른 작업이 0.3초 점유하는 동안 배치가 대기열에 들어감
+        busy = asyncio.ensure_future(coalescer.run_exclusive(time.sleep, 0.3))
+        await asyncio.sleep(0.01)
+        submitted = time.perf_counter()
+        result = await coalescer.submit("k", "x")
+        await busy
+        return submitted, result
+
+    submitted, (result, size, timing) = asyncio.run(main())
+    assert (result, size) == ("x", 1)
+    assert timing["executor_wait_s"] >= 0.2
+    assert 0.04 <= timing["run_s"] < 0.2
+    assert timing["started"] - submitted >= timing["executor_wait_s"]
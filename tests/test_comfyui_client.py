@@ -0,0 +1,150 @@
+"""comfyui_client: fake_runpod 엔드포인트로 동시 진행 수, 일괄 폴링, 조기 종료 취소, 불변 워크플로우 확인"""
+
+import asyncio
+import base64
+import io
+
+import pytest
+from PIL import Image
+
+from comfyui_client import ComfyClient, Workflow, decode_images
+from fake_runpod import FakeRunPod
+
+GRAPH = {
+    "5": {"class_type": "EmptyLatentImage", "inputs": {"width": 64, "height": 48, "batch_size": 1}},
+    "6": {"class_type": "CLIPTextEncode", "inputs": {"text": "base", "clip": ["4", 1]}},
+    "4": {"class_type": "CheckpointLoaderSimple", "inputs": {"ckpt_name": "flux.safetensors"}},
+}
+
+
+class CountingRunPod(FakeRunPod):
+    """대기/실행 중인 작업 수의 최댓값을 기록"""
+
+    max_active = 0
+
+    def _create(self, body):
+        job = super()._create(body)
+        active = sum(j["status"] in ("IN_QUEUE", "IN_PROGRESS") for j in self.jobs.values())
+        self.max_active = max(self.max_active, active)
+        return job
+
+
+def run(scenario, fake=None, **client_kwargs):
+    """가짜 엔드포인트와 클라이언트를 띄워 scenario(fake, client) 실행"""
+    async def main():
+        server = fake or FakeRunPod(workers=8, job_seconds=0.2)
+        base_url = await server.start(port=0)
+        client = ComfyClient("test", "key", api_url=base_url,
+                             **{"poll_interval": 0.05, **client_kwargs})
+        try:
+            return await scenario(server, client)
+        finally:
+            await client.close()
+            await server.stop()
+    return asyncio.run(main())
+
+
+def template():
+    return Workflow(GRAPH).bind("prompt", ("6", "text")).bind("size", ("5", "width"), ("5", "height"))
+
+
+def test_in_flight_cap_is_respected():
+    fake = CountingRunPod(workers=8, job_seconds=0.2)
+
+    async def scenario(fake, client):
+        return await client.run_all([template().render(prompt=f"p{i}") for i in range(9)])
+
+    results = run(scenario, fake=fake, max_in_flight=3)
+    assert [r.index for r in results] == list(range(9))
+    assert all(r.ok and r.images[0].size == (64, 48) for r in results)
+    assert fake.max_active <= 3
+
+
+def test_status_is_polled_in_batches():
+    async def scenario(fake, client):
+        await client.run_all([template().render(prompt=f"p{i}") for i in range(8)])
+        return fake.requests, client.requests
+
+    server, client = run(scenario, fake=FakeRunPod(workers=8, job_seconds=0.3),
+                         max_in_flight=8, poll_interval=0.1)
+    assert server["run"] == 8
+    assert server["runsync"] == 0
+    assert server["status"] == client["status"]
+    # 8개가 함께 끝나므로 주기당 8개씩, 대략 3~5주기
+    assert server["status"] % 8 == 0
+    assert server["status"] <= 8 * 6
+
+
+def test_early_stop_cancels_in_flight_jobs():
+    async def scenario(fake, client):
+        results = client.run_many([template().render(prompt=f"p{i}") for i in range(6)])
+        first = await results.__anext__()
+        await results.aclose()
+        return first, fake
+
+    first, fake = run(scenario, fake=FakeRunPod(workers=1, job_seconds=0.2), max_in_flight=4)
+    assert first.ok
+    # 첫 결과를 돌려주기 전에 빈 자리 하나를 더 채울 수 있음
+    submitted = fake.requests["run"]
+    assert submitted in (4, 5)
+    assert fake.requests["cancel"] == submitted - 1
+    statuses = sorted(job["status"] for job in fake.jobs.values())
+    assert statuses == ["CANCELLED"] * (submitted - 1) + ["COMPLETED"]
+
+
+def test_timeout_cancel_failure_does_not_drop_other_results():
+    async def scenario(fake, client):
+        async def broken_cancel(job_id):
+            raise ConnectionError("cancel failed")
+
+        client.cancel = broken_cancel
+        return await client.run_all([template().render(prompt=f"p{i}") for i in range(3)])
+
+    results = run(scenario, fake=FakeRunPod(workers=3, job_seconds=5), job_timeout=0.2)
+    assert [r.status for r in results] == ["TIMED_OUT"] * 3
+
+
+def test_workflow_is_immutable():
+    base = template()
+    before = base.to_dict()
+    rendered = base.render(prompt="changed", size=512)
+    rendered["6"]["inputs"]["text"] = "mutated after render"
+    overridden = base.override({"6": {"text": "override"}}).set("5", "batch_size", 4)
+
+    assert base.to_dict() == before
+    assert GRAPH["6"]["inputs"]["text"] == "base"
+    assert overridden["6"]["inputs"]["text"] == "override"
+    assert overridden["5"]["inputs"]["batch_size"] == 4
+    assert base.render(size=512)["5"]["inputs"]["height"] == 512
+    with pytest.raises(ValueError):
+        base.render(unknown=1)
+    with pytest.raises(ValueError):
+        base.set("99", "text", "x")
+
+
+def test_decode_images_formats_and_errors():
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8)).save(buffer, format="PNG")
+    data = base64.b64encode(buffer.getvalue()).decode()
+
+    assert len(decode_images({"images": [data, {"type": "base64", "data": data}]})) == 2
+    assert len(decode_images({"message": f"data:image/png;base64,{data}"})) == 1
+    with pytest.raises(ValueError):
+        decode_images({"images": [{"type": "s3_url", "data": "https://x"}]})
+    with pytest.raises(ValueError):
+        decode_images(["not", "a", "dict"])
+    with pytest.raises(Exception):
+        decode_images({"images": ["not-an-image"]})
+
+
+def test_decode_error_is_reported_per_job():
+    fake = FakeRunPod(workers=2, job_seconds=0.05)
+    fake._image_b64 = lambda width, height: base64.b64encode(b"garbage").decode()
+
+    async def scenario(fake, client):
+        return await client.run_all([template().render(prompt="p")])
+
+    result, = run(scenario, fake=fake)
+    assert result.status == "COMPLETED"
+    assert not result.ok
+    assert "디코드 실패" in result.error
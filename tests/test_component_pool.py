@@ -0,0 +1,168 @@
+"""component_pool: 체크포인트 파일 키로 공유, 오프로드 전 withdraw, LoRA 범위 확인"""
+
+import json
+import os
+
+import pytest
+from torch import nn
+
+from component_pool import ComponentPool, component_key
+from lora_manager import LoRAManager
+from model_provision import MARKER_FILE
+
+
+def write_marker(root, files):
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, MARKER_FILE), "w") as f:
+        json.dump({"files": {path: {"size": 1, "sha256": sha} for path, sha in files.items()}}, f)
+
+
+class FakePipe:
+    def __init__(self, **components):
+        self.components = dict(components)
+        for name, module in components.items():
+            setattr(self, name, module)
+
+    def register_modules(self, **modules):
+        self.components.update(modules)
+        for name, module in modules.items():
+            setattr(self, name, module)
+
+
+class Loader:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return nn.Linear(4, 4)
+
+
+def sha(char):
+    return char * 64
+
+
+def test_component_key_uses_marker_weight_hashes(tmp_path):
+    flux, sd3 = str(tmp_path / "flux"), str(tmp_path / "sd3")
+    write_marker(flux, {
+        "text_encoder_2/model.safetensors": sha("a"), "text_encoder_2/config.json": sha("1"),
+        "vae/model.safetensors": sha("b"), "vae/model.fp16.safetensors": sha("d"),
+    })
+    write_marker(sd3, {
+        "text_encoder_3/model.safetensors": sha("a"), "text_encoder_3/config.json": sha("2"),
+        "vae/model.safetensors": sha("c"),
+    })
+
+    # 설정 파일이 달라도 가중치가 같으면 같은 키
+    assert component_key(flux, "text_encoder_2") == component_key(sd3, "text_encoder_3")
+    assert component_key(flux, "vae") != component_key(sd3, "vae")
+    assert component_key(flux, "vae", variant="fp16") != component_key(flux, "vae")
+    # variant 파일이 없으면 기본 가중치를 로드하므로 기본 키와 같음
+    assert component_key(sd3, "vae", variant="fp16") == component_key(sd3, "vae")
+
+
+def test_marker_and_hub_cache_with_same_weights_share_key(tmp_path, monkeypatch):
+    huggingface_hub = pytest.importorskip("huggingface_hub")
+    local = str(tmp_path / "local")
+    write_marker(local, {"text_encoder_2/model.safetensors": sha("a"), "text_encoder_2/config.json": sha("1")})
+
+    # 허브 캐시 스냅샷: 스냅샷 파일은 blobs/<etag>를 가리키는 심볼릭 링크
+    repo = tmp_path / "hub"
+    (repo / "blobs").mkdir(parents=True)
+    (repo / "blobs" / sha("a")).write_bytes(b"weights")
+    (repo / "blobs" / ("f" * 40)).write_text("{}")
+    folder = repo / "snapshots" / "main" / "text_encoder_2"
+    folder.mkdir(parents=True)
+    (folder / "model.safetensors").symlink_to(repo / "blobs" / sha("a"))
+    (folder / "config.json").symlink_to(repo / "blobs" / ("f" * 40))
+    monkeypatch.setattr(huggingface_hub, "snapshot_download",
+                        lambda *args, **kwargs: str(repo / "snapshots" / "main"))
+
+    assert component_key("owner/flux", "text_encoder_2") == component_key(local, "text_encoder_2")
+
+
+def test_hub_cache_without_sha256_blob_falls_back_to_repo_path(tmp_path, monkeypatch):
+    huggingface_hub = pytest.importorskip("huggingface_hub")
+    folder = tmp_path / "snapshot" / "vae"
+    folder.mkdir(parents=True)
+    (tmp_path / ("e" * 40)).write_bytes(b"small")
+    (folder / "model.safetensors").symlink_to(tmp_path / ("e" * 40))
+    monkeypatch.setattr(huggingface_hub, "snapshot_download",
+                        lambda *args, **kwargs: str(tmp_path / "snapshot"))
+
+    assert component_key("owner/flux", "vae", revision="r") == ("path", "owner/flux/vae", "r", None)
+
+
+def test_component_key_without_marker_uses_path_and_revision(tmp_path):
+    root = str(tmp_path / "model")
+    os.makedirs(os.path.join(root, "vae"))
+    assert component_key(root, "vae") == component_key(root + "/", "vae")
+    assert component_key(root, "vae", revision="a") != component_key(root, "vae", revision="b")
+
+
+def test_shared_module_loaded_once_and_reported():
+    pool = ComponentPool()
+    first, second = Loader(), Loader()
+    a = pool.get("flux", "text_encoder_2", lambda: "t5", first)
+    b = pool.get("sd3", "text_encoder_3", lambda: "t5", second)
+
+    assert a is b and (first.calls, second.calls) == (1, 0)
+    assert pool.is_shared(a)
+    assert pool.report()["shared"] == ["sd3.text_encoder_3 -> flux.text_encoder_2"]
+
+
+def test_withdraw_gives_offloading_pipeline_a_private_copy():
+    pool = ComponentPool()
+    flux_loader, sd3_loader = Loader(), Loader()
+    t5 = pool.get("flux", "text_encoder_2", lambda: "t5", flux_loader)
+    sd3 = FakePipe(text_encoder_3=pool.get("sd3", "text_encoder_3", lambda: "t5", sd3_loader))
+
+    pool.withdraw(sd3, "sd3")
+    assert sd3.text_encoder_3 is not t5 and sd3_loader.calls == 1
+    assert not pool.is_shared(t5)
+    assert pool.report()["shared"] == []
+
+
+def test_withdrawn_module_is_not_handed_out_again():
+    pool = ComponentPool()
+    vae = pool.get("flux", "vae", lambda: "vae", Loader())
+    pool.withdraw(FakePipe(vae=vae), "flux")
+
+    loader = Loader()
+    assert pool.get("sd3", "vae", lambda: "vae", loader) is not vae
+    assert loader.calls == 1
+
+
+class FakeLoRAPipe(FakePipe):
+    def __init__(self, **components):
+        super().__init__(**components)
+        self.loaded = []
+
+    def lora_state_dict(self, path):
+        return {"transformer.a.lora_A.weight": 1, "text_encoder.b.lora_A.weight": 2}
+
+    def load_lora_weights(self, state_dict, adapter_name):
+        self.loaded.append(sorted(state_dict))
+
+    def enable_lora(self):
+        pass
+
+    def set_adapters(self, names, adapter_weights):
+        pass
+
+
+def test_lora_skips_shared_text_encoder(tmp_path):
+    (tmp_path / "style.safetensors").write_bytes(b"")
+    pool = ComponentPool()
+    clip = pool.get("flux", "text_encoder", lambda: "clip", Loader())
+    pipe = FakeLoRAPipe(text_encoder=clip)
+    manager = LoRAManager(pipe, lora_dir=str(tmp_path), fuse=False, is_shared=pool.is_shared)
+
+    manager.activate("style.safetensors")
+    assert pipe.loaded[-1] == ["text_encoder.b.lora_A.weight", "transformer.a.lora_A.weight"]
+
+    pool.get("sd3", "text_encoder", lambda: "clip", Loader())
+    (tmp_path / "other.safetensors").write_bytes(b"")
+    manager.activate("other.safetensors")
+    assert pipe.loaded[-1] == ["transformer.a.lora_A.weight"]
+    assert not manager.affects_text_encoder("other.safetensors")
@@ -0,0 +1,61 @@
+"""dataset_ingest: 평탄화한 이름이 겹치는 경로 구분, 캡션 짝 맞추기, 풀 제출 수 제한 확인"""
+
+import io
+import zipfile
+
+import pytest
+from PIL import Image
+
+import dataset_ingest
+from dataset_ingest import DatasetIngestor, _entry_key
+
+NAMES = ["a b.png", "a_b.png", "dir/x.png", "dir__x.png"]
+
+
+def png_bytes(color):
+    buffer = io.BytesIO()
+    Image.new("RGB", (320, 320), color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_entry_key_disambiguates_collisions():
+    used = set()
+    keys = []
+    for stem in ["a b", "a_b", "dir/x", "dir__x"]:
+        keys.append(_entry_key(stem, used))
+        used.add(keys[-1])
+    assert keys[0] == "a_b" and keys[2] == "dir__x"
+    assert len(set(keys)) == 4
+    assert keys[1].startswith("a_b-") and keys[3].startswith("dir__x-")
+
+
+@pytest.fixture
+def archive(tmp_path):
+    path = tmp_path / "dataset.zip"
+    with zipfile.ZipFile(path, "w") as zf:
+        for i, name in enumerate(NAMES):
+            zf.writestr(name, png_bytes((i * 60, 0, 0)))
+            zf.writestr(name.rsplit(".", 1)[0] + ".txt", f"caption {name}")
+    return str(path)
+
+
+def test_prepare_keeps_colliding_names_with_their_captions(tmp_path, archive, monkeypatch):
+    ingestor = DatasetIngestor(cache_dir=str(tmp_path / "cache"), resolution=256, workers=1, max_pending=1)
+    submitted = []
+    original_wait = dataset_ingest.wait
+
+    def counting_wait(futures, **kwargs):
+        submitted.append(len(futures))
+        return original_wait(futures, **kwargs)
+
+    monkeypatch.setattr(dataset_ingest, "wait", counting_wait)
+    manifest = ingestor.prepare(archive, "hash")
+
+    assert sorted(image["source"] for image in manifest["images"]) == sorted(NAMES)
+    assert len({image["file"] for image in manifest["images"]}) == 4
+    for image in manifest["images"]:
+        assert image["caption"] == f"caption {image['source']}"
+        text = (tmp_path / "cache" / ingestor.dataset_dir("hash") / "images" / image["file"]).with_suffix(".txt")
+        assert text.read_text(encoding="utf-8") == image["caption"]
+    # max_pending=1이면 새 이미지를 넘기기 전에 앞 작업을 기다림
+    assert submitted and max(submitted) <= 1
@@ -0,0 +1,101 @@
+"""dataset_packager: 증분 모드 선택, 중간에 끊긴 덧붙이기 복구, 캡션 이름 충돌 확인"""
+
+import zipfile
+
+import pytest
+from PIL import Image
+
+from dataset_packager import DatasetPackager
+
+
+def make_images(folder, start, count):
+    folder.mkdir(exist_ok=True)
+    for i in range(start, start + count):
+        Image.new("RGB", (64, 48), (i * 20 % 256, 80, 160)).save(folder / f"img_{i:03d}.png")
+
+
+def names(path):
+    with zipfile.ZipFile(path) as zf:
+        return zf.namelist()
+
+
+@pytest.fixture
+def packager():
+    return DatasetPackager(max_side=0, workers=1)
+
+
+def test_incremental_modes(tmp_path, packager):
+    folder, output = tmp_path / "images", str(tmp_path / "dataset.zip")
+    make_images(folder, 0, 3)
+
+    assert packager.package(str(folder), output)["mode"] == "full"
+    assert packager.package(str(folder), output)["mode"] == "noop"
+
+    make_images(folder, 3, 2)
+    report = packager.package(str(folder), output)
+    assert report["mode"] == "append" and report["added"] == 2
+
+    report = packager.package(str(folder), output, captions={"img_000.png": "TOK on a beach"})
+    assert report["mode"] == "rebuild" and report["changed"] == 1
+    with zipfile.ZipFile(output) as zf:
+        assert zf.read("img_000.txt") == b"TOK on a beach"
+        assert len(zf.namelist()) == 10
+
+
+def test_crashed_append_keeps_zip_and_rebuilds(tmp_path, packager, monkeypatch):
+    folder, output = tmp_path / "images", str(tmp_path / "dataset.zip")
+    make_images(folder, 0, 3)
+    packager.package(str(folder), output)
+    before = names(output)
+
+    make_images(folder, 3, 2)
+    calls = []
+
+    def crash(zf, names_, scanned, sources):
+        # 첫 항목을 쓴 뒤 중단
+        calls.append(names_)
+        zf.write(sources[names_[0]], names_[0])
+        raise RuntimeError("중단")
+
+    monkeypatch.setattr(DatasetPackager, "_write_entries", staticmethod(crash))
+    with pytest.raises(RuntimeError):
+        packager.package(str(folder), output)
+    monkeypatch.undo()
+
+    # 기존 ZIP은 그대로이고 임시 파일도 남지 않음
+    assert calls and names(output) == before
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["dataset.zip", "dataset.zip.manifest.json", "images"]
+
+    assert packager.package(str(folder), output)["mode"] == "append"
+    assert sorted(names(output)) == sorted(set(names(output)))
+    assert len(names(output)) == 10
+
+
+@pytest.mark.filterwarnings("ignore:Duplicate name")
+def test_zip_out_of_sync_with_manifest_rebuilds(tmp_path, packager):
+    folder, output = tmp_path / "images", str(tmp_path / "dataset.zip")
+    make_images(folder, 0, 2)
+    packager.package(str(folder), output)
+
+    # 매니페스트 갱신 전에 끊긴 것처럼 ZIP에만 항목을 덧붙임
+    with zipfile.ZipFile(output, "a") as zf:
+        zf.write(folder / "img_000.png", "img_000.png")
+
+    report = packager.package(str(folder), output)
+    assert report["mode"] == "full"
+    assert sorted(names(output)) == sorted(set(names(output)))
+    assert len(names(output)) == 4
+
+
+def test_same_stem_images_keep_one_caption(tmp_path, packager):
+    folder, output = tmp_path / "images", str(tmp_path / "dataset.zip")
+    make_images(folder, 0, 1)
+    Image.new("RGB", (64, 48)).save(folder / "img_000.jpg")
+
+    report = packager.package(str(folder), output, captions={"img_000.jpg": "jpg", "img_000.png": "png"})
+    assert report["images"] == 1 and report["skipped"] == 1
+    assert sorted(names(output)) == ["img_000.jpg", "img_000.txt"]
+    with zipfile.ZipFile(output) as zf:
+        assert zf.read("img_000.txt") == b"jpg"
+    # 매니페스트와 ZIP이 일치하므로 다시 실행해도 재빌드하지 않음
+    assert packager.package(str(folder), output, captions={"img_000.jpg": "jpg"})["mode"] == "noop"
@@ -0,0 +1,173 @@
+"""http_client.PooledHTTPClient: 로컬 aiohttp 서버로 풀링/재시도/Retry-After/타임아웃 확인"""
+
+import asyncio
+import time
+
+import pytest
+from aiohttp import web
+
+import http_client
+from http_client import PooledHTTPClient, HTTPError, backoff_delay, is_idempotent
+
+
+class FakeServer:
+    """경로별 응답 순서를 정할 수 있는 로컬 서버"""
+
+    def __init__(self):
+        self.hits = {}
+        self.peers = []
+        self.plans = {}
+        self.runner = None
+        self.base_url = ""
+
+    def plan(self, path, *responses):
+        """path에 대한 응답 순서 [(status, headers)] (다 쓰면 200)"""
+        self.plans[path] = list(responses)
+
+    async def handle(self, request):
+        path = request.path
+        self.hits[path] = self.hits.get(path, 0) + 1
+        self.peers.append(request.transport.get_extra_info("peername")[1])
+        if path == "/slow":
+            await asyncio.sleep(1.0)
+        plan = self.plans.get(path)
+        if plan:
+            status, headers = plan.pop(0)
+            return web.Response(status=status, headers=headers, text="fail")
+        return web.json_response({"path": path, "hits": self.hits[path]})
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_route("*", "/{tail:.*}", self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        self.base_url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+
+def run(scenario, **client_kwargs):
+    """서버와 클라이언트를 띄워 scenario(server, client) 실행"""
+    async def main():
+        server = FakeServer()
+        await server.start()
+        client = PooledHTTPClient(**client_kwargs)
+        try:
+            return await scenario(server, client)
+        finally:
+            await client.close()
+            await server.stop()
+    return asyncio.run(main())
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(http_client, "backoff_delay", lambda attempt: 0.01)
+
+
+def test_connections_are_pooled():
+    async def scenario(server, client):
+        for _ in range(5):
+            response = await client.get(f"{server.base_url}/ok")
+            assert response.status == 200
+        return server.peers
+
+    peers = run(scenario)
+    assert len(peers) == 5
+    assert len(set(peers)) == 1
+
+
+def test_get_retries_retryable_status():
+    async def scenario(server, client):
+        server.plan("/flaky", (503, {}), (502, {}))
+        response = await client.get(f"{server.base_url}/flaky")
+        return response.json(), server.hits["/flaky"]
+
+    body, hits = run(scenario)
+    assert body["hits"] == 3
+    assert hits == 3
+
+
+def test_retries_are_bounded():
+    async def scenario(server, client):
+        server.plan("/down", *[(503, {})] * 10)
+        with pytest.raises(HTTPError) as error:
+            await client.get(f"{server.base_url}/down")
+        assert error.value.status == 503
+        return server.hits["/down"]
+
+    assert run(scenario, max_retries=2) == 3
+
+
+def test_client_errors_are_not_retried():
+    async def scenario(server, client):
+        server.plan("/missing", (404, {}))
+        with pytest.raises(HTTPError):
+            await client.get(f"{server.base_url}/missing")
+        return server.hits["/missing"]
+
+    assert run(scenario) == 1
+
+
+def test_post_is_not_retried_by_default():
+    async def scenario(server, client):
+        server.plan("/create", (503, {}))
+        with pytest.raises(HTTPError):
+            await client.post(f"{server.base_url}/create", json={})
+        return server.hits["/create"]
+
+    assert run(scenario) == 1
+
+
+def test_post_retries_when_opted_in():
+    async def scenario(server, client):
+        server.plan("/create", (503, {}))
+        explicit = await client.post(f"{server.base_url}/create", json={}, retries=2)
+        server.plan("/keyed", (503, {}))
+        keyed = await client.post(f"{server.base_url}/keyed", json={}, headers={"Idempotency-Key": "abc"})
+        return explicit.status, keyed.status, server.hits
+
+    explicit, keyed, hits = run(scenario)
+    assert (explicit, keyed) == (200, 200)
+    assert hits["/create"] == 2
+    assert hits["/keyed"] == 2
+
+
+def test_retry_after_is_respected():
+    async def scenario(server, client):
+        server.plan("/limited", (429, {"Retry-After": "1"}))
+        started = time.perf_counter()
+        response = await client.get(f"{server.base_url}/limited")
+        return response.status, time.perf_counter() - started
+
+    status, elapsed = run(scenario)
+    assert status == 200
+    assert elapsed >= 0.9
+
+
+def test_timeout_raises_after_retries():
+    async def scenario(server, client):
+        started = time.perf_counter()
+        with pytest.raises(asyncio.TimeoutError):
+            await client.get(f"{server.base_url}/slow", timeout=0.2, retries=1)
+        return server.hits["/slow"], time.perf_counter() - started
+
+    hits, elapsed = run(scenario)
+    assert hits == 2
+    assert elapsed < 1.0
+
+
+def test_backoff_delay_is_bounded_full_jitter():
+    delays = [backoff_delay(attempt, base=0.5, maximum=4) for attempt in range(8) for _ in range(50)]
+    assert all(0 <= d <= 4 for d in delays)
+    assert max(backoff_delay(0, base=0.5, maximum=4) for _ in range(200)) <= 0.5
+
+
+def test_is_idempotent():
+    assert is_idempotent("get")
+    assert is_idempotent("DELETE")
+    assert not is_idempotent("POST")
+    assert is_idempotent("POST", {"Idempotency-Key": "k"})
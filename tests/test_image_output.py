@@ -0,0 +1,107 @@
+"""image_output: 출력 옵션 검증, 형식별 인코딩, 참조 모드(로컬 저장 / 업로드 후 URL) 확인"""
+
+import base64
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+import image_output
+from image_output import LocalStorage, S3Storage, build_output, encode_image, parse_output_options
+
+
+def sample_image(mode="RGB"):
+    image = Image.new(mode, (32, 32))
+    for x in range(32):
+        for y in range(32):
+            image.putpixel((x, y), (x * 8, y * 8, 128, 200)[:len(mode)])
+    return image
+
+
+def test_parse_output_options_defaults_and_overrides():
+    options = parse_output_options({"output_format": "JPG", "quality": "75", "output_mode": "Reference"})
+    assert options["format"] == "jpg" and options["quality"] == 75 and options["mode"] == "reference"
+    assert parse_output_options({})["format"] == image_output.OUTPUT_FORMAT
+
+
+@pytest.mark.parametrize("job_input", [
+    {"output_format": "gif"},
+    {"output_mode": "url"},
+    {"quality": 0},
+    {"quality": 101},
+    {"compress_level": -1},
+    {"compress_level": 10},
+    {"quality": "high"},
+])
+def test_parse_output_options_rejects_invalid(job_input):
+    with pytest.raises(ValueError):
+        parse_output_options(job_input)
+
+
+@pytest.mark.parametrize("fmt,pil_format", [("png", "PNG"), ("webp", "WEBP"), ("jpeg", "JPEG")])
+def test_encode_image_uses_requested_format(fmt, pil_format):
+    data = encode_image(sample_image("RGBA"), parse_output_options({"output_format": fmt}))
+    decoded = Image.open(BytesIO(data))
+    assert decoded.format == pil_format
+    assert decoded.size == (32, 32)
+
+
+def test_quality_and_compress_level_change_output_size():
+    image = sample_image()
+    low = encode_image(image, parse_output_options({"output_format": "jpeg", "quality": 10}))
+    high = encode_image(image, parse_output_options({"output_format": "jpeg", "quality": 95}))
+    assert len(low) < len(high)
+
+    fast = encode_image(image, parse_output_options({"output_format": "png", "compress_level": 0}))
+    small = encode_image(image, parse_output_options({"output_format": "png", "compress_level": 9}))
+    assert len(small) < len(fast)
+
+
+def test_base64_mode_inlines_image():
+    output = build_output(sample_image(), parse_output_options({"output_format": "png"}))
+    assert output["format"] == "png"
+    assert base64.b64decode(output["image"])[:8] == b"\x89PNG\r\n\x1a\n"
+    assert output["bytes"] == len(base64.b64decode(output["image"]))
+
+
+def test_reference_mode_writes_to_local_storage(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_output, "_storage", LocalStorage(str(tmp_path)))
+    options = parse_output_options({"output_format": "webp", "output_mode": "reference"})
+    output = build_output(sample_image(), options, name="job-1")
+
+    assert "image" not in output
+    assert output["image_path"] == str(tmp_path / "job-1.webp")
+    assert (tmp_path / "job-1.webp").read_bytes()[:4] == b"RIFF"
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_reference_mode_returns_base_url(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_output, "_storage", LocalStorage(str(tmp_path), "https://cdn.example.com/out/"))
+    output = build_output(sample_image(), parse_output_options({"output_mode": "reference"}), name="job-2")
+    assert output["image_url"] == "https://cdn.example.com/out/job-2.png"
+
+
+class FakeS3Client:
+    def __init__(self):
+        self.objects = {}
+
+    def put_object(self, Bucket, Key, Body, ContentType):
+        self.objects[(Bucket, Key)] = (Body, ContentType)
+
+    def generate_presigned_url(self, method, Params, ExpiresIn):
+        return f"https://s3.example.com/{Params['Bucket']}/{Params['Key']}?expires={ExpiresIn}"
+
+
+def test_reference_mode_uploads_and_returns_url(monkeypatch):
+    boto3 = pytest.importorskip("boto3")
+    client = FakeS3Client()
+    monkeypatch.setattr(boto3, "client", lambda *args, **kwargs: client)
+    monkeypatch.setattr(image_output, "_storage", S3Storage(bucket="images", prefix="/outputs/"))
+
+    options = parse_output_options({"output_format": "jpeg", "output_mode": "reference"})
+    output = build_output(sample_image(), options, name="job-3")
+
+    body, content_type = client.objects[("images", "outputs/job-3.jpg")]
+    assert content_type == "image/jpeg" and body[:2] == b"\xff\xd8"
+    assert output["image_url"].startswith("https://s3.example.com/images/outputs/job-3.jpg")
+    assert output["bytes"] == len(body)
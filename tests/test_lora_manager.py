@@ -0,0 +1,84 @@
+"""lora_manager: LORA_DIR 밖 경로·허용되지 않은 허브 repo id 거절, 어댑터 이름 충돌 방지"""
+
+import os
+
+import pytest
+
+from lora_manager import LoRAManager, adapter_name, resolve_lora
+
+
+@pytest.fixture
+def lora_dir(tmp_path):
+    root = tmp_path / "loras"
+    root.mkdir()
+    (root / "style.safetensors").write_bytes(b"x")
+    (tmp_path / "secret.txt").write_text("secret")
+    os.symlink(tmp_path / "secret.txt", root / "escape.safetensors")
+    return str(root)
+
+
+def test_local_file_resolves_inside_lora_dir(lora_dir):
+    expected = os.path.join(os.path.realpath(lora_dir), "style.safetensors")
+    assert resolve_lora("style.safetensors", lora_dir, []) == expected
+
+
+@pytest.mark.parametrize("name", [
+    "../secret.txt", "../../etc/passwd", "/etc/passwd", "sub/../../secret.txt",
+    "..", ".hidden", "a\\\\b", "", "escape.safetensors", "missing.safetensors",
+])
+def test_rejected_local_names(lora_dir, name):
+    with pytest.raises(ValueError):
+        resolve_lora(name, lora_dir, [])
+
+
+def test_hub_ids_require_allowlist(lora_dir):
+    assert resolve_lora("owner/flux-lora", lora_dir, ["owner/flux-lora"]) == "owner/flux-lora"
+    assert resolve_lora("team/any", lora_dir, ["team/*"]) == "team/any"
+    for name in ("other/flux-lora", "team/../x", "teamx/any"):
+        with pytest.raises(ValueError):
+            resolve_lora(name, lora_dir, ["owner/flux-lora", "team/*"])
+
+
+class RecordingPipe:
+    """LoRAManager가 호출하는 파이프라인 메서드만 기록"""
+
+    def __init__(self):
+        self.adapters = {}
+        self.active = None
+
+    def lora_state_dict(self, path):
+        return {"transformer.lora_A.weight": os.path.basename(path)}
+
+    def load_lora_weights(self, state_dict, adapter_name):
+        assert adapter_name not in self.adapters
+        self.adapters[adapter_name] = state_dict["transformer.lora_A.weight"]
+
+    def delete_adapters(self, name):
+        del self.adapters[name]
+
+    def enable_lora(self):
+        pass
+
+    def set_adapters(self, names, adapter_weights):
+        self.active = names[0]
+
+
+def test_colliding_sanitized_names_load_separate_adapters(tmp_path):
+    for name in ("a.b.safetensors", "a_b.safetensors"):
+        (tmp_path / name).write_bytes(b"x")
+    pipe = RecordingPipe()
+    manager = LoRAManager(pipe, lora_dir=str(tmp_path), fuse=False, hub_allowlist=[])
+
+    manager.activate("a.b.safetensors")
+    first = pipe.active
+    manager.activate("a_b.safetensors")
+    assert pipe.active != first
+    assert sorted(pipe.adapters.values()) == ["a.b.safetensors", "a_b.safetensors"]
+    assert pipe.adapters[pipe.active] == "a_b.safetensors"
+
+    manager.activate("a.b.safetensors")
+    assert pipe.adapters[pipe.active] == "a.b.safetensors"
+
+
+def test_adapter_name_unique_for_hub_ids():
+    assert adapter_name("owner/x") != adapter_name("owner_x")
@@ -0,0 +1,67 @@
+"""memory_planner: 가상 구성요소 크기/예산으로 전략, 배치 크기, VAE 설정 확인"""
+
+import pytest
+
+import memory_planner
+from memory_planner import GB, device_memory_budget, known_footprints, plan_memory
+
+FOOTPRINTS = {"transformer": 8 * GB, "text_encoder_2": 4 * GB, "text_encoder": GB // 4, "vae": GB // 8}
+
+
+@pytest.mark.parametrize("budget_gb,strategy", [
+    (40, "resident"),
+    (12, "model"),
+    (6, "sequential"),
+    (0, "sequential"),
+])
+def test_strategy_by_budget(budget_gb, strategy):
+    plan = plan_memory("flux", FOOTPRINTS, budget_gb * GB, strategy="auto")
+    assert plan.strategy == strategy
+
+
+def test_forced_strategy_and_unknown_strategy():
+    assert plan_memory("flux", FOOTPRINTS, 80 * GB, strategy="sequential").strategy == "sequential"
+    with pytest.raises(ValueError):
+        plan_memory("flux", FOOTPRINTS, 80 * GB, strategy="gpu")
+
+
+def test_known_flux_footprints_on_common_cards():
+    footprints = known_footprints("flux")
+    strategies = [plan_memory("flux", footprints, gb * GB, strategy="auto").strategy for gb in (24, 32, 48)]
+    assert strategies == ["sequential", "model", "resident"]
+
+
+def test_max_batch_size_grows_with_headroom():
+    small = plan_memory("flux", FOOTPRINTS, 14 * GB, strategy="resident")
+    large = plan_memory("flux", FOOTPRINTS, 80 * GB, strategy="resident")
+    assert small.max_batch_size(1024, 1024) == 1
+    assert 1 < large.max_batch_size(1024, 1024) <= 16
+    assert large.max_batch_size(1024, 1024, limit=4) == 4
+    assert large.max_batch_size(512, 512) >= large.max_batch_size(1024, 1024)
+
+
+def test_vae_settings(monkeypatch):
+    monkeypatch.setattr(memory_planner, "VAE_TILING", "auto")
+    roomy = plan_memory("flux", FOOTPRINTS, 80 * GB, strategy="resident")
+    assert roomy.vae_settings(1024, 1024) == (False, False)
+    # 타일링 기준 해상도를 넘으면 메모리와 관계없이 tiling
+    assert roomy.vae_settings(2048, 2048)[1] is True
+
+    tight = plan_memory("flux", FOOTPRINTS, 16 * GB, strategy="resident")
+    # 한 장은 들어가지만 배치 전체는 넘으면 slicing만
+    assert tight.vae_settings(1024, 1024, batch_size=1) == (False, False)
+    assert tight.vae_settings(1024, 1024, batch_size=8) == (True, False)
+
+    monkeypatch.setattr(memory_planner, "VAE_TILING", "off")
+    assert tight.vae_settings(2048, 2048, batch_size=8) == (False, False)
+
+
+def test_budget_without_cuda_is_zero_and_logged(monkeypatch, capsys):
+    torch = pytest.importorskip("torch")
+    monkeypatch.setattr(memory_planner, "MEMORY_BUDGET_GB", "")
+    monkeypatch.setattr(torch.cuda, "is_available", lambda: False)
+    assert device_memory_budget() == 0
+    assert "CUDA" in capsys.readouterr().out
+
+    monkeypatch.setattr(memory_planner, "MEMORY_BUDGET_GB", "24")
+    assert device_memory_budget() == 24 * GB
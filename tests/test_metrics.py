@@ -0,0 +1,83 @@
+"""metrics: 동시 flush의 원자적 기록, 백그라운드 flush, finish의 한 번만 집계 확인"""
+
+import json
+import os
+import threading
+import time
+
+from metrics import JobMetrics, MetricsRegistry
+
+
+def job(total_ms=120.0):
+    return {"total_ms": total_ms, "stages_ms": {"denoise": 100.0, "encode": 20.0},
+            "gpu_peak_mb": None, "process_peak_rss_mb": 512.0}
+
+
+def test_concurrent_flushes_write_complete_files(tmp_path):
+    path = str(tmp_path / "metrics.json")
+    registry = MetricsRegistry(path=path, flush_seconds=0)
+    errors = []
+
+    def worker():
+        try:
+            for _ in range(50):
+                registry.observe("flux", job())
+                registry.flush(force=True)
+                with open(path) as f:
+                    json.load(f)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    registry.flush(force=True)
+
+    assert errors == []
+    with open(path) as f:
+        data = json.load(f)
+    assert data["jobs"] == [{"model": "flux", "status": "ok", "count": 400}]
+    assert data["peak_memory_bytes"] == [{"model": "flux", "kind": "host", "value": 512 * 1024 ** 2}]
+    assert [name for name in os.listdir(tmp_path) if name.endswith(".tmp")] == []
+
+
+def test_observe_flushes_off_the_calling_thread(tmp_path):
+    path = str(tmp_path / "metrics.prom")
+    registry = MetricsRegistry(path=path, flush_seconds=0)
+    writers = []
+    original = registry.flush
+
+    def recording_flush(force=False):
+        writers.append(threading.current_thread().name)
+        original(force)
+
+    registry.flush = recording_flush
+    registry.observe("flux", job())
+    deadline = time.monotonic() + 5
+    while not os.path.exists(path) and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert writers and all(name.startswith("metrics") for name in writers)
+    with open(path) as f:
+        assert 'flux_worker_jobs_total{model="flux",status="ok"} 1' in f.read()
+
+
+def test_finish_observes_once_and_swallows_registry_errors():
+    class Registry:
+        calls = 0
+
+        def observe(self, model, result, status="ok"):
+            self.calls += 1
+            raise OSError("disk full")
+
+    registry = Registry()
+    metrics = JobMetrics()
+    with metrics.stage("parse"):
+        pass
+    first = metrics.finish("flux", registry=registry)
+    second = metrics.finish("flux", status="error", registry=registry)
+
+    assert registry.calls == 1
+    assert "parse" in first["stages_ms"] and "parse" in second["stages_ms"]
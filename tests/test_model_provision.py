@@ -0,0 +1,178 @@
+"""model_provision: 로컬 가짜 허브(LocalHub)로 선택 다운로드, 마커, 이어받기, 손상 복구, 잠금 확인"""
+
+import os
+import threading
+
+import pytest
+
+import model_provision
+from model_provision import (
+    FileLock, LocalHub, MARKER_FILE, fetch_file, file_sha256, is_complete, provision, read_marker
+)
+
+REPO = "org/tiny-model"
+VARIANT = "tiny"
+
+
+class CountingHub(LocalHub):
+    """open 호출(오프셋)을 기록하고, 필요하면 첫 응답을 손상시키는 LocalHub"""
+
+    def __init__(self, root, corrupt_first=False):
+        super().__init__(root)
+        self.opens = []
+        self.corrupt_first = corrupt_first
+
+    def open(self, repo_id, path, offset=0, revision=None, token=None):
+        self.opens.append((path, offset))
+        stream = super().open(repo_id, path, offset, revision, token)
+        if self.corrupt_first:
+            self.corrupt_first = False
+            data = stream.read()
+            stream.close()
+            return _Bytes(b"\xff" * len(data))
+        return stream
+
+
+class _Bytes:
+    def __init__(self, data):
+        self.data = data
+
+    def read(self, size):
+        chunk, self.data = self.data[:size], self.data[size:]
+        return chunk
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def hub_root(tmp_path, monkeypatch):
+    root = tmp_path / "hub"
+    repo = root / REPO
+    for rel, size in [("model_index.json", 100), ("transformer/weights.bin", 300_000),
+                      ("vae/weights.bin", 50_000), ("original/full.bin", 400_000), ("README.md", 10)]:
+        path = repo / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(os.urandom(size))
+    monkeypatch.setitem(model_provision.MANIFESTS, VARIANT, {
+        "repo_id": REPO,
+        "allow_patterns": ["model_index.json", "transformer/*", "vae/*"],
+    })
+    # 작은 청크로 여러 번 읽게 함
+    monkeypatch.setattr(model_provision, "CHUNK_SIZE", 64 * 1024)
+    return str(root)
+
+
+def remote_for(hub, rel):
+    return next(f for f in hub.list_files(REPO) if f.path == rel)
+
+
+def test_selective_fetch_and_marker(hub_root, tmp_path):
+    dest = str(tmp_path / "models" / "tiny")
+    result = provision(VARIANT, dest, hub=LocalHub(hub_root))
+
+    assert result["files"] == 3
+    assert not os.path.exists(os.path.join(dest, "original", "full.bin"))
+    assert not os.path.exists(os.path.join(dest, "README.md"))
+    marker = read_marker(dest)
+    assert set(marker["files"]) == {"model_index.json", "transformer/weights.bin", "vae/weights.bin"}
+    source = os.path.join(hub_root, REPO, "transformer", "weights.bin")
+    assert marker["files"]["transformer/weights.bin"]["sha256"] == file_sha256(source)
+    assert is_complete(dest, VARIANT)
+
+    # 완료된 상태면 허브를 다시 보지 않음
+    assert provision(VARIANT, dest, hub=CountingHub(hub_root))["skipped"]
+
+
+def test_marker_detects_missing_or_changed_files(hub_root, tmp_path):
+    dest = str(tmp_path / "tiny")
+    provision(VARIANT, dest, hub=LocalHub(hub_root))
+    weights = os.path.join(dest, "vae", "weights.bin")
+    with open(weights, "ab") as f:
+        f.write(b"extra")
+    assert not is_complete(dest, VARIANT)
+
+    hub = CountingHub(hub_root)
+    result = provision(VARIANT, dest, hub=hub)
+    assert result["downloaded_files"] == 1
+    assert hub.opens == [("vae/weights.bin", 0)]
+    assert is_complete(dest, VARIANT, verify="full")
+
+    os.remove(os.path.join(dest, MARKER_FILE))
+    assert not is_complete(dest, VARIANT)
+
+
+def test_range_resume_from_partial(hub_root, tmp_path):
+    hub = CountingHub(hub_root)
+    remote = remote_for(hub, "transformer/weights.bin")
+    dest = str(tmp_path / "tiny")
+    os.makedirs(os.path.join(dest, "transformer"))
+    source = os.path.join(hub_root, REPO, remote.path)
+    with open(source, "rb") as f:
+        head = f.read(120_000)
+    with open(os.path.join(dest, remote.path + ".partial"), "wb") as f:
+        f.write(head)
+
+    sha256, received = fetch_file(hub, REPO, remote, dest)
+    assert hub.opens == [(remote.path, 120_000)]
+    assert received == remote.size - 120_000
+    assert sha256 == remote.sha256
+    assert not os.path.exists(os.path.join(dest, remote.path + ".partial"))
+
+
+def test_corrupt_partial_restarts_from_zero(hub_root, tmp_path):
+    hub = CountingHub(hub_root)
+    remote = remote_for(hub, "vae/weights.bin")
+    dest = str(tmp_path / "tiny")
+    os.makedirs(os.path.join(dest, "vae"))
+    with open(os.path.join(dest, remote.path + ".partial"), "wb") as f:
+        f.write(b"\x00" * 10_000)
+
+    sha256, _ = fetch_file(hub, REPO, remote, dest)
+    assert sha256 == remote.sha256
+    assert hub.opens == [(remote.path, 10_000), (remote.path, 0)]
+    assert file_sha256(os.path.join(dest, remote.path)) == remote.sha256
+
+
+def test_corrupt_download_fails_after_one_restart(hub_root, tmp_path):
+    class AlwaysCorrupt(CountingHub):
+        def open(self, *args, **kwargs):
+            self.corrupt_first = True
+            return super().open(*args, **kwargs)
+
+    hub = AlwaysCorrupt(hub_root)
+    remote = remote_for(hub, "vae/weights.bin")
+    dest = str(tmp_path / "tiny")
+    with pytest.raises(IOError):
+        fetch_file(hub, REPO, remote, dest)
+    assert len(hub.opens) == 2
+    assert not os.path.exists(os.path.join(dest, remote.path + ".partial"))
+
+
+def test_lock_times_out_while_held(tmp_path):
+    path = str(tmp_path / "tiny.lock")
+    with FileLock(path):
+        with pytest.raises(TimeoutError):
+            with FileLock(path, timeout=0.2, poll=0.05):
+                pass
+    with FileLock(path, timeout=0.2):
+        pass
+
+
+def test_concurrent_provision_downloads_once(hub_root, tmp_path):
+    dest = str(tmp_path / "tiny")
+    hub = CountingHub(hub_root)
+    results = []
+
+    def worker():
+        results.append(provision(VARIANT, dest, hub=hub))
+
+    threads = [threading.Thread(target=worker) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(r["skipped"] for r in results) == [False, True, True]
+    assert len(hub.opens) == 3
+    assert is_complete(dest, VARIANT, verify="full")
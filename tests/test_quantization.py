@@ -0,0 +1,84 @@
+"""quantization: 작은 Linear 모델로 int8/fp8 오차(PSNR)와 저장 -> mmap 로드 왕복 확인"""
+
+import math
+
+import pytest
+import torch
+from torch import nn
+
+from quantization import (
+    QuantizedLinear, fp8_supported, load_or_quantize, load_quantized, quantize_module, quantized_path,
+    save_quantized,
+)
+
+MODES = ["int8"] + (["fp8"] if fp8_supported() else [])
+
+
+def tiny_model():
+    return nn.Sequential(nn.Linear(256, 512), nn.GELU(), nn.Linear(512, 256, bias=False))
+
+
+def reference():
+    torch.manual_seed(0)
+    return tiny_model().eval()
+
+
+def psnr(output, expected):
+    mse = torch.mean((output.float() - expected.float()) ** 2).item()
+    peak = expected.abs().max().item()
+    return float("inf") if mse == 0 else 10 * math.log10(peak ** 2 / mse)
+
+
+@pytest.fixture
+def inputs():
+    return torch.randn(4, 256, generator=torch.Generator().manual_seed(1))
+
+
+@pytest.mark.parametrize("mode,min_psnr", [("int8", 35.0), ("fp8", 25.0)])
+def test_quantized_output_close_to_reference(mode, min_psnr, inputs):
+    if mode not in MODES:
+        pytest.skip("float8_e4m3fn 미지원")
+    with torch.no_grad():
+        expected = reference()(inputs)
+        module = quantize_module(reference(), mode, torch.float32)
+        output = module(inputs)
+
+    assert all(isinstance(module[i], QuantizedLinear) for i in (0, 2))
+    assert psnr(output, expected) >= min_psnr
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_save_and_load_round_trip(tmp_path, mode, inputs):
+    path = str(tmp_path / f"tiny-{mode}.safetensors")
+    module = quantize_module(reference(), mode, torch.float32)
+    save_quantized(module, path, mode, torch.float32, source="tiny")
+
+    loaded = load_quantized(tiny_model, path)
+    assert loaded.quantized_layers == module.quantized_layers
+    for key, tensor in module.state_dict().items():
+        assert torch.equal(loaded.state_dict()[key], tensor)
+    with torch.no_grad():
+        assert torch.equal(loaded(inputs), module(inputs))
+
+
+def test_load_or_quantize_builds_file_once(tmp_path):
+    path = str(tmp_path / "quantized" / "tiny-int8.safetensors")
+    calls = []
+
+    def load_full():
+        calls.append(1)
+        return reference()
+
+    load_or_quantize(load_full, tiny_model, path, "int8", torch.float32)
+    load_or_quantize(load_full, tiny_model, path, "int8", torch.float32)
+    assert calls == [1]
+
+
+def test_quantized_path_depends_on_model_revision(tmp_path):
+    root = str(tmp_path)
+    base = quantized_path(root, "owner/model", "transformer", "int8")
+    assert base.endswith("owner--model-transformer-int8.safetensors")
+    first = quantized_path(root, "owner/model", "transformer", "int8", model_revision="a")
+    second = quantized_path(root, "owner/model", "transformer", "int8", model_revision="b")
+    assert len({base, first, second}) == 3
+    assert first == quantized_path(root, "owner/model", "transformer", "int8", model_revision="a")
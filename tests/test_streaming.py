@@ -0,0 +1,44 @@
+"""streaming: 미리보기 설정 검증과 크기 제한 확인"""
+
+import pytest
+import torch
+
+import streaming
+from streaming import StepProgress, latents_to_preview, preview_settings
+
+
+def test_preview_settings_clamps_size():
+    assert preview_settings(5, 256, 1024, 768) == (5, 256)
+    assert preview_settings(5, 4096, 512, 384) == (5, 512)
+    assert preview_settings(5, 4096, 2048, 2048, max_size=640) == (5, 640)
+    assert preview_settings(0, 256, 1024, 1024) == (0, 256)
+
+
+@pytest.mark.parametrize("every,size", [(-1, 256), (5, 0), (5, -8)])
+def test_preview_settings_rejects_invalid(every, size):
+    with pytest.raises(ValueError):
+        preview_settings(every, size, 1024, 1024)
+
+
+def test_step_progress_rejects_negative_interval():
+    with pytest.raises(ValueError):
+        StepProgress(lambda event: None, 10, 512, 512, preview_every=-2)
+
+
+def test_preview_never_larger_than_output(monkeypatch):
+    monkeypatch.setattr(streaming, "PREVIEW_MAX_SIZE", 512)
+    latents = torch.zeros(1, 16, 256 // 8, 192 // 8)
+    assert max(latents_to_preview(latents, 256, 192, preview_size=10_000).size) == 256
+
+    latents = torch.zeros(1, 16, 2048 // 8, 2048 // 8)
+    assert latents_to_preview(latents, 2048, 2048, preview_size=10_000).size == (512, 512)
+
+
+def test_previews_emitted_every_n_steps():
+    events = []
+    progress = StepProgress(events.append, 6, 64, 64, preview_every=2, preview_size=4096)
+    latents = torch.zeros(1, 16, 8, 8)
+    for step in range(6):
+        progress(None, step, None, {"latents": latents})
+    assert [e["step"] for e in events if "preview" in e] == [2, 4]
+    assert progress.preview_size == 64
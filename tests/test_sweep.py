@@ -0,0 +1,125 @@
+"""sweep: 조합 전개와 개수 제한, 시드 순환, 배치 묶기, 단일 작업 측정 배치 선택, 비용 계산 확인"""
+
+import pytest
+
+import sweep
+from request_params import MAX_SEED
+from sweep import SWEEP_MAX_VARIATIONS, cost_report, parse_sweep, plan_batches
+
+BASE = {"width": 512, "height": 512, "steps": 28, "guidance_scale": 3.5,
+        "max_sequence_length": 512, "lora_name": None, "lora_strength": 1.0}
+
+
+def test_grid_expands_guidance_then_steps_then_seeds():
+    variations = parse_sweep({"seed": 7, "sweep": {"count": 2, "guidance_scale": [2.5, 3.5], "steps": 20}})
+    assert variations == [
+        {"seed": 7, "guidance_scale": 2.5, "steps": 20},
+        {"seed": 8, "guidance_scale": 2.5, "steps": 20},
+        {"seed": 7, "guidance_scale": 3.5, "steps": 20},
+        {"seed": 8, "guidance_scale": 3.5, "steps": 20},
+    ]
+    assert parse_sweep({"sweep": {"seeds": [1, 2]}}) == [{"seed": 1}, {"seed": 2}]
+
+
+def test_variation_limit():
+    assert parse_sweep.__defaults__ == (SWEEP_MAX_VARIATIONS,)
+    job_input = {"sweep": {"seeds": [1, 2, 3], "guidance_scale": [2.5, 3.5], "steps": [10, 20]}}
+    assert len(parse_sweep(job_input, max_variations=12)) == 12
+    with pytest.raises(ValueError, match="3×2×2=12"):
+        parse_sweep(job_input, max_variations=11)
+
+
+@pytest.mark.parametrize("sweep_input", [
+    None,
+    {"count": 0},
+    {"seeds": []},
+    {"seeds": 5},
+    {"guidance_scale": []},
+])
+def test_invalid_sweep_rejected(sweep_input):
+    with pytest.raises(ValueError):
+        parse_sweep({"sweep": sweep_input})
+
+
+def test_seeds_wrap_around_max_seed():
+    variations = parse_sweep({"seed": MAX_SEED - 1, "sweep": {"count": 3}})
+    assert [v["seed"] for v in variations] == [MAX_SEED - 1, MAX_SEED, 0]
+
+
+def test_random_base_seed_stays_in_range(monkeypatch):
+    monkeypatch.setattr(sweep.random, "randint", lambda low, high: high)
+    assert [v["seed"] for v in parse_sweep({"sweep": {"count": 2}})] == [MAX_SEED, 0]
+
+
+def test_plan_batches_groups_by_key_and_splits_by_size():
+    items = [{"g": g, "i": i} for i, g in enumerate([1, 2, 1, 1, 2, 1])]
+    assert plan_batches(items, lambda item: item["g"], 2) == [[0, 2], [3, 5], [1, 4]]
+    assert plan_batches(items, lambda item: item["g"], 8, indices=range(1, 6)) == [[1, 4], [2, 3, 5]]
+
+
+@pytest.fixture(scope="module")
+def handler():
+    pytest.importorskip("diffusers")
+    import handler
+
+    return handler
+
+
+def variations_for(job_sweep):
+    return [{**BASE, **variation} for variation in parse_sweep({"seed": 1, "sweep": job_sweep})]
+
+
+def test_batch_key_separates_guidance_steps_and_lora(handler):
+    variations = variations_for({"count": 2, "guidance_scale": [2.5, 3.5], "steps": [10, 20]})
+    assert plan_batches(variations, handler.batch_key, 8) == [[0, 1], [2, 3], [4, 5], [6, 7]]
+
+    key = handler.batch_key(BASE)
+    assert handler.batch_key({**BASE, "seed": 99}) == key
+    # LoRA가 없으면 강도는 키에 영향을 주지 않음
+    assert handler.batch_key({**BASE, "lora_strength": 0.5}) == key
+    assert handler.batch_key({**BASE, "lora_name": "style", "lora_strength": 0.5}) != \
+        handler.batch_key({**BASE, "lora_name": "style", "lora_strength": 1.0})
+
+
+@pytest.fixture
+def recorded_batches(handler, monkeypatch):
+    batches = []
+
+    def run_batch(batch):
+        batches.append([params["seed"] for params in batch])
+        return [params["seed"] for params in batch]
+
+    monkeypatch.setattr(handler, "run_batch", run_batch)
+    return batches
+
+
+def test_existing_single_batch_is_used_for_calibration(handler, recorded_batches):
+    variations = variations_for({"count": 3, "guidance_scale": [2.5, 3.5]})
+    outputs, runs, calibration_run = handler.generate_sweep(variations, max_batch_size=2, calibrate=False)
+
+    assert [run["indices"] for run in runs] == [[2], [0, 1], [3, 4], [5]]
+    assert calibration_run == 0
+    assert outputs == [v["seed"] for v in variations]
+
+
+def test_compare_single_splits_off_first_variation(handler, recorded_batches):
+    variations = variations_for({"count": 4})
+    _, runs, calibration_run = handler.generate_sweep(variations, max_batch_size=4, calibrate=False)
+    assert [run["indices"] for run in runs] == [[0, 1, 2, 3]] and calibration_run is None
+
+    _, runs, calibration_run = handler.generate_sweep(variations, max_batch_size=4, calibrate=True)
+    assert [run["indices"] for run in runs] == [[0], [1, 2, 3]] and calibration_run == 0
+
+
+def test_cost_report_arithmetic():
+    variations = [{"steps": 20}, {"steps": 10}, {"steps": 20}]
+    calibration = {"index": 0, "total_s": 3.0, "text_encode_s": 0.5, "denoise_s": 2.0, "steps": 20}
+    report = cost_report(3.5, variations, calibration)
+
+    # 스텝당 0.1초, 고정 비용 0.5초: 3.0 + (0.5 + 1.0) + (0.5 + 2.0)
+    assert report["single_job_estimate_s"] == 7.0
+    assert report["single_job_per_image_s"] == 2.333
+    assert report["speedup"] == 2.0
+    assert report["per_image_s"] == 1.167
+
+    assert cost_report(3.0, variations) == {"images": 3, "sweep_s": 3.0, "per_image_s": 1.0}
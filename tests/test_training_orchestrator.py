@@ -0,0 +1,200 @@
+"""training_orchestrator: fake_replicate 서버로 폴링 백오프, 웹훅 서명, 병렬 검증 확인"""
+
+import asyncio
+import base64
+import json
+import os
+import socket
+import time
+
+import pytest
+from aiohttp import ClientSession
+
+from fake_replicate import FakeReplicate
+from training_orchestrator import (
+    TrainingJob, TrainingOrchestrator, WebhookReceiver, WEBHOOK_PATH, sign_webhook, verify_webhook
+)
+
+SECRET = f"whsec_{base64.b64encode(b'test-secret-key-0123456789').decode()}"
+VERSION = "fake/flux-dev-lora-trainer:abc123"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def run(scenario, **fake_kwargs):
+    """가짜 Replicate와 오케스트레이터를 띄워 scenario(fake, orchestrator) 실행"""
+    async def main():
+        fake = FakeReplicate(**fake_kwargs)
+        base_url = await fake.start("127.0.0.1", 0)
+        orchestrator = TrainingOrchestrator(api_url=f"{base_url}/v1", token="fake",
+                                            poll_min=0.05, poll_max=0.4, poll_factor=2.0)
+        try:
+            return await scenario(fake, orchestrator)
+        finally:
+            await orchestrator.close()
+            await fake.stop()
+    return asyncio.run(main())
+
+
+def test_polling_backs_off_while_status_is_unchanged():
+    async def scenario(fake, orchestrator):
+        jobs = await asyncio.gather(*(
+            orchestrator.create(VERSION, {"steps": 10}, f"user/lora-{i}") for i in range(3)
+        ))
+        jobs = await orchestrator.wait_all(jobs)
+        return fake, jobs
+
+    fake, jobs = run(scenario, training_seconds=1.5)
+    for job in jobs:
+        assert job.status == "succeeded"
+        assert job.version.startswith("user/lora-")
+        # 0.05초 고정 간격이면 약 30회, 백오프로 훨씬 적게 폴링
+        assert job.polls <= 12
+        assert job.finished - fake.completed_at(job.id) < 0.4 * 1.2 + 0.2
+
+
+def test_create_and_predict_are_not_retried():
+    calls = []
+
+    class RecordingClient:
+        async def post(self, url, **kwargs):
+            calls.append(kwargs.get("retries"))
+            raise ConnectionError("stop")
+
+        async def close(self):
+            pass
+
+    async def main():
+        orchestrator = TrainingOrchestrator(api_url="http://unused/v1", token="t", client=RecordingClient())
+        with pytest.raises(ConnectionError):
+            await orchestrator.create(VERSION, {}, "user/lora")
+        with pytest.raises(ConnectionError):
+            await orchestrator.predict("user/lora:v1", {"prompt": "x"})
+
+    asyncio.run(main())
+    assert calls == [0, 0]
+
+
+def test_signed_webhook_wakes_wait_without_polling():
+    async def scenario(fake, orchestrator):
+        port = free_port()
+        receiver = await WebhookReceiver(orchestrator, public_url=f"http://127.0.0.1:{port}",
+                                         host="127.0.0.1", port=port, secret=SECRET).start()
+        try:
+            job = await orchestrator.create(VERSION, {}, "user/lora")
+            # 웹훅 모드의 보조 폴링 간격(300초)보다 훨씬 빨리 끝나야 함
+            job = await asyncio.wait_for(orchestrator.wait(job), 5)
+            return job, receiver.received, receiver.rejected
+        finally:
+            await receiver.stop()
+
+    job, received, rejected = run(scenario, training_seconds=0.5, secret=SECRET)
+    assert job.status == "succeeded"
+    assert job.polls == 0
+    assert job.webhooks >= 1
+    assert received >= 1 and rejected == 0
+
+
+def test_unsigned_or_forged_webhooks_are_rejected():
+    async def scenario(fake, orchestrator):
+        port = free_port()
+        receiver = await WebhookReceiver(orchestrator, public_url=f"http://127.0.0.1:{port}",
+                                         host="127.0.0.1", port=port, secret=SECRET).start()
+        job = await orchestrator.create(VERSION, {}, "user/lora")
+        forged = json.dumps({"id": job.id, "status": "succeeded",
+                             "output": {"version": "attacker/model:evil"}}).encode()
+        url = f"http://127.0.0.1:{port}{WEBHOOK_PATH}"
+        wrong_key = f"whsec_{base64.b64encode(b'another-key').decode()}"
+        timestamp = str(int(time.time()))
+        try:
+            async with ClientSession() as session:
+                unsigned = await session.post(url, data=forged)
+                wrong = await session.post(url, data=forged, headers={
+                    "webhook-id": "msg_1", "webhook-timestamp": timestamp,
+                    "webhook-signature": f"v1,{sign_webhook(wrong_key, 'msg_1', timestamp, forged)}",
+                })
+            return job, unsigned.status, wrong.status, receiver.rejected
+        finally:
+            await receiver.stop()
+
+    job, unsigned, wrong, rejected = run(scenario, training_seconds=5)
+    assert (unsigned, wrong) == (401, 401)
+    assert rejected == 2
+    assert job.status == "starting"
+    assert job.version is None
+
+
+def test_receiver_requires_secret():
+    async def main():
+        receiver = WebhookReceiver(TrainingOrchestrator(token="t"), public_url="http://x",
+                                   host="127.0.0.1", port=free_port(), secret="")
+        with pytest.raises(ValueError):
+            await receiver.start()
+
+    asyncio.run(main())
+
+
+def test_verify_webhook_rejects_stale_timestamp():
+    body = b'{"id": "t"}'
+    timestamp = str(int(time.time()) - 3600)
+    headers = {"webhook-id": "msg_1", "webhook-timestamp": timestamp,
+               "webhook-signature": f"v1,{sign_webhook(SECRET, 'msg_1', timestamp, body)}"}
+    assert not verify_webhook(SECRET, headers, body)
+
+
+def test_webhook_does_not_downgrade_terminal_status():
+    async def main():
+        orchestrator = TrainingOrchestrator(token="t")
+        job = TrainingJob({"id": "t1", "status": "succeeded", "output": {"version": "user/lora:v1"}})
+        orchestrator.jobs["t1"] = job
+        accepted = orchestrator.notify({"id": "t1", "status": "processing", "output": None})
+        return job, accepted
+
+    job, accepted = asyncio.run(main())
+    assert not accepted
+    assert job.status == "succeeded"
+    assert job.version == "user/lora:v1"
+
+
+def test_validation_runs_predictions_in_parallel(tmp_path):
+    prompts = [f"TOK prompt {i}" for i in range(8)]
+
+    async def scenario(fake, orchestrator):
+        started = time.perf_counter()
+        results = await orchestrator.validate("user/lora:v1", prompts, str(tmp_path), concurrency=4)
+        return fake, results, time.perf_counter() - started
+
+    fake, results, elapsed = run(scenario, prediction_seconds=0.3)
+    assert [r["prompt"] for r in results] == prompts
+    assert all(os.path.exists(path) for r in results for path in r["files"])
+    assert fake.requests["create_prediction"] == 8
+    # 순차면 2.4초, 동시 4개면 약 0.6초
+    assert elapsed < 1.5
+
+
+def test_validation_download_failure_is_reported_per_prompt(tmp_path):
+    prompts = ["TOK ok", "TOK broken"]
+
+    async def scenario(fake, orchestrator):
+        async def predict(version, input):
+            return [f"https://example.invalid/{input['prompt'].split()[-1]}.png"]
+
+        class Response:
+            body = b"png"
+
+        async def get(url, **kwargs):
+            if "broken" in url:
+                raise ConnectionError("connection reset")
+            return Response()
+
+        orchestrator.predict = predict
+        orchestrator.client.get = get
+        return await orchestrator.validate("user/lora:v1", prompts, str(tmp_path))
+
+    ok, broken = run(scenario)
+    assert os.path.exists(ok["files"][0])
+    assert broken["prompt"] == "TOK broken" and "connection reset" in broken["error"]
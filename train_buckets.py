@@ -0,0 +1,211 @@
+"""
+학습용 가로세로 비율 버킷 엔진
+
+- 버킷 배정: 모든 버킷이 거의 같은 픽셀 수(TRAIN_RESOLUTION^2)를 갖고, 이미지마다 비율이
+  가장 가까운 버킷을 고름 (dataset_ingest가 전처리하면서 이 크기로 잘라 저장)
+- 배치 크기: 버킷마다 토큰 수로 활성화 메모리를 추정해 메모리 예산 안에서 가장 큰 값
+- 샘플러: 같은 버킷의 이미지로만 배치를 만들고, 에폭마다 버킷 안 순서와 배치 순서를 섞음
+  (시드 + 위치만으로 재현되므로 체크포인트에서 이어서 학습 가능)
+
+배치 계획은 CPU에서 가상 예산으로 확인할 수 있습니다:
+
+    python train_buckets.py --budget-gb 24 48 80
+"""
+
+import argparse
+import math
+import os
+import random
+import time
+
+from memory_planner import GB, MEMORY_RESERVE_GB, device_memory_budget
+from resolution_buckets import build_buckets
+
+# 배치 설정 (환경 변수로 변경 가능)
+TRAIN_MAX_BATCH_SIZE = int(os.environ.get("TRAIN_MAX_BATCH_SIZE", "16"))
+# 학습 시 토큰당 활성화 메모리 (바이트, gradient checkpointing 기준)
+# 기본값: 블록 입력 저장 57개 + 재계산 중인 블록 하나 (hidden 3072, bf16)
+TRAIN_BYTES_PER_TOKEN = int(os.environ.get("TRAIN_BYTES_PER_TOKEN", str(3072 * 2 * (57 + 32))))
+# 캡션 T5 토큰 수 (latent_cache의 TRAIN_MAX_SEQUENCE_LENGTH와 같은 값)
+TRAIN_TEXT_TOKENS = int(os.environ.get("TRAIN_MAX_SEQUENCE_LENGTH", "512"))
+
+# FLUX 트랜스포머 bf16 가중치 (LoRA 학습 시 고정)
+FLUX_TRANSFORMER_BYTES = 11_900_000_000 * 2
+
+
+def bucket_key(bucket):
+    return f"{bucket[0]}x{bucket[1]}"
+
+
+def parse_bucket(key):
+    width, height = (int(v) for v in key.split("x"))
+    return width, height
+
+
+def sample_bytes(bucket, text_tokens=TRAIN_TEXT_TOKENS, bytes_per_token=TRAIN_BYTES_PER_TOKEN):
+    """버킷 이미지 한 장의 학습 활성화 메모리 근사"""
+    width, height = parse_bucket(bucket)
+    tokens = (width // 16) * (height // 16) + text_tokens
+    return tokens * bytes_per_token
+
+
+def plan_batch_sizes(bucket_counts, budget, fixed_bytes, max_batch=TRAIN_MAX_BATCH_SIZE,
+                     text_tokens=TRAIN_TEXT_TOKENS, bytes_per_token=TRAIN_BYTES_PER_TOKEN):
+    """버킷별로 예산 안에 들어가는 가장 큰 배치 크기
+
+    Args:
+        bucket_counts: {"WxH": 이미지 수}
+        budget: 디바이스 메모리 예산 (바이트)
+        fixed_bytes: 배치 크기와 무관한 메모리 (가중치, LoRA, 옵티마이저 상태)
+
+    Returns:
+        {"WxH": 배치 크기} (최소 1, 버킷 이미지 수와 max_batch 이하)
+    """
+    headroom = budget - fixed_bytes - MEMORY_RESERVE_GB * GB
+    plan = {}
+    for bucket, count in bucket_counts.items():
+        per_sample = sample_bytes(bucket, text_tokens, bytes_per_token)
+        fits = int(headroom // per_sample) if headroom > 0 else 0
+        plan[bucket] = max(1, min(fits, max_batch, count))
+    return plan
+
+
+class BucketBatchSampler:
+    """같은 버킷 이미지로만 배치를 만드는 무한 샘플러
+
+    next()는 (버킷, 버킷 안 행 번호 목록)을 돌려주고, state_dict()/load_state_dict()로
+    (에폭, 에폭 안 위치)를 저장/복원합니다.
+    """
+
+    def __init__(self, bucket_counts, batch_sizes, seed=0):
+        self.bucket_counts = dict(sorted(bucket_counts.items()))
+        self.batch_sizes = batch_sizes
+        self.seed = seed
+        self.epoch = 0
+        self.position = 0
+        self._batches = self._epoch_batches(0)
+
+    def _epoch_batches(self, epoch):
+        rng = random.Random(f"{self.seed}:{epoch}")
+        batches = []
+        for bucket, count in self.bucket_counts.items():
+            indices = list(range(count))
+            rng.shuffle(indices)
+            size = self.batch_sizes[bucket]
+            batches.extend((bucket, indices[i:i + size]) for i in range(0, count, size))
+        rng.shuffle(batches)
+        return batches
+
+    def batches_per_epoch(self):
+        return len(self._batches)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.position >= len(self._batches):
+            self.epoch += 1
+            self.position = 0
+            self._batches = self._epoch_batches(self.epoch)
+        bucket, indices = self._batches[self.position]
+        self.position += 1
+        return bucket, indices
+
+    def state_dict(self):
+        return {"seed": self.seed, "epoch": self.epoch, "position": self.position}
+
+    def load_state_dict(self, state):
+        self.seed = state["seed"]
+        self.epoch = state["epoch"]
+        self.position = state["position"]
+        self._batches = self._epoch_batches(self.epoch)
+
+
+class BucketThroughput:
+    """버킷별 처리량 집계 (학습 스텝 시간 기준)"""
+
+    def __init__(self):
+        self.images = {}
+        self.steps = {}
+        self.seconds = {}
+        self._started = time.perf_counter()
+
+    def record(self, bucket, images, seconds):
+        self.images[bucket] = self.images.get(bucket, 0) + images
+        self.steps[bucket] = self.steps.get(bucket, 0) + 1
+        self.seconds[bucket] = self.seconds.get(bucket, 0.0) + seconds
+
+    def state_dict(self):
+        return {"images": self.images, "steps": self.steps, "seconds": self.seconds,
+                "wall_s": time.perf_counter() - self._started}
+
+    def load_state_dict(self, state):
+        self.images = dict(state["images"])
+        self.steps = dict(state["steps"])
+        self.seconds = dict(state["seconds"])
+        # 이전 실행의 경과 시간을 이어서 계산
+        self._started = time.perf_counter() - state["wall_s"]
+
+    def to_dict(self):
+        total_images = sum(self.images.values())
+        total_seconds = sum(self.seconds.values())
+        return {
+            "images": total_images,
+            "steps": sum(self.steps.values()),
+            "images_per_s": round(total_images / total_seconds, 3) if total_seconds else 0.0,
+            "wall_s": round(time.perf_counter() - self._started, 2),
+            "buckets": {
+                bucket: {
+                    "images": self.images[bucket],
+                    "steps": self.steps[bucket],
+                    "images_per_s": round(self.images[bucket] / self.seconds[bucket], 3)
+                    if self.seconds[bucket] else 0.0,
+                }
+                for bucket in sorted(self.images)
+            },
+        }
+
+
+def bucket_report(bucket_counts, batch_sizes, budget, fixed_bytes):
+    """작업 결과에 넣을 버킷 통계"""
+    return {
+        "budget_gb": round(budget / GB, 2),
+        "fixed_gb": round(fixed_bytes / GB, 2),
+        "buckets": {
+            bucket: {
+                "images": count,
+                "batch_size": batch_sizes[bucket],
+                "batches_per_epoch": math.ceil(count / batch_sizes[bucket]),
+                "sample_gb": round(sample_bytes(bucket) / GB, 2),
+            }
+            for bucket, count in sorted(bucket_counts.items())
+        },
+    }
+
+
+def plan_for_device(bucket_counts, fixed_bytes=FLUX_TRANSFORMER_BYTES, budget=None):
+    """현재 디바이스 예산(MEMORY_BUDGET_GB 또는 GPU 여유 메모리) 기준 배치 계획"""
+    if budget is None:
+        budget = device_memory_budget()
+    batch_sizes = plan_batch_sizes(bucket_counts, budget, fixed_bytes)
+    return batch_sizes, bucket_report(bucket_counts, batch_sizes, budget, fixed_bytes)
+
+
+def main():
+    from dataset_ingest import TRAIN_RESOLUTION, TRAIN_BUCKET_ASPECTS
+
+    parser = argparse.ArgumentParser(description="학습 버킷 배치 계획 시뮬레이션 (CPU)")
+    parser.add_argument("--budget-gb", type=float, nargs="+", default=[24, 48, 80])
+    parser.add_argument("--resolution", type=int, default=TRAIN_RESOLUTION)
+    parser.add_argument("--images-per-bucket", type=int, default=100)
+    args = parser.parse_args()
+
+    buckets = [bucket_key(b) for b in build_buckets("", TRAIN_BUCKET_ASPECTS, str(args.resolution))]
+    counts = {bucket: args.images_per_bucket for bucket in buckets}
+    for budget_gb in args.budget_gb:
+        batch_sizes = plan_batch_sizes(counts, int(budget_gb * GB), FLUX_TRANSFORMER_BYTES)
+        print(f"{budget_gb:>6.1f}GB -> " + ", ".join(f"{b}:{s}" for b, s in batch_sizes.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -4,11 +4,20 @@ Replicate를 사용한 FLUX LoRA 학습 및 추론 통합 스크립트
 
 import replicate
 import requests
-import zipfile
+import asyncio
 import os
-from PIL import Image
 import time
 
+from dataset_packager import DatasetPackager
+from training_orchestrator import (
+    TrainingOrchestrator, WebhookReceiver, WEBHOOK_PATH, WEBHOOK_PUBLIC_URL, REPLICATE_WEBHOOK_SECRET
+)
+
+# 웹훅은 공개 URL과 서명 키가 모두 있을 때만 사용 (키 없이는 수신기가 시작되지 않음)
+USE_WEBHOOK = bool(WEBHOOK_PUBLIC_URL and REPLICATE_WEBHOOK_SECRET)
+if WEBHOOK_PUBLIC_URL and not REPLICATE_WEBHOOK_SECRET:
+    print("⚠️ REPLICATE_WEBHOOK_SECRET이 없어 웹훅 대신 폴링으로 학습 상태를 확인합니다")
+
 class FluxLoRATrainer:
     def __init__(self, api_token):
         os.environ["REPLICATE_API_TOKEN"] = api_token
@@ -24,27 +33,10 @@ class FluxLoRATrainer:
             trigger_word: LoRA 트리거 워드
             captions: 이미지별 캡션 딕셔너리 (선택사항)
         """
-        with zipfile.ZipFile(output_zip, 'w') as zf:
-            for filename in os.listdir(image_folder):
-                if filename.lower().endswith(('.png', '.jpg', '.jpeg')):
-                    img_path = os.path.join(image_folder, filename)
-                    
-                    # 이미지 검증 및 변환
-                    img = Image.open(img_path)
-                    if img.mode != 'RGB':
-                        img = img.convert('RGB')
-                    
-                    # ZIP에 이미지 추가
-                    zf.write(img_path, f"{filename}")
-                    
-                    # 캡션 추가
-                    base_name = os.path.splitext(filename)[0]
-                    if captions and filename in captions:
-                        caption = captions[filename]
-                    else:
-                        caption = f"a photo of {trigger_word}"
-                    
-                    zf.writestr(f"{base_name}.txt", caption)
+        # 헤더만 검증하고 필요한 파일만 병렬 변환, 이전 ZIP이 있으면 바뀐 항목만 갱신
+        report = DatasetPackager().package(image_folder, output_zip, trigger_word, captions)
+        print(f"📦 {report['images']}개 이미지 ({report['mode']}: 추가 {report['added']}, "
+              f"변경 {report['changed']}, 삭제 {report['removed']}, 변환 {report['converted']})")
         
         print(f"✅ 데이터셋 준비 완료: {output_zip}")
         return output_zip
@@ -77,6 +69,10 @@ class FluxLoRATrainer:
         # 학습 시작
         print("🚀 LoRA 학습 시작...")
         
+        # 웹훅을 쓸 수 있으면 완료 시 웹훅으로 통지 (wait_for_training에서 수신)
+        webhook = {"webhook": f"{WEBHOOK_PUBLIC_URL}{WEBHOOK_PATH}", "webhook_events_filter": ["completed"]} \
+            if USE_WEBHOOK else {}
+        
         training = replicate.trainings.create(
             version="ostris/flux-dev-lora-trainer:4ffd32160efd92e956d39c5338a9b8fbafca58e03f791f6d8011f3e20e8ea6fa",
             input={
@@ -91,7 +87,8 @@ class FluxLoRATrainer:
                 "autocaption": True,  # 자동 캡션 생성
                 "autocaption_prefix": trigger_word,
             },
-            destination=f"{os.environ.get('REPLICATE_USERNAME', 'user')}/{model_name}"
+            destination=f"{os.environ.get('REPLICATE_USERNAME', 'user')}/{model_name}",
+            **webhook
         )
         
         print(f"📊 학습 ID: {training.id}")
@@ -102,23 +99,46 @@ class FluxLoRATrainer:
         return training
     
     def wait_for_training(self, training):
-        """학습 완료 대기"""
-        print("\n⏳ 학습 진행 중...")
-        
-        while training.status not in ["succeeded", "failed", "canceled"]:
-            time.sleep(30)
-            training.reload()
-            print(f"   상태: {training.status} - {time.strftime('%H:%M:%S')}")
-        
-        if training.status == "succeeded":
-            print(f"\n✅ 학습 완료!")
-            print(f"🎉 모델: {training.output['version']}")
-            return training.output['version']
-        else:
-            print(f"\n❌ 학습 실패: {training.status}")
-            if training.error:
-                print(f"   에러: {training.error}")
-            return None
+        """학습 완료 대기 (적응형 폴링, WEBHOOK_PUBLIC_URL과 서명 키가 있으면 웹훅)"""
+        version, = self.wait_for_trainings([training])
+        return version
+    
+    def wait_for_trainings(self, trainings):
+        """여러 학습을 한 이벤트 루프에서 동시에 대기, 학습별 모델 버전(실패 시 None) 반환"""
+        print(f"\n⏳ 학습 {len(trainings)}개 진행 중...")
+        
+        async def run():
+            orchestrator = TrainingOrchestrator()
+            receiver = await WebhookReceiver(orchestrator).start() if USE_WEBHOOK else None
+            try:
+                jobs = await orchestrator.wait_all(
+                    [t.id for t in trainings],
+                    on_update=lambda job: print(f"   상태: {job.id} {job.status} - {time.strftime('%H:%M:%S')}")
+                )
+            finally:
+                if receiver:
+                    await receiver.stop()
+                await orchestrator.close()
+            return [job.version if job.status == "succeeded" else None for job in jobs]
+        
+        return asyncio.run(run())
+    
+    def generate_validation_images(self, model_version, prompts, output_dir="."):
+        """검증 이미지를 병렬로 생성하고 풀링된 클라이언트로 다운로드"""
+        async def run():
+            orchestrator = TrainingOrchestrator()
+            try:
+                return await orchestrator.validate(model_version, prompts, output_dir, input={
+                    "num_outputs": 1,
+                    "aspect_ratio": "1:1",
+                    "output_format": "png",
+                    "guidance": 3.5,
+                    "num_inference_steps": 28,
+                })
+            finally:
+                await orchestrator.close()
+        
+        return asyncio.run(run())
     
     def generate_image(self, model_version, prompt, num_images=1):
         """학습된 LoRA로 이미지 생성"""
@@ -180,16 +200,7 @@ if __name__ == "__main__":
             "MYCHAR wearing kimono in japanese garden"
         ]
         
-        for i, prompt in enumerate(test_prompts):
-            print(f"\n생성 중: {prompt}")
-            output = trainer.generate_image(model_version, prompt)
-            
-            # 이미지 저장
-            for j, image_url in enumerate(output):
-                img_data = requests.get(image_url).content
-                with open(f"output_{i}_{j}.png", "wb") as f:
-                    f.write(img_data)
-                print(f"   ✅ 저장: output_{i}_{j}.png")
+        trainer.generate_validation_images(model_version, test_prompts)
     
     print("\n🎉 완료!")
     print(f"💡 다음에 사용하려면: replicate.run('{model_version}', input={{...}})")
\ No newline at end of file
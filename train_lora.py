@@ -0,0 +1,283 @@
+"""
+FLUX LoRA 학습 스크립트 (사전 계산된 latent / 텍스트 임베딩 사용)
+
+워커(runpod_train_handler)가 별도 프로세스로 실행합니다:
+
+    python train_lora.py <config.json>
+
+- 입력: latent_cache 샤드 + train_buckets 샘플러 (이미지 디코드, VAE, 텍스트 인코더 없음)
+- 진행: 스텝마다 stdout에 "@progress {json}" 한 줄 (training_process가 파싱)
+- 체크포인트: TRAIN_CHECKPOINT_EVERY 스텝마다 <checkpoint_dir>/step-XXXXXXXX에 LoRA 가중치,
+  옵티마이저, 샘플러 위치, 난수 상태를 저장 (임시 디렉토리 -> os.replace)
+- 재개: 시작할 때 가장 최근 체크포인트가 있으면 그 스텝부터 이어서 학습
+- SIGTERM (스팟 회수 등): 현재 스텝을 마치고 체크포인트를 쓴 뒤 종료 코드 143으로 끝남
+- 결과: <checkpoint_dir>/final/<output_name>.safetensors (diffusers 형식, load_lora_weights로 로드)
+"""
+
+import json
+import math
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import time
+from collections import deque
+
+import torch
+
+from latent_cache import LatentCache
+from train_buckets import BucketBatchSampler, BucketThroughput
+
+# 체크포인트 설정 (환경 변수로 변경 가능)
+TRAIN_CHECKPOINT_DIR = os.environ.get("TRAIN_CHECKPOINT_DIR", "/runpod-volume/train_checkpoints")
+TRAIN_CHECKPOINT_EVERY = int(os.environ.get("TRAIN_CHECKPOINT_EVERY", "100"))
+# 남겨 둘 스텝 체크포인트 수 (오래된 것부터 삭제)
+TRAIN_KEEP_CHECKPOINTS = int(os.environ.get("TRAIN_KEEP_CHECKPOINTS", "2"))
+
+PROGRESS_PREFIX = "@progress "
+STATE_FILE = "state.json"
+FINAL_DIR = "final"
+LORA_TARGET_MODULES = ["to_k", "to_q", "to_v", "to_out.0"]
+# SIGTERM으로 멈췄을 때의 종료 코드 (128 + 15)
+PREEMPTED_EXIT_CODE = 143
+
+
+def emit(event, **fields):
+    """진행 이벤트 한 줄 출력 (training_process.parse_progress가 읽음)"""
+    print(PROGRESS_PREFIX + json.dumps({"event": event, **fields}), flush=True)
+
+
+def checkpoint_name(step):
+    return f"step-{step:08d}"
+
+
+def list_checkpoints(checkpoint_dir):
+    """완료된(state.json이 있는) 스텝 체크포인트를 스텝 순서로"""
+    try:
+        names = os.listdir(checkpoint_dir)
+    except FileNotFoundError:
+        return []
+    return sorted(
+        os.path.join(checkpoint_dir, name) for name in names
+        if name.startswith("step-") and os.path.exists(os.path.join(checkpoint_dir, name, STATE_FILE))
+    )
+
+
+def latest_checkpoint(checkpoint_dir):
+    checkpoints = list_checkpoints(checkpoint_dir)
+    return checkpoints[-1] if checkpoints else None
+
+
+def read_state(path):
+    with open(os.path.join(path, STATE_FILE)) as f:
+        return json.load(f)
+
+
+def final_weights(checkpoint_dir, output_name):
+    """학습이 이미 끝난 작업이면 결과 파일 경로, 아니면 None"""
+    path = os.path.join(checkpoint_dir, FINAL_DIR, f"{output_name}.safetensors")
+    return path if os.path.exists(path) else None
+
+
+def _publish(staging, final_dir):
+    if os.path.exists(final_dir):
+        shutil.rmtree(final_dir)
+    os.replace(staging, final_dir)
+
+
+def save_checkpoint(checkpoint_dir, step, loss_avg, transformer, optimizer, scheduler, sampler, throughput,
+                    keep=TRAIN_KEEP_CHECKPOINTS):
+    from peft.utils import get_peft_model_state_dict
+    from safetensors.torch import save_file
+
+    staging = tempfile.mkdtemp(prefix=".staging-", dir=checkpoint_dir)
+    lora = {k: v.detach().to("cpu").contiguous() for k, v in get_peft_model_state_dict(transformer).items()}
+    save_file(lora, os.path.join(staging, "adapter.safetensors"))
+    torch.save({
+        "optimizer": optimizer.state_dict(),
+        "scheduler": scheduler.state_dict(),
+        "rng": torch.get_rng_state(),
+        "cuda_rng": torch.cuda.get_rng_state_all() if torch.cuda.is_available() else None,
+    }, os.path.join(staging, "optimizer.pt"))
+    # state.json을 마지막에 써서 완료 마커로 사용
+    with open(os.path.join(staging, STATE_FILE), "w") as f:
+        json.dump({"step": step, "loss_avg": loss_avg, "sampler": sampler.state_dict(),
+                   "throughput": throughput.state_dict(), "saved_at": time.time()}, f)
+    path = os.path.join(checkpoint_dir, checkpoint_name(step))
+    _publish(staging, path)
+
+    for old in list_checkpoints(checkpoint_dir)[:-keep] if keep > 0 else []:
+        shutil.rmtree(old, ignore_errors=True)
+    return path
+
+
+def load_checkpoint(path, transformer, optimizer, scheduler, sampler, throughput):
+    from peft.utils import set_peft_model_state_dict
+    from safetensors.torch import load_file
+
+    state = read_state(path)
+    set_peft_model_state_dict(transformer, load_file(os.path.join(path, "adapter.safetensors")))
+    extra = torch.load(os.path.join(path, "optimizer.pt"), map_location="cpu", weights_only=False)
+    optimizer.load_state_dict(extra["optimizer"])
+    scheduler.load_state_dict(extra["scheduler"])
+    torch.set_rng_state(extra["rng"])
+    if extra["cuda_rng"] is not None and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(extra["cuda_rng"])
+    sampler.load_state_dict(state["sampler"])
+    throughput.load_state_dict(state["throughput"])
+    return state["step"], state["loss_avg"]
+
+
+def load_transformer(model_name, rank, alpha, device, dtype):
+    """고정된 FLUX 트랜스포머 + 학습할 LoRA 어댑터"""
+    from diffusers import FluxTransformer2DModel
+    from peft import LoraConfig
+
+    transformer = FluxTransformer2DModel.from_pretrained(model_name, subfolder="transformer", torch_dtype=dtype)
+    transformer.requires_grad_(False)
+    transformer.add_adapter(LoraConfig(
+        r=rank, lora_alpha=alpha, init_lora_weights="gaussian", target_modules=LORA_TARGET_MODULES
+    ))
+    # LoRA 파라미터는 float32로 학습
+    for param in transformer.parameters():
+        if param.requires_grad:
+            param.data = param.data.float()
+    if device == "cuda":
+        transformer.enable_gradient_checkpointing()
+    return transformer.to(device)
+
+
+def flow_matching_loss(transformer, latents, prompt_embeds, pooled, guidance_scale):
+    """rectified flow 손실: x_t = (1 - t) x0 + t noise, 목표 속도 = noise - x0"""
+    from diffusers import FluxPipeline
+
+    batch, channels, height, width = latents.shape
+    device, dtype = latents.device, transformer.dtype
+    noise = torch.randn_like(latents)
+    # logit-normal 타임스텝 샘플링 (SD3/FLUX 학습 기본값)
+    t = torch.sigmoid(torch.randn(batch, device=device))
+    t_ = t.view(-1, 1, 1, 1)
+    noisy = (1 - t_) * latents + t_ * noise
+
+    packed = FluxPipeline._pack_latents(noisy, batch, channels, height, width)
+    target = FluxPipeline._pack_latents(noise - latents, batch, channels, height, width)
+    img_ids = FluxPipeline._prepare_latent_image_ids(batch, height // 2, width // 2, device, dtype)
+    txt_ids = torch.zeros(prompt_embeds.shape[1], 3, device=device, dtype=dtype)
+    guidance = torch.full((batch,), guidance_scale, device=device, dtype=dtype) \
+        if transformer.config.guidance_embeds else None
+
+    pred = transformer(
+        hidden_states=packed.to(dtype),
+        encoder_hidden_states=prompt_embeds.to(dtype),
+        pooled_projections=pooled.to(dtype),
+        timestep=t.to(dtype),
+        img_ids=img_ids,
+        txt_ids=txt_ids,
+        guidance=guidance,
+        return_dict=False,
+    )[0]
+    return torch.nn.functional.mse_loss(pred.float(), target.float())
+
+
+def save_final(checkpoint_dir, output_name, transformer):
+    from diffusers import FluxPipeline
+    from diffusers.utils import convert_state_dict_to_diffusers
+    from peft.utils import get_peft_model_state_dict
+
+    staging = tempfile.mkdtemp(prefix=".staging-", dir=checkpoint_dir)
+    FluxPipeline.save_lora_weights(
+        staging,
+        transformer_lora_layers=convert_state_dict_to_diffusers(get_peft_model_state_dict(transformer)),
+        weight_name=f"{output_name}.safetensors",
+    )
+    _publish(staging, os.path.join(checkpoint_dir, FINAL_DIR))
+    return final_weights(checkpoint_dir, output_name)
+
+
+def train(config):
+    """config (training_process.write_config 참고)로 학습하고 결과 파일 경로 반환"""
+    checkpoint_dir = config["checkpoint_dir"]
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    max_steps = config["max_steps"]
+    checkpoint_every = config.get("checkpoint_every", TRAIN_CHECKPOINT_EVERY)
+
+    stop = {"requested": False}
+
+    def request_stop(signum, frame):
+        stop["requested"] = True
+
+    signal.signal(signal.SIGTERM, request_stop)
+
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    dtype = torch.bfloat16 if device == "cuda" else torch.float32
+
+    with open(config["manifest_path"]) as f:
+        manifest = json.load(f)
+    latents = LatentCache(config["latent_cache_dir"]).open(manifest, config["revision"], config["text_dir"])
+    sampler = BucketBatchSampler(latents.bucket_sizes(), config["batch_sizes"], seed=config.get("seed", 0))
+    throughput = BucketThroughput()
+
+    # LoRA 초기값과 노이즈를 시드로 고정 (재개하면 체크포인트의 난수 상태로 덮어씀)
+    torch.manual_seed(config.get("seed", 0))
+    transformer = load_transformer(config["model_name"], config["rank"], config.get("alpha", config["rank"]),
+                                   device, dtype)
+    params = [p for p in transformer.parameters() if p.requires_grad]
+    optimizer = torch.optim.AdamW(params, lr=config["learning_rate"], weight_decay=1e-4)
+    warmup = config.get("warmup_steps", min(100, max_steps // 10))
+    scheduler = torch.optim.lr_scheduler.LambdaLR(
+        optimizer, lambda s: min(1.0, (s + 1) / warmup) if warmup else 1.0
+    )
+
+    step, loss_avg = 0, None
+    resume_from = latest_checkpoint(checkpoint_dir)
+    if resume_from:
+        step, loss_avg = load_checkpoint(resume_from, transformer, optimizer, scheduler, sampler, throughput)
+        emit("resumed", step=step, max_steps=max_steps, checkpoint=resume_from)
+    emit("start", step=step, max_steps=max_steps, device=device,
+         trainable_params=sum(p.numel() for p in params))
+
+    transformer.train()
+    recent = deque(maxlen=20)
+    while step < max_steps:
+        started = time.perf_counter()
+        bucket, indices = next(sampler)
+        batch_latents, prompt_embeds, pooled = (t.to(device) for t in latents.batch(bucket, indices))
+        loss = flow_matching_loss(transformer, batch_latents.float(), prompt_embeds, pooled,
+                                  config.get("guidance_scale", 1.0))
+        if not math.isfinite(loss.item()):
+            raise FloatingPointError(f"손실이 발산했습니다 (스텝 {step + 1}, 버킷 {bucket})")
+        loss.backward()
+        torch.nn.utils.clip_grad_norm_(params, 1.0)
+        optimizer.step()
+        scheduler.step()
+        optimizer.zero_grad(set_to_none=True)
+        if device == "cuda":
+            torch.cuda.synchronize()
+
+        step += 1
+        elapsed = time.perf_counter() - started
+        recent.append(elapsed)
+        throughput.record(bucket, len(indices), elapsed)
+        loss_value = loss.item()
+        loss_avg = loss_value if loss_avg is None else 0.95 * loss_avg + 0.05 * loss_value
+        emit("step", step=step, max_steps=max_steps, loss=round(loss_value, 5), loss_avg=round(loss_avg, 5),
+             it_s=round(len(recent) / sum(recent), 3), lr=scheduler.get_last_lr()[0], bucket=bucket)
+
+        if stop["requested"] or (checkpoint_every and step % checkpoint_every == 0 and step < max_steps):
+            path = save_checkpoint(checkpoint_dir, step, loss_avg, transformer, optimizer, scheduler, sampler, throughput)
+            emit("checkpoint", step=step, path=path)
+            if stop["requested"]:
+                emit("preempted", step=step, path=path)
+                sys.exit(PREEMPTED_EXIT_CODE)
+
+    output_path = save_final(checkpoint_dir, config["output_name"], transformer)
+    emit("done", step=step, max_steps=max_steps, path=output_path, throughput=throughput.to_dict())
+    return output_path
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        sys.exit("사용법: python train_lora.py <config.json>")
+    with open(sys.argv[1]) as f:
+        train(json.load(f))
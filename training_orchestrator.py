@@ -0,0 +1,372 @@
+"""
+Replicate 학습 오케스트레이터 (asyncio)
+
+- 여러 학습을 한 이벤트 루프에서 동시에 추적
+- 적응형 폴링: 상태가 그대로면 간격을 늘리고(최대 TRAIN_POLL_MAX), 바뀌면 다시 짧게,
+  매번 지터를 섞어 여러 학습의 요청이 한꺼번에 몰리지 않게 함
+- 선택적 웹훅 수신기: Replicate가 보내는 완료 이벤트로 즉시 깨어나고,
+  폴링은 웹훅이 유실될 때를 위한 긴 간격의 보조 수단으로만 사용
+- 학습 후 검증 이미지 생성/다운로드를 풀링된 HTTP 클라이언트로 병렬 처리
+
+REPLICATE_API_URL을 fake_replicate.py 서버로 바꾸면 로컬에서 전체 흐름을 확인할 수 있습니다:
+
+    python training_orchestrator.py --fake 20 --webhook
+"""
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+import random
+import time
+
+from http_client import PooledHTTPClient
+
+# 오케스트레이터 설정 (환경 변수로 변경 가능)
+REPLICATE_API_URL = os.environ.get("REPLICATE_API_URL", "https://api.replicate.com/v1")
+TRAIN_POLL_MIN = float(os.environ.get("TRAIN_POLL_MIN", "5"))
+TRAIN_POLL_MAX = float(os.environ.get("TRAIN_POLL_MAX", "60"))
+TRAIN_POLL_FACTOR = float(os.environ.get("TRAIN_POLL_FACTOR", "1.5"))
+TRAIN_POLL_JITTER = float(os.environ.get("TRAIN_POLL_JITTER", "0.2"))
+# 웹훅을 쓸 때의 보조 폴링 간격 (초)
+TRAIN_WEBHOOK_POLL = float(os.environ.get("TRAIN_WEBHOOK_POLL", "300"))
+# 웹훅 수신기 (공개 URL은 터널/로드밸런서 주소, 비어 있으면 웹훅 사용 안 함)
+WEBHOOK_HOST = os.environ.get("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.environ.get("WEBHOOK_PORT", "8790"))
+WEBHOOK_PUBLIC_URL = os.environ.get("WEBHOOK_PUBLIC_URL", "")
+REPLICATE_WEBHOOK_SECRET = os.environ.get("REPLICATE_WEBHOOK_SECRET", "")
+# 검증 이미지 동시 생성 수
+VALIDATION_CONCURRENCY = int(os.environ.get("VALIDATION_CONCURRENCY", "4"))
+
+TERMINAL = ("succeeded", "failed", "canceled")
+WEBHOOK_PATH = "/replicate/webhook"
+
+
+def poll_delay(delay, jitter=TRAIN_POLL_JITTER):
+    """지터를 섞은 실제 대기 시간"""
+    return delay * random.uniform(1 - jitter, 1 + jitter)
+
+
+def sign_webhook(secret, webhook_id, timestamp, body):
+    """Replicate(Standard Webhooks) 서명: base64(HMAC-SHA256(id.timestamp.body))"""
+    key = base64.b64decode(secret.split("_", 1)[1] if secret.startswith("whsec_") else secret)
+    message = f"{webhook_id}.{timestamp}.".encode() + body
+    return base64.b64encode(hmac.new(key, message, hashlib.sha256).digest()).decode()
+
+
+def verify_webhook(secret, headers, body, tolerance=300):
+    webhook_id = headers.get("webhook-id", "")
+    timestamp = headers.get("webhook-timestamp", "")
+    if not webhook_id or not timestamp.isdigit() or abs(time.time() - int(timestamp)) > tolerance:
+        return False
+    expected = sign_webhook(secret, webhook_id, timestamp, body)
+    signatures = [s.split(",", 1)[-1] for s in headers.get("webhook-signature", "").split()]
+    return any(hmac.compare_digest(expected, s) for s in signatures)
+
+
+class TrainingJob:
+    """추적 중인 학습 하나"""
+
+    def __init__(self, training):
+        self.id = training["id"]
+        self.training = training
+        self.status = training.get("status", "starting")
+        self.started = time.monotonic()
+        self.finished = None
+        self.polls = 0
+        self.webhooks = 0
+        self.event = asyncio.Event()
+
+    @property
+    def version(self):
+        output = self.training.get("output") or {}
+        return output.get("version")
+
+    def update(self, training):
+        changed = training.get("status") != self.status
+        self.training = training
+        self.status = training.get("status", self.status)
+        if self.status in TERMINAL and self.finished is None:
+            self.finished = time.monotonic()
+        return changed
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "status": self.status,
+            "version": self.version,
+            "error": self.training.get("error"),
+            "polls": self.polls,
+            "webhooks": self.webhooks,
+            "elapsed_s": round((self.finished or time.monotonic()) - self.started, 2),
+        }
+
+
+class TrainingOrchestrator:
+    """Replicate HTTP API로 학습 생성/추적, 검증 이미지 생성"""
+
+    def __init__(self, api_url=REPLICATE_API_URL, token=None, client=None,
+                 poll_min=TRAIN_POLL_MIN, poll_max=TRAIN_POLL_MAX, poll_factor=TRAIN_POLL_FACTOR):
+        self.api_url = api_url.rstrip("/")
+        self.token = token if token is not None else os.environ.get("REPLICATE_API_TOKEN", "")
+        self.client = client or PooledHTTPClient()
+        self.poll_min = poll_min
+        self.poll_max = poll_max
+        self.poll_factor = poll_factor
+        self.jobs = {}
+        self.webhook_url = None
+
+    @property
+    def headers(self):
+        return {"Authorization": f"Bearer {self.token}"}
+
+    # --- 학습 ---
+
+    async def create(self, version, input, destination):
+        """학습 생성 (version: "owner/model:version_id")"""
+        model, version_id = version.split(":", 1)
+        body = {"input": input, "destination": destination}
+        if self.webhook_url:
+            body["webhook"] = self.webhook_url
+            body["webhook_events_filter"] = ["start", "completed"]
+        # 생성은 재시도하지 않음 (받아들여진 뒤 시간 초과면 유료 학습이 중복 시작됨)
+        response = await self.client.post(
+            f"{self.api_url}/models/{model}/versions/{version_id}/trainings",
+            headers=self.headers, json=body, retries=0
+        )
+        job = TrainingJob(response.json())
+        self.jobs[job.id] = job
+        print(f"🚀 학습 생성: {job.id} -> {destination}")
+        return job
+
+    async def refresh(self, job):
+        response = await self.client.get(f"{self.api_url}/trainings/{job.id}", headers=self.headers)
+        job.polls += 1
+        return job.update(response.json())
+
+    async def cancel(self, job):
+        await self.client.post(f"{self.api_url}/trainings/{job.id}/cancel", headers=self.headers, retries=0)
+
+    def notify(self, training):
+        """웹훅으로 받은 학습 상태 반영 (추적 중이고 아직 끝나지 않은 학습만)"""
+        job = self.jobs.get(training.get("id"))
+        if job is None:
+            return False
+        job.webhooks += 1
+        if job.status in TERMINAL:
+            # 늦게 도착하거나 재전송된 웹훅이 끝난 상태를 덮어쓰지 않게 함
+            return False
+        job.update(training)
+        job.event.set()
+        return True
+
+    async def wait(self, job, on_update=None):
+        """끝날 때까지 적응형 폴링 (웹훅을 받으면 바로 깨어남)"""
+        if isinstance(job, str):
+            job = self.jobs.get(job) or TrainingJob({"id": job, "status": "unknown"})
+            self.jobs[job.id] = job
+            await self.refresh(job)
+        delay = self.poll_min
+        while job.status not in TERMINAL:
+            timeout = poll_delay(TRAIN_WEBHOOK_POLL if self.webhook_url else delay)
+            job.event.clear()
+            try:
+                await asyncio.wait_for(job.event.wait(), timeout)
+                changed = True
+            except asyncio.TimeoutError:
+                changed = await self.refresh(job)
+            if changed and on_update:
+                on_update(job)
+            delay = self.poll_min if changed else min(self.poll_max, delay * self.poll_factor)
+
+        if job.status == "succeeded":
+            print(f"✅ 학습 완료: {job.id} ({job.version}, 폴링 {job.polls}회, 웹훅 {job.webhooks}회)")
+        else:
+            print(f"❌ 학습 {job.status}: {job.id} {job.training.get('error') or ''}")
+        return job
+
+    async def wait_all(self, jobs, on_update=None):
+        return await asyncio.gather(*(self.wait(job, on_update) for job in jobs))
+
+    # --- 검증 이미지 ---
+
+    async def predict(self, version, input, timeout=600):
+        """예측 생성 (Prefer: wait 후 필요하면 지터 백오프 폴링)"""
+        version_id = version.split(":", 1)[-1]
+        response = await self.client.post(
+            f"{self.api_url}/predictions", headers={**self.headers, "Prefer": "wait"},
+            json={"version": version_id, "input": input}, retries=0
+        )
+        prediction = response.json()
+        deadline = time.monotonic() + timeout
+        delay = 0.5
+        while prediction.get("status") not in TERMINAL:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"예측 시간 초과: {prediction.get('id')}")
+            await asyncio.sleep(poll_delay(delay))
+            delay = min(5.0, delay * self.poll_factor)
+            response = await self.client.get(prediction["urls"]["get"], headers=self.headers)
+            prediction = response.json()
+        if prediction["status"] != "succeeded":
+            raise RuntimeError(f"예측 실패: {prediction.get('error') or prediction['status']}")
+        output = prediction["output"]
+        return output if isinstance(output, list) else [output]
+
+    async def validate(self, version, prompts, output_dir, input=None,
+                       concurrency=VALIDATION_CONCURRENCY):
+        """프롬프트별 검증 이미지를 병렬로 생성하고 다운로드되는 대로 저장
+
+        Returns:
+            [{"prompt", "files"} 또는 {"prompt", "error"}] (prompts 순서)
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def download(url, path):
+            response = await self.client.get(url)
+            with open(path, "wb") as f:
+                f.write(response.body)
+            return path
+
+        async def one(i, prompt):
+            async with semaphore:
+                try:
+                    urls = await self.predict(version, {**(input or {}), "prompt": prompt})
+                except Exception as e:
+                    print(f"   ❌ {prompt}: {e}")
+                    return {"prompt": prompt, "error": str(e)}
+                try:
+                    files = await asyncio.gather(*(
+                        download(url, os.path.join(output_dir, f"output_{i}_{j}.png"))
+                        for j, url in enumerate(urls)
+                    ))
+                except Exception as e:
+                    # 다운로드 실패도 예측 실패처럼 해당 프롬프트만 오류로 기록
+                    print(f"   ❌ {prompt}: 다운로드 실패: {e}")
+                    return {"prompt": prompt, "error": f"다운로드 실패: {e}"}
+            for path in files:
+                print(f"   ✅ 저장: {path}")
+            return {"prompt": prompt, "files": list(files)}
+
+        return await asyncio.gather(*(one(i, p) for i, p in enumerate(prompts)))
+
+    async def close(self):
+        await self.client.close()
+
+
+class WebhookReceiver:
+    """Replicate 웹훅을 받아 오케스트레이터에 전달하는 로컬 HTTP 서버
+
+    서명 키(REPLICATE_WEBHOOK_SECRET) 없이는 시작하지 않습니다. 포트에 닿을 수 있는
+    누구나 succeeded와 임의의 output.version을 보낼 수 있기 때문입니다.
+    """
+
+    def __init__(self, orchestrator, public_url=WEBHOOK_PUBLIC_URL, host=WEBHOOK_HOST,
+                 port=WEBHOOK_PORT, secret=REPLICATE_WEBHOOK_SECRET):
+        self.orchestrator = orchestrator
+        self.public_url = public_url.rstrip("/")
+        self.host = host
+        self.port = port
+        self.secret = secret
+        self.received = 0
+        self.rejected = 0
+        self._runner = None
+
+    async def _handle(self, request):
+        from aiohttp import web
+
+        body = await request.read()
+        if not verify_webhook(self.secret, request.headers, body):
+            self.rejected += 1
+            return web.Response(status=401)
+        self.received += 1
+        self.orchestrator.notify(await request.json())
+        return web.Response(status=204)
+
+    async def start(self):
+        from aiohttp import web
+
+        if not self.secret:
+            raise ValueError("웹훅 수신기에는 REPLICATE_WEBHOOK_SECRET이 필요합니다 (서명 없는 웹훅은 받지 않음)")
+        app = web.Application()
+        app.router.add_post(WEBHOOK_PATH, self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.orchestrator.webhook_url = f"{self.public_url}{WEBHOOK_PATH}"
+        print(f"📡 웹훅 수신 대기: {self.host}:{self.port} ({self.orchestrator.webhook_url})")
+        return self
+
+    async def stop(self):
+        self.orchestrator.webhook_url = None
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+
+async def run_fake(count, webhook, training_seconds, prompts, output_dir):
+    """fake_replicate 서버를 띄우고 학습 count개를 동시에 추적"""
+    from fake_replicate import FakeReplicate
+
+    # 로컬 확인용 서명 키 (환경 변수가 없으면 임시 키 생성)
+    secret = REPLICATE_WEBHOOK_SECRET or f"whsec_{base64.b64encode(os.urandom(24)).decode()}"
+    fake = FakeReplicate(training_seconds=training_seconds, secret=secret)
+    base_url = await fake.start("127.0.0.1", 0)
+    orchestrator = TrainingOrchestrator(api_url=f"{base_url}/v1", token="fake",
+                                        poll_min=min(TRAIN_POLL_MIN, training_seconds / 10))
+    receiver = None
+    if webhook:
+        receiver = await WebhookReceiver(orchestrator, public_url=f"http://127.0.0.1:{WEBHOOK_PORT}",
+                                         host="127.0.0.1", secret=secret).start()
+    try:
+        started = time.monotonic()
+        jobs = await asyncio.gather(*(
+            orchestrator.create("fake/flux-dev-lora-trainer:abc123", {"steps": 1000},
+                                f"user/lora-{i}")
+            for i in range(count)
+        ))
+        jobs = await orchestrator.wait_all(jobs)
+        tracked_s = time.monotonic() - started
+
+        started = time.monotonic()
+        results = await orchestrator.validate(jobs[0].version, prompts, output_dir)
+        validate_s = time.monotonic() - started
+
+        # 완료 시각과 오케스트레이터가 알아챈 시각의 차이 = 폴링 지연
+        lags = [job.finished - fake.completed_at(job.id) for job in jobs]
+        report = {
+            "trainings": count,
+            "webhook": webhook,
+            "tracked_s": round(tracked_s, 2),
+            "status_requests": fake.requests["get_training"],
+            "polls_per_training": round(sum(j.polls for j in jobs) / count, 1),
+            "detect_lag_s_mean": round(sum(lags) / count, 2),
+            "detect_lag_s_max": round(max(lags), 2),
+            "validation_images": sum(len(r.get("files", [])) for r in results),
+            "validate_s": round(validate_s, 2),
+        }
+        print(report)
+        return report
+    finally:
+        if receiver:
+            await receiver.stop()
+        await orchestrator.close()
+        await fake.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replicate 학습 오케스트레이터 (가짜 API로 확인)")
+    parser.add_argument("--fake", type=int, default=10, help="동시에 추적할 학습 수")
+    parser.add_argument("--webhook", action="store_true")
+    parser.add_argument("--training-seconds", type=float, default=5.0)
+    parser.add_argument("--output-dir", default="validation")
+    args = parser.parse_args()
+
+    prompts = [f"TOK test prompt {i}" for i in range(8)]
+    asyncio.run(run_fake(args.fake, args.webhook, args.training_seconds, prompts, args.output_dir))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+학습 서브프로세스 관리
+
+- 실행: train_lora.py 또는 Kohya 스크립트를 subprocess.Popen으로 띄우고 stdout을 한 줄씩 읽음
+  (워커 스레드를 막는 os.system 대신, 종료 코드와 마지막 로그를 확인)
+- 진행: "@progress {json}" 줄(train_lora)과 Kohya tqdm 줄("steps: 12%|..| 120/1000 [.., 1.43it/s, avr_loss=0.12]")을
+  {"step", "max_steps", "loss", "it_s", "eta_s"} 이벤트로 변환, TRAIN_PROGRESS_INTERVAL초마다 하나씩 전달
+- 선점: 워커가 SIGTERM을 받으면 자식에게 전달하고, 자식이 체크포인트를 쓰고 끝날 때까지 기다림
+- 작업 키: 같은 job_key(또는 같은 데이터셋/모델/하이퍼파라미터)로 다시 제출하면 같은
+  체크포인트 디렉토리를 사용하므로 마지막 체크포인트부터 이어서 학습
+"""
+
+import hashlib
+import json
+import os
+import re
+import signal
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+
+from train_lora import PROGRESS_PREFIX, PREEMPTED_EXIT_CODE
+
+# 진행 이벤트 전달 간격 (초, 체크포인트/시작/종료 이벤트는 항상 전달)
+TRAIN_PROGRESS_INTERVAL = float(os.environ.get("TRAIN_PROGRESS_INTERVAL", "2"))
+# 같은 작업 키를 다른 워커가 학습 중일 때 기다리는 시간 (초)
+TRAIN_LOCK_TIMEOUT = float(os.environ.get("TRAIN_LOCK_TIMEOUT", "60"))
+# 자식 프로세스가 SIGTERM 후 체크포인트를 쓰고 끝나기까지 기다리는 시간 (초)
+TRAIN_STOP_TIMEOUT = float(os.environ.get("TRAIN_STOP_TIMEOUT", "120"))
+
+KOHYA_PROGRESS = re.compile(
+    r"steps:\s*\d+%.*?\|\s*(\d+)/(\d+)\s*\[[^\],]*"
+    r"(?:,\s*([\d.]+)(it/s|s/it))?"
+    r"(?:,\s*avr_loss=([-+\d.eE]+|nan))?"
+)
+KOHYA_CHECKPOINT = re.compile(r"saving (?:checkpoint|state)[^:]*:\s*(\S+)", re.IGNORECASE)
+JOB_KEY_PATTERN = re.compile(r"^[A-Za-z0-9._-]{1,128}$")
+LOG_TAIL_LINES = 40
+
+
+def parse_progress(line):
+    """학습 로그 한 줄 -> 이벤트 dict (진행 줄이 아니면 None)"""
+    line = line.strip()
+    if line.startswith(PROGRESS_PREFIX):
+        try:
+            return json.loads(line[len(PROGRESS_PREFIX):])
+        except ValueError:
+            return None
+
+    match = KOHYA_PROGRESS.search(line)
+    if match:
+        step, max_steps, rate, unit, loss = match.groups()
+        event = {"event": "step", "step": int(step), "max_steps": int(max_steps)}
+        if rate and float(rate) > 0:
+            event["it_s"] = round(float(rate) if unit == "it/s" else 1 / float(rate), 3)
+        if loss and loss != "nan":
+            event["loss_avg"] = float(loss)
+        return event
+
+    match = KOHYA_CHECKPOINT.search(line)
+    if match:
+        return {"event": "checkpoint", "path": match.group(1)}
+    return None
+
+
+def job_key(job_input, **identity):
+    """체크포인트 디렉토리 이름
+
+    job_input["job_key"]가 있으면 그대로(안전한 문자만) 쓰고, 없으면 데이터셋/모델/하이퍼파라미터
+    해시를 사용해 같은 작업을 다시 제출하면 같은 키가 나오게 합니다.
+    """
+    key = job_input.get("job_key")
+    if key:
+        key = str(key)
+        return key if JOB_KEY_PATTERN.match(key) else hashlib.sha256(key.encode()).hexdigest()[:24]
+    raw = json.dumps(identity, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()[:24]
+
+
+class TrainingProcess:
+    """학습 서브프로세스 하나 (events()로 진행 이벤트를 받음)
+
+    Args:
+        argv: 실행할 명령 (리스트)
+        cwd: 작업 디렉토리
+        env: 추가 환경 변수
+        interval: step 이벤트 최소 간격 (초)
+    """
+
+    def __init__(self, argv, cwd=None, env=None, interval=TRAIN_PROGRESS_INTERVAL):
+        self.argv = [str(a) for a in argv]
+        self.cwd = cwd
+        self.env = {**os.environ, "PYTHONUNBUFFERED": "1", **(env or {})}
+        self.interval = interval
+        self.proc = None
+        self.tail = deque(maxlen=LOG_TAIL_LINES)
+        self.last_step = None
+        self.last_checkpoint = None
+        self.preempted = False
+
+    def _forward_sigterm(self):
+        """워커 SIGTERM을 자식에게 전달 (메인 스레드에서만 설치 가능)"""
+        if threading.current_thread() is not threading.main_thread():
+            return None
+
+        def forward(signum, frame):
+            self.preempted = True
+            print("⚠️ SIGTERM 수신: 학습 프로세스에 체크포인트 저장 요청")
+            if self.proc and self.proc.poll() is None:
+                self.proc.send_signal(signal.SIGTERM)
+
+        return signal.signal(signal.SIGTERM, forward)
+
+    def stop(self, timeout=TRAIN_STOP_TIMEOUT):
+        """SIGTERM으로 체크포인트 저장 후 종료를 요청하고, 시간이 지나면 강제 종료"""
+        if self.proc is None or self.proc.poll() is not None:
+            return
+        self.proc.send_signal(signal.SIGTERM)
+        try:
+            self.proc.wait(timeout)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+            self.proc.wait()
+
+    def events(self):
+        """진행 이벤트를 yield (실패하거나 중단되면 RuntimeError)"""
+        print(f"🏃 학습 프로세스 시작: {' '.join(self.argv)}")
+        self.proc = subprocess.Popen(
+            self.argv, cwd=self.cwd, env=self.env,
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1
+        )
+        previous_handler = self._forward_sigterm()
+        started = time.monotonic()
+        last_sent = 0.0
+        pending = None
+        try:
+            # text 모드는 tqdm의 \r도 줄 끝으로 처리
+            for line in self.proc.stdout:
+                event = parse_progress(line)
+                if event is None:
+                    if line.strip():
+                        self.tail.append(line.rstrip())
+                        print(line.rstrip())
+                    continue
+
+                if event["event"] == "step":
+                    self.last_step = event["step"]
+                    rate = event.get("it_s")
+                    if rate:
+                        event["eta_s"] = round((event["max_steps"] - event["step"]) / rate, 1)
+                    event["elapsed_s"] = round(time.monotonic() - started, 1)
+                    now = time.monotonic()
+                    if now - last_sent < self.interval:
+                        pending = event
+                        continue
+                    last_sent, pending = now, None
+                elif pending is not None:
+                    # 다른 이벤트 앞에 마지막 스텝을 먼저 전달
+                    yield pending
+                    pending = None
+                if event["event"] == "checkpoint":
+                    self.last_checkpoint = event.get("path")
+                    self.last_step = event.get("step", self.last_step)
+                elif event["event"] == "preempted":
+                    self.preempted = True
+                yield event
+
+            returncode = self.proc.wait()
+        finally:
+            # 소비자가 중간에 멈추거나 예외가 나면 자식도 체크포인트를 쓰고 끝나게 함
+            self.stop()
+            if previous_handler is not None:
+                signal.signal(signal.SIGTERM, previous_handler)
+
+        if pending is not None:
+            yield pending
+        if returncode in (PREEMPTED_EXIT_CODE, -signal.SIGTERM) or self.preempted:
+            raise RuntimeError(
+                f"학습이 중단되었습니다 (스텝 {self.last_step}, 체크포인트 {self.last_checkpoint}). "
+                f"같은 job_key로 다시 제출하면 이어서 학습합니다."
+            )
+        if returncode != 0:
+            log = "\n".join(self.tail)
+            raise RuntimeError(f"학습 프로세스 실패 (종료 코드 {returncode}):\n{log}")
+
+
+def write_config(path, config):
+    """train_lora.py 설정 파일 저장 후 실행 명령 반환"""
+    with open(path, "w") as f:
+        json.dump(config, f)
+    return [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "train_lora.py"), path]
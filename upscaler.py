@@ -0,0 +1,242 @@
+"""
+타일 기반 병렬 업스케일링 엔진
+
+- 겹치는 타일을 스레드 풀에서 병렬 처리 (OpenCV는 GIL을 해제함)
+- 백엔드: cubic, lanczos, sr (OpenCV dnn_superres 학습 모델, CPU 경로)
+- 보간 백엔드는 여백이 커널 크기보다 크면 타일 결과가 전체 프레임과 동일하므로
+  여백만 잘라 출력 배열에 바로 씀 (블렌딩 불필요)
+- 학습 모델 백엔드는 타일 행(strip) 단위로 가중치 블렌딩해 이음새를 없애고,
+  누적 버퍼를 strip 크기로 제한해 메모리 사용량을 묶어 둠
+- PIL <-> numpy 변환은 입력 1회, 출력은 버퍼 공유(Image.fromarray)로 처리
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# 업스케일 설정 (환경 변수로 변경 가능)
+UPSCALE_BACKEND = os.environ.get("UPSCALE_BACKEND", "cubic").lower()
+UPSCALE_TILE_SIZE = int(os.environ.get("UPSCALE_TILE_SIZE", "512"))
+UPSCALE_OVERLAP = int(os.environ.get("UPSCALE_OVERLAP", "16"))
+UPSCALE_WORKERS = int(os.environ.get("UPSCALE_WORKERS", str(os.cpu_count() or 4)))
+# 학습 모델 파일 디렉토리 (예: ESPCN_x2.pb, FSRCNN_x3.pb, EDSR_x4.pb)
+UPSCALE_MODEL_DIR = os.environ.get("UPSCALE_MODEL_DIR", "/workspace/models/superres")
+UPSCALE_MODEL = os.environ.get("UPSCALE_MODEL", "espcn").lower()
+
+MAX_SCALE = 8
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=UPSCALE_WORKERS, thread_name_prefix="upscale")
+    return _executor
+
+
+class InterpolationBackend:
+    """OpenCV 보간 백엔드 (타일 결과가 전체 프레임 결과와 동일)"""
+
+    needs_blending = False
+
+    def __init__(self, interpolation, support):
+        self.interpolation = interpolation
+        # 커널 반경 (입력 픽셀 기준), 여백은 이보다 커야 함
+        self.support = support
+
+    def __call__(self, tile, scale):
+        height, width = tile.shape[:2]
+        return cv2.resize(tile, (width * scale, height * scale), interpolation=self.interpolation)
+
+
+class SuperResBackend:
+    """OpenCV dnn_superres 학습 모델 백엔드 (CPU)
+
+    opencv-contrib-python과 UPSCALE_MODEL_DIR의 모델 파일이 필요합니다.
+    DnnSuperResImpl은 스레드 안전하지 않으므로 스레드마다 인스턴스를 만듭니다.
+    """
+
+    needs_blending = True
+    support = 8
+
+    def __init__(self, model=UPSCALE_MODEL, model_dir=UPSCALE_MODEL_DIR):
+        if not hasattr(cv2, "dnn_superres"):
+            raise RuntimeError("sr 백엔드에는 opencv-contrib-python이 필요합니다")
+        self.model = model
+        self.model_dir = model_dir
+        self._local = threading.local()
+
+    def _model_path(self, scale):
+        return os.path.join(self.model_dir, f"{self.model.upper()}_x{scale}.pb")
+
+    def _get_impl(self, scale):
+        impls = getattr(self._local, "impls", None)
+        if impls is None:
+            impls = self._local.impls = {}
+        if scale not in impls:
+            path = self._model_path(scale)
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"업스케일 모델 파일이 없습니다: {path}")
+            impl = cv2.dnn_superres.DnnSuperResImpl_create()
+            impl.readModel(path)
+            impl.setModel(self.model, scale)
+            impl.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+            impl.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+            impls[scale] = impl
+        return impls[scale]
+
+    def __call__(self, tile, scale):
+        # dnn_superres는 BGR 3채널 입력을 기대함
+        bgr = cv2.cvtColor(tile, cv2.COLOR_RGB2BGR)
+        return cv2.cvtColor(self._get_impl(scale).upsample(bgr), cv2.COLOR_BGR2RGB)
+
+
+_backends = {}
+
+
+def get_backend(name):
+    """이름으로 업스케일 백엔드 반환"""
+    name = name.lower()
+    if name not in _backends:
+        if name == "cubic":
+            _backends[name] = InterpolationBackend(cv2.INTER_CUBIC, support=2)
+        elif name == "lanczos":
+            _backends[name] = InterpolationBackend(cv2.INTER_LANCZOS4, support=4)
+        elif name == "sr":
+            _backends[name] = SuperResBackend()
+        else:
+            raise ValueError(f"지원하지 않는 업스케일 백엔드: {name} (cubic, lanczos, sr)")
+    return _backends[name]
+
+
+def _tile_starts(length, tile_size):
+    return list(range(0, length, tile_size))
+
+
+def _upscale_cropped(src, out, scale, backend, tile_size, overlap):
+    """타일마다 여백을 붙여 처리하고 중심부만 출력에 복사 (병렬, 서로 겹치지 않음)"""
+    height, width = src.shape[:2]
+
+    def work(y0, x0):
+        y1, x1 = min(y0 + tile_size, height), min(x0 + tile_size, width)
+        ey0, ex0 = max(y0 - overlap, 0), max(x0 - overlap, 0)
+        ey1, ex1 = min(y1 + overlap, height), min(x1 + overlap, width)
+
+        result = backend(src[ey0:ey1, ex0:ex1], scale)
+        if result.ndim == 2:
+            result = result[:, :, None]
+        oy, ox = (y0 - ey0) * scale, (x0 - ex0) * scale
+        out[y0 * scale:y1 * scale, x0 * scale:x1 * scale] = \
+            result[oy:oy + (y1 - y0) * scale, ox:ox + (x1 - x0) * scale]
+
+    futures = [
+        _get_executor().submit(work, y0, x0)
+        for y0 in _tile_starts(height, tile_size)
+        for x0 in _tile_starts(width, tile_size)
+    ]
+    for future in futures:
+        future.result()
+
+
+def _ramp(length, fade_start, fade_end):
+    """가장자리 블렌딩용 1D 가중치 (겹치는 쪽만 선형으로 감소)"""
+    index = np.arange(length, dtype=np.float32)
+    weights = np.ones(length, dtype=np.float32)
+    if fade_start > 0:
+        weights = np.minimum(weights, (index + 1) / (fade_start + 1))
+    if fade_end > 0:
+        weights = np.minimum(weights, (length - index) / (fade_end + 1))
+    return weights
+
+
+def _upscale_blended(src, out, scale, backend, tile_size, overlap):
+    """타일 행 단위로 가중 누적 후 정규화 (이음새 블렌딩, strip 크기 메모리)"""
+    height, width = src.shape[:2]
+    channels = out.shape[2]
+    out_width = width * scale
+    lock = threading.Lock()
+
+    # 이전 strip과 겹치는 행 (아직 확정되지 않은 누적값)
+    carry_start, carry_acc, carry_weight = 0, None, None
+
+    for y0 in _tile_starts(height, tile_size):
+        y1 = min(y0 + tile_size, height)
+        ey0, ey1 = max(y0 - overlap, 0), min(y1 + overlap, height)
+        strip_h = (ey1 - ey0) * scale
+        acc = np.zeros((strip_h, out_width, channels), dtype=np.float32)
+        weight = np.zeros((strip_h, out_width), dtype=np.float32)
+
+        def work(x0):
+            x1 = min(x0 + tile_size, width)
+            ex0, ex1 = max(x0 - overlap, 0), min(x1 + overlap, width)
+            result = backend(src[ey0:ey1, ex0:ex1], scale).astype(np.float32)
+            if result.ndim == 2:
+                result = result[:, :, None]
+
+            wy = _ramp(strip_h, (y0 - ey0) * 2 * scale, (ey1 - y1) * 2 * scale)
+            wx = _ramp((ex1 - ex0) * scale, (x0 - ex0) * 2 * scale, (ex1 - x1) * 2 * scale)
+            w = np.outer(wy, wx)
+            with lock:
+                acc[:, ex0 * scale:ex1 * scale] += result * w[:, :, None]
+                weight[:, ex0 * scale:ex1 * scale] += w
+
+        futures = [_get_executor().submit(work, x0) for x0 in _tile_starts(width, tile_size)]
+        for future in futures:
+            future.result()
+
+        # 이전 strip에서 넘어온 겹침 영역 합산
+        if carry_acc is not None:
+            rows = carry_acc.shape[0]
+            offset = carry_start - ey0 * scale
+            acc[offset:offset + rows] += carry_acc
+            weight[offset:offset + rows] += carry_weight
+
+        # 다음 strip과 겹치는 행은 남겨두고 나머지를 확정
+        final_end = strip_h if y1 == height else (y1 - overlap - ey0) * scale
+        block = acc[:final_end] / np.maximum(weight[:final_end], 1e-6)[:, :, None]
+        out[ey0 * scale:ey0 * scale + final_end] = np.clip(block + 0.5, 0, 255).astype(np.uint8)
+
+        carry_start = ey0 * scale + final_end
+        carry_acc = acc[final_end:].copy() if final_end < strip_h else None
+        carry_weight = weight[final_end:].copy() if final_end < strip_h else None
+
+
+def upscale_array(src, scale=2, backend=UPSCALE_BACKEND, tile_size=UPSCALE_TILE_SIZE,
+                  overlap=UPSCALE_OVERLAP):
+    """numpy(H, W, C) uint8 배열 업스케일"""
+    scale = int(scale)
+    if not 1 <= scale <= MAX_SCALE:
+        raise ValueError(f"upscale_factor는 1~{MAX_SCALE} 사이 정수여야 합니다: {scale}")
+    if scale == 1:
+        return src
+
+    if isinstance(backend, str):
+        backend = get_backend(backend)
+    # 보간 백엔드는 커널 반경만큼의 여백이면 결과가 정확히 같음
+    overlap = max(overlap, backend.support) if backend.needs_blending else backend.support
+    tile_size = max(tile_size, overlap * 2)
+
+    squeeze = src.ndim == 2
+    if squeeze:
+        src = src[:, :, None]
+    height, width, channels = src.shape
+    out = np.empty((height * scale, width * scale, channels), dtype=np.uint8)
+
+    if backend.needs_blending:
+        _upscale_blended(src, out, scale, backend, tile_size, overlap)
+    else:
+        _upscale_cropped(src, out, scale, backend, tile_size, overlap)
+
+    return out[:, :, 0] if squeeze else out
+
+
+def upscale(image, scale=2, backend=UPSCALE_BACKEND, tile_size=UPSCALE_TILE_SIZE,
+            overlap=UPSCALE_OVERLAP):
+    """PIL 이미지 업스케일 (출력은 numpy 버퍼를 공유)"""
+    src = np.asarray(image)
+    return Image.fromarray(upscale_array(src, scale, backend, tile_size, overlap))